@@ -24,7 +24,7 @@ async def get_application_metrics() -> Dict[str, Any]:
     - 缓存指标（命中率、内存使用、淘汰率）
     """
     try:
-        return application_collector.collect_all()
+        return await application_collector.collect_all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -35,7 +35,7 @@ async def get_api_services() -> Dict[str, Any]:
     获取所有API服务的监控数据
     """
     try:
-        result = application_collector.collect_all()
+        result = await application_collector.collect_all()
         return {
             "services": result.get("api_services", {}),
             "timestamp": result.get("timestamp")
@@ -60,7 +60,7 @@ async def get_service_metrics(service_name: str) -> Dict[str, Any]:
     
     try:
         config = application_collector.services[service_name]
-        metrics = application_collector.api_monitor.get_service_metrics(
+        metrics = await application_collector.api_monitor.get_service_metrics_async(
             service_name=service_name,
             base_url=config['base_url'],
             endpoints=config['endpoints']
@@ -76,7 +76,7 @@ async def get_service_health(service_name: str) -> Dict[str, Any]:
     获取指定服务的健康状态
     """
     try:
-        return application_collector.get_service_health(service_name)
+        return await application_collector.get_service_health(service_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -6,6 +6,7 @@
 """
 
 from fastapi import APIRouter, HTTPException
+from datetime import datetime
 from typing import Dict, Any
 
 from app.services.infrastructure_monitor import (
@@ -29,7 +30,7 @@ async def get_infrastructure_metrics() -> Dict[str, Any]:
     - 文件系统指标（磁盘使用、文件统计）
     """
     try:
-        return infrastructure_collector.collect_all()
+        return await infrastructure_collector.collect_all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -76,7 +77,7 @@ async def get_port_metrics() -> Dict[str, Any]:
     获取所有服务端口的监控数据
     """
     try:
-        return infrastructure_collector.port_monitor.monitor_service_ports()
+        return await infrastructure_collector.port_monitor.monitor_service_ports_async()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -103,7 +104,7 @@ async def get_service_port_metrics(service_name: str) -> Dict[str, Any]:
     
     try:
         host, port = port_map[service_name]
-        metrics = infrastructure_collector.port_monitor.check_port(host, port)
+        metrics = await infrastructure_collector.port_monitor.check_port_async(host, port)
         return metrics.to_dict()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -115,9 +116,9 @@ async def get_filesystem_metrics() -> Dict[str, Any]:
     获取文件系统监控数据
     """
     try:
-        return (
+        return await (
             infrastructure_collector.filesystem_monitor
-            .monitor_project_directories()
+            .monitor_project_directories_async()
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -143,7 +144,7 @@ async def get_all_services_health() -> Dict[str, Any]:
     """
     services = ['yl-monitor', 'ar-backend', 'user-gui']
     result = {
-        "timestamp": infrastructure_collector.collect_all()["timestamp"],
+        "timestamp": datetime.now().isoformat(),
         "services": {}
     }
     
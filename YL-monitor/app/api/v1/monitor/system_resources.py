@@ -18,6 +18,16 @@ from app.services.system_resource_monitor import (
 router = APIRouter()
 
 
+def _history(monitor, limit: int, columnar: bool):
+    """历史数据：columnar=true 时按列返回，避免逐样本构造字典"""
+    if columnar:
+        return {
+            name: values.tolist()
+            for name, values in monitor.export_usage_history(last=limit).items()
+        }
+    return monitor.get_usage_history(last=limit)
+
+
 @router.get("/system-resources")
 async def get_system_resources() -> Dict[str, Any]:
     """
@@ -36,16 +46,20 @@ async def get_system_resources() -> Dict[str, Any]:
 
 
 @router.get("/system-resources/cpu")
-async def get_cpu_metrics() -> Dict[str, Any]:
+async def get_cpu_metrics(limit: int = 60, columnar: bool = False) -> Dict[str, Any]:
     """
     获取 CPU 详细指标
+    
+    - limit: 返回的历史样本数
+    - columnar: 历史按列返回（timestamp/overall/per_cpu 各一个数组）
     """
     try:
-        metrics = system_resource_collector.cpu_monitor.collect_metrics()
+        cpu_monitor = system_resource_collector.cpu_monitor
+        metrics = cpu_monitor.collect_metrics()
         return {
             "metrics": metrics.to_dict(),
-            "pressure": system_resource_collector.cpu_monitor.get_cpu_pressure(),
-            "history": system_resource_collector.cpu_monitor.get_usage_history()
+            "pressure": cpu_monitor.get_cpu_pressure(),
+            "history": _history(cpu_monitor, limit, columnar)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -63,20 +77,20 @@ async def get_cpu_pressure() -> Dict[str, Any]:
 
 
 @router.get("/system-resources/memory")
-async def get_memory_metrics() -> Dict[str, Any]:
+async def get_memory_metrics(limit: int = 60, columnar: bool = False) -> Dict[str, Any]:
     """
     获取内存详细指标
+    
+    - limit: 返回的历史样本数
+    - columnar: 历史按列返回
     """
     try:
-        metrics = system_resource_collector.memory_monitor.collect_metrics()
+        memory_monitor = system_resource_collector.memory_monitor
+        metrics = memory_monitor.collect_metrics()
         return {
             "metrics": metrics.to_dict(),
-            "pressure": (
-                system_resource_collector.memory_monitor.get_memory_pressure()
-            ),
-            "history": (
-                system_resource_collector.memory_monitor.get_usage_history()
-            )
+            "pressure": memory_monitor.get_memory_pressure(),
+            "history": _history(memory_monitor, limit, columnar)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -8,6 +8,10 @@
 - AR告警和通知
 - 与现有监控系统集成
 
+设备指标按设备保存在列式环形缓冲区中(每个指标一列 NumPy 数组)，
+不再逐样本保存 ARMetrics 对象；告警规则按指标索引，持续型规则
+(持续 N 秒满足条件)对时间窗口做向量化判断；历史查询支持按时间桶降采样。
+
 作者: AI Assistant
 创建时间: 2026-02-10
 版本: 1.0.0
@@ -16,6 +20,7 @@
 - 数据模型: app/models/ar.py
 - WebSocket: app/ws/ar_ws.py
 - 事件总线: app/services/event_bus.py
+- 列式环形缓冲区: app/services/ring_buffer.py
 
 示例:
     extension = ARMonitorExtension()
@@ -29,7 +34,11 @@ import logging
 import time
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Any, Callable, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from app.services.ring_buffer import ColumnarRing
 
 logger = logging.getLogger(__name__)
 
@@ -185,6 +194,7 @@ class ARMetrics:
         scene_id: 场景ID
         fps: 帧率
         cpu_usage: CPU使用率
+        gpu_usage: GPU使用率
         memory_usage: 内存使用率
         tracking_quality: 追踪质量(0-100)
         network_latency: 网络延迟(ms)
@@ -197,6 +207,7 @@ class ARMetrics:
     scene_id: Optional[str] = None
     fps: float = 0.0
     cpu_usage: float = 0.0
+    gpu_usage: float = 0.0
     memory_usage: float = 0.0
     tracking_quality: float = 100.0
     network_latency: float = 0.0
@@ -212,6 +223,7 @@ class ARMetrics:
             'scene_id': self.scene_id,
             'fps': self.fps,
             'cpu_usage': self.cpu_usage,
+            'gpu_usage': self.gpu_usage,
             'memory_usage': self.memory_usage,
             'tracking_quality': self.tracking_quality,
             'network_latency': self.network_latency,
@@ -221,6 +233,21 @@ class ARMetrics:
         }
 
 
+# 按列存储的数值指标
+METRIC_FIELDS = (
+    'fps', 'cpu_usage', 'gpu_usage', 'memory_usage', 'tracking_quality',
+    'network_latency', 'battery_level', 'temperature', 'error_count',
+)
+
+_OPERATORS = {
+    ">": np.greater,
+    "<": np.less,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    "==": np.equal,
+}
+
+
 class ARAlertRule:
     """
     【AR告警规则】AR监控告警规则
@@ -234,6 +261,8 @@ class ARAlertRule:
         severity: 严重级别
         enabled: 是否启用
         cooldown: 冷却时间(秒)
+        duration: 持续时间(秒)，为 0 时单个样本满足即触发，
+            否则需最近 duration 秒内的样本全部满足
     """
     
     def __init__(
@@ -245,7 +274,8 @@ class ARAlertRule:
         operator: str = ">",
         severity: str = "warning",
         enabled: bool = True,
-        cooldown: float = 300.0
+        cooldown: float = 300.0,
+        duration: float = 0.0
     ):
         self.rule_id = rule_id
         self.rule_name = rule_name
@@ -255,8 +285,19 @@ class ARAlertRule:
         self.severity = severity
         self.enabled = enabled
         self.cooldown = cooldown
+        self.duration = duration
         self._last_triggered: float = 0.0
     
+    def _ready(self, current_time: float) -> bool:
+        """是否启用且已过冷却时间"""
+        return self.enabled and current_time - self._last_triggered >= self.cooldown
+    
+    def _compare(self, values):
+        compare = _OPERATORS.get(self.operator)
+        if compare is None:
+            return np.zeros(np.shape(values), dtype=bool)
+        return compare(values, self.threshold)
+    
     def check(self, value: float) -> bool:
         """
         检查指标是否触发告警
@@ -267,27 +308,31 @@ class ARAlertRule:
         Returns:
             bool: 是否触发告警
         """
-        if not self.enabled:
+        current_time = time.time()
+        if not self._ready(current_time):
             return False
         
-        # 检查冷却时间
+        triggered = bool(self._compare(value))
+        if triggered:
+            self._last_triggered = current_time
+        
+        return triggered
+    
+    def check_window(self, values: np.ndarray) -> bool:
+        """
+        检查时间窗口内的样本是否全部满足条件(向量化)
+        
+        Args:
+            values: 窗口内的指标值(按时间顺序)
+        
+        Returns:
+            bool: 是否触发告警
+        """
         current_time = time.time()
-        if current_time - self._last_triggered < self.cooldown:
+        if not self._ready(current_time) or len(values) == 0:
             return False
         
-        # 比较
-        triggered = False
-        if self.operator == ">":
-            triggered = value > self.threshold
-        elif self.operator == "<":
-            triggered = value < self.threshold
-        elif self.operator == ">=":
-            triggered = value >= self.threshold
-        elif self.operator == "<=":
-            triggered = value <= self.threshold
-        elif self.operator == "==":
-            triggered = value == self.threshold
-        
+        triggered = bool(self._compare(values).all())
         if triggered:
             self._last_triggered = current_time
         
@@ -304,6 +349,7 @@ class ARAlertRule:
             'severity': self.severity,
             'enabled': self.enabled,
             'cooldown': self.cooldown,
+            'duration': self.duration,
         }
 
 
@@ -339,19 +385,23 @@ class ARMonitorExtension:
         extension.start_monitoring()
     """
     
-    def __init__(self):
+    def __init__(self, history_size: int = 1000):
         # 设备管理
         self._devices: Dict[str, ARDevice] = {}
         
         # 场景管理
         self._scenes: Dict[str, ARScene] = {}
         
-        # 指标历史
-        self._metrics_history: Dict[str, List[ARMetrics]] = {}
-        self._max_history_size = 1000
+        # 指标历史: 每个设备一个列式环形缓冲区
+        self._metrics_history: Dict[str, ColumnarRing] = {}
+        self._max_history_size = history_size
+        # 场景ID编码为整数列，0 表示无场景
+        self._scene_codes: Dict[str, int] = {}
+        self._scene_ids: List[Optional[str]] = [None]
         
-        # 告警规则
+        # 告警规则(按指标名索引)
         self._alert_rules: Dict[str, ARAlertRule] = {}
+        self._rules_by_metric: Dict[str, List[ARAlertRule]] = {}
         
         # 告警处理器
         self._alert_handlers: List[Callable[[Dict[str, Any]], None]] = []
@@ -547,53 +597,89 @@ class ARMonitorExtension:
         metrics.device_id = device_id
         
         # 保存到历史
-        if device_id not in self._metrics_history:
-            self._metrics_history[device_id] = []
-        
-        self._metrics_history[device_id].append(metrics)
-        
-        # 限制历史大小
-        if len(self._metrics_history[device_id]) > self._max_history_size:
-            self._metrics_history[device_id] = self._metrics_history[device_id][-self._max_history_size:]
+        ring = self._metrics_history.get(device_id)
+        if ring is None:
+            ring = self._metrics_history[device_id] = ColumnarRing(
+                self._max_history_size, METRIC_FIELDS + ('scene',)
+            )
+        ring.append(
+            metrics.timestamp,
+            scene=self._scene_code(metrics.scene_id),
+            **{name: getattr(metrics, name) for name in METRIC_FIELDS}
+        )
         
         # 检查告警规则
-        self._check_alert_rules(device_id, metrics)
+        if self._rules_by_metric:
+            self._check_alert_rules(device_id, metrics)
         
         # 触发事件
-        self._trigger_event('metrics_updated', metrics.to_dict())
+        if 'metrics_updated' in self._event_handlers:
+            self._trigger_event('metrics_updated', metrics.to_dict())
         
         return True
     
+    def _scene_code(self, scene_id: Optional[str]) -> int:
+        if scene_id is None:
+            return 0
+        code = self._scene_codes.get(scene_id)
+        if code is None:
+            code = self._scene_codes[scene_id] = len(self._scene_ids)
+            self._scene_ids.append(scene_id)
+        return code
+    
     def _check_alert_rules(self, device_id: str, metrics: ARMetrics):
-        """检查告警规则"""
-        metrics_dict = metrics.to_dict()
-        
-        for rule in self._alert_rules.values():
-            if rule.metric_name in metrics_dict:
-                value = metrics_dict[rule.metric_name]
-                if rule.check(value):
-                    alert = {
-                        'rule_id': rule.rule_id,
-                        'rule_name': rule.rule_name,
-                        'device_id': device_id,
-                        'metric_name': rule.metric_name,
-                        'metric_value': value,
-                        'threshold': rule.threshold,
-                        'severity': rule.severity,
-                        'timestamp': time.time(),
-                    }
-                    
-                    logger.warning(f"AR告警触发: {rule.rule_name} ({device_id})")
-                    
-                    # 调用告警处理器
-                    for handler in self._alert_handlers:
-                        try:
-                            handler(alert)
-                        except Exception as e:
-                            logger.error(f"告警处理器错误: {e}")
-                    
-                    # 触发事件
-                    self._trigger_event('alert_triggered', alert)
+        """检查告警规则(只检查与指标相关的规则，持续型规则按时间窗口判断)"""
+        ring = self._metrics_history[device_id]
+        
+        for metric_name, rules in self._rules_by_metric.items():
+            value = getattr(metrics, metric_name)
+            for rule in rules:
+                if rule.duration > 0:
+                    triggered = rule.check_window(
+                        self._sustained_window(ring, metric_name, rule.duration)
+                    )
+                else:
+                    triggered = rule.check(value)
+                if not triggered:
+                    continue
+                
+                alert = {
+                    'rule_id': rule.rule_id,
+                    'rule_name': rule.rule_name,
+                    'device_id': device_id,
+                    'metric_name': rule.metric_name,
+                    'metric_value': value,
+                    'threshold': rule.threshold,
+                    'severity': rule.severity,
+                    'duration': rule.duration,
+                    'timestamp': time.time(),
+                }
+                
+                logger.warning(f"AR告警触发: {rule.rule_name} ({device_id})")
+                
+                # 调用告警处理器
+                for handler in self._alert_handlers:
+                    try:
+                        handler(alert)
+                    except Exception as e:
+                        logger.error(f"告警处理器错误: {e}")
+                
+                # 触发事件
+                self._trigger_event('alert_triggered', alert)
+    
+    @staticmethod
+    def _sustained_window(ring: ColumnarRing, metric_name: str, duration: float) -> np.ndarray:
+        """
+        覆盖最近 duration 秒的样本
+        
+        样本跨度不足 duration 秒时返回空数组(数据不足不触发)
+        """
+        values = ring.column(metric_name, seconds=duration)
+        # 窗口内样本加上窗口前一个样本(若有)
+        timestamps = ring.timestamps(last=len(values) + 1)
+        if len(timestamps) == 0 or timestamps[-1] - timestamps[0] < duration:
+            return values[:0]
+        return values
     
     def add_alert_rule(self, rule: ARAlertRule) -> 'ARMonitorExtension':
         """
@@ -605,7 +691,10 @@ class ARMonitorExtension:
         Returns:
             ARMonitorExtension: 自身，支持链式调用
         """
+        self.remove_alert_rule(rule.rule_id)
         self._alert_rules[rule.rule_id] = rule
+        if rule.metric_name in METRIC_FIELDS:
+            self._rules_by_metric.setdefault(rule.metric_name, []).append(rule)
         logger.info(f"告警规则已添加: {rule.rule_id}")
         return self
     
@@ -620,7 +709,12 @@ class ARMonitorExtension:
             bool: 是否成功移除
         """
         if rule_id in self._alert_rules:
-            del self._alert_rules[rule_id]
+            rule = self._alert_rules.pop(rule_id)
+            rules = self._rules_by_metric.get(rule.metric_name, [])
+            if rule in rules:
+                rules.remove(rule)
+                if not rules:
+                    del self._rules_by_metric[rule.metric_name]
             logger.info(f"告警规则已移除: {rule_id}")
             return True
         return False
@@ -740,8 +834,63 @@ class ARMonitorExtension:
         Returns:
             List[ARMetrics]: 指标历史列表
         """
-        history = self._metrics_history.get(device_id, [])
-        return history[-limit:] if limit > 0 else history
+        ring = self._metrics_history.get(device_id)
+        if ring is None:
+            return []
+        
+        data = ring.export(last=limit if limit > 0 else None)
+        columns = {name: data[name].tolist() for name in METRIC_FIELDS}
+        scene_codes = data['scene'].astype(np.int64).tolist()
+        return [
+            ARMetrics(
+                timestamp=timestamp,
+                device_id=device_id,
+                scene_id=self._scene_ids[scene_codes[i]],
+                **{name: columns[name][i] for name in METRIC_FIELDS}
+            )
+            for i, timestamp in enumerate(data['timestamp'].tolist())
+        ]
+    
+    def get_device_history(
+        self,
+        device_id: str,
+        seconds: Optional[float] = None,
+        bucket_seconds: Optional[float] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Dict[str, List[float]]:
+        """
+        获取设备指标历史(按列返回，可按时间桶降采样)
+        
+        Args:
+            device_id: 设备ID
+            seconds: 只取最近 seconds 秒，为空时取全部历史
+            bucket_seconds: 时间桶长度(秒)，每个桶取均值；为空时不降采样
+            fields: 返回的指标，为空时返回全部
+        
+        Returns:
+            Dict[str, List[float]]: {'timestamp': [...], 指标名: [...]}，
+            降采样时 timestamp 为桶起始时间
+        """
+        fields = list(fields) if fields else list(METRIC_FIELDS)
+        ring = self._metrics_history.get(device_id)
+        if ring is None:
+            return {name: [] for name in ['timestamp'] + fields}
+        
+        data = ring.export(seconds=seconds)
+        timestamps = data['timestamp']
+        if not bucket_seconds or len(timestamps) == 0:
+            result = {'timestamp': timestamps.tolist()}
+            result.update({name: data[name].tolist() for name in fields})
+            return result
+        
+        # 样本按时间递增，桶边界即桶编号变化的位置
+        buckets = np.floor(timestamps / bucket_seconds)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        counts = np.diff(np.r_[starts, len(timestamps)])
+        result = {'timestamp': (buckets[starts] * bucket_seconds).tolist()}
+        for name in fields:
+            result[name] = (np.add.reduceat(data[name], starts) / counts).tolist()
+        return result
     
     def get_statistics(self) -> Dict[str, Any]:
         """
@@ -770,7 +919,7 @@ class ARMonitorExtension:
                 'completed': sum(1 for s in self._scenes.values() if s.status == "completed"),
             },
             'alert_rules': len(self._alert_rules),
-            'metrics_history_size': sum(len(h) for h in self._metrics_history.values()),
+            'metrics_history_size': sum(len(ring) for ring in self._metrics_history.values()),
         }
     
     def to_dict(self) -> Dict[str, Any]:
@@ -801,6 +950,7 @@ __all__ = [
     'ARScene',
     'ARMetrics',
     'ARAlertRule',
+    'METRIC_FIELDS',
     'ARDeviceStatus',
     'ARSceneType',
     'ARNodeType',
@@ -19,6 +19,7 @@ parent_dir = os.path.dirname(current_dir)
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
+import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
@@ -28,10 +29,13 @@ from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from app.middleware.compression import CompressionStage
+from app.middleware.pipeline import ASGIPipeline
+from app.middleware.request_id import AccessLogStage, RequestIDStage
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -106,8 +110,9 @@ async def lifespan(app: FastAPI):
     
     # 初始化指标服务
     try:
-        from app.services.metrics_service import MetricsService
-        metrics_service = MetricsService()
+        from app.services.metrics_service import get_metrics_service
+        metrics_service = get_metrics_service()
+        metrics_service.start_collection()
         app.state.metrics_service = metrics_service
         logger.info("✓ 指标服务已启动")
     except Exception as e:
@@ -125,6 +130,38 @@ async def lifespan(app: FastAPI):
         logger.warning(f"⚠ 告警监控服务启动失败（非关键）: {e}")
         app.state.alert_monitor = None
     
+    # 启动服务端口探测（结果持续写入指标存储）
+    try:
+        from app.services.async_prober import AsyncProber
+        from app.services.infrastructure_monitor import infrastructure_collector
+        from app.services.metrics_storage import metrics_storage
+        port_prober = AsyncProber(
+            interval=float(os.getenv("YL_MONITOR_PROBE_INTERVAL", "30")),
+            sinks=[lambda result: metrics_storage.store_metric(result.to_metric())]
+        )
+        app.state.port_prober = port_prober
+        # 按需的端口检查复用同一探测引擎
+        infrastructure_collector.port_monitor.prober = port_prober
+        app.state.port_prober_task = asyncio.create_task(
+            port_prober.run(infrastructure_collector.port_monitor.service_targets())
+        )
+        logger.info("✓ 端口探测已启动")
+    except Exception as e:
+        logger.warning(f"⚠ 端口探测启动失败（非关键）: {e}")
+        app.state.port_prober = None
+    
+    # 端点检查使用长期探测引擎，结果同样写入指标存储
+    try:
+        from app.services.async_prober import AsyncProber
+        from app.services.application_monitor import application_collector
+        from app.services.metrics_storage import metrics_storage
+        application_collector.api_monitor.prober = AsyncProber(
+            default_timeout=5.0,
+            sinks=[lambda result: metrics_storage.store_metric(result.to_metric())]
+        )
+    except Exception as e:
+        logger.warning(f"⚠ 端点探测初始化失败（非关键）: {e}")
+    
     elapsed = time.time() - start_time
     logger.info("=" * 60)
     logger.info(f"YL-Monitor 启动完成！耗时 {elapsed:.2f} 秒")
@@ -160,6 +197,42 @@ async def lifespan(app: FastAPI):
         logger.info("正在停止告警监控服务...")
         await app.state.alert_monitor.stop()
     
+    # 关闭告警服务(停止告警历史写入线程并落盘)
+    if getattr(app.state, "alert_service", None):
+        logger.info("正在关闭告警服务...")
+        await asyncio.to_thread(app.state.alert_service.close)
+    try:
+        from app.services.alert_service import close_alert_service
+        await asyncio.to_thread(close_alert_service)
+    except Exception as e:
+        logger.warning(f"告警服务关闭失败: {e}")
+    
+    # 停止指标采集
+    if getattr(app.state, "metrics_service", None):
+        logger.info("正在停止指标采集...")
+        await asyncio.to_thread(app.state.metrics_service.stop_collection)
+    
+    # 停止端口探测
+    if getattr(app.state, "port_prober", None):
+        logger.info("正在停止端口探测...")
+        try:
+            await app.state.port_prober.close()
+            await app.state.port_prober_task
+        except Exception as e:
+            logger.warning(f"端口探测停止失败: {e}")
+    
+    # 关闭监控采集器的探测引擎(HTTP 连接池)
+    try:
+        from app.services.infrastructure_monitor import infrastructure_collector
+        await infrastructure_collector.close()
+    except Exception as e:
+        logger.warning(f"基础设施探测引擎关闭失败: {e}")
+    try:
+        from app.services.application_monitor import application_collector
+        await application_collector.close()
+    except Exception as e:
+        logger.warning(f"端点探测引擎关闭失败: {e}")
+    
     logger.info("YL-Monitor 已关闭")
 
 
@@ -184,38 +257,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 配置 GZip 压缩
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-# 请求日志中间件
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """记录所有 HTTP 请求"""
-    start_time = time.time()
-    
-    # 生成请求 ID
-    request_id = f"{int(start_time * 1000)}-{id(request)}"
-    request.state.request_id = request_id
-    
-    # 记录请求
-    logger.debug(f"[{request_id}] {request.method} {request.url.path}")
-    
-    # 执行请求
-    response = await call_next(request)
-    
-    # 计算耗时
-    elapsed = time.time() - start_time
-    
-    # 记录响应
-    status_code = response.status_code
-    log_level = logging.INFO if status_code < 400 else logging.WARNING
-    logger.log(log_level, f"[{request_id}] {request.method} {request.url.path} - {status_code} ({elapsed:.3f}s)")
-    
-    # 添加响应头
-    response.headers["X-Request-ID"] = request_id
-    response.headers["X-Response-Time"] = f"{elapsed:.3f}"
-    
-    return response
+# 请求 ID、访问日志与压缩组合为单个纯 ASGI 中间件管线
+# (静态资源存在 .br/.gz 预压缩文件时直接返回，其余响应流式压缩)
+app.add_middleware(
+    ASGIPipeline,
+    stages=[
+        RequestIDStage(),
+        AccessLogStage(),
+        CompressionStage(
+            minimum_size=1000,
+            static_prefix="/static",
+            static_directory=str(PROJECT_ROOT / "static"),
+        ),
+    ],
+)
 
 
 # 挂载静态文件
@@ -5,13 +5,23 @@
 - request_id: 请求 ID 追踪
 - error_handler: 统一错误响应
 - rate_limit: 请求限流
+- pipeline: 纯 ASGI 中间件管线
 
 作者: AI Assistant
 版本: v1.0
 """
 
+from app.middleware.pipeline import (
+    ASGIPipeline,
+    PipelineStage,
+    RequestContext,
+    StageMiddleware,
+)
+
 from app.middleware.request_id import (
     RequestIDMiddleware,
+    RequestIDStage,
+    AccessLogStage,
     get_request_id,
     get_correlation_id,
     REQUEST_ID_HEADER,
@@ -29,13 +39,26 @@ from app.middleware.error_handler import (
 
 from app.middleware.rate_limit import (
     RateLimitMiddleware,
+    RateLimitStage,
     RateLimitConfig,
     RateLimitEntry,
+    RateLimitDecision,
+    RateLimitBackend,
+    MemoryRateLimitBackend,
+    SQLiteRateLimitBackend,
 )
 
 __all__ = [
+    # Pipeline
+    "ASGIPipeline",
+    "PipelineStage",
+    "RequestContext",
+    "StageMiddleware",
+
     # Request ID
     "RequestIDMiddleware",
+    "RequestIDStage",
+    "AccessLogStage",
     "get_request_id",
     "get_correlation_id",
     "REQUEST_ID_HEADER",
@@ -51,7 +74,12 @@ __all__ = [
     
     # Rate Limit
     "RateLimitMiddleware",
+    "RateLimitStage",
     "RateLimitConfig",
     "RateLimitEntry",
+    "RateLimitDecision",
+    "RateLimitBackend",
+    "MemoryRateLimitBackend",
+    "SQLiteRateLimitBackend",
 ]
 
@@ -6,23 +6,31 @@
 - 异常访问监控
 - 敏感操作标记
 - 审计数据存储
+- 按时间分区的批量写入存储，带二级索引与免物化统计
 
 作者: AI Assistant
-版本: 1.0.0
+版本: 1.1.0
 """
 
+import asyncio
+import bisect
 import json
 import logging
+import os
+import sys
+import threading
 import time
 import uuid
+from collections import Counter, deque
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, Callable, Set
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Callable, Set, Tuple
 
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+
+from app.middleware.pipeline import PipelineStage, RequestContext, StageMiddleware
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +92,48 @@ class AuditLogEntry:
         """转换为JSON字符串"""
         return json.dumps(self.to_dict(), default=str, ensure_ascii=False)
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AuditLogEntry":
+        """从字典恢复"""
+        data = dict(data)
+        data["level"] = AuditLevel(data.get("level", AuditLevel.INFO))
+        data["action"] = ActionType(data.get("action", ActionType.ACCESS))
+        known = cls.__dataclass_fields__
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+# 支持分组统计的字段
+AGGREGATE_FIELDS = ("action", "level", "user_id", "ip_address", "hour", "success")
+
+
+def _group_value(entry: AuditLogEntry, group_by: str) -> Any:
+    """取条目的分组值(枚举取其值，hour 为本地时间小时)"""
+    if group_by == "hour":
+        return time.localtime(entry.timestamp).tm_hour
+    value = getattr(entry, group_by)
+    return value.value if isinstance(value, Enum) else value
+
+
+def _matches(
+    entry: AuditLogEntry,
+    start_time: Optional[float],
+    end_time: Optional[float],
+    user_id: Optional[str],
+    action: Optional[ActionType],
+    level: Optional[AuditLevel]
+) -> bool:
+    if start_time and entry.timestamp < start_time:
+        return False
+    if end_time and entry.timestamp > end_time:
+        return False
+    if user_id and entry.user_id != user_id:
+        return False
+    if action and entry.action != action:
+        return False
+    if level and entry.level != level:
+        return False
+    return True
+
 
 class AuditStorage:
     """
@@ -120,6 +170,30 @@ class AuditStorage:
         """统计审计日志数量"""
         raise NotImplementedError
 
+    async def aggregate(
+        self,
+        group_by: str,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        user_id: Optional[str] = None,
+        action: Optional[ActionType] = None,
+        level: Optional[AuditLevel] = None
+    ) -> Dict[Any, int]:
+        """
+        按字段分组计数
+
+        group_by 取值见 AGGREGATE_FIELDS；默认基于 query 实现，子类可覆盖
+        """
+        entries = await self.query(
+            start_time=start_time,
+            end_time=end_time,
+            user_id=user_id,
+            action=action,
+            level=level,
+            limit=sys.maxsize
+        )
+        return dict(Counter(_group_value(e, group_by) for e in entries))
+
 
 class MemoryAuditStorage(AuditStorage):
     """
@@ -130,16 +204,11 @@ class MemoryAuditStorage(AuditStorage):
     
     def __init__(self, max_entries: int = 10000):
         self.max_entries = max_entries
-        self._entries: List[AuditLogEntry] = []
+        self._entries: deque = deque(maxlen=max_entries)
     
     async def store(self, entry: AuditLogEntry) -> bool:
-        """存储审计日志"""
+        """存储审计日志(超出上限时自动丢弃最旧条目)"""
         self._entries.append(entry)
-        
-        # 限制大小
-        if len(self._entries) > self.max_entries:
-            self._entries = self._entries[-self.max_entries:]
-        
         return True
     
     async def query(
@@ -153,19 +222,10 @@ class MemoryAuditStorage(AuditStorage):
         offset: int = 0
     ) -> List[AuditLogEntry]:
         """查询审计日志"""
-        results = self._entries
-        
-        # 过滤
-        if start_time:
-            results = [e for e in results if e.timestamp >= start_time]
-        if end_time:
-            results = [e for e in results if e.timestamp <= end_time]
-        if user_id:
-            results = [e for e in results if e.user_id == user_id]
-        if action:
-            results = [e for e in results if e.action == action]
-        if level:
-            results = [e for e in results if e.level == level]
+        results = [
+            e for e in self._entries
+            if _matches(e, start_time, end_time, user_id, action, level)
+        ]
         
         # 排序(时间倒序)
         results.sort(key=lambda e: e.timestamp, reverse=True)
@@ -181,20 +241,30 @@ class MemoryAuditStorage(AuditStorage):
         action: Optional[ActionType] = None,
         level: Optional[AuditLevel] = None
     ) -> int:
-        """统计数量"""
-        entries = await self.query(
-            start_time=start_time,
-            end_time=end_time,
-            user_id=user_id,
-            action=action,
-            level=level,
-            limit=999999999
+        """统计数量(单次遍历，不构造结果列表)"""
+        return sum(
+            1 for e in self._entries
+            if _matches(e, start_time, end_time, user_id, action, level)
         )
-        return len(entries)
+
+    async def aggregate(
+        self,
+        group_by: str,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        user_id: Optional[str] = None,
+        action: Optional[ActionType] = None,
+        level: Optional[AuditLevel] = None
+    ) -> Dict[Any, int]:
+        """按字段分组计数"""
+        return dict(Counter(
+            _group_value(e, group_by) for e in self._entries
+            if _matches(e, start_time, end_time, user_id, action, level)
+        ))
     
     def clear(self):
         """清空存储"""
-        self._entries = []
+        self._entries.clear()
 
 
 class FileAuditStorage(AuditStorage):
@@ -229,12 +299,473 @@ class FileAuditStorage(AuditStorage):
         return 0
 
 
-class AuditMiddleware(BaseHTTPMiddleware):
+class _AuditPartition:
+    """
+    单个时间分区
+
+    行数据只保存在文件中；内存中保留按列存储的过滤/分组字段、
+    行在文件中的位置，以及 user_id/action/level 的倒排索引。
+    写入失败的行记录在 failed 中，select() 不再返回这些行。
+    """
+
+    __slots__ = (
+        "start", "path", "size", "ordered", "positions", "times", "users",
+        "actions", "levels", "ips", "hours", "success",
+        "user_index", "action_index", "level_index", "failed",
+    )
+
+    def __init__(self, start: int, path: Path):
+        self.start = start
+        self.path = path
+        self.size = 0
+        # 行是否按时间有序(乱序写入时查询需额外排序)
+        self.ordered = True
+        self.positions: List[int] = []
+        self.times: List[float] = []
+        self.users: List[Optional[str]] = []
+        self.actions: List[str] = []
+        self.levels: List[str] = []
+        self.ips: List[Optional[str]] = []
+        self.hours: List[int] = []
+        self.success: List[bool] = []
+        self.user_index: Dict[str, List[int]] = {}
+        self.action_index: Dict[str, List[int]] = {}
+        self.level_index: Dict[str, List[int]] = {}
+        self.failed: Set[int] = set()
+
+    def add(self, data: Dict[str, Any], position: int) -> int:
+        """登记一行，返回行号"""
+        row = len(self.times)
+        timestamp = data["timestamp"]
+        if self.times and timestamp < self.times[-1]:
+            self.ordered = False
+        user_id = data.get("user_id")
+        action = sys.intern(str(data.get("action", ActionType.ACCESS.value)))
+        level = sys.intern(str(data.get("level", AuditLevel.INFO.value)))
+
+        self.positions.append(position)
+        self.times.append(timestamp)
+        self.users.append(user_id)
+        self.actions.append(action)
+        self.levels.append(level)
+        self.ips.append(data.get("ip_address"))
+        self.hours.append(time.localtime(timestamp).tm_hour)
+        self.success.append(bool(data.get("success", True)))
+
+        if user_id:
+            self.user_index.setdefault(user_id, []).append(row)
+        self.action_index.setdefault(action, []).append(row)
+        self.level_index.setdefault(level, []).append(row)
+        return row
+
+    def column(self, group_by: str) -> List[Any]:
+        return {
+            "action": self.actions,
+            "level": self.levels,
+            "user_id": self.users,
+            "ip_address": self.ips,
+            "hour": self.hours,
+            "success": self.success,
+        }[group_by]
+
+    def select(
+        self,
+        start_time: Optional[float],
+        end_time: Optional[float],
+        user_id: Optional[str],
+        action: Optional[str],
+        level: Optional[str]
+    ) -> Iterable[int]:
+        """返回满足条件的行号(按行号升序)"""
+        postings = []
+        if user_id:
+            postings.append(self.user_index.get(user_id, ()))
+        if action:
+            postings.append(self.action_index.get(action, ()))
+        if level:
+            postings.append(self.level_index.get(level, ()))
+
+        times = self.times
+        failed = self.failed
+        if postings:
+            # 从最短的倒排列表出发，其余条件逐行校验
+            candidates = min(postings, key=len)
+        elif self.ordered:
+            lo = bisect.bisect_left(times, start_time) if start_time else 0
+            hi = bisect.bisect_right(times, end_time) if end_time else len(times)
+            if not failed:
+                return range(lo, hi)
+            return [row for row in range(lo, hi) if row not in failed]
+        else:
+            candidates = range(len(times))
+
+        return [
+            row for row in candidates
+            if row not in failed
+            and (not start_time or times[row] >= start_time)
+            and (not end_time or times[row] <= end_time)
+            and (not user_id or self.users[row] == user_id)
+            and (not action or self.actions[row] == action)
+            and (not level or self.levels[row] == level)
+        ]
+
+    def covered_by(self, start_time: Optional[float], end_time: Optional[float],
+                   partition_seconds: int) -> bool:
+        """分区是否完全落在时间范围内"""
+        return (not start_time or self.start >= start_time) and \
+            (not end_time or self.start + partition_seconds <= end_time)
+
+
+class PartitionedAuditStorage(AuditStorage):
+    """
+    分区审计存储
+
+    - store() 只在内存中登记索引并入队，由后台线程批量追加写入
+    - 文件按时间分区: {directory}/{分区起始时间戳}.jsonl
+    - 每个分区维护列式字段与 user_id/action/level 倒排索引，
+      count()/aggregate() 直接在索引上计算，不解析、不构造条目
+    - query() 先在索引上定位行，再按文件位置只读取需要返回的行
+    - 超过保留期的分区整文件删除；启动时扫描已有分区重建索引
+    """
+
+    FILE_SUFFIX = ".jsonl"
+
+    def __init__(
+        self,
+        directory: str = "logs/audit",
+        partition_seconds: int = 3600,
+        retention_seconds: float = 30 * 24 * 3600,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        background: bool = True
+    ):
+        """
+        参数:
+            directory: 存储目录
+            partition_seconds: 分区时间跨度(秒)
+            retention_seconds: 分区保留时间
+            batch_size: 缓冲达到该条数时立即落盘
+            flush_interval: 后台落盘间隔(秒)
+            background: 是否启动后台落盘线程
+        """
+        self.directory = Path(directory)
+        self.partition_seconds = partition_seconds
+        self.retention_seconds = retention_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._partitions: Dict[int, _AuditPartition] = {}
+        self._starts: List[int] = []
+        # 待落盘: (分区, 行号, 编码后的行)
+        self._buffer: List[Tuple[_AuditPartition, int, bytes]] = []
+
+        # _lock 保护索引与缓冲区；_io_lock 串行化文件读写
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._closed = False
+        self._stats = {
+            "stored": 0, "flushed": 0, "flush_batches": 0, "write_failed": 0,
+            "partitions_deleted": 0,
+        }
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_partitions()
+
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(
+                target=self._flush_loop, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+
+    # ==================== 分区管理 ====================
+
+    def _partition_for(self, timestamp: float) -> _AuditPartition:
+        start = int(timestamp // self.partition_seconds * self.partition_seconds)
+        partition = self._partitions.get(start)
+        if partition is None:
+            partition = _AuditPartition(start, self.directory / f"{start}{self.FILE_SUFFIX}")
+            self._partitions[start] = partition
+            bisect.insort(self._starts, start)
+        return partition
+
+    def _load_partitions(self):
+        """扫描已有分区文件并重建索引，截断末尾不完整的行"""
+        for path in sorted(self.directory.glob(f"*{self.FILE_SUFFIX}")):
+            try:
+                start = int(path.stem)
+            except ValueError:
+                continue
+            partition = self._partition_for(start)
+            position = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        partition.add(json.loads(line), position)
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    position += len(line)
+            if position < path.stat().st_size:
+                with open(path, "r+b") as f:
+                    f.truncate(position)
+            partition.size = position
+
+    def _enforce_retention(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                s for s in self._starts if s + self.partition_seconds < cutoff
+            ]
+            for start in expired:
+                partition = self._partitions.pop(start)
+                self._starts.remove(start)
+                try:
+                    partition.path.unlink()
+                except FileNotFoundError:
+                    pass
+                self._stats["partitions_deleted"] += 1
+
+    def _select_partitions(
+        self, start_time: Optional[float], end_time: Optional[float]
+    ) -> List[_AuditPartition]:
+        lo = 0
+        if start_time:
+            lo = max(bisect.bisect_right(self._starts, start_time) - 1, 0)
+        hi = bisect.bisect_right(self._starts, end_time) if end_time else len(self._starts)
+        return [self._partitions[s] for s in self._starts[lo:hi]]
+
+    # ==================== 写入 ====================
+
+    async def store(self, entry: AuditLogEntry) -> bool:
+        """登记索引并入队，实际写入由后台线程批量完成"""
+        data = entry.to_dict()
+        line = (json.dumps(data, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+        data["action"] = entry.action.value
+        data["level"] = entry.level.value
+        with self._lock:
+            partition = self._partition_for(entry.timestamp)
+            row = partition.add(data, -1)
+            self._buffer.append((partition, row, line))
+            self._stats["stored"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        if self._thread is None and len(self._buffer) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """将缓冲区写入磁盘"""
+        with self._io_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                self._write_batch(batch)
+            self._enforce_retention()
+
+    def _write_batch(self, batch: List[Tuple[_AuditPartition, int, bytes]]):
+        grouped: Dict[int, List[Tuple[int, bytes]]] = {}
+        partitions: Dict[int, _AuditPartition] = {}
+        for partition, row, line in batch:
+            grouped.setdefault(partition.start, []).append((row, line))
+            partitions[partition.start] = partition
+
+        for start, rows in grouped.items():
+            partition = partitions[start]
+            try:
+                with open(partition.path, "ab") as f:
+                    f.write(b"".join(line for _, line in rows))
+            except Exception as e:
+                # 写入失败的行保持位置 -1 并标记为失败，查询与统计均跳过；按实际文件大小继续追加
+                logger.error(f"审计日志写入失败: {e}")
+                with self._lock:
+                    partition.failed.update(row for row, _ in rows)
+                    self._stats["write_failed"] += len(rows)
+                try:
+                    partition.size = os.path.getsize(partition.path)
+                except OSError:
+                    pass
+                continue
+            position = partition.size
+            for row, line in rows:
+                partition.positions[row] = position
+                position += len(line)
+            partition.size = position
+
+        self._stats["flushed"] += len(batch)
+        self._stats["flush_batches"] += 1
+
+    def _flush_loop(self):
+        """后台落盘线程"""
+        while True:
+            with self._lock:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(timeout=self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"审计日志落盘失败: {e}")
+            if closed:
+                return
+
+    def close(self):
+        """停止后台线程并落盘剩余记录"""
+        with self._lock:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    # ==================== 查询与统计 ====================
+
+    async def query(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        user_id: Optional[str] = None,
+        action: Optional[ActionType] = None,
+        level: Optional[AuditLevel] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[AuditLogEntry]:
+        """查询审计日志(时间倒序)"""
+        wanted = offset + limit
+        selected: List[Tuple[_AuditPartition, List[int]]] = []
+        with self._lock:
+            partitions = self._select_partitions(start_time, end_time)
+            total = 0
+            for partition in reversed(partitions):
+                rows = partition.select(
+                    start_time, end_time, user_id,
+                    action.value if action else None,
+                    level.value if level else None
+                )
+                if partition.ordered:
+                    rows = rows[::-1]
+                else:
+                    rows = sorted(rows, key=partition.times.__getitem__, reverse=True)
+                selected.append((partition, list(rows[:max(wanted - total, 0)])))
+                total += len(rows)
+                if total >= wanted:
+                    break
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read_rows, selected, offset, limit)
+
+    def _read_rows(
+        self,
+        selected: List[Tuple[_AuditPartition, List[int]]],
+        offset: int,
+        limit: int
+    ) -> List[AuditLogEntry]:
+        """按文件位置读取选中的行"""
+        self.flush()
+        ordered = [(p, row) for p, rows in selected for row in rows][offset:offset + limit]
+        results: List[AuditLogEntry] = []
+        with self._io_lock:
+            handles: Dict[int, Any] = {}
+            try:
+                for partition, row in ordered:
+                    if partition.positions[row] < 0:
+                        # 写入失败的行
+                        continue
+                    f = handles.get(partition.start)
+                    if f is None:
+                        f = handles[partition.start] = open(partition.path, "rb")
+                    f.seek(partition.positions[row])
+                    results.append(AuditLogEntry.from_dict(json.loads(f.readline())))
+            except (OSError, ValueError) as e:
+                logger.error(f"审计日志读取失败: {e}")
+            finally:
+                for f in handles.values():
+                    f.close()
+        return results
+
+    async def count(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        user_id: Optional[str] = None,
+        action: Optional[ActionType] = None,
+        level: Optional[AuditLevel] = None
+    ) -> int:
+        """统计数量(只访问索引)"""
+        action_value = action.value if action else None
+        level_value = level.value if level else None
+        total = 0
+        with self._lock:
+            for partition in self._select_partitions(start_time, end_time):
+                filters = [f for f in (user_id, action_value, level_value) if f]
+                if len(filters) <= 1 and not partition.failed and partition.covered_by(
+                        start_time, end_time, self.partition_seconds):
+                    # 分区完全落在时间范围内时直接取倒排列表长度
+                    if user_id:
+                        total += len(partition.user_index.get(user_id, ()))
+                    elif action_value:
+                        total += len(partition.action_index.get(action_value, ()))
+                    elif level_value:
+                        total += len(partition.level_index.get(level_value, ()))
+                    else:
+                        total += len(partition.times)
+                    continue
+                total += len(partition.select(
+                    start_time, end_time, user_id, action_value, level_value
+                ))
+        return total
+
+    async def aggregate(
+        self,
+        group_by: str,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        user_id: Optional[str] = None,
+        action: Optional[ActionType] = None,
+        level: Optional[AuditLevel] = None
+    ) -> Dict[Any, int]:
+        """按字段分组计数(只访问列式字段)"""
+        if group_by not in AGGREGATE_FIELDS:
+            raise ValueError(f"不支持的分组字段: {group_by}")
+        result: Counter = Counter()
+        with self._lock:
+            for partition in self._select_partitions(start_time, end_time):
+                column = partition.column(group_by)
+                rows = partition.select(
+                    start_time, end_time, user_id,
+                    action.value if action else None,
+                    level.value if level else None
+                )
+                if isinstance(rows, range) and len(rows) == len(column):
+                    result.update(column)
+                else:
+                    result.update(column[row] for row in rows)
+        return dict(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        with self._lock:
+            return {
+                **self._stats,
+                "partitions": len(self._partitions),
+                "rows": sum(len(p.times) - len(p.failed) for p in self._partitions.values()),
+                "size_bytes": sum(p.size for p in self._partitions.values()),
+                "buffered": len(self._buffer),
+            }
+
+
+class AuditStage(PipelineStage):
     """
-    审计中间件
+    审计阶段
     
-    自动记录所有请求和响应
+    自动记录所有请求和响应；审计条目在请求进入时创建，
+    响应完成后补充状态码、实际发送字节数与耗时再写入存储。
     """
+
+    name = "audit"
     
     # 敏感字段，需要脱敏
     SENSITIVE_FIELDS = {
@@ -252,13 +783,11 @@ class AuditMiddleware(BaseHTTPMiddleware):
     
     def __init__(
         self,
-        app: ASGIApp,
         storage: Optional[AuditStorage] = None,
         exclude_paths: Optional[Set[str]] = None,
         log_request_body: bool = False,
         log_response_body: bool = False
     ):
-        super().__init__(app)
         self.storage = storage or MemoryAuditStorage()
         self.exclude_paths = exclude_paths or {"/health", "/metrics", "/static"}
         self.log_request_body = log_request_body
@@ -269,77 +798,81 @@ class AuditMiddleware(BaseHTTPMiddleware):
         
         logger.info("审计中间件已初始化")
     
-    async def dispatch(self, request: Request, call_next):
-        """处理请求"""
-        start_time = time.time()
-        
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        """创建审计条目"""
         # 检查是否排除
-        if self._is_excluded(request.url.path):
-            return await call_next(request)
+        if self._is_excluded(ctx.path):
+            return None
+
+        request = ctx.request
         
         # 创建审计条目
         entry = AuditLogEntry(
-            request_method=request.method,
+            request_method=ctx.method,
             request_path=str(request.url),
             ip_address=self._get_client_ip(request),
-            user_agent=request.headers.get("user-agent"),
+            user_agent=ctx.headers.get("user-agent"),
         )
         
-        # 获取用户信息(如果已认证)
-        user = getattr(request.state, "user", None)
-        if user:
-            entry.user_id = getattr(user, "user_id", None)
-            entry.username = getattr(user, "username", None)
-        
         # 记录请求参数
         entry.request_params = dict(request.query_params)
         
-        # 记录请求体(如果启用)
-        if self.log_request_body and request.method in ["POST", "PUT", "PATCH"]:
+        # 记录请求体(如果启用)，缓存后仍可被下游读取
+        if self.log_request_body and ctx.method in ["POST", "PUT", "PATCH"]:
             try:
-                body = await request.body()
+                body = await ctx.body()
                 if body:
                     entry.request_body = self._sanitize_body(body.decode())
             except:
                 pass
-        
-        # 执行请求
-        try:
-            response = await call_next(request)
-            
+
+        ctx.state["audit.entry"] = entry
+        return None
+
+    async def after(self, ctx: RequestContext):
+        """补充响应信息并存储"""
+        entry: Optional[AuditLogEntry] = ctx.state.get("audit.entry")
+        if entry is None:
+            return
+        path = ctx.path
+
+        # 获取用户信息(如果已认证)
+        user = ctx.scope.get("state", {}).get("user")
+        if user:
+            entry.user_id = getattr(user, "user_id", None)
+            entry.username = getattr(user, "username", None)
+
+        # 确定操作类型
+        entry.action = self._determine_action(ctx.method, path)
+
+        if ctx.error is not None:
+            entry.level = AuditLevel.ERROR
+            entry.error_message = str(ctx.error)
+            entry.success = False
+        else:
             # 记录响应
-            entry.response_status = response.status_code
-            entry.response_size = int(response.headers.get("content-length", 0))
-            entry.success = 200 <= response.status_code < 400
-            
-            # 确定操作类型
-            entry.action = self._determine_action(request.method, request.url.path)
+            status_code = ctx.status_code
+            entry.response_status = status_code
+            entry.response_size = ctx.response_size
+            entry.success = 200 <= status_code < 400
             
             # 检查是否为敏感操作
-            if self._is_sensitive_path(request.url.path):
+            if self._is_sensitive_path(path):
                 entry.level = AuditLevel.SECURITY
             
             # 检查是否为错误
-            if response.status_code >= 400:
-                entry.level = AuditLevel.ERROR if response.status_code < 500 else AuditLevel.CRITICAL
+            if status_code >= 400:
+                entry.level = AuditLevel.ERROR if status_code < 500 else AuditLevel.CRITICAL
                 entry.success = False
-            
-        except Exception as e:
-            entry.level = AuditLevel.ERROR
-            entry.error_message = str(e)
-            entry.success = False
-            raise
-        finally:
-            # 计算执行时间
-            entry.execution_time = (time.time() - start_time) * 1000
-            
-            # 存储审计日志
-            await self.storage.store(entry)
-            
-            # 记录到日志
-            self._log_entry(entry)
+
+        # 计算执行时间
+        entry.execution_time = ctx.elapsed * 1000
         
-        return response
+        # 存储审计日志
+        await self.storage.store(entry)
+        
+        # 记录到日志
+        self._log_entry(entry)
     
     def _is_excluded(self, path: str) -> bool:
         """检查路径是否排除"""
@@ -441,6 +974,12 @@ class AuditMiddleware(BaseHTTPMiddleware):
             logger.debug(message)
 
 
+class AuditMiddleware(StageMiddleware):
+    """审计中间件(单阶段管线)"""
+
+    stage_class = AuditStage
+
+
 class AuditAnalyzer:
     """
     审计分析器
@@ -469,21 +1008,16 @@ class AuditAnalyzer:
         current_time = time.time()
         start_time = current_time - time_window
         
-        # 1. 检测频繁登录失败
-        failed_logins = await self.storage.query(
+        # 1. 检测频繁登录失败(按IP分组统计)
+        ip_failures = await self.storage.aggregate(
+            "ip_address",
             start_time=start_time,
             action=ActionType.LOGIN,
-            level=AuditLevel.ERROR,
-            limit=999999
+            level=AuditLevel.ERROR
         )
         
-        # 按IP分组统计
-        ip_failures: Dict[str, int] = {}
-        for entry in failed_logins:
-            ip = entry.ip_address or "unknown"
-            ip_failures[ip] = ip_failures.get(ip, 0) + 1
-        
         for ip, count in ip_failures.items():
+            ip = ip or "unknown"
             if count >= threshold:
                 anomalies.append({
                     "type": "brute_force",
@@ -495,34 +1029,30 @@ class AuditAnalyzer:
                 })
         
         # 2. 检测大量数据导出
-        exports = await self.storage.query(
+        export_count = await self.storage.count(
             start_time=start_time,
-            action=ActionType.EXPORT,
-            limit=999999
+            action=ActionType.EXPORT
         )
         
-        if len(exports) > threshold * 2:
+        if export_count > threshold * 2:
             anomalies.append({
                 "type": "mass_export",
                 "severity": "medium",
-                "description": f"1小时内发生 {len(exports)} 次数据导出操作",
-                "count": len(exports),
+                "description": f"1小时内发生 {export_count} 次数据导出操作",
+                "count": export_count,
                 "recommendation": "建议审查导出操作是否合规"
             })
         
         # 3. 检测异常时间访问(凌晨2-5点)
-        night_access = []
-        for entry in await self.storage.query(start_time=start_time, limit=999999):
-            hour = datetime.fromtimestamp(entry.timestamp).hour
-            if 2 <= hour <= 5:
-                night_access.append(entry)
+        by_hour = await self.storage.aggregate("hour", start_time=start_time)
+        night_access = sum(count for hour, count in by_hour.items() if 2 <= hour <= 5)
         
-        if len(night_access) > threshold:
+        if night_access > threshold:
             anomalies.append({
                 "type": "night_access",
                 "severity": "low",
-                "description": f"凌晨时段(2-5点)发生 {len(night_access)} 次访问",
-                "count": len(night_access),
+                "description": f"凌晨时段(2-5点)发生 {night_access} 次访问",
+                "count": night_access,
                 "recommendation": "建议关注夜间操作"
             })
         
@@ -543,39 +1073,24 @@ class AuditAnalyzer:
         # 统计总数
         total_count = await self.storage.count(start_time=start_time, end_time=end_time)
         
-        # 按操作类型统计
-        action_stats = {}
-        for action in ActionType:
-            count = await self.storage.count(
-                start_time=start_time,
-                end_time=end_time,
-                action=action
-            )
-            if count > 0:
-                action_stats[action.value] = count
-        
-        # 按级别统计
-        level_stats = {}
-        for level in AuditLevel:
-            count = await self.storage.count(
-                start_time=start_time,
-                end_time=end_time,
-                level=level
-            )
-            if count > 0:
-                level_stats[level.value] = count
+        # 按操作类型、级别统计
+        action_stats = await self.storage.aggregate(
+            "action", start_time=start_time, end_time=end_time
+        )
+        level_stats = await self.storage.aggregate(
+            "level", start_time=start_time, end_time=end_time
+        )
         
         # 活跃用户
-        entries = await self.storage.query(
-            start_time=start_time,
-            end_time=end_time,
-            limit=999999
+        users = await self.storage.aggregate(
+            "user_id", start_time=start_time, end_time=end_time
+        )
+        active_users = [u for u in users if u]
+
+        # 成功率
+        outcomes = await self.storage.aggregate(
+            "success", start_time=start_time, end_time=end_time
         )
-        
-        active_users = set()
-        for entry in entries:
-            if entry.user_id:
-                active_users.add(entry.user_id)
         
         # 异常检测
         anomalies = await self.detect_anomalies(end_time - start_time)
@@ -588,21 +1103,21 @@ class AuditAnalyzer:
             "summary": {
                 "total_operations": total_count,
                 "active_users": len(active_users),
-                "success_rate": self._calculate_success_rate(entries),
+                "success_rate": self._calculate_success_rate(outcomes),
             },
-            "action_statistics": action_stats,
-            "level_statistics": level_stats,
+            "action_statistics": {a.value: action_stats[a.value] for a in ActionType if action_stats.get(a.value)},
+            "level_statistics": {l.value: level_stats[l.value] for l in AuditLevel if level_stats.get(l.value)},
             "anomalies": anomalies,
             "recommendations": self._generate_recommendations(anomalies)
         }
     
-    def _calculate_success_rate(self, entries: List[AuditLogEntry]) -> float:
-        """计算成功率"""
-        if not entries:
+    def _calculate_success_rate(self, outcomes: Dict[Any, int]) -> float:
+        """计算成功率(outcomes 为按 success 分组的计数)"""
+        total = sum(outcomes.values())
+        if not total:
             return 100.0
         
-        success_count = sum(1 for e in entries if e.success)
-        return (success_count / len(entries)) * 100
+        return (outcomes.get(True, 0) / total) * 100
     
     def _generate_recommendations(self, anomalies: List[Dict[str, Any]]) -> List[str]:
         """生成建议"""
@@ -2,38 +2,85 @@
 响应压缩中间件
 
 功能:
-- Gzip压缩响应
+- Gzip/Brotli 流式压缩响应(逐块压缩，不缓冲整个响应体)
+- 静态资源优先使用预压缩文件(.br / .gz)，运行时零压缩开销
 - 压缩级别控制
 - 内容类型过滤
 - 性能监控
 
 作者: AI Assistant
-版本: 1.0.0
+版本: 1.1.0
 """
 
 import gzip
 import logging
-from typing import Optional, Set
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import ASGIApp
+import mimetypes
+import os
+import time
+import zlib
+from typing import Dict, Optional, Set, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.types import Message, Send
+
+from app.middleware.pipeline import PipelineStage, RequestContext, StageMiddleware
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# 预压缩文件扩展名
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class _StreamCompressor:
+    """统一 gzip 与 brotli 的增量压缩接口"""
+
+    __slots__ = ("_compress", "_finish")
+
+    def __init__(self, encoding: str, level: int, brotli_quality: int):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self._compress = compressor.process
+            self._finish = compressor.finish
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress = compressor.compress
+            self._finish = compressor.flush
 
-class CompressionMiddleware(BaseHTTPMiddleware):
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionStage(PipelineStage):
     """
-    响应压缩中间件
+    响应压缩阶段
     
-    自动压缩符合条件的响应，减少传输大小
+    自动压缩符合条件的响应，减少传输大小:
+    - 响应头到达时判断是否可压缩，首个响应体块到达时决定是否启用
+    - 单块响应直接整体压缩并给出 content-length，流式响应逐块压缩
+    - 客户端支持 br 且安装了 brotli 时优先使用 br
     """
+
+    name = "compression"
     
     # 默认压缩的最小大小 (字节)
     MINIMUM_SIZE = 500
     
     # 默认压缩级别 (1-9, 9最大压缩率但最慢)
     COMPRESS_LEVEL = 6
+
+    # 动态压缩的 brotli 质量 (0-11)，动态内容取较低值以控制 CPU
+    BROTLI_QUALITY = 4
     
     # 需要压缩的内容类型
     COMPRESSIBLE_TYPES: Set[str] = {
@@ -56,68 +103,116 @@ class CompressionMiddleware(BaseHTTPMiddleware):
     
     def __init__(
         self,
-        app: ASGIApp,
         minimum_size: int = MINIMUM_SIZE,
         compress_level: int = COMPRESS_LEVEL,
-        compressible_types: Optional[Set[str]] = None
+        compressible_types: Optional[Set[str]] = None,
+        brotli_quality: int = BROTLI_QUALITY,
+        static_prefix: Optional[str] = None,
+        static_directory: Optional[str] = None,
+        precompressed_cache_size: int = 4096
     ):
-        super().__init__(app)
+        """
+        参数:
+            minimum_size: 小于该大小的单块响应不压缩
+            compress_level: gzip 压缩级别
+            compressible_types: 可压缩的内容类型
+            brotli_quality: brotli 压缩质量
+            static_prefix: 静态资源 URL 前缀(如 "/static")，用于查找预压缩文件
+            static_directory: 静态资源目录
+            precompressed_cache_size: 预压缩文件查找结果缓存条数
+        """
         self.minimum_size = minimum_size
         self.compress_level = max(1, min(9, compress_level))
         self.compressible_types = compressible_types or self.COMPRESSIBLE_TYPES.copy()
+        self.brotli_quality = max(0, min(11, brotli_quality))
+        self.static_prefix = static_prefix.rstrip("/") + "/" if static_prefix else None
+        self.static_directory = os.path.realpath(static_directory) if static_directory else None
+        self._precompressed: Dict[Tuple[str, str], Optional[str]] = {}
+        self._precompressed_cache_size = precompressed_cache_size
+        self.stats = get_compression_stats()
         
         logger.info(
             f"压缩中间件已初始化: "
             f"min_size={minimum_size}, "
-            f"level={compress_level}"
+            f"level={compress_level}, "
+            f"brotli={'on' if BROTLI_AVAILABLE else 'off'}"
         )
-    
-    async def dispatch(self, request: Request, call_next):
-        """处理请求"""
-        # 检查客户端是否支持gzip
-        accept_encoding = request.headers.get("accept-encoding", "")
-        supports_gzip = "gzip" in accept_encoding.lower()
-        
-        # 继续处理请求
-        response = await call_next(request)
-        
-        # 如果不支持gzip或响应已压缩，直接返回
-        if not supports_gzip or self._is_already_compressed(response):
-            return response
-        
-        # 检查是否应该压缩
-        if not self._should_compress(response):
-            return response
-        
-        # 执行压缩
-        try:
-            compressed_response = await self._compress_response(response)
-            
-            # 添加压缩统计日志
-            original_size = len(response.body)
-            compressed_size = len(compressed_response.body)
-            ratio = (1 - compressed_size / original_size) * 100
-            
-            logger.debug(
-                f"响应已压缩: {original_size} -> {compressed_size} bytes "
-                f"({ratio:.1f}% 减少)"
+
+    def _negotiate(self, accept_encoding: str) -> Optional[str]:
+        """根据 Accept-Encoding 选择编码"""
+        accept_encoding = accept_encoding.lower()
+        if BROTLI_AVAILABLE and "br" in accept_encoding:
+            return "br"
+        if "gzip" in accept_encoding:
+            return "gzip"
+        return None
+
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        encoding = self._negotiate(ctx.headers.get("accept-encoding", ""))
+        ctx.state["compression.encoding"] = encoding
+        if encoding is None or self.static_prefix is None:
+            return None
+        if ctx.method not in ("GET", "HEAD") or not ctx.path.startswith(self.static_prefix):
+            return None
+        return self._precompressed_response(ctx.path[len(self.static_prefix):], ctx)
+
+    def _precompressed_response(self, relative: str, ctx: RequestContext) -> Optional[Response]:
+        """查找静态资源的预压缩版本"""
+        accept = ctx.headers.get("accept-encoding", "").lower()
+        for encoding in ("br", "gzip"):
+            if encoding not in accept:
+                continue
+            path = self._find_precompressed(relative, encoding)
+            if path is None:
+                continue
+            media_type = mimetypes.guess_type(relative)[0] or "application/octet-stream"
+            self.stats.record_skip()
+            return FileResponse(
+                path,
+                media_type=media_type,
+                headers={"content-encoding": encoding, "vary": "Accept-Encoding"}
             )
-            
-            return compressed_response
-            
-        except Exception as e:
-            logger.error(f"响应压缩失败: {e}")
-            return response
+        return None
+
+    def _find_precompressed(self, relative: str, encoding: str) -> Optional[str]:
+        key = (relative, encoding)
+        if key in self._precompressed:
+            return self._precompressed[key]
+
+        path = None
+        original = os.path.realpath(os.path.join(self.static_directory, relative))
+        if original.startswith(self.static_directory + os.sep):
+            candidate = original + PRECOMPRESSED_SUFFIXES[encoding]
+            if os.path.isfile(candidate):
+                path = candidate
+
+        if len(self._precompressed) >= self._precompressed_cache_size:
+            self._precompressed.clear()
+        self._precompressed[key] = path
+        return path
+
+    def wrap_send(self, ctx: RequestContext, send: Send) -> Send:
+        encoding = ctx.state.get("compression.encoding")
+        if encoding is None:
+            return send
+        return _CompressingSend(self, ctx, encoding, send)
     
-    def _is_already_compressed(self, response: Response) -> bool:
+    def _is_already_compressed(self, headers: Headers) -> bool:
         """检查响应是否已压缩"""
-        content_encoding = response.headers.get("content-encoding", "")
+        content_encoding = headers.get("content-encoding", "")
         return "gzip" in content_encoding or "br" in content_encoding or "deflate" in content_encoding
     
-    def _should_compress(self, response: Response) -> bool:
+    def _should_compress(self, status_code: int, headers: Headers) -> bool:
         """检查是否应该压缩响应"""
+        # 检查状态码 (只压缩成功响应)
+        if status_code < 200 or status_code >= 300:
+            return False
+
+        if self._is_already_compressed(headers):
+            return False
+
         # 检查内容类型
-        content_type = response.headers.get("content-type", "").lower()
+        content_type = headers.get("content-type", "").lower()
         
         # 提取主内容类型
         if ";" in content_type:
@@ -126,45 +221,101 @@ class CompressionMiddleware(BaseHTTPMiddleware):
         if content_type not in self.compressible_types:
             return False
         
-        # 检查响应大小
-        body = response.body
-        if len(body) < self.minimum_size:
-            return False
-        
-        # 检查状态码 (只压缩成功响应)
-        if response.status_code < 200 or response.status_code >= 300:
+        # 检查响应大小(已知长度时)
+        content_length = headers.get("content-length")
+        if content_length is not None and int(content_length) < self.minimum_size:
             return False
         
         return True
-    
-    async def _compress_response(self, response: Response) -> Response:
-        """压缩响应"""
-        body = response.body
-        
-        # 压缩内容
-        compressed = gzip.compress(
-            body,
-            compresslevel=self.compress_level
-        )
-        
-        # 创建新响应
-        compressed_response = Response(
-            content=compressed,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type
-        )
-        
-        # 更新头信息
-        compressed_response.headers["content-encoding"] = "gzip"
-        compressed_response.headers["content-length"] = str(len(compressed))
-        compressed_response.headers["vary"] = "accept-encoding"
-        
-        # 移除不必要的头
-        if "content-md5" in compressed_response.headers:
-            del compressed_response.headers["content-md5"]
-        
-        return compressed_response
+
+
+class _CompressingSend:
+    """逐块压缩响应体的 send 包装"""
+
+    __slots__ = ("stage", "ctx", "encoding", "send", "start", "compressor",
+                 "passthrough", "original_size", "compressed_size")
+
+    def __init__(self, stage: CompressionStage, ctx: RequestContext, encoding: str, send: Send):
+        self.stage = stage
+        self.ctx = ctx
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.compressor: Optional[_StreamCompressor] = None
+        self.passthrough = False
+        self.original_size = 0
+        self.compressed_size = 0
+
+    async def __call__(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if self.stage._should_compress(message["status"], Headers(raw=message["headers"])):
+                # 延迟到首个响应体块再决定
+                self.start = message
+                return
+            self.passthrough = True
+            self.stage.stats.record_skip()
+            await self.send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        t0 = time.perf_counter()
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        start = None
+
+        if self.compressor is None:
+            start, self.start = self.start, None
+            if not more_body and len(body) < self.stage.minimum_size:
+                self.passthrough = True
+                self.stage.stats.record_skip()
+                self.ctx.add_time(self.stage.name, time.perf_counter() - t0)
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = _StreamCompressor(
+                self.encoding, self.stage.compress_level, self.stage.brotli_quality
+            )
+
+        self.original_size += len(body)
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        self.compressed_size += len(chunk)
+
+        if start is not None:
+            headers = MutableHeaders(scope=start)
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-md5" in headers:
+                del headers["content-md5"]
+            if more_body:
+                # 流式响应长度未知，改用分块传输
+                if "content-length" in headers:
+                    del headers["content-length"]
+            else:
+                headers["content-length"] = str(len(chunk))
+        self.ctx.add_time(self.stage.name, time.perf_counter() - t0)
+
+        if start is not None:
+            await self.send(start)
+        if not more_body:
+            self.stage.stats.record_compression(self.original_size, self.compressed_size)
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+class CompressionMiddleware(StageMiddleware):
+    """响应压缩中间件(单阶段管线)"""
+
+    stage_class = CompressionStage
+
+    MINIMUM_SIZE = CompressionStage.MINIMUM_SIZE
+    COMPRESS_LEVEL = CompressionStage.COMPRESS_LEVEL
+    COMPRESSIBLE_TYPES = CompressionStage.COMPRESSIBLE_TYPES
 
 
 class CompressionConfig:
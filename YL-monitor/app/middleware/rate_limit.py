@@ -5,19 +5,37 @@
 - 防止 API 滥用
 - 支持 IP 级别的限流
 - 可配置的限流规则
+- 在执行请求之前判定，超限请求不会进入业务处理
+
+算法:
+- GCRA(通用信元速率算法，等价于令牌桶)，每个键只保存一个
+  "理论到达时间"(TAT)，判定为 O(1)
+- 路径规则预编译为最长前缀优先的正则，并缓存路径匹配结果
+- 默认按 ip:路径 计数，规则可通过 group_by_rule 改为按规则共享配额
+- 内存后端限制键数量，只淘汰已完全恢复的空闲键；没有可淘汰的键时
+  改用更粗粒度的 ip:规则 键计数，不丢弃仍在限流中的状态
+- 可选 SQLite 后端，供多 worker 部署共享限流状态
+- 作为纯 ASGI 管线阶段运行(RateLimitStage)，也可单独注册为中间件
 
 作者: AI Assistant
-版本: v1.0
+版本: v1.2
 """
 
+import re
+import sqlite3
+import threading
 import time
-from collections import defaultdict
-from dataclasses import dataclass, field
-from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import Request, Response
+from fastapi import Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+from app.middleware.pipeline import PipelineStage, RequestContext, StageMiddleware
 
 
 @dataclass
@@ -25,137 +43,442 @@ class RateLimitConfig:
     """限流配置"""
     requests: int = 100  # 允许的请求数
     seconds: int = 60    # 时间窗口（秒）
+    # 为 True 时同一规则下的所有路径共享一个配额(键为 ip:规则)，
+    # 默认每个路径独立计数(键为 ip:路径)
+    group_by_rule: bool = False
+
+    @property
+    def emission_interval(self) -> float:
+        """两次请求之间的平均间隔（秒）"""
+        return self.seconds / self.requests
 
 
 @dataclass
 class RateLimitEntry:
-    """限流条目"""
-    count: int = 0
-    window_start: float = field(default_factory=time.time)
+    """限流条目（GCRA 理论到达时间）"""
+    tat: float = 0.0
+
+
+@dataclass
+class RateLimitDecision:
+    """限流判定结果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_at: float
+    retry_after: float = 0.0
+
+
+def gcra_decide(
+    tat: float,
+    now: float,
+    config: RateLimitConfig
+) -> Tuple[RateLimitDecision, float]:
+    """
+    GCRA 判定
+
+    参数:
+        tat: 当前理论到达时间（无记录时传 0）
+        now: 当前时间戳
+        config: 限流配置
+
+    返回:
+        (判定结果, 新的理论到达时间)
+    """
+    interval = config.emission_interval
+    new_tat = max(tat, now) + interval
+    allow_at = new_tat - config.seconds
+
+    if now < allow_at:
+        return RateLimitDecision(
+            allowed=False,
+            limit=config.requests,
+            remaining=0,
+            reset_at=max(tat, now),
+            retry_after=allow_at - now
+        ), tat
+
+    remaining = int((now - allow_at) / interval + 1e-9)
+    return RateLimitDecision(
+        allowed=True,
+        limit=config.requests,
+        remaining=min(remaining, config.requests - 1),
+        reset_at=new_tat
+    ), new_tat
+
+
+class RateLimitBackend:
+    """
+    限流状态存储基类
+
+    定义限流状态存储接口
+    """
+
+    #: 判定是否涉及阻塞 I/O，为 True 时在线程池中执行
+    blocking = False
+
+    def acquire(
+        self,
+        key: str,
+        config: RateLimitConfig,
+        now: float,
+        fallback_key: Optional[str] = None
+    ) -> RateLimitDecision:
+        """
+        尝试消耗一次请求配额
+
+        参数:
+            key: 限流键
+            config: 限流配置
+            now: 当前时间戳
+            fallback_key: 更粗粒度的键，存储已满无法记录 key 时改用该键计数
+        """
+        raise NotImplementedError
+
+    def reset(self, key: Optional[str] = None):
+        """重置限流状态"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    内存限流存储
+
+    使用 OrderedDict 维护 LRU 顺序；每 sweep_every 次判定从最旧端清理
+    已完全恢复(TAT 已过)的空闲键。达到 max_keys 时只淘汰已恢复的键，
+    仍在限流中的键不会因为新键涌入而被淘汰(否则客户端可以用大量不同路径
+    重置自己的配额)；没有可淘汰的键时改用 fallback_key 计数，粗粒度键
+    也无法记录时淘汰最早恢复的键。
     """
-    请求限流中间件
-    
-    基于滑动窗口算法的限流实现:
-    - 按 IP 地址限流
-    - 可配置限流规则
+
+    def __init__(self, max_keys: int = 100000, sweep_every: int = 1024):
+        self.max_keys = max_keys
+        self.sweep_every = sweep_every
+        self._entries: "OrderedDict[str, RateLimitEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ops = 0
+        # 存储已满且没有已恢复的键时，记录最早恢复的键及其恢复时间，此前不再扫描
+        self._full_until = 0.0
+        self._earliest_key: Optional[str] = None
+
+    def acquire(
+        self,
+        key: str,
+        config: RateLimitConfig,
+        now: float,
+        fallback_key: Optional[str] = None
+    ) -> RateLimitDecision:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and len(self._entries) >= self.max_keys and not self._make_room(now):
+                if fallback_key is not None:
+                    key = fallback_key
+                    entry = self._entries.get(key)
+                if entry is None:
+                    # 粗粒度键也不存在时，淘汰最早恢复的键，丢失的限流状态最少
+                    if self._earliest_key in self._entries:
+                        del self._entries[self._earliest_key]
+                    else:
+                        self._entries.popitem(last=False)
+                    self._earliest_key = None
+            if entry is None:
+                entry = RateLimitEntry()
+                self._entries[key] = entry
+            else:
+                self._entries.move_to_end(key)
+
+            decision, entry.tat = gcra_decide(entry.tat, now, config)
+
+            self._ops += 1
+            if self._ops % self.sweep_every == 0:
+                self._evict_idle(now)
+
+            return decision
+
+    def _make_room(self, now: float) -> bool:
+        """存储已满时淘汰已恢复的键，没有可淘汰的键时返回 False"""
+        if now < self._full_until:
+            return False
+        self._evict_idle(now)
+        if len(self._entries) < self.max_keys:
+            return True
+        # 最旧端的键仍在限流中，继续查找其余已恢复的键
+        expired = None
+        earliest = None
+        for key, entry in self._entries.items():
+            if entry.tat <= now:
+                expired = key
+                break
+            if earliest is None or entry.tat < earliest.tat:
+                self._earliest_key, earliest = key, entry
+        if expired is None:
+            self._full_until = earliest.tat
+            return False
+        del self._entries[expired]
+        return True
+
+    def _evict_idle(self, now: float):
+        """淘汰空闲键：LRU 顺序下从最旧端开始，遇到未恢复的键即停止"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.tat > now:
+                break
+            del self._entries[key]
+
+    def reset(self, key: Optional[str] = None):
+        with self._lock:
+            if key:
+                self._entries.pop(key, None)
+            else:
+                self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    SQLite 限流存储
+
+    多个 worker 进程共享同一数据库文件；每次判定在一个 IMMEDIATE 事务内
+    读取并更新 TAT，保证跨进程的原子性。
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "data/rate_limit.db", sweep_every: int = 1024):
+        self.path = path
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._ops = 0
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(
+        self,
+        key: str,
+        config: RateLimitConfig,
+        now: float,
+        fallback_key: Optional[str] = None
+    ) -> RateLimitDecision:
+        # 数据库不限制键数量，不需要 fallback_key
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limit WHERE key = ?", (key,)).fetchone()
+            decision, new_tat = gcra_decide(row[0] if row else 0.0, now, config)
+            if decision.allowed:
+                conn.execute(
+                    "INSERT INTO rate_limit (key, tat) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, new_tat)
+                )
+            self._ops += 1
+            if self._ops % self.sweep_every == 0:
+                conn.execute("DELETE FROM rate_limit WHERE tat <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return decision
+
+    def reset(self, key: Optional[str] = None):
+        conn = self._connect()
+        if key:
+            conn.execute("DELETE FROM rate_limit WHERE key = ?", (key,))
+        else:
+            conn.execute("DELETE FROM rate_limit")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+
+
+class PathRuleMatcher:
+    """
+    路径规则匹配器
+
+    精确规则走字典查找；前缀规则编译为一个按长度降序排列的正则，
+    保证最长前缀优先。匹配结果按路径缓存（有界）。
+    """
+
+    def __init__(
+        self,
+        rules: Dict[str, RateLimitConfig],
+        default: RateLimitConfig,
+        cache_size: int = 4096
+    ):
+        self._exact = dict(rules)
+        self._default = default
+        self._prefixes: List[str] = sorted(rules, key=len, reverse=True)
+        self._pattern = re.compile(
+            "|".join(re.escape(p) for p in self._prefixes)
+        ) if self._prefixes else None
+        self._cache: Dict[str, Tuple[str, RateLimitConfig]] = {}
+        self._cache_size = cache_size
+
+    def match(self, path: str) -> Tuple[str, RateLimitConfig]:
+        """返回 (规则名, 配置)，规则名用于按规则共享配额时构造限流键"""
+        cached = self._cache.get(path)
+        if cached is not None:
+            return cached
+
+        if path in self._exact:
+            result = (path, self._exact[path])
+        else:
+            m = self._pattern.match(path) if self._pattern else None
+            result = (m.group(0), self._exact[m.group(0)]) if m else ("*", self._default)
+
+        if len(self._cache) >= self._cache_size:
+            self._cache.clear()
+        self._cache[path] = result
+        return result
+
+
+class RateLimitStage(PipelineStage):
+    """
+    请求限流阶段
+
+    基于 GCRA（令牌桶）的限流实现:
+    - 按 IP 地址 + 路径限流，规则设置 group_by_rule 时按 IP + 规则共享配额
+    - 可配置限流规则，最长前缀优先
+    - 在调用下游之前判定，超限直接返回 429
     - 返回剩余请求数和重试时间
-    
+
     响应头:
     - X-RateLimit-Limit: 允许的最大请求数
     - X-RateLimit-Remaining: 剩余请求数
-    - X-RateLimit-Reset: 窗口重置时间戳
+    - X-RateLimit-Reset: 配额完全恢复的时间戳
     """
-    
+
+    name = "rate_limit"
+
     # 默认限流配置
     DEFAULT_CONFIG = RateLimitConfig(requests=100, seconds=60)
-    
+
     # 不同路径的限流配置
     PATH_CONFIGS: Dict[str, RateLimitConfig] = {
         "/api/": RateLimitConfig(requests=100, seconds=60),      # 普通 API
         "/api/scripts/run": RateLimitConfig(requests=10, seconds=60),  # 脚本执行
         "/api/dag/run": RateLimitConfig(requests=5, seconds=60),      # DAG 执行
     }
-    
-    def __init__(self, app, default_config: Optional[RateLimitConfig] = None):
-        super().__init__(app)
+
+    def __init__(
+        self,
+        default_config: Optional[RateLimitConfig] = None,
+        backend: Optional[RateLimitBackend] = None,
+        path_configs: Optional[Dict[str, RateLimitConfig]] = None
+    ):
         self.default_config = default_config or self.DEFAULT_CONFIG
-        self.windows: Dict[str, RateLimitEntry] = defaultdict(RateLimitEntry)
-    
-    async def dispatch(self, request: Request, call_next):
-        # 获取客户端 IP
-        client_ip = self._get_client_ip(request)
-        key = f"{client_ip}:{request.url.path}"
-        
-        # 获取限流配置
-        config = self._get_config(request.url.path)
-        
-        # 检查限流
-        remaining, reset_at = self._check_rate_limit(key, config)
-        
-        # 获取响应
-        response = await call_next(request)
-        
-        # 添加限流头
-        response.headers["X-RateLimit-Limit"] = str(config.requests)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(int(reset_at))
-        
-        # 如果超过限流，返回 429
-        if remaining < 0:
+        self.backend = backend or MemoryRateLimitBackend()
+        self.matcher = PathRuleMatcher(
+            path_configs if path_configs is not None else self.PATH_CONFIGS,
+            self.default_config
+        )
+
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        decision = await self.check(ctx.request)
+        ctx.state["rate_limit"] = decision
+
+        # 超过限流，直接返回 429，不执行下游处理
+        if not decision.allowed:
+            retry_after = int(decision.retry_after) + 1
             response = JSONResponse(
                 status_code=429,
                 content={
                     "code": "RATE_LIMIT_EXCEEDED",
                     "message": "请求过于频繁，请稍后再试",
                     "details": {
-                        "retry_after": int(reset_at - time.time()) + 1
+                        "retry_after": retry_after
                     },
                     "timestamp": self._get_timestamp()
                 }
             )
-            response.headers["Retry-After"] = str(int(reset_at - time.time()) + 1)
-        
-        return response
-    
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+        return None
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        decision = ctx.state.get("rate_limit")
+        if decision is not None:
+            self._set_headers(headers, decision)
+
+    async def check(self, request: Request) -> RateLimitDecision:
+        """对请求进行限流判定并消耗配额"""
+        # 获取客户端 IP
+        client_ip = self._get_client_ip(request)
+
+        # 获取限流规则
+        path = request.url.path
+        rule, config = self.matcher.match(path)
+        if config.group_by_rule:
+            key, fallback_key = f"{client_ip}:{rule}", None
+        else:
+            # 存储已满时按规则共享配额，而不是丢弃限流状态
+            key, fallback_key = f"{client_ip}:{path}", f"{client_ip}:{rule}"
+
+        return await self._check_rate_limit(key, config, fallback_key)
+
+    async def _check_rate_limit(
+        self,
+        key: str,
+        config: RateLimitConfig,
+        fallback_key: Optional[str] = None
+    ) -> RateLimitDecision:
+        """检查限流"""
+        now = time.time()
+        if self.backend.blocking:
+            return await run_in_threadpool(self.backend.acquire, key, config, now, fallback_key)
+        return self.backend.acquire(key, config, now, fallback_key)
+
+    @staticmethod
+    def _set_headers(headers: MutableHeaders, decision: RateLimitDecision):
+        """添加限流头"""
+        headers["X-RateLimit-Limit"] = str(decision.limit)
+        headers["X-RateLimit-Remaining"] = str(decision.remaining)
+        headers["X-RateLimit-Reset"] = str(int(decision.reset_at))
+
     def _get_client_ip(self, request: Request) -> str:
         """获取客户端 IP"""
         # 优先使用 X-Forwarded-For（反向代理场景）
         forwarded = request.headers.get("X-Forwarded-For")
         if forwarded:
             return forwarded.split(",")[0].strip()
-        
+
         # 直接连接
         return request.client.host if request.client else "unknown"
-    
+
     def _get_config(self, path: str) -> RateLimitConfig:
         """获取路径对应的限流配置"""
-        # 精确匹配
-        if path in self.PATH_CONFIGS:
-            return self.PATH_CONFIGS[path]
-        
-        # 前缀匹配
-        for prefix, config in self.PATH_CONFIGS.items():
-            if path.startswith(prefix):
-                return config
-        
-        return self.default_config
-    
-    def _check_rate_limit(self, key: str, config: RateLimitConfig) -> Tuple[int, float]:
-        """
-        检查限流
-        
-        返回:
-            remaining: 剩余请求数
-            reset_at: 窗口重置时间戳
-        """
-        now = time.time()
-        entry = self.windows[key]
-        
-        # 如果窗口已过期，重置
-        if now - entry.window_start >= config.seconds:
-            entry.count = 0
-            entry.window_start = now
-        
-        # 计算剩余请求数
-        remaining = config.requests - entry.count - 1
-        
-        # 增加计数
-        entry.count += 1
-        
-        return remaining, entry.window_start + config.seconds
-    
+        return self.matcher.match(path)[1]
+
     def _get_timestamp(self) -> str:
         """获取当前时间戳（ISO 格式）"""
         from datetime import datetime
         return datetime.utcnow().isoformat() + "Z"
-    
+
     def reset(self, key: Optional[str] = None):
         """重置限流计数"""
-        if key:
-            self.windows.pop(key, None)
-        else:
-            self.windows.clear()
+        self.backend.reset(key)
+
+
+class RateLimitMiddleware(StageMiddleware):
+    """请求限流中间件(单阶段管线)"""
+
+    stage_class = RateLimitStage
 
+    DEFAULT_CONFIG = RateLimitStage.DEFAULT_CONFIG
+    PATH_CONFIGS = RateLimitStage.PATH_CONFIGS
@@ -5,45 +5,87 @@
 - 为每个请求生成唯一 ID
 - 在响应头中返回请求 ID
 - 在日志中包含请求 ID
+- 访问日志与响应耗时头
 
 作者: AI Assistant
-版本: v1.0
+版本: v1.1
 """
 
+import logging
 import uuid
+from typing import Optional
+
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+from app.middleware.pipeline import PipelineStage, RequestContext, StageMiddleware
+
+logger = logging.getLogger("yl_monitor")
 
 # 请求 ID 头名称
 REQUEST_ID_HEADER = "X-Request-ID"
 CORRELATION_ID_HEADER = "X-Correlation-ID"
+RESPONSE_TIME_HEADER = "X-Response-Time"
 
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
+class RequestIDStage(PipelineStage):
     """
-    请求 ID 中间件
+    请求 ID 阶段
     
     为每个请求分配唯一 ID，用于:
     - 请求追踪
     - 日志关联
     - 问题排查
     """
-    
-    async def dispatch(self, request: Request, call_next):
+
+    name = "request_id"
+
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
         # 获取或生成请求 ID
-        request_id = request.headers.get(REQUEST_ID_HEADER) or str(uuid.uuid4())
-        correlation_id = request.headers.get(CORRELATION_ID_HEADER) or request_id
-        
+        request_id = ctx.headers.get(REQUEST_ID_HEADER) or str(uuid.uuid4())
+        correlation_id = ctx.headers.get(CORRELATION_ID_HEADER) or request_id
+
         # 存储到 state
-        request.state.request_id = request_id
-        request.state.correlation_id = correlation_id
-        
+        state = ctx.request.state
+        state.request_id = request_id
+        state.correlation_id = correlation_id
+        return None
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
         # 添加到响应头
-        response = await call_next(request)
-        response.headers[REQUEST_ID_HEADER] = request_id
-        response.headers[CORRELATION_ID_HEADER] = correlation_id
-        
-        return response
+        state = ctx.request.state
+        headers[REQUEST_ID_HEADER] = state.request_id
+        headers[CORRELATION_ID_HEADER] = state.correlation_id
+
+
+class AccessLogStage(PipelineStage):
+    """
+    访问日志阶段
+
+    记录请求方法、路径、状态码与耗时，并添加 X-Response-Time 响应头。
+    """
+
+    name = "access_log"
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        headers[RESPONSE_TIME_HEADER] = f"{ctx.elapsed:.3f}"
+
+    async def after(self, ctx: RequestContext):
+        request_id = ctx.scope.get("state", {}).get("request_id", "-")
+        status_code = ctx.status_code or 500
+        log_level = logging.INFO if status_code < 400 else logging.WARNING
+        if logger.isEnabledFor(log_level):
+            logger.log(
+                log_level,
+                f"[{request_id}] {ctx.method} {ctx.path} - {status_code} ({ctx.elapsed:.3f}s)"
+            )
+
+
+class RequestIDMiddleware(StageMiddleware):
+    """请求 ID 中间件(单阶段管线)"""
+
+    stage_class = RequestIDStage
 
 
 def get_request_id(request: Request) -> str:
@@ -54,4 +96,3 @@ def get_request_id(request: Request) -> str:
 def get_correlation_id(request: Request) -> str:
     """获取当前请求的关联 ID"""
     return getattr(request.state, "correlation_id", "unknown")
-
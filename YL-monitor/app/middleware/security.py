@@ -19,8 +19,10 @@ import re
 from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
 
 from fastapi import HTTPException, Request, Response, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+
+from app.middleware.pipeline import PipelineStage, RequestContext, StageMiddleware
 
 logger = logging.getLogger(__name__)
 
@@ -62,12 +64,14 @@ class SecurityConfig:
         }
 
 
-class SecurityMiddleware(BaseHTTPMiddleware):
+class SecurityStage(PipelineStage):
     """
-    安全中间件
+    安全阶段
     
-    提供全面的安全防护
+    提供全面的安全防护；检查失败时直接返回错误响应，不进入下游处理
     """
+
+    name = "security"
     
     # SQL注入检测模式
     SQL_INJECTION_PATTERNS = [
@@ -91,13 +95,26 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         r"<object",  # object
         r"<embed",  # embed
     ]
-    
-    def __init__(
-        self,
-        app: ASGIApp,
-        config: Optional[SecurityConfig] = None
-    ):
-        super().__init__(app)
+
+    # 安全响应头
+    SECURITY_HEADERS = {
+        # 防止MIME类型嗅探
+        "X-Content-Type-Options": "nosniff",
+        # XSS保护
+        "X-XSS-Protection": "1; mode=block",
+        # 点击劫持保护
+        "X-Frame-Options": "DENY",
+        # 内容安全策略
+        "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'",
+        # 严格传输安全(HTTPS)
+        "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+        # 引用来源策略
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+        # 权限策略
+        "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+    }
+    
+    def __init__(self, config: Optional[SecurityConfig] = None):
         self.config = config or SecurityConfig()
         
         # 编译正则表达式
@@ -109,11 +126,13 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         
         logger.info("安全中间件已初始化")
     
-    async def dispatch(self, request: Request, call_next):
-        """处理请求"""
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        """执行安全检查"""
         try:
+            request = ctx.request
+
             # 请求大小检查
-            content_length = request.headers.get("content-length")
+            content_length = ctx.headers.get("content-length")
             if content_length and int(content_length) > self.config.max_request_size:
                 raise HTTPException(
                     status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
@@ -121,7 +140,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 )
             
             # 内容类型检查
-            content_type = request.headers.get("content-type", "").lower()
+            content_type = ctx.headers.get("content-type", "").lower()
             if content_type and not self._is_allowed_content_type(content_type):
                 raise HTTPException(
                     status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
@@ -138,25 +157,23 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             
             # CSRF检查
             if self.config.enable_csrf_protection:
-                await self._check_csrf(request)
-            
-            # 继续处理请求
-            response = await call_next(request)
+                await self._check_csrf(ctx)
             
-            # 添加安全头
-            if self.config.enable_security_headers:
-                response = self._add_security_headers(response)
+            return None
             
-            return response
-            
-        except HTTPException:
-            raise
+        except HTTPException as e:
+            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
         except Exception as e:
             logger.error(f"安全中间件错误: {e}")
-            raise HTTPException(
+            return JSONResponse(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="安全检查失败"
+                content={"detail": "安全检查失败"}
             )
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        # 添加安全头
+        if self.config.enable_security_headers:
+            self._add_security_headers(headers)
     
     def _is_allowed_content_type(self, content_type: str) -> bool:
         """检查内容类型是否允许"""
@@ -208,18 +225,18 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 return True
         return False
     
-    async def _check_csrf(self, request: Request):
+    async def _check_csrf(self, ctx: RequestContext):
         """检查CSRF"""
         # 只检查修改操作的请求
-        if request.method not in ["POST", "PUT", "DELETE", "PATCH"]:
+        if ctx.method not in ["POST", "PUT", "DELETE", "PATCH"]:
             return
         
         # 检查CSRF Token
-        csrf_token = request.headers.get(self.config.csrf_token_header)
+        csrf_token = ctx.headers.get(self.config.csrf_token_header)
         if not csrf_token:
-            # 尝试从表单数据获取
+            # 尝试从请求体获取(缓存后仍可被下游读取)
             try:
-                body = await request.body()
+                body = await ctx.body()
                 if body:
                     data = json.loads(body)
                     csrf_token = data.get("csrf_token")
@@ -227,7 +244,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 pass
         
         if not csrf_token or not self._validate_csrf_token(csrf_token):
-            logger.warning(f"CSRF验证失败: {request.url.path}")
+            logger.warning(f"CSRF验证失败: {ctx.path}")
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="CSRF验证失败"
@@ -238,29 +255,21 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         # 简化实现，实际应使用更复杂的验证
         return token in self._csrf_tokens
     
-    def _add_security_headers(self, response: Response) -> Response:
+    def _add_security_headers(self, headers: MutableHeaders) -> MutableHeaders:
         """添加安全头"""
-        headers = {
-            # 防止MIME类型嗅探
-            "X-Content-Type-Options": "nosniff",
-            # XSS保护
-            "X-XSS-Protection": "1; mode=block",
-            # 点击劫持保护
-            "X-Frame-Options": "DENY",
-            # 内容安全策略
-            "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'",
-            # 严格传输安全(HTTPS)
-            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
-            # 引用来源策略
-            "Referrer-Policy": "strict-origin-when-cross-origin",
-            # 权限策略
-            "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
-        }
-        
-        for key, value in headers.items():
-            response.headers[key] = value
+        for key, value in self.SECURITY_HEADERS.items():
+            headers[key] = value
         
-        return response
+        return headers
+
+
+class SecurityMiddleware(StageMiddleware):
+    """安全中间件(单阶段管线)"""
+
+    stage_class = SecurityStage
+
+    SQL_INJECTION_PATTERNS = SecurityStage.SQL_INJECTION_PATTERNS
+    XSS_PATTERNS = SecurityStage.XSS_PATTERNS
 
 
 class InputValidator:
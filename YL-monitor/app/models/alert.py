@@ -23,6 +23,8 @@ class AlertStatus(str, Enum):
     ACTIVE = "active"
     ACKNOWLEDGED = "acknowledged"
     RESOLVED = "resolved"
+    TRIGGERED = "triggered"  # AlertService: 已触发
+    RECOVERED = "recovered"  # AlertService: 已恢复
 
 
 class AlertCreate(BaseModel):
@@ -60,7 +60,7 @@ async def list_alerts(
     )
     
     # 获取总数
-    total = len(service.get_alert_history(limit=10000))
+    total = service.count_alert_history(level=level, status=status)
     
     return {
         "items": alerts,
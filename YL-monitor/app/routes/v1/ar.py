@@ -11,6 +11,8 @@ API v1 - AR 路由
 
 from __future__ import annotations
 
+import json
+import zlib
 from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Request, HTTPException
@@ -19,6 +21,9 @@ from app.middleware import create_success_response
 
 router = APIRouter(prefix="/ar", tags=["AR"])
 
+# 批量心跳解压后的最大字节数
+MAX_HEARTBEAT_BATCH_BYTES = 8 * 1024 * 1024
+
 
 def _get_monitor(request: Request):
     monitor = getattr(request.app.state, "ar_monitor", None)
@@ -127,6 +132,51 @@ async def heartbeat(request: Request, node_id: str):
     return create_success_response(message="Heartbeat updated")
 
 
+@router.post("/heartbeats")
+async def batch_heartbeats(request: Request):
+    """
+    批量上报心跳
+
+    请求体为 {"heartbeats": [{"node_id": ..., "status": ..., ...}]} 或心跳数组，
+    支持 Content-Encoding: gzip / deflate
+    """
+    monitor = _get_monitor(request)
+    body = await request.body()
+
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    try:
+        if encoding in ("gzip", "deflate"):
+            # gzip 头用 wbits=31，zlib 格式用 15；限制解压后大小
+            decompressor = zlib.decompressobj(31 if encoding == "gzip" else 15)
+            body = decompressor.decompress(body, MAX_HEARTBEAT_BATCH_BYTES)
+            if decompressor.unconsumed_tail:
+                raise HTTPException(status_code=413, detail="heartbeat batch too large")
+        elif encoding != "identity":
+            raise HTTPException(status_code=415, detail=f"unsupported content encoding: {encoding}")
+        payload = json.loads(body)
+    except (zlib.error, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid heartbeat payload: {e}")
+
+    heartbeats = payload.get("heartbeats") if isinstance(payload, dict) else payload
+    if not isinstance(heartbeats, list):
+        raise HTTPException(status_code=400, detail="heartbeats must be a list")
+
+    result = monitor.ingest_heartbeats(heartbeats)
+    return create_success_response(data=result, message="Heartbeats ingested")
+
+
+@router.get("/probe-stats")
+async def get_probe_stats(request: Request, node_id: Optional[str] = None):
+    """
+    获取节点健康检查的延迟分布与当前检查间隔
+    """
+    monitor = _get_monitor(request)
+    return create_success_response(
+        data={"nodes": monitor.get_probe_stats(node_id)},
+        message="Probe stats retrieved"
+    )
+
+
 @router.get("/scenes")
 async def get_scenes(request: Request):
     """
@@ -281,6 +281,8 @@ async def update_policy(
             existing_policy.recover_check_interval = request.recover_check_interval
         
         existing_policy.updated_at = datetime.utcnow()
+        # 重新登记以更新规则 -> 策略索引
+        intelligent_alert_service.add_policy(existing_policy)
         
         return PolicyResponse(
             success=True,
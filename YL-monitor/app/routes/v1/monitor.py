@@ -22,9 +22,10 @@ async def get_system_resources() -> Dict[str, Any]:
     """
     try:
         import psutil
+        from app.services.resource_sampler import sample_resources
         
         return {
-            "cpu": psutil.cpu_percent(interval=1),
+            "cpu": sample_resources().cpu_percent,
             "memory": psutil.virtual_memory().percent,
             "disk": psutil.disk_usage('/').percent,
             "timestamp": datetime.utcnow().isoformat()
@@ -0,0 +1,400 @@
+"""
+告警历史存储
+为 AlertService 提供追加写日志、定期压缩、内存索引与分页查询
+
+存储布局:
+- history.json: 压缩后的快照(JSON 数组，与旧格式兼容)
+- history.journal: 快照之后的变更，每行一条完整告警记录(按 id 覆盖)
+
+写入只在内存中更新索引并入队，由后台线程批量追加到日志；
+日志行数超过在内存记录数的 compact_ratio 倍时重写快照并清空日志。
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.models.alert import AlertHistory
+
+logger = logging.getLogger(__name__)
+
+# 建立倒排索引的字段
+INDEXED_FIELDS = ("rule_id", "level", "status")
+
+# 时间序键: (触发时间, 写入序号, 告警 ID)
+_OrderKey = Tuple[datetime, int, str]
+
+
+class AlertHistoryStore:
+    """
+    告警历史存储
+
+    - 字典式访问: store[alert_id] = alert 登记或更新记录
+    - rule_id / level / status 倒排索引 + 按触发时间排序的列表，
+      query()/count() 只访问命中的记录
+    - 超过 max_records 时淘汰最早触发的记录
+    """
+
+    SNAPSHOT_NAME = "history.json"
+    JOURNAL_NAME = "history.journal"
+
+    def __init__(
+        self,
+        directory: Path,
+        max_records: int = 1000,
+        compact_ratio: float = 2.0,
+        flush_interval: float = 1.0,
+        background: bool = True
+    ):
+        """
+        参数:
+            directory: 存储目录
+            max_records: 内存中保留的最大记录数
+            compact_ratio: 日志行数达到记录数的该倍数时压缩
+            flush_interval: 后台落盘间隔(秒)
+            background: 是否使用后台线程落盘(否则需显式调用 flush)
+        """
+        self.directory = Path(directory)
+        self.snapshot_file = self.directory / self.SNAPSHOT_NAME
+        self.journal_file = self.directory / self.JOURNAL_NAME
+        self.max_records = max_records
+        self.compact_ratio = compact_ratio
+        self.flush_interval = flush_interval
+        self.background = background
+
+        self._records: Dict[str, AlertHistory] = {}
+        self._order: List[_OrderKey] = []
+        self._order_keys: Dict[str, _OrderKey] = {}
+        # 记录登记时的索引值，原地修改后据此移除旧索引
+        self._indexed: Dict[str, Tuple[Any, ...]] = {}
+        self._indexes: Dict[str, Dict[Any, Set[str]]] = {f: {} for f in INDEXED_FIELDS}
+        self._seq = 0
+
+        self._pending: List[Dict[str, Any]] = []
+        self._journal_lines = 0
+
+        # _lock 保护内存结构与待写队列；_io_lock 串行化文件写入
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats = {"appended": 0, "flush_batches": 0, "compactions": 0, "evicted": 0}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    # ==================== 字典接口 ====================
+
+    def __setitem__(self, alert_id: str, alert: AlertHistory):
+        self.put(alert)
+
+    def __getitem__(self, alert_id: str) -> AlertHistory:
+        return self._records[alert_id]
+
+    def __contains__(self, alert_id: object) -> bool:
+        return alert_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._records))
+
+    def get(self, alert_id: str, default: Optional[AlertHistory] = None) -> Optional[AlertHistory]:
+        return self._records.get(alert_id, default)
+
+    def values(self) -> List[AlertHistory]:
+        """按触发时间正序返回全部记录"""
+        with self._lock:
+            return [self._records[key[2]] for key in self._order]
+
+    # ==================== 写入 ====================
+
+    def put(self, alert: AlertHistory):
+        """登记新记录或在原地修改后重新登记，持久化异步完成"""
+        data = alert.dict()
+        with self._lock:
+            self._index(alert)
+            self._pending.append(data)
+            self._evict()
+            self._ensure_writer()
+            self._cond.notify()
+
+    def _index(self, alert: AlertHistory):
+        alert_id = alert.id
+        previous = self._indexed.get(alert_id)
+        values = tuple(getattr(alert, f) for f in INDEXED_FIELDS)
+        if previous != values:
+            if previous is not None:
+                for field_name, value in zip(INDEXED_FIELDS, previous):
+                    self._indexes[field_name][value].discard(alert_id)
+            for field_name, value in zip(INDEXED_FIELDS, values):
+                self._indexes[field_name].setdefault(value, set()).add(alert_id)
+            self._indexed[alert_id] = values
+
+        key = self._order_keys.get(alert_id)
+        if key is None or key[0] != alert.triggered_at:
+            if key is not None:
+                self._order.pop(bisect.bisect_left(self._order, key))
+            self._seq += 1
+            key = (alert.triggered_at, self._seq, alert_id)
+            # 触发时间通常单调递增，多数情况下等价于追加
+            if not self._order or self._order[-1] < key:
+                self._order.append(key)
+            else:
+                bisect.insort(self._order, key)
+            self._order_keys[alert_id] = key
+        self._records[alert_id] = alert
+
+    def _evict(self):
+        while len(self._order) > self.max_records:
+            _, _, alert_id = self._order.pop(0)
+            del self._order_keys[alert_id]
+            del self._records[alert_id]
+            for field_name, value in zip(INDEXED_FIELDS, self._indexed.pop(alert_id)):
+                self._indexes[field_name][value].discard(alert_id)
+            self._stats["evicted"] += 1
+
+    # ==================== 查询 ====================
+
+    def by_status(self, status: Any) -> List[AlertHistory]:
+        with self._lock:
+            return [self._records[i] for i in self._indexes["status"].get(status, ())]
+
+    def _candidates(
+        self,
+        rule_id: Optional[str],
+        status: Optional[Any],
+        level: Optional[Any]
+    ) -> Optional[Set[str]]:
+        """按倒排索引求交集，None 表示无索引条件"""
+        sets = []
+        for field_name, value in (("rule_id", rule_id), ("status", status), ("level", level)):
+            if value:
+                sets.append(self._indexes[field_name].get(value, set()))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:]) if len(sets) > 1 else set(sets[0])
+
+    def _range(
+        self, start_time: Optional[datetime], end_time: Optional[datetime]
+    ) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self._order, (start_time,)) if start_time else 0
+        hi = (
+            bisect.bisect_right(self._order, (end_time, float("inf")))
+            if end_time else len(self._order)
+        )
+        return lo, hi
+
+    def _matching_keys(
+        self,
+        rule_id: Optional[str],
+        status: Optional[Any],
+        level: Optional[Any],
+        start_time: Optional[datetime],
+        end_time: Optional[datetime]
+    ) -> Tuple[Optional[List[_OrderKey]], int, int, Optional[Set[str]]]:
+        """
+        返回 (候选键列表, lo, hi, 候选集)
+
+        索引命中集合小于时间范围时直接对命中键排序，否则在时间范围内按集合过滤
+        """
+        candidates = self._candidates(rule_id, status, level)
+        lo, hi = self._range(start_time, end_time)
+        if candidates is not None and len(candidates) < hi - lo:
+            lo_key, hi_key = self._order[lo], self._order[hi - 1]
+            keys = sorted(
+                key for key in (self._order_keys[i] for i in candidates)
+                if lo_key <= key <= hi_key
+            )
+            return keys, lo, hi, candidates
+        return None, lo, hi, candidates
+
+    def query(
+        self,
+        rule_id: Optional[str] = None,
+        status: Optional[Any] = None,
+        level: Optional[Any] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[AlertHistory]:
+        """按触发时间倒序分页查询"""
+        with self._lock:
+            keys, lo, hi, candidates = self._matching_keys(
+                rule_id, status, level, start_time, end_time
+            )
+            if keys is not None:
+                page = keys[::-1][offset:offset + limit]
+                return [self._records[k[2]] for k in page]
+
+            result: List[AlertHistory] = []
+            skipped = 0
+            for i in range(hi - 1, lo - 1, -1):
+                alert_id = self._order[i][2]
+                if candidates is not None and alert_id not in candidates:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if len(result) >= limit:
+                    break
+                result.append(self._records[alert_id])
+            return result
+
+    def count(
+        self,
+        rule_id: Optional[str] = None,
+        status: Optional[Any] = None,
+        level: Optional[Any] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> int:
+        """统计匹配记录数(不构造结果列表)"""
+        with self._lock:
+            keys, lo, hi, candidates = self._matching_keys(
+                rule_id, status, level, start_time, end_time
+            )
+            if keys is not None:
+                return len(keys)
+            if candidates is None:
+                return hi - lo
+            return sum(1 for i in range(lo, hi) if self._order[i][2] in candidates)
+
+    # ==================== 持久化 ====================
+
+    def _load(self):
+        """加载快照并重放日志，截断末尾不完整的行"""
+        if self.snapshot_file.exists():
+            try:
+                with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                    for data in json.load(f):
+                        self._load_record(data)
+            except (OSError, ValueError) as e:
+                logger.error(f"加载告警历史快照失败: {e}")
+
+        if not self.journal_file.exists():
+            return
+        position = 0
+        with open(self.journal_file, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self._load_record(json.loads(line))
+                except ValueError:
+                    pass
+                position += len(line)
+                self._journal_lines += 1
+        if position < self.journal_file.stat().st_size:
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(position)
+
+    def _load_record(self, data: Dict[str, Any]):
+        try:
+            alert = AlertHistory(**data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"跳过无效告警记录: {e}")
+            return
+        self._index(alert)
+        self._evict()
+
+    def _ensure_writer(self):
+        if self.background and self._thread is None and not self._closed:
+            self._thread = threading.Thread(
+                target=self._flush_loop, name="alert-journal", daemon=True
+            )
+            self._thread.start()
+
+    def flush(self):
+        """将待写记录追加到日志，必要时压缩"""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                data = "".join(
+                    json.dumps(d, ensure_ascii=False, default=str) + "\n" for d in batch
+                )
+                try:
+                    with open(self.journal_file, "a", encoding="utf-8") as f:
+                        f.write(data)
+                except OSError as e:
+                    logger.error(f"告警历史写入失败: {e}")
+                    return
+                self._journal_lines += len(batch)
+                self._stats["appended"] += len(batch)
+                self._stats["flush_batches"] += 1
+            if self._journal_lines > max(self.max_records, len(self._records)) * self.compact_ratio:
+                self._compact()
+
+    def compact(self):
+        """立即重写快照并清空日志"""
+        self.flush()
+        with self._io_lock:
+            self._compact()
+
+    def _compact(self):
+        # 调用方持有 _io_lock；快照之后的新写入仍在 _pending 中，会写入新日志
+        with self._lock:
+            snapshot = [self._records[key[2]].dict() for key in self._order]
+        tmp = self.snapshot_file.with_suffix(".json.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, default=str)
+            os.replace(tmp, self.snapshot_file)
+            with open(self.journal_file, "w", encoding="utf-8"):
+                pass
+        except OSError as e:
+            logger.error(f"告警历史压缩失败: {e}")
+            return
+        self._journal_lines = 0
+        self._stats["compactions"] += 1
+
+    def _flush_loop(self):
+        """后台落盘线程"""
+        while True:
+            with self._lock:
+                while not self._closed and not self._pending:
+                    self._cond.wait()
+                # 合并一个间隔内的写入，告警风暴时只产生少量追加
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"告警历史落盘失败: {e}")
+            if closed:
+                return
+
+    def close(self):
+        """停止后台线程并落盘剩余记录"""
+        with self._lock:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self._stats,
+                "records": len(self._records),
+                "pending": len(self._pending),
+                "journal_lines": self._journal_lines,
+            }
@@ -19,6 +19,8 @@ from pathlib import Path
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from app.services.rule_evaluator import compile_condition
+
 logger = logging.getLogger('AlertManager')
 
 
@@ -333,42 +335,18 @@ class AlertManager:
                 logger.error(f"评估规则 {rule.rule_id} 失败: {e}")
     
     def _evaluate_condition(self, condition: str, data: dict) -> bool:
-        """评估条件表达式"""
-        # 简单的条件评估
-        try:
-            # 支持的条件格式:
-            # - status == "offline"
-            # - cpu_percent > 80
-            # - memory_percent > 85
-            
-            if '==' in condition:
-                key, value = condition.split('==')
-                key = key.strip()
-                value = value.strip().strip('"').strip("'")
-                return str(data.get(key)) == value
-            
-            elif '>' in condition:
-                key, value = condition.split('>')
-                key = key.strip()
-                value = float(value.strip())
-                return float(data.get(key, 0)) > value
-            
-            elif '<' in condition:
-                key, value = condition.split('<')
-                key = key.strip()
-                value = float(value.strip())
-                return float(data.get(key, 0)) < value
-            
-            else:
-                # 特殊条件
-                if condition == 'health_check_failed':
-                    return data.get('consecutive_fails', 0) > 0
-                
-        except Exception as e:
-            logger.error(f"条件评估错误: {e}")
-            return False
-        
-        return False
+        """
+        评估条件表达式
+
+        支持的条件格式:
+        - status == "offline"
+        - cpu_percent > 80
+        - memory_percent >= 85
+        - health_check_failed
+
+        表达式按字符串缓存编译结果，只在首次出现时解析
+        """
+        return compile_condition(condition)(data)
     
     async def _trigger_alert(self, rule: AlertRule, node_id: str,
                              node_data: dict):
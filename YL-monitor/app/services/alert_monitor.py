@@ -13,7 +13,6 @@
 
 import asyncio
 import psutil
-import time
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
@@ -21,6 +20,7 @@ from pathlib import Path
 
 from app.services.alert_service import get_alert_service, AlertService
 from app.services.event_bus import EventBus, EventType
+from app.services.resource_sampler import sample_resources
 from app.models.alert import MetricType
 
 logger = logging.getLogger(__name__)
@@ -41,9 +41,6 @@ class AlertMonitor:
         self._task: Optional[asyncio.Task] = None
         self._alert_service: Optional[AlertService] = None
         
-        # 上次指标值（用于计算变化率）
-        self._last_metrics: Dict[str, Any] = {}
-        
         # 统计信息
         self._stats = {
             'checks_performed': 0,
@@ -121,8 +118,9 @@ class AlertMonitor:
     
     async def _check_all_metrics(self):
         """检查所有系统指标"""
-        # CPU 使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # CPU 使用率与网络速率（增量采样，不阻塞事件循环）
+        resources = sample_resources()
+        cpu_percent = resources.cpu_percent
         await self._check_metric(MetricType.CPU, cpu_percent)
         
         # 内存使用率
@@ -138,10 +136,9 @@ class AlertMonitor:
         load_avg = psutil.getloadavg()
         await self._check_metric(MetricType.LOAD, load_avg[0])  # 1分钟负载
         
-        # 网络流量（计算变化率）
-        net_io = psutil.net_io_counters()
-        network_rate = self._calculate_network_rate(net_io)
-        if network_rate is not None:
+        # 网络流量（KB/s，首次采样没有速率）
+        if resources.interval > 0:
+            network_rate = resources.net_total_per_sec / 1024
             await self._check_metric(MetricType.NETWORK, network_rate)
         
         # 进程数
@@ -174,28 +171,6 @@ class AlertMonitor:
         if self._alert_service:
             self._alert_service.check_alerts(metric_type, value)
     
-    def _calculate_network_rate(self, net_io) -> Optional[float]:
-        """计算网络流量变化率（KB/s）"""
-        current_time = time.time()
-        
-        if 'network' in self._last_metrics:
-            last_io, last_time = self._last_metrics['network']
-            time_delta = current_time - last_time
-            
-            if time_delta > 0:
-                # 计算总流量（发送 + 接收）
-                bytes_sent_delta = net_io.bytes_sent - last_io.bytes_sent
-                bytes_recv_delta = net_io.bytes_recv - last_io.bytes_recv
-                total_bytes = bytes_sent_delta + bytes_recv_delta
-                
-                # 转换为 KB/s
-                rate_kb_s = (total_bytes / 1024) / time_delta
-                return rate_kb_s
-        
-        # 保存当前值
-        self._last_metrics['network'] = (net_io, current_time)
-        return None
-    
     def get_stats(self) -> Dict[str, Any]:
         """获取监控统计"""
         uptime = None
@@ -22,7 +22,9 @@ from app.models.alert import (
     AlertRule, AlertHistory, AlertStatus, AlertLevel,
     MetricType, NotificationChannel, ComparisonOp
 )
+from app.services.alert_journal import AlertHistoryStore
 from app.services.event_bus import EventBus, EventType, Event
+from app.services.rule_evaluator import CompiledRule, RuleIndex, compare, normalize_op
 from app.services.email_service import get_email_service
 from app.services.webhook_service import get_webhook_service
 
@@ -35,11 +37,12 @@ class AlertService:
         self.storage_dir.mkdir(parents=True, exist_ok=True)
         
         self.rules_file = self.storage_dir / "rules.json"
-        self.history_file = self.storage_dir / "history.json"
         
         # 内存缓存
         self._rules: Dict[str, AlertRule] = {}
-        self._history: Dict[str, AlertHistory] = {}
+        # 告警历史（追加写日志 + 索引，保留最近 1000 条）
+        self._history = AlertHistoryStore(self.storage_dir, max_records=1000)
+        self.history_file = self._history.snapshot_file
         self._active_alerts: Dict[str, AlertHistory] = {}  # rule_id -> alert
         
         # 规则触发时间记录（用于计算持续时间）
@@ -47,9 +50,13 @@ class AlertService:
         
         # 最后通知时间（用于静默期）
         self._last_notification: Dict[str, datetime] = {}
+
+        # 已编译的启用规则（按指标索引，仅在规则增删改时重建）
+        self._rule_index = RuleIndex()
         
         # 加载数据
         self._load_data()
+        self._compile_rules()
         
         # 订阅系统指标事件
         self._subscribe_events()
@@ -90,21 +97,9 @@ class AlertService:
             except Exception as e:
                 print(f"加载告警规则失败: {e}")
         
-        # 加载历史（最近 1000 条）
-        if self.history_file.exists():
-            try:
-                with open(self.history_file, "r", encoding="utf-8") as f:
-                    history_data = json.load(f)
-                    # 只保留最近 1000 条
-                    history_data = history_data[-1000:]
-                    for alert_dict in history_data:
-                        alert = AlertHistory(**alert_dict)
-                        self._history[alert.id] = alert
-                        # 恢复活动告警状态
-                        if alert.status == AlertStatus.TRIGGERED:
-                            self._active_alerts[alert.rule_id] = alert
-            except Exception as e:
-                print(f"加载告警历史失败: {e}")
+        # 历史已由 AlertHistoryStore 加载，恢复活动告警状态
+        for alert in self._history.by_status(AlertStatus.TRIGGERED):
+            self._active_alerts[alert.rule_id] = alert
     
     def _save_rules(self):
         """保存规则到文件"""
@@ -121,18 +116,9 @@ class AlertService:
             print(f"保存告警规则失败: {e}")
     
     def _save_history(self):
-        """保存历史到文件"""
+        """立即将待写的告警历史落盘（正常路径由后台线程批量追加）"""
         try:
-            # 只保留最近 1000 条
-            history_list = list(self._history.values())[-1000:]
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(
-                    [alert.dict() for alert in history_list],
-                    f,
-                    ensure_ascii=False,
-                    indent=2,
-                    default=str
-                )
+            self._history.flush()
         except Exception as e:
             print(f"保存告警历史失败: {e}")
     
@@ -149,6 +135,7 @@ class AlertService:
         )
         
         self._rules[rule_id] = rule
+        self._compile_rules()
         self._save_rules()
         
         return rule
@@ -167,6 +154,7 @@ class AlertService:
         
         rule.updated_at = datetime.utcnow()
         
+        self._compile_rules()
         self._save_rules()
         return rule
     
@@ -176,6 +164,7 @@ class AlertService:
             return False
         
         del self._rules[rule_id]
+        self._compile_rules()
         self._save_rules()
         return True
     
@@ -206,24 +195,54 @@ class AlertService:
         
         return rules
     
+    def _compile_rules(self):
+        """编译启用的规则（顺序与 list_rules 一致：按创建时间倒序）"""
+        rules = sorted(
+            (r for r in self._rules.values() if r.enabled),
+            key=lambda r: r.created_at or datetime.min,
+            reverse=True
+        )
+        self._rule_index.rebuild(
+            CompiledRule(
+                rule_id=r.id,
+                metric=r.metric,
+                op=normalize_op(r.comparison),
+                threshold=float(r.threshold),
+                rule=r
+            )
+            for r in rules
+        )
+    
     # ==================== 告警检查 ====================
     
     def check_alerts(self, metric: MetricType, actual_value: float):
         """检查告警条件"""
-        # 获取该指标的所有启用规则
-        rules = self.list_rules(enabled_only=True, metric=metric)
-        
-        for rule in rules:
-            self._check_rule(rule, actual_value)
+        # 只评估该指标的已编译规则
+        for compiled, condition_met in self._rule_index.evaluate(metric, actual_value):
+            self._apply_condition(compiled.rule, condition_met, actual_value)
+
+    def check_alerts_batch(self, metric: MetricType, values: List[float]):
+        """
+        批量检查同一指标的多个样本
+
+        一次向量比较得到全部 样本 x 规则 结果，再按样本顺序推进告警状态
+        """
+        rules, results = self._rule_index.evaluate_batch(metric, values)
+        for value, row in zip(values, results):
+            for compiled, condition_met in zip(rules, row):
+                self._apply_condition(compiled.rule, condition_met, value)
     
     def _check_rule(self, rule: AlertRule, actual_value: float):
         """检查单个规则"""
-        rule_id = rule.id
-        
         # 计算条件是否满足
         condition_met = self._evaluate_condition(
             rule.comparison, actual_value, rule.threshold
         )
+        self._apply_condition(rule, condition_met, actual_value)
+
+    def _apply_condition(self, rule: AlertRule, condition_met: bool, actual_value: float):
+        """根据条件结果推进告警状态"""
+        rule_id = rule.id
         
         # 获取当前告警状态
         current_alert = self._active_alerts.get(rule_id)
@@ -248,17 +267,10 @@ class AlertService:
         threshold: float
     ) -> bool:
         """评估条件"""
-        if comparison == ComparisonOp.GT:
-            return actual > threshold
-        elif comparison == ComparisonOp.GTE:
-            return actual >= threshold
-        elif comparison == ComparisonOp.LT:
-            return actual < threshold
-        elif comparison == ComparisonOp.LTE:
-            return actual <= threshold
-        elif comparison == ComparisonOp.EQ:
-            return abs(actual - threshold) < 0.001
-        return False
+        try:
+            return compare(comparison, actual, threshold)
+        except ValueError:
+            return False
     
     def _trigger_alert(self, rule: AlertRule, actual_value: float):
         """触发告警"""
@@ -299,7 +311,6 @@ class AlertService:
         
         self._history[alert_id] = alert
         self._active_alerts[rule_id] = alert
-        self._save_history()
         
         # 发送通知
         asyncio.create_task(self._send_notifications(rule, alert))
@@ -335,7 +346,7 @@ class AlertService:
         if rule_id in self._trigger_times:
             del self._trigger_times[rule_id]
         
-        self._save_history()
+        self._history.put(alert)
         
         # 发布恢复事件
         EventBus().publish(EventType.ALERT_RECOVERED, {
@@ -408,7 +419,7 @@ class AlertService:
                     "error": str(e)
                 })
         
-        self._save_history()
+        self._history.put(alert)
     
     def _should_send_notification(self, rule_id: str, channel: NotificationChannel) -> bool:
         """检查是否应该发送通知（静默期检查）"""
@@ -505,30 +516,33 @@ class AlertService:
         limit: int = 100,
         offset: int = 0
     ) -> List[AlertHistory]:
-        """获取告警历史"""
-        alerts = list(self._history.values())
-        
-        # 过滤
-        if rule_id:
-            alerts = [a for a in alerts if a.rule_id == rule_id]
-        
-        if status:
-            alerts = [a for a in alerts if a.status == status]
-        
-        if level:
-            alerts = [a for a in alerts if a.level == level]
-        
-        if start_time:
-            alerts = [a for a in alerts if a.triggered_at >= start_time]
-        
-        if end_time:
-            alerts = [a for a in alerts if a.triggered_at <= end_time]
-        
-        # 按时间倒序
-        alerts.sort(key=lambda a: a.triggered_at, reverse=True)
-        
-        # 分页
-        return alerts[offset:offset + limit]
+        """获取告警历史（按触发时间倒序）"""
+        return self._history.query(
+            rule_id=rule_id,
+            status=status,
+            level=level,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit,
+            offset=offset
+        )
+    
+    def count_alert_history(
+        self,
+        rule_id: Optional[str] = None,
+        status: Optional[AlertStatus] = None,
+        level: Optional[AlertLevel] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> int:
+        """统计符合条件的告警历史数量"""
+        return self._history.count(
+            rule_id=rule_id,
+            status=status,
+            level=level,
+            start_time=start_time,
+            end_time=end_time
+        )
     
     def get_active_alerts(self) -> List[AlertHistory]:
         """获取当前活动告警"""
@@ -544,7 +558,7 @@ class AlertService:
         alert.acknowledged_at = datetime.utcnow()
         alert.acknowledged_by = user
         
-        self._save_history()
+        self._history.put(alert)
         return alert
     
     def get_stats(self) -> Dict[str, int]:
@@ -553,10 +567,7 @@ class AlertService:
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         
         total = len(self._history)
-        triggered_today = sum(
-            1 for a in self._history.values()
-            if a.triggered_at >= today_start
-        )
+        triggered_today = self._history.count(start_time=today_start)
         active = len(self._active_alerts)
         recovered_today = sum(
             1 for a in self._history.values()
@@ -610,6 +621,10 @@ class AlertService:
         except Exception as e:
             print(f"测试通知失败: {e}")
             return False
+    
+    def close(self):
+        """停止告警历史后台写入并落盘剩余记录"""
+        self._history.close()
 
 
 # 全局实例
@@ -622,3 +637,11 @@ def get_alert_service() -> AlertService:
     if _alert_service is None:
         _alert_service = AlertService()
     return _alert_service
+
+
+def close_alert_service():
+    """关闭全局告警服务实例(应用关闭时调用)"""
+    global _alert_service
+    if _alert_service is not None:
+        _alert_service.close()
+        _alert_service = None
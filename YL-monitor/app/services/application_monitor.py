@@ -5,6 +5,7 @@
 提供 API、数据库、缓存的详细监控
 """
 
+import asyncio
 import time
 import logging
 import statistics
@@ -16,6 +17,9 @@ import requests
 import sqlite3
 import os
 
+from app.services.async_prober import AsyncProber, ProbeTarget
+from app.services.quantile_sketch import QuantileSketch, WindowedSketch
+
 logger = logging.getLogger(__name__)
 
 
@@ -52,6 +56,9 @@ class APIServiceMetrics:
     avg_response_time: float
     availability_percent: float
     endpoints: List[APIEndpointMetrics] = field(default_factory=list)
+    p50_response_time: float = 0.0
+    p95_response_time: float = 0.0
+    p99_response_time: float = 0.0
     timestamp: str = ""
     
     def to_dict(self) -> Dict[str, Any]:
@@ -101,6 +108,19 @@ class CacheMetrics:
         return asdict(self)
 
 
+class _EndpointStats:
+    """单个端点的累计计数与响应时间窗口草图"""
+    
+    __slots__ = ("latency", "request_count", "error_count", "last_status_code", "last_error")
+    
+    def __init__(self, latency: WindowedSketch):
+        self.latency = latency
+        self.request_count = 0
+        self.error_count = 0
+        self.last_status_code = 0
+        self.last_error: Optional[str] = None
+
+
 class APIDetailedMonitor:
     """
     API详细监控器
@@ -111,14 +131,56 @@ class APIDetailedMonitor:
     - 错误率和错误类型
     - 服务可用性
     - 端点健康状态
+    
+    响应时间按端点记录到时间分槽的分位数草图中，记录为 O(1)、
+    不保存单个请求；查询合并窗口内的槽，服务级分位数由各端点草图合并得到。
+    端点检查共用一个长期探测引擎(连接池跨检查周期复用)，关闭时调用 close()。
     """
     
-    def __init__(self, history_size: int = 100):
+    PERCENTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(
+        self,
+        history_size: int = 100,
+        window_seconds: float = 300.0,
+        window_slots: int = 10,
+        relative_accuracy: float = 0.01,
+        prober: Optional[AsyncProber] = None
+    ):
+        """
+        Args:
+            history_size: 保留参数（旧版按请求数的窗口大小），兼容旧调用
+            window_seconds: 响应时间统计窗口（秒）
+            window_slots: 窗口分槽数，窗口按槽滑动
+            relative_accuracy: 分位数相对误差
+            prober: 端点检查使用的探测引擎，为空时首次检查时创建
+        """
         self.history_size = history_size
-        self._response_times: Dict[str, deque] = {}
-        self._error_counts: Dict[str, int] = {}
-        self._request_counts: Dict[str, int] = {}
-        self._last_errors: Dict[str, str] = {}
+        self.window_seconds = window_seconds
+        self.window_slots = window_slots
+        self.relative_accuracy = relative_accuracy
+        self.prober = prober
+        self._endpoints: Dict[str, _EndpointStats] = {}
+    
+    def get_prober(self) -> AsyncProber:
+        """长期复用的探测引擎(首次使用时创建)"""
+        if self.prober is None:
+            self.prober = AsyncProber(default_timeout=5.0)
+        return self.prober
+    
+    async def close(self):
+        """关闭探测引擎的 HTTP 会话"""
+        if self.prober is not None:
+            await self.prober.close()
+    
+    def _stats_for(self, key: str) -> _EndpointStats:
+        stats = self._endpoints.get(key)
+        if stats is None:
+            stats = _EndpointStats(WindowedSketch(
+                self.window_seconds, self.window_slots, self.relative_accuracy
+            ))
+            self._endpoints[key] = stats
+        return stats
     
     def record_request(
         self,
@@ -138,27 +200,18 @@ class APIDetailedMonitor:
             status_code: 状态码
             error: 错误信息
         """
-        key = f"{method}:{endpoint}"
-        
-        # 初始化数据结构
-        if key not in self._response_times:
-            self._response_times[key] = deque(maxlen=self.history_size)
-            self._error_counts[key] = 0
-            self._request_counts[key] = 0
+        stats = self._stats_for(f"{method}:{endpoint}")
         
         # 记录数据
-        self._request_counts[key] += 1
-        self._response_times[key].append({
-            'timestamp': datetime.now().isoformat(),
-            'response_time': response_time_ms,
-            'status_code': status_code
-        })
+        stats.request_count += 1
+        stats.last_status_code = status_code
+        stats.latency.add(response_time_ms)
         
         # 记录错误
         if status_code >= 400 or error:
-            self._error_counts[key] += 1
+            stats.error_count += 1
             if error:
-                self._last_errors[key] = error
+                stats.last_error = error
     
     def check_endpoint(
         self,
@@ -246,6 +299,72 @@ class APIDetailedMonitor:
                 "timestamp": datetime.now().isoformat()
             }
     
+    async def check_endpoints_async(
+        self,
+        base_url: str,
+        endpoints: List[Dict[str, str]],
+        timeout: float = 5.0,
+        prober: Optional[AsyncProber] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        并发检查多个端点（共用 HTTP 连接池，每个端点独立超时）
+        
+        Args:
+            base_url: 基础URL
+            endpoints: 端点列表 [{"path": "/health", "method": "GET"}, ...]
+            timeout: 每个端点的超时时间
+            prober: 探测引擎，为空时使用本监控器的长期探测引擎
+            
+        Returns:
+            检查结果，顺序与 endpoints 一致
+        """
+        prober = prober or self.get_prober()
+        targets = [
+            ProbeTarget(
+                name=ep['path'], url=f"{base_url}{ep['path']}",
+                method=ep.get('method', 'GET'), timeout=timeout
+            )
+            for ep in endpoints
+        ]
+        probe_results = await prober.probe_many(targets)
+        
+        results = []
+        for target, probe in zip(targets, probe_results):
+            endpoint, method = target.name, target.method
+            response_time = probe.response_time_ms or 0
+            status_code = probe.status_code or 0
+            self.record_request(
+                endpoint=endpoint,
+                method=method,
+                response_time_ms=response_time,
+                status_code=status_code,
+                error=probe.error
+            )
+            result = {
+                "endpoint": endpoint,
+                "method": method,
+                "status_code": status_code,
+                "response_time_ms": round(response_time, 2),
+                "healthy": probe.healthy,
+                "timestamp": probe.timestamp
+            }
+            if probe.error and status_code == 0:
+                result["error"] = probe.error
+            results.append(result)
+        return results
+    
+    async def check_endpoint_async(
+        self,
+        base_url: str,
+        endpoint: str,
+        method: str = "GET",
+        timeout: float = 5.0
+    ) -> Dict[str, Any]:
+        """主动检查端点健康状态（异步，结果格式与 check_endpoint 相同）"""
+        return (await self.check_endpoints_async(
+            base_url, [{"path": endpoint, "method": method}], timeout
+        ))[0]
+    
     def get_endpoint_metrics(self, endpoint: str, method: str) -> APIEndpointMetrics:
         """
         获取端点指标
@@ -257,43 +376,42 @@ class APIDetailedMonitor:
         Returns:
             端点指标
         """
-        key = f"{method}:{endpoint}"
+        return self._build_endpoint_metrics(
+            endpoint, method, self._endpoints.get(f"{method}:{endpoint}")
+        )[0]
+    
+    def _build_endpoint_metrics(
+        self,
+        endpoint: str,
+        method: str,
+        stats: Optional[_EndpointStats],
+        into: Optional[QuantileSketch] = None
+    ):
+        """
+        构造端点指标，返回 (指标, 窗口草图)
         
-        request_count = self._request_counts.get(key, 0)
-        error_count = self._error_counts.get(key, 0)
-        error_rate = (error_count / request_count * 100) if request_count > 0 else 0
+        into 不为空时窗口内的槽同时合并进 into，用于服务级汇总
+        """
+        if stats is None:
+            stats = _EndpointStats(WindowedSketch(1.0, 1, self.relative_accuracy))
         
-        response_times = self._response_times.get(key, deque())
+        sketch = stats.latency.snapshot()
+        if into is not None:
+            into.merge(sketch)
         
-        if response_times:
-            times = [r['response_time'] for r in response_times]
-            avg_time = statistics.mean(times)
-            min_time = min(times)
-            max_time = max(times)
-            
-            # 计算百分位数
-            sorted_times = sorted(times)
-            p50_idx = len(sorted_times) // 2
-            p95_idx = int(len(sorted_times) * 0.95)
-            p99_idx = int(len(sorted_times) * 0.99)
-            p50_time = sorted_times[p50_idx] if sorted_times else 0
-            p95_time = (
-                sorted_times[p95_idx] 
-                if p95_idx < len(sorted_times) 
-                else sorted_times[-1]
-            )
-            p99_time = (
-                sorted_times[p99_idx] 
-                if p99_idx < len(sorted_times) 
-                else sorted_times[-1]
-            )
-            
-            last_status = response_times[-1]['status_code']
+        request_count = stats.request_count
+        error_count = stats.error_count
+        error_rate = (error_count / request_count * 100) if request_count > 0 else 0
+        
+        if sketch.count:
+            avg_time = sketch.mean
+            min_time = sketch.min
+            max_time = sketch.max
+            p50_time, p95_time, p99_time = sketch.quantiles(self.PERCENTILES)
         else:
             avg_time = min_time = max_time = p50_time = p95_time = p99_time = 0
-            last_status = 0
         
-        return APIEndpointMetrics(
+        metrics = APIEndpointMetrics(
             endpoint=endpoint,
             method=method,
             request_count=request_count,
@@ -305,48 +423,41 @@ class APIDetailedMonitor:
             p50_response_time=round(p50_time, 2),
             p95_response_time=round(p95_time, 2),
             p99_response_time=round(p99_time, 2),
-            last_status_code=last_status,
-            last_error=self._last_errors.get(key),
+            last_status_code=stats.last_status_code,
+            last_error=stats.last_error,
             timestamp=datetime.now().isoformat()
         )
+        return metrics, sketch
     
-    def get_service_metrics(
+    async def get_service_metrics_async(
         self,
         service_name: str,
         base_url: str,
-        endpoints: List[Dict[str, str]]
+        endpoints: List[Dict[str, str]],
+        prober: Optional[AsyncProber] = None
     ) -> APIServiceMetrics:
-        """
-        获取服务整体指标
+        """获取服务整体指标，所有端点并发检查"""
+        check_results = await self.check_endpoints_async(base_url, endpoints, prober=prober)
         
-        Args:
-            service_name: 服务名称
-            base_url: 基础URL
-            endpoints: 端点列表 [{"path": "/health", "method": "GET"}, ...]
-            
-        Returns:
-            服务指标
-        """
         endpoint_metrics = []
         total_requests = 0
         total_errors = 0
-        total_response_time = 0
         healthy_count = 0
+        # 各端点窗口草图合并为服务级分布
+        service_sketch = QuantileSketch(self.relative_accuracy)
         
-        for ep in endpoints:
+        for ep, check_result in zip(endpoints, check_results):
             path = ep['path']
             method = ep.get('method', 'GET')
             
-            # 主动检查端点
-            check_result = self.check_endpoint(base_url, path, method)
-            
             # 获取端点指标
-            metrics = self.get_endpoint_metrics(path, method)
+            metrics, _ = self._build_endpoint_metrics(
+                path, method, self._endpoints.get(f"{method}:{path}"), into=service_sketch
+            )
             endpoint_metrics.append(metrics)
             
             total_requests += metrics.request_count
             total_errors += metrics.error_count
-            total_response_time += metrics.avg_response_time
             
             if check_result['healthy']:
                 healthy_count += 1
@@ -359,9 +470,9 @@ class APIDetailedMonitor:
         overall_error_rate = (
             total_errors / total_requests * 100
         ) if total_requests > 0 else 0
-        avg_response_time = (
-            total_response_time / endpoint_count
-        ) if endpoint_count > 0 else 0
+        # 按请求数加权的平均值与分位数
+        avg_response_time = service_sketch.mean
+        p50_time, p95_time, p99_time = service_sketch.quantiles(self.PERCENTILES)
         
         return APIServiceMetrics(
             service_name=service_name,
@@ -372,6 +483,9 @@ class APIDetailedMonitor:
             avg_response_time=round(avg_response_time, 2),
             availability_percent=round(availability, 2),
             endpoints=endpoint_metrics,
+            p50_response_time=round(p50_time, 2),
+            p95_response_time=round(p95_time, 2),
+            p99_response_time=round(p99_time, 2),
             timestamp=datetime.now().isoformat()
         )
 
@@ -572,9 +686,24 @@ class ApplicationCollector:
             }
         }
     
-    def collect_all(self) -> Dict[str, Any]:
+    async def _collect_service(self, service_name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            metrics = await self.api_monitor.get_service_metrics_async(
+                service_name=service_name,
+                base_url=config['base_url'],
+                endpoints=config['endpoints']
+            )
+            return metrics.to_dict()
+        except Exception as e:
+            logger.error(f"监控API服务失败 {service_name}: {e}")
+            return {
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    async def collect_all(self) -> Dict[str, Any]:
         """
-        采集所有应用服务层指标
+        采集所有应用服务层指标(各服务端点并发检查)
         """
         result = {
             "timestamp": datetime.now().isoformat(),
@@ -582,21 +711,11 @@ class ApplicationCollector:
         }
         
         # API 服务监控
-        api_metrics = {}
-        for service_name, config in self.services.items():
-            try:
-                metrics = self.api_monitor.get_service_metrics(
-                    service_name=service_name,
-                    base_url=config['base_url'],
-                    endpoints=config['endpoints']
-                )
-                api_metrics[service_name] = metrics.to_dict()
-            except Exception as e:
-                logger.error(f"监控API服务失败 {service_name}: {e}")
-                api_metrics[service_name] = {
-                    "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                }
+        names = list(self.services)
+        collected = await asyncio.gather(
+            *(self._collect_service(name, self.services[name]) for name in names)
+        )
+        api_metrics = dict(zip(names, collected))
         
         result["api_services"] = api_metrics
         
@@ -615,7 +734,11 @@ class ApplicationCollector:
         
         return result
     
-    def get_service_health(self, service_name: str) -> Dict[str, Any]:
+    async def close(self):
+        """释放端点检查的探测引擎"""
+        await self.api_monitor.close()
+    
+    async def get_service_health(self, service_name: str) -> Dict[str, Any]:
         """
         获取指定服务的健康状态
         """
@@ -628,7 +751,7 @@ class ApplicationCollector:
         config = self.services[service_name]
         
         try:
-            metrics = self.api_monitor.get_service_metrics(
+            metrics = await self.api_monitor.get_service_metrics_async(
                 service_name=service_name,
                 base_url=config['base_url'],
                 endpoints=config['endpoints']
@@ -675,7 +798,7 @@ if __name__ == "__main__":
     # 测试 API 监控
     print("\n1. API 服务监控:")
     for service_name in collector.services.keys():
-        health = collector.get_service_health(service_name)
+        health = asyncio.run(collector.get_service_health(service_name))
         status = "✅ 健康" if health.get('healthy') else "❌ 异常"
         print(f"  {status} {service_name}:")
         if 'error' in health:
@@ -2,23 +2,37 @@
 AR 状态监控器
 负责 AR 节点的心跳检测、状态同步和进度监控
 集成事件总线支持模块联动
+
+节点状态按状态值建立索引，计数随状态变更增量维护；节点响应模型按需缓存，
+只重建发生变化的节点。健康检查与心跳超时由截止时间队列调度，不再定时全量扫描。
+
+健康检查间隔自适应：状态变化或失败后快速探测，结果连续稳定后逐步退避，
+探测开销与状态变化频率相关而不是与节点数相关。HTTP 检查复用长连接池，
+进程检查在共享线程池中基于进程表快照执行；每个节点记录探测延迟分布。
 """
 
 import asyncio
 import aiohttp
+import time
 import yaml
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List, Set
 from pathlib import Path
 from dataclasses import dataclass, field
 
 from app.models.ar import ARNode, ARScene, ARStatus, ARNodeStatus, ARNodesResponse, ARStatusResponse
+from app.services.deadline_queue import DeadlineQueue
 from app.services.event_bus import event_bus, EventType
-from app.services.user_gui_monitor import user_gui_monitor, get_user_gui_status
+from app.services.quantile_sketch import QuantileSketch
+from app.services.user_gui_monitor import get_user_gui_status
 
 import logging
 logger = logging.getLogger('ARMonitor')
 
+_AR_NODE_STATUSES = {s.value for s in ARNodeStatus}
+
 
 @dataclass
 class NodeInfo:
@@ -33,12 +47,15 @@ class NodeInfo:
     check_interval: int = 30  # 秒
     timeout: int = 5  # 秒
     fail_threshold: int = 3  # 连续失败次数标记离线
+    passive: bool = False  # 仅靠心跳上报，不主动健康检查
 
     # 运行时状态
     status: str = 'unknown'  # online, offline, error
     last_check: Optional[datetime] = None
     last_heartbeat: Optional[datetime] = None
     consecutive_fails: int = 0
+    stable_checks: int = 0  # 连续相同检查结果的次数，用于调整检查间隔
+    last_probe_ok: Optional[bool] = None
     metadata: Dict = field(default_factory=dict)
 
     @property
@@ -64,6 +81,14 @@ class ARMonitor:
     AR 节点监控器
     """
 
+    # 自适应检查间隔
+    PROBE_MIN_INTERVAL = 1.0      # 快速探测的最小间隔（秒）
+    PROBE_FAST_DIVISOR = 4        # 快速探测间隔 = check_interval / 4
+    PROBE_STABLE_STEP = 3         # 每连续稳定 3 次，退避一级
+    PROBE_MAX_BACKOFF = 4         # 最长间隔 = check_interval * 4
+    # 长连接保持时间需覆盖最长检查间隔，退避后仍可复用连接
+    HTTP_KEEPALIVE_SECONDS = 150
+
     def __init__(self, config_path: Optional[str] = None):
         self.nodes: Dict[str, NodeInfo] = {}
         self.scenes: Dict[str, ARScene] = {}
@@ -72,6 +97,19 @@ class ARMonitor:
         self.check_task: Optional[asyncio.Task] = None
         self.running = False
 
+        # 状态 -> 节点ID（有序集合），计数随状态变更增量维护
+        self._by_status: Dict[str, Dict[str, None]] = defaultdict(dict)
+        # 节点响应模型缓存，只重建发生变化的节点
+        self._node_views: Dict[str, ARNode] = {}
+        self._dirty: Set[str] = set()
+        # ("check", 节点ID) 健康检查 / ("expire", 节点ID) 心跳超时
+        self._deadlines = DeadlineQueue()
+        self._wakeup: Optional[asyncio.Event] = None
+        # 进程检查等阻塞操作的共享线程池
+        self._probe_executor: Optional[ThreadPoolExecutor] = None
+        # 节点ID -> 探测延迟(ms)分布
+        self._probe_latency: Dict[str, QuantileSketch] = {}
+
         # 加载配置
         self._load_config()
 
@@ -115,7 +153,7 @@ class ARMonitor:
 
             for node_config in config.get('nodes', []):
                 node = NodeInfo(**node_config)
-                self.nodes[node.node_id] = node
+                self._add_node(node)
                 logger.info(f"加载节点配置: {node.node_id} ({node.node_name})")
 
         except Exception as e:
@@ -145,7 +183,7 @@ class ARMonitor:
         ]
 
         for node in default_nodes:
-            self.nodes[node.node_id] = node
+            self._add_node(node)
 
         # 保存默认配置
         if self.config_path:
@@ -185,7 +223,19 @@ class ARMonitor:
             return
 
         self.running = True
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=4,
+                keepalive_timeout=self.HTTP_KEEPALIVE_SECONDS,
+                ttl_dns_cache=300
+            )
+        )
+        self._probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ar-probe")
+        self._wakeup = asyncio.Event()
+        for node in self.nodes.values():
+            if not node.passive:
+                self._schedule(("check", node.node_id), 0)
 
         # 启动定期检查任务
         self.check_task = asyncio.create_task(self._check_loop())
@@ -195,6 +245,8 @@ class ARMonitor:
     async def stop_monitoring(self):
         """停止监控"""
         self.running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
 
         if self.check_task:
             self.check_task.cancel()
@@ -206,24 +258,118 @@ class ARMonitor:
         if self.session:
             await self.session.close()
 
+        if self._probe_executor is not None:
+            self._probe_executor.shutdown(wait=False)
+            self._probe_executor = None
+
         logger.info("AR监控服务已停止")
 
+    def _schedule(self, key: tuple, delay: float):
+        """设定定时，早于当前最早截止时间时唤醒检查循环"""
+        if self._deadlines.schedule_in(key, delay) and self._wakeup is not None:
+            self._wakeup.set()
+
     async def _check_loop(self):
-        """检查循环"""
+        """检查循环：按截止时间执行到期的健康检查与心跳超时判定"""
         while self.running:
             try:
-                await self._check_all_nodes()
+                await self._run_due()
             except Exception as e:
                 logger.error(f"检查循环异常: {e}")
 
-            # 等待下一次检查（使用较短的间隔以便快速响应）
-            await asyncio.sleep(10)
+            # 等待最早的截止时间，或新定时早于它时被唤醒
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._deadlines.next_delay())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_due(self):
+        """处理所有已到期的定时"""
+        checks = []
+        for (kind, node_id), _ in self._deadlines.pop_due():
+            node = self.nodes.get(node_id)
+            if node is None:
+                continue
+            if kind == "expire":
+                await self._expire_heartbeat(node)
+            elif not node.passive:
+                checks.append(node)
+
+        if checks:
+            await asyncio.gather(*(self._probe_node(node) for node in checks), return_exceptions=True)
+            for node in checks:
+                if self.nodes.get(node.node_id) is node:
+                    self._schedule(("check", node.node_id), self._next_probe_delay(node))
+
+    async def _probe_node(self, node: NodeInfo):
+        """执行一次健康检查，记录延迟与结果稳定性"""
+        previous_status = node.status
+        start = time.perf_counter()
+        try:
+            await self._check_node(node)
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            sketch = self._probe_latency.get(node.node_id)
+            if sketch is None:
+                sketch = self._probe_latency[node.node_id] = QuantileSketch()
+            sketch.add(latency_ms)
+
+        ok = node.consecutive_fails == 0
+        if ok == node.last_probe_ok and node.status == previous_status:
+            node.stable_checks += 1
+        else:
+            node.stable_checks = 0
+        node.last_probe_ok = ok
+
+    def _next_probe_delay(self, node: NodeInfo) -> float:
+        """
+        下一次检查的间隔
+
+        结果刚发生变化（含失败确认期间）时按快速间隔探测，
+        之后每连续稳定 PROBE_STABLE_STEP 次间隔翻倍，最长 PROBE_MAX_BACKOFF 倍。
+        """
+        if node.stable_checks < self.PROBE_STABLE_STEP:
+            return max(self.PROBE_MIN_INTERVAL, node.check_interval / self.PROBE_FAST_DIVISOR)
+        factor = 2 ** (node.stable_checks // self.PROBE_STABLE_STEP - 1)
+        return node.check_interval * min(factor, self.PROBE_MAX_BACKOFF)
+
+    def get_probe_stats(self, node_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """各节点的探测延迟分布(ms)与当前检查间隔"""
+        stats = {}
+        for nid, sketch in self._probe_latency.items():
+            node = self.nodes.get(nid)
+            if node is None or (node_id is not None and nid != node_id):
+                continue
+            p50, p90, p99 = sketch.quantiles([0.5, 0.9, 0.99])
+            stats[nid] = {
+                "count": sketch.count,
+                "mean_ms": round(sketch.mean, 2),
+                "p50_ms": round(p50, 2),
+                "p90_ms": round(p90, 2),
+                "p99_ms": round(p99, 2),
+                "max_ms": round(sketch.max, 2),
+                "stable_checks": node.stable_checks,
+                "next_interval": self._next_probe_delay(node)
+            }
+        return stats
 
     async def _check_all_nodes(self):
         """检查所有节点"""
         tasks = [self._check_node(node) for node in self.nodes.values()]
         await asyncio.gather(*tasks, return_exceptions=True)
 
+    async def _expire_heartbeat(self, node: NodeInfo):
+        """心跳超时（2倍检查间隔）未收到新心跳，标记离线
+
+        主动检查的节点由健康检查决定状态，心跳超时不改变其状态。
+        """
+        if not node.passive:
+            return
+        if self._set_status(node, 'offline'):
+            logger.error(f"节点 {node.node_id} 心跳超时，标记为离线")
+            await self._trigger_alert(node, 'heartbeat_timeout')
+
     async def _check_node(self, node: NodeInfo):
         """检查单个节点"""
         # 对于 user-gui 类型节点，使用进程监控
@@ -244,13 +390,14 @@ class ARMonitor:
                     data = await response.json()
 
                     # 更新节点状态
-                    node.status = 'online'
+                    self._set_status(node, 'online')
                     node.last_check = datetime.utcnow()
                     node.consecutive_fails = 0
 
                     # 合并返回的元数据
                     if isinstance(data, dict):
                         node.metadata.update(data)
+                        self._dirty.add(node.node_id)
 
                     logger.debug(f"节点 {node.node_id} 健康检查通过")
 
@@ -271,8 +418,7 @@ class ARMonitor:
 
         # 检查是否达到失败阈值
         if node.consecutive_fails >= node.fail_threshold:
-            if node.status != 'offline':
-                node.status = 'offline'
+            if self._set_status(node, 'offline'):
                 logger.error(f"节点 {node.node_id} 标记为离线")
 
                 # 触发告警
@@ -281,16 +427,15 @@ class ARMonitor:
     async def _check_user_gui_node(self, node: NodeInfo):
         """检查 User GUI 节点（使用进程监控）"""
         try:
-            # 使用进程监控检查 User GUI 状态
-            is_running = user_gui_monitor.check_process_running()
+            # 在共享线程池中基于进程表快照检查 User GUI 状态
+            loop = asyncio.get_running_loop()
+            status_info = await loop.run_in_executor(self._probe_executor, get_user_gui_status)
             
-            if is_running:
-                # 获取详细状态
-                status_info = get_user_gui_status()
-                
-                node.status = 'online'
+            if status_info.get('status') == 'running':
+                self._set_status(node, 'online')
                 node.last_check = datetime.utcnow()
                 node.consecutive_fails = 0
+                self._dirty.add(node.node_id)
                 
                 # 更新元数据
                 if status_info.get('process'):
@@ -309,8 +454,7 @@ class ARMonitor:
         
         # 检查是否达到失败阈值
         if node.consecutive_fails >= node.fail_threshold:
-            if node.status != 'offline':
-                node.status = 'offline'
+            if self._set_status(node, 'offline'):
                 logger.error(f"User GUI 节点 {node.node_id} 标记为离线")
                 
                 # 触发告警
@@ -322,17 +466,72 @@ class ARMonitor:
         # 这里可以集成告警系统
         # 例如：发送邮件、钉钉通知等
 
-    def update_heartbeat(self, node_id: str, data: dict):
-        """更新节点心跳（由API调用）"""
-        if node_id not in self.nodes:
-            # 自动注册新节点
+    # ==================== 节点状态表 ====================
+
+    def _add_node(self, node: NodeInfo):
+        """加入（或替换）节点"""
+        old = self.nodes.get(node.node_id)
+        if old is not None:
+            self._by_status[old.status].pop(node.node_id, None)
+        self.nodes[node.node_id] = node
+        self._by_status[node.status][node.node_id] = None
+        self._dirty.add(node.node_id)
+        if self.running and not node.passive:
+            self._schedule(("check", node.node_id), 0)
+
+    def _remove_node(self, node_id: str) -> Optional[NodeInfo]:
+        """移除节点及其定时与缓存"""
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return None
+        self._by_status[node.status].pop(node_id, None)
+        self._node_views.pop(node_id, None)
+        self._probe_latency.pop(node_id, None)
+        self._dirty.discard(node_id)
+        self._deadlines.cancel(("check", node_id))
+        self._deadlines.cancel(("expire", node_id))
+        return node
+
+    def _set_status(self, node: NodeInfo, status: str) -> bool:
+        """变更节点状态并维护状态索引，返回状态是否改变"""
+        if node.status == status:
+            return False
+        self._by_status[node.status].pop(node.node_id, None)
+        self._by_status[status][node.node_id] = None
+        node.status = status
+        self._dirty.add(node.node_id)
+        return True
+
+    def get_status_counts(self) -> Dict[str, int]:
+        """各状态的节点数"""
+        return {status: len(ids) for status, ids in self._by_status.items() if ids}
+
+    # ==================== 心跳 ====================
+
+    def _apply_heartbeat(self, node_id: str, data: dict, now: datetime) -> bool:
+        """
+        应用一次心跳，未知节点自动注册
+
+        返回:
+            是否为新注册的节点
+
+        异常:
+            ValueError: status 不是字符串
+        """
+        status = data.get('status') or 'online'
+        if not isinstance(status, str):
+            raise ValueError(f"无效的心跳状态: {status!r}")
+
+        node = self.nodes.get(node_id)
+        registered = node is None
+        if registered:
             logger.info(f"自动注册新节点: {node_id}")
-            self._auto_register_node(node_id, data)
-            return
+            node = self._auto_register_node(node_id, data)
 
-        node = self.nodes[node_id]
-        node.last_heartbeat = datetime.utcnow()
-        node.status = data.get('status', 'unknown')
+        node.last_heartbeat = now
+        previous = node.status
+        self._set_status(node, status)
+        self._dirty.add(node_id)
 
         # 更新元数据
         if 'gui' in data:
@@ -345,8 +544,57 @@ class ARMonitor:
             logger.info(f"节点 {node_id} 恢复在线")
             node.consecutive_fails = 0
 
-    def _auto_register_node(self, node_id: str, data: dict):
-        """自动注册节点"""
+        # 被动节点心跳超时（2倍检查间隔）后标记离线
+        if node.passive:
+            self._schedule(("expire", node_id), node.check_interval * 2)
+
+        if not registered and previous != 'online' and node.status == 'online':
+            # 发布心跳恢复事件
+            event_bus.publish_event(
+                event_type=EventType.AR_STATUS_CHANGED,
+                source="ar_monitor",
+                data={
+                    "node_id": node_id,
+                    "status": "heartbeat_restored"
+                }
+            )
+        return registered
+
+    def ingest_heartbeats(self, heartbeats: List[dict]) -> Dict[str, int]:
+        """
+        批量应用心跳（由API调用）
+
+        参数:
+            heartbeats: 心跳列表，每项需包含 node_id，其余字段同 update_heartbeat 的 data
+
+        返回:
+            accepted/registered/rejected 计数
+        """
+        now = datetime.utcnow()
+        result = {"accepted": 0, "registered": 0, "rejected": 0}
+        for item in heartbeats:
+            node_id = item.get('node_id') if isinstance(item, dict) else None
+            if not isinstance(node_id, str) or not node_id:
+                result["rejected"] += 1
+                continue
+            try:
+                registered = self._apply_heartbeat(node_id, item, now)
+            except Exception as e:
+                # 单条心跳异常不影响同批次的其他心跳
+                logger.warning(f"拒绝节点 {node_id} 的心跳: {e}")
+                result["rejected"] += 1
+                continue
+            if registered:
+                result["registered"] += 1
+            result["accepted"] += 1
+        return result
+
+    def update_heartbeat(self, node_id: str, data: dict):
+        """更新节点心跳（由API调用）"""
+        self._apply_heartbeat(node_id, data, datetime.utcnow())
+
+    def _auto_register_node(self, node_id: str, data: dict) -> NodeInfo:
+        """自动注册节点（仅靠心跳判定在线状态）"""
         node_type = data.get('node_type', 'unknown')
 
         # 根据类型确定端口
@@ -357,16 +605,18 @@ class ARMonitor:
 
         node = NodeInfo(
             node_id=node_id,
-            node_name=data.get('node_name', node_id),
+            node_name=data.get('node_name') or node_id,
             node_type=node_type,
             host='0.0.0.0',
             port=port_map.get(node_type, 5500),
             health_endpoint='/health',
-            status_endpoint='/status'
+            status_endpoint='/status',
+            passive=True
         )
 
-        self.nodes[node_id] = node
+        self._add_node(node)
         logger.info(f"节点 {node_id} 已自动注册")
+        return node
 
     def get_node(self, node_id: str) -> Optional[NodeInfo]:
         """获取节点信息"""
@@ -378,7 +628,10 @@ class ARMonitor:
 
     def get_online_nodes(self) -> List[NodeInfo]:
         """获取在线节点"""
-        return [n for n in self.nodes.values() if n.is_online]
+        return [
+            self.nodes[node_id] for node_id in self._by_status.get('online', ())
+            if self.nodes[node_id].is_online
+        ]
 
     def get_offline_nodes(self) -> List[NodeInfo]:
         """获取离线节点"""
@@ -430,19 +683,15 @@ class ARMonitor:
         """处理 AR 节点更新事件"""
         node_id = event.data.get('node_id')
         ar_config = event.data.get('ar_config', {})
+        if not node_id or event.source == "ar_monitor":
+            # 忽略自身发布的注册/进度事件
+            return
         
         # 更新或创建 AR 节点
-        if node_id not in self.nodes:
-            node = ARNode(
-                id=node_id,
-                name=ar_config.get('name', node_id),
-                type=ar_config.get('type', 'render'),
-                status=ARNodeStatus.ONLINE
-            )
-            self.nodes[node_id] = node
-        else:
-            self.nodes[node_id].status = ARNodeStatus.ONLINE
-            self.nodes[node_id].last_heartbeat = datetime.now()
+        self._apply_heartbeat(node_id, {
+            'node_name': ar_config.get('name', node_id),
+            'node_type': ar_config.get('type', 'render')
+        }, datetime.utcnow())
         
         # 发布 AR 状态变更事件
         event_bus.publish_event(
@@ -457,21 +706,23 @@ class ARMonitor:
     
     def update_ar_node_from_dag(self, node_id: str, dag_data: Dict):
         """从 DAG 节点更新 AR 节点状态"""
-        if node_id not in self.nodes:
-            node = ARNode(
-                id=node_id,
-                name=node_id,
-                type="render",
-                status=ARNodeStatus.ONLINE
-            )
-            self.nodes[node_id] = node
-        else:
-            self.nodes[node_id].status = ARNodeStatus.ONLINE
-            self.nodes[node_id].last_heartbeat = datetime.now()
+        self._apply_heartbeat(node_id, {'node_type': 'render'}, datetime.utcnow())
     
     def register_node(self, node: ARNode):
         """注册节点"""
-        self.nodes[node.id] = node
+        self._add_node(NodeInfo(
+            node_id=node.id,
+            node_name=node.name,
+            node_type=node.type,
+            host=node.ip_address or '0.0.0.0',
+            port=node.port or 0,
+            health_endpoint='/health',
+            status_endpoint='/status',
+            status=node.status.value,
+            last_heartbeat=node.last_heartbeat,
+            metadata={'resources': dict(node.resources)},
+            passive=True
+        ))
         
         # 发布节点注册事件
         event_bus.publish_event(
@@ -486,50 +737,43 @@ class ARMonitor:
         
     def unregister_node(self, node_id: str):
         """注销节点"""
-        if node_id in self.nodes:
-            del self.nodes[node_id]
+        self._remove_node(node_id)
             
     def update_node_heartbeat(self, node_id: str):
         """更新节点心跳"""
         if node_id in self.nodes:
-            self.nodes[node_id].last_heartbeat = datetime.now()
-            if self.nodes[node_id].status != ARNodeStatus.ONLINE:
-                self.nodes[node_id].status = ARNodeStatus.ONLINE
-                # 发布心跳恢复事件
-                event_bus.publish_event(
-                    event_type=EventType.AR_STATUS_CHANGED,
-                    source="ar_monitor",
-                    data={
-                        "node_id": node_id,
-                        "status": "heartbeat_restored"
-                    }
-                )
+            self._apply_heartbeat(node_id, {}, datetime.utcnow())
             
+    def _to_ar_node(self, info: NodeInfo) -> ARNode:
+        """NodeInfo 转为响应模型"""
+        resources = info.metadata.get('resources')
+        return ARNode(
+            id=info.node_id,
+            name=info.node_name,
+            type=info.node_type,
+            status=ARNodeStatus(info.status) if info.status in _AR_NODE_STATUSES else ARNodeStatus.OFFLINE,
+            ip_address=info.host,
+            port=info.port,
+            resources=resources if isinstance(resources, dict) else {},
+            last_heartbeat=info.last_heartbeat
+        )
+
     def get_nodes(self) -> ARNodesResponse:
-        """获取所有节点"""
-        node_infos = list(self.nodes.values())
-        online_count = sum(1 for n in node_infos if n.status == ARNodeStatus.ONLINE)
-        offline_count = len(node_infos) - online_count
-        
-        # Convert NodeInfo to ARNode
-        ar_nodes = []
-        for info in node_infos:
-            ar_node = ARNode(
-                id=info.node_id,
-                name=info.node_name,
-                type=info.node_type,
-                status=ARNodeStatus(info.status) if info.status in [s.value for s in ARNodeStatus] else ARNodeStatus.OFFLINE,
-                ip_address=info.host,
-                port=info.port,
-                last_heartbeat=info.last_heartbeat
-            )
-            ar_nodes.append(ar_node)
+        """获取所有节点（只重建发生变化的节点）"""
+        for node_id in self._dirty:
+            info = self.nodes.get(node_id)
+            if info is not None:
+                self._node_views[node_id] = self._to_ar_node(info)
+        self._dirty.clear()
+
+        ar_nodes = list(self._node_views.values())
+        online_count = len(self._by_status.get('online', ()))
         
-        return ARNodesResponse(
+        return ARNodesResponse.model_construct(
             nodes=ar_nodes,
             total=len(ar_nodes),
             online_count=online_count,
-            offline_count=offline_count
+            offline_count=len(ar_nodes) - online_count
         )
     
     def get_scene_status(self, scene_id: str) -> Optional[ARStatusResponse]:
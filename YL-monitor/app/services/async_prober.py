@@ -0,0 +1,314 @@
+"""
+异步探测引擎
+并发检查大量 host:port / URL 目标的连通性与响应时间
+
+- 每个目标独立超时，一个不可达主机不会拖慢其他目标
+- HTTP 探测共用一个 aiohttp 会话，连接池复用 keep-alive 连接
+- run() 按截止时间队列调度，每个目标的探测间隔带随机抖动，避免同时发起
+- 每个结果完成即推送给已注册的结果处理器(如写入指标存储)
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+from app.services.deadline_queue import DeadlineQueue
+
+logger = logging.getLogger(__name__)
+
+ResultSink = Callable[["ProbeResult"], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class ProbeTarget:
+    """探测目标(url 为空时为 TCP 探测)"""
+    name: str
+    host: str = ""
+    port: int = 0
+    url: Optional[str] = None
+    method: str = "GET"
+    # TCP 连接成功后发送 GET 请求测量响应时间，None 表示只测连接
+    http_path: Optional[str] = "/health"
+    timeout: Optional[float] = None
+    interval: Optional[float] = None
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def kind(self) -> str:
+        return "http" if self.url else "tcp"
+
+    @property
+    def address(self) -> str:
+        return self.url or f"{self.host}:{self.port}"
+
+
+@dataclass
+class ProbeResult:
+    """探测结果"""
+    name: str
+    kind: str
+    address: str
+    healthy: bool
+    connect_time_ms: Optional[float] = None
+    response_time_ms: Optional[float] = None
+    status_code: Optional[int] = None
+    error_code: Optional[int] = None
+    error: Optional[str] = None
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def to_metric(self) -> Dict[str, Any]:
+        """转换为 MetricsStorage.store_metric 的输入格式"""
+        value = self.response_time_ms
+        if value is None:
+            value = self.connect_time_ms
+        return {
+            "timestamp": self.timestamp,
+            "metric_type": "probe",
+            "name": self.name,
+            "value": value if value is not None else -1,
+            "unit": "ms",
+            "labels": {
+                **self.labels,
+                "kind": self.kind,
+                "address": self.address,
+                "healthy": str(self.healthy).lower(),
+            },
+        }
+
+
+class AsyncProber:
+    """
+    异步探测引擎
+
+    probe_many() 一次性并发探测；run() 持续按间隔调度探测直到 stop()。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 200,
+        default_timeout: float = 2.0,
+        interval: float = 30.0,
+        jitter: float = 0.1,
+        sinks: Optional[Iterable[ResultSink]] = None
+    ):
+        """
+        参数:
+            concurrency: 同时进行的探测数上限
+            default_timeout: 目标未指定超时时使用的超时(秒)
+            interval: 目标未指定间隔时使用的探测间隔(秒)
+            jitter: 间隔随机抖动比例(0.1 表示 ±10%)
+            sinks: 结果处理器，每个结果完成时调用
+        """
+        self.concurrency = concurrency
+        self.default_timeout = default_timeout
+        self.interval = interval
+        self.jitter = jitter
+        self._sinks: List[ResultSink] = list(sinks or [])
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session = None
+        # 信号量与会话所属的事件循环(长期复用的探测器可能跨事件循环使用)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: set = set()
+        self._stats = {"probes": 0, "failures": 0, "timeouts": 0}
+
+    def add_sink(self, sink: ResultSink):
+        """注册结果处理器"""
+        self._sinks.append(sink)
+
+    # ==================== 单次探测 ====================
+
+    async def probe(self, target: ProbeTarget) -> ProbeResult:
+        """探测单个目标(不抛出异常)，结果推送给处理器"""
+        self._bind_loop()
+        async with self._semaphore:
+            if target.kind == "http":
+                result = await self.probe_http(target)
+            else:
+                result = await self.probe_tcp(target)
+
+        self._stats["probes"] += 1
+        if not result.healthy:
+            self._stats["failures"] += 1
+        await self._emit(result)
+        return result
+
+    async def probe_many(self, targets: Iterable[ProbeTarget]) -> List[ProbeResult]:
+        """并发探测一组目标，结果顺序与输入一致"""
+        return list(await asyncio.gather(*(self.probe(t) for t in targets)))
+
+    async def probe_tcp(self, target: ProbeTarget) -> ProbeResult:
+        """TCP 连接探测，可选发送 HTTP GET 测量首字节响应时间"""
+        timeout = target.timeout or self.default_timeout
+        result = ProbeResult(
+            name=target.name, kind="tcp", address=target.address,
+            healthy=False, labels=target.labels
+        )
+        start = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(target.host, target.port), timeout
+            )
+            result.connect_time_ms = (time.perf_counter() - start) * 1000
+            result.healthy = True
+
+            if target.http_path:
+                remaining = max(timeout - result.connect_time_ms / 1000, 0.001)
+                request = (
+                    f"GET {target.http_path} HTTP/1.1\r\n"
+                    f"Host: {target.host}\r\nConnection: close\r\n\r\n"
+                ).encode()
+                response_start = time.perf_counter()
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    await asyncio.wait_for(reader.read(1024), remaining)
+                    result.response_time_ms = (time.perf_counter() - response_start) * 1000
+                except (asyncio.TimeoutError, OSError) as e:
+                    logger.debug(f"HTTP 响应测试失败 {target.address}: {e}")
+
+        except asyncio.TimeoutError:
+            result.error = "Connection timeout"
+            self._stats["timeouts"] += 1
+        except OSError as e:
+            result.connect_time_ms = (time.perf_counter() - start) * 1000
+            result.error_code = e.errno
+            result.error = e.strerror or str(e)
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            if writer is not None:
+                writer.close()
+        return result
+
+    def _bind_loop(self):
+        """在新的事件循环中使用时重建信号量并丢弃旧循环的会话"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = None
+
+    async def _get_session(self):
+        self._bind_loop()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency, ttl_dns_cache=300, keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def probe_http(self, target: ProbeTarget) -> ProbeResult:
+        """HTTP 探测(复用连接池)"""
+        timeout = target.timeout or self.default_timeout
+        result = ProbeResult(
+            name=target.name, kind="http", address=target.address,
+            healthy=False, labels=target.labels
+        )
+        if not AIOHTTP_AVAILABLE:
+            result.error = "aiohttp 未安装"
+            return result
+
+        start = time.perf_counter()
+        try:
+            session = await self._get_session()
+            async with session.request(
+                target.method.upper(), target.url,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                await response.read()
+                result.response_time_ms = (time.perf_counter() - start) * 1000
+                result.status_code = response.status
+                result.healthy = response.status < 400
+                if not result.healthy:
+                    result.error = f"HTTP {response.status}"
+        except asyncio.TimeoutError:
+            result.response_time_ms = timeout * 1000
+            result.error = "Timeout"
+            self._stats["timeouts"] += 1
+        except Exception as e:
+            result.error = str(e) or e.__class__.__name__
+        return result
+
+    async def _emit(self, result: ProbeResult):
+        for sink in self._sinks:
+            try:
+                ret = sink(result)
+                if asyncio.iscoroutine(ret):
+                    await ret
+            except Exception as e:
+                logger.error(f"探测结果处理失败: {e}")
+
+    # ==================== 持续调度 ====================
+
+    def _next_interval(self, target: ProbeTarget) -> float:
+        interval = target.interval or self.interval
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def run(self, targets: Iterable[ProbeTarget]):
+        """
+        按间隔持续探测，直到 stop()
+
+        首轮探测在一个间隔内随机分散，之后每个目标按各自(带抖动的)间隔重新调度。
+        """
+        targets = list(targets)
+        queue = DeadlineQueue()
+        for i, target in enumerate(targets):
+            queue.schedule_in(i, random.uniform(0, target.interval or self.interval))
+
+        self._running = True
+        self._wakeup = asyncio.Event()
+        try:
+            while self._running:
+                delay = queue.next_delay()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                for index, _ in queue.pop_due():
+                    target = targets[index]
+                    task = asyncio.create_task(self.probe(target))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    queue.schedule_in(index, self._next_interval(target))
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            self._running = False
+
+    def stop(self):
+        """停止 run() 调度"""
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def close(self):
+        """停止调度并关闭 HTTP 会话"""
+        self.stop()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, "in_flight": len(self._tasks)}
+
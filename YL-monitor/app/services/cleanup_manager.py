@@ -4,15 +4,24 @@
 """
 
 import asyncio
-import hashlib
 import json
 import os
 import time
-from typing import Dict, List, Optional, Set, Callable, Any, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Set, Callable, Any, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from pathlib import Path
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.cleanup_index import (
+    CleanupCandidate,
+    RuleIndex,
+    ThroughputBudget,
+    walk_candidates,
+)
+from app.services.duplicate_finder import DuplicateFinder, full_hash
 
 
 @dataclass
@@ -59,8 +68,23 @@ class CleanupManager:
     4. 队列监控
     """
     
-    def __init__(self, project_root: str = "."):
+    def __init__(
+        self,
+        project_root: str = ".",
+        hash_cache_file: Optional[str] = "data/dedup_hash_cache.json",
+        hash_workers: int = 4,
+        delete_workers: int = 4,
+        delete_batch_size: int = 64,
+        max_files_per_sec: Optional[float] = 500,
+        max_mb_per_sec: Optional[float] = 100
+    ):
         self.project_root = Path(project_root).absolute()
+        self.delete_workers = delete_workers
+        self.delete_batch_size = delete_batch_size
+        # 删除限速（None 表示不限）
+        self.max_files_per_sec = max_files_per_sec
+        self.max_mb_per_sec = max_mb_per_sec
+        self.duplicate_finder = DuplicateFinder(workers=hash_workers, cache_file=hash_cache_file)
         self._cleanup_rules: List[CleanupRule] = []
         self._queue_monitors: Dict[str, Callable] = {}
         self._error_handlers: Dict[str, Callable] = {}
@@ -142,22 +166,39 @@ class CleanupManager:
             "details": []
         }
         
-        for rule in self._cleanup_rules:
-            if not rule.enabled:
-                continue
-            
-            try:
-                rule_result = await self._process_rule(rule, dry_run)
-                results["rules_processed"] += 1
-                results["files_found"] += rule_result["files_found"]
-                results["files_deleted"] += rule_result["files_deleted"]
-                results["space_reclaimed_mb"] += rule_result["space_reclaimed_mb"]
-                results["details"].append({
-                    "rule": rule.name,
-                    **rule_result
-                })
-            except Exception as e:
-                results["errors"].append(f"规则 {rule.name} 执行失败: {str(e)}")
+        rules = [rule for rule in self._cleanup_rules if rule.enabled]
+        details = {
+            rule.name: {
+                "rule": rule.name,
+                "files_found": 0,
+                "files_deleted": 0,
+                "space_reclaimed_mb": 0.0,
+                "files": []
+            }
+            for rule in rules
+        }
+        
+        try:
+            async for item in self.stream_cleanup(dry_run=dry_run):
+                detail = details[item["rule"]]
+                detail["files_found"] += 1
+                if item["action"] == "dry_run":
+                    detail["files"].append(f"{item['path']} (模拟删除)")
+                elif item["action"] == "failed":
+                    detail["files"].append(f"{item['path']} (删除失败: {item['error']})")
+                else:
+                    detail["files_deleted"] += 1
+                    detail["space_reclaimed_mb"] += item["size_mb"]
+                    detail["files"].append(item["path"])
+            results["rules_processed"] = len(rules)
+        except Exception as e:
+            results["errors"].append(f"清理执行失败: {str(e)}")
+        
+        for detail in details.values():
+            results["files_found"] += detail["files_found"]
+            results["files_deleted"] += detail["files_deleted"]
+            results["space_reclaimed_mb"] += detail["space_reclaimed_mb"]
+            results["details"].append(detail)
         
         results["end_time"] = datetime.now().isoformat()
         
@@ -171,97 +212,113 @@ class CleanupManager:
         
         return results
     
-    async def _process_rule(self, rule: CleanupRule, dry_run: bool) -> Dict[str, Any]:
-        """处理单个清理规则"""
-        result = {
-            "files_found": 0,
-            "files_deleted": 0,
-            "space_reclaimed_mb": 0.0,
-            "files": []
-        }
+    async def stream_cleanup(self, dry_run: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式执行清理，每处理一个条目产出一条记录
         
-        # 查找匹配的文件
-        pattern_path = self.project_root / rule.path_pattern
+        目录树只遍历一次，每个条目按规则索引匹配；删除按批提交到线程池，
+        并受 max_files_per_sec / max_mb_per_sec 限速。
         
-        if "**" in rule.path_pattern:
-            # 递归查找
-            base_path = self.project_root
-            relative_pattern = rule.path_pattern.replace("**/", "")
-            
-            for file_path in base_path.rglob(relative_pattern):
-                if self._should_delete(file_path, rule):
-                    result["files_found"] += 1
-                    file_size = file_path.stat().st_size / (1024 * 1024)  # MB
-                    
-                    if not dry_run:
-                        try:
-                            if file_path.is_dir():
-                                shutil.rmtree(file_path)
-                            else:
-                                file_path.unlink()
-                            result["files_deleted"] += 1
-                            result["space_reclaimed_mb"] += file_size
-                            result["files"].append(str(file_path))
-                        except Exception as e:
-                            result["files"].append(f"{file_path} (删除失败: {e})")
+        参数：
+            dry_run: 是否为模拟运行（不实际删除文件，也不限速）
+        
+        产出：
+            {"rule", "path", "size_mb", "action": deleted/dry_run/failed, "error"}
+        """
+        index = RuleIndex(self._cleanup_rules)
+        if not index.rules:
+            return
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+        # 消费方提前结束时通知遍历线程停止
+        stop = threading.Event()
+        
+        def produce():
+            # 遍历线程：按批放入队列，队列满时等待（背压）
+            try:
+                batch: List[CleanupCandidate] = []
+                for candidate in walk_candidates(str(self.project_root), index):
+                    if stop.is_set():
+                        return
+                    batch.append(candidate)
+                    if len(batch) >= self.delete_batch_size:
+                        asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+                        batch = []
+                if batch:
+                    asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+            except BaseException as e:
+                asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+        
+        producer = loop.run_in_executor(None, produce)
+        budget = ThroughputBudget(self.max_files_per_sec, self.max_mb_per_sec)
+        executor = None if dry_run else ThreadPoolExecutor(
+            max_workers=self.delete_workers, thread_name_prefix="cleanup"
+        )
+        
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+                
+                if dry_run:
+                    outcomes = [None] * len(batch)
+                else:
+                    delay = budget.consume(len(batch), sum(c.size for c in batch))
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    outcomes = await asyncio.gather(*(
+                        loop.run_in_executor(executor, self._delete_candidate, candidate)
+                        for candidate in batch
+                    ))
+                
+                for candidate, error in zip(batch, outcomes):
+                    if dry_run:
+                        action = "dry_run"
                     else:
-                        result["files"].append(f"{file_path} (模拟删除)")
-        else:
-            # 直接匹配
-            if pattern_path.exists():
-                for file_path in pattern_path.parent.glob(pattern_path.name):
-                    if self._should_delete(file_path, rule):
-                        result["files_found"] += 1
-                        file_size = file_path.stat().st_size / (1024 * 1024)
-                        
-                        if not dry_run:
-                            try:
-                                if file_path.is_dir():
-                                    shutil.rmtree(file_path)
-                                else:
-                                    file_path.unlink()
-                                result["files_deleted"] += 1
-                                result["space_reclaimed_mb"] += file_size
-                                result["files"].append(str(file_path))
-                            except Exception as e:
-                                result["files"].append(f"{file_path} (删除失败: {e})")
-                        else:
-                            result["files"].append(f"{file_path} (模拟删除)")
-        
-        return result
+                        action = "failed" if error else "deleted"
+                    yield {
+                        "rule": candidate.rule,
+                        "path": candidate.path,
+                        "size_mb": candidate.size / (1024 * 1024),
+                        "action": action,
+                        "error": error
+                    }
+        finally:
+            # 提前结束时停止遍历并排空队列，避免遍历线程阻塞
+            stop.set()
+            while not producer.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+            if executor is not None:
+                executor.shutdown(wait=True)
     
-    def _should_delete(self, file_path: Path, rule: CleanupRule) -> bool:
-        """判断是否应该删除文件"""
-        # 检查排除模式
-        for exclude in rule.exclude_patterns:
-            if exclude in str(file_path):
-                return False
-        
+    @staticmethod
+    def _delete_candidate(candidate: CleanupCandidate) -> Optional[str]:
+        """删除单个条目，失败时返回错误信息"""
         try:
-            stat = file_path.stat()
-            modified_time = datetime.fromtimestamp(stat.st_mtime)
-            age_days = (datetime.now() - modified_time).days
-            
-            # 检查年龄
-            if age_days > rule.max_age_days:
-                return True
-            
-            # 检查大小
-            if rule.max_size_mb:
-                file_size_mb = stat.st_size / (1024 * 1024)
-                if file_size_mb > rule.max_size_mb:
-                    return True
-            
-        except Exception:
-            return False
-        
-        return False
+            if candidate.is_dir:
+                shutil.rmtree(candidate.path)
+            else:
+                os.unlink(candidate.path)
+        except Exception as e:
+            return str(e)
+        return None
     
     async def find_duplicates(self, directories: List[str], 
                             min_size_kb: int = 1) -> List[DuplicateFile]:
         """
         查找重复文件
         
+        按大小、首尾部分哈希、完整哈希逐级筛选，未变化文件的哈希取自缓存
+        
         参数：
             directories: 要扫描的目录列表
             min_size_kb: 最小文件大小(KB)
@@ -269,72 +326,36 @@ class CleanupManager:
         返回：
             重复文件列表
         """
-        file_hashes: Dict[str, List[Path]] = {}
-        
-        for directory in directories:
-            dir_path = self.project_root / directory
-            if not dir_path.exists():
-                continue
-            
-            for file_path in dir_path.rglob("*"):
-                if not file_path.is_file():
-                    continue
-                
-                try:
-                    stat = file_path.stat()
-                    file_size = stat.st_size
-                    
-                    # 跳过小文件
-                    if file_size < min_size_kb * 1024:
-                        continue
-                    
-                    # 计算文件哈希
-                    file_hash = await self._calculate_hash(file_path)
-                    
-                    if file_hash in file_hashes:
-                        file_hashes[file_hash].append(file_path)
-                    else:
-                        file_hashes[file_hash] = [file_path]
-                        
-                except Exception:
-                    continue
+        paths = [str(self.project_root / directory) for directory in directories]
+        groups = await asyncio.to_thread(
+            self.duplicate_finder.find, paths, min_size_kb * 1024
+        )
         
         # 构建重复文件列表
         duplicates = []
-        for file_hash, paths in file_hashes.items():
-            if len(paths) > 1:
-                # 保留第一个，其余标记为重复
-                original = paths[0]
-                stat = original.stat()
-                
-                dup = DuplicateFile(
-                    file_path=str(original),
-                    file_hash=file_hash,
-                    file_size=stat.st_size,
-                    modified_time=datetime.fromtimestamp(stat.st_mtime),
-                    duplicates=[str(p) for p in paths[1:]]
-                )
-                duplicates.append(dup)
+        for group in groups:
+            # 保留第一个，其余标记为重复
+            original = Path(group.paths[0])
+            try:
+                modified_time = datetime.fromtimestamp(original.stat().st_mtime)
+            except OSError:
+                continue
+            
+            dup = DuplicateFile(
+                file_path=str(original),
+                file_hash=group.digest,
+                file_size=group.size,
+                modified_time=modified_time,
+                duplicates=group.paths[1:]
+            )
+            duplicates.append(dup)
         
         return duplicates
     
     async def _calculate_hash(self, file_path: Path, 
-                            chunk_size: int = 8192) -> str:
-        """计算文件哈希"""
-        hasher = hashlib.md5()
-        
-        def read_chunks():
-            with open(file_path, 'rb') as f:
-                while chunk := f.read(chunk_size):
-                    yield chunk
-        
-        # 在线程池中执行文件读取
-        loop = asyncio.get_event_loop()
-        for chunk in await loop.run_in_executor(None, 
-                                               lambda: list(read_chunks())):
-            hasher.update(chunk)
-        
-        return hasher.hexdigest()
+                            chunk_size: int = 1024 * 1024) -> str:
+        """计算文件哈希（在线程中流式读取）"""
+        return await asyncio.to_thread(full_hash, str(file_path), chunk_size)
     
     async def remove_duplicates(self, duplicates: List[DuplicateFile],
                                keep_strategy: str = "first",
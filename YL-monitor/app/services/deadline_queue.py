@@ -0,0 +1,110 @@
+"""
+按键去重的截止时间队列
+
+最小堆 + 键到代次的映射:
+- schedule() 为同一个键重新设定截止时间时只递增代次，旧堆项在弹出时丢弃
+- pop_due() 只弹出已到期的项，复杂度 O(k log n)，与未到期项数量无关
+- 适用于去重过期、合并窗口关闭、升级期限、心跳超时等"到点触发一次"的定时任务
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class DeadlineQueue:
+    """截止时间队列(非线程安全，由调用方所在的事件循环或锁保护)"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        # 堆项: (截止时间, 序号, 键, 代次)
+        self._heap: List[Tuple[float, int, Hashable, int]] = []
+        # 键 -> (代次, 截止时间, 附带数据)
+        self._entries: Dict[Hashable, Tuple[int, float, Any]] = {}
+        self._counter = itertools.count()
+
+    def schedule(self, key: Hashable, deadline: float, payload: Any = None) -> bool:
+        """
+        设定键的截止时间(覆盖已有设定)
+
+        返回:
+            新截止时间是否早于调整前的队首，调用方据此唤醒等待中的调度循环
+        """
+        head = self.next_deadline()
+        seq = next(self._counter)
+        self._entries[key] = (seq, deadline, payload)
+        heapq.heappush(self._heap, (deadline, seq, key, seq))
+        return head is None or deadline < head
+
+    def schedule_in(self, key: Hashable, delay: float, payload: Any = None) -> bool:
+        """在 delay 秒后到期"""
+        return self.schedule(key, self.clock() + max(delay, 0.0), payload)
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消键的定时(堆项惰性删除)"""
+        return self._entries.pop(key, None) is not None
+
+    def deadline_of(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def _discard_stale(self):
+        heap = self._heap
+        while heap:
+            _, _, key, generation = heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                return
+            heapq.heappop(heap)
+
+    def next_deadline(self) -> Optional[float]:
+        """最早的有效截止时间"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def next_delay(self) -> Optional[float]:
+        """距最早截止时间的秒数，队列为空返回 None"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        return max(deadline - self.clock(), 0.0)
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Tuple[Hashable, Any]]:
+        """弹出全部(或至多 limit 个)已到期的 (键, 附带数据)"""
+        if now is None:
+            now = self.clock()
+        due: List[Tuple[Hashable, Any]] = []
+        heap = self._heap
+        while heap and (limit is None or len(due) < limit):
+            deadline, _, key, generation = heap[0]
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                heapq.heappop(heap)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(heap)
+            del self._entries[key]
+            due.append((key, entry[2]))
+        # 重复调度留下的过期堆项过多时重建
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (deadline, seq, key, seq)
+                for key, (seq, deadline, _) in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+        return due
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
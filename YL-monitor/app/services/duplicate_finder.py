@@ -0,0 +1,319 @@
+"""
+分级重复文件查找器
+
+按代价递增逐级缩小候选集，只有前一级仍然冲突的文件才进入下一级:
+1. 按文件大小分组(只需 stat)，大小唯一的文件直接排除
+2. 读取首尾各 64KB 计算部分哈希，小文件的部分哈希即完整哈希
+3. 部分哈希仍冲突的文件流式读取计算完整哈希
+
+- 哈希使用非加密哈希(安装 xxhash 时为 xxh3_128，否则为 blake2b)
+- 哈希在定长线程池中计算，分块流式读取，内存占用与文件大小无关
+- (路径, 大小, mtime) → 哈希 的缓存可持久化为 JSON，重复运行时未变化的文件不再读取
+- 同一 inode 的硬链接只计一次(删除硬链接不释放空间)
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import hashlib
+import json
+import logging
+import os
+import stat
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+HASH_ALGORITHM = "xxh3_128" if XXHASH_AVAILABLE else "blake2b"
+EDGE_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+# (路径, 大小, mtime_ns)
+FileKey = Tuple[str, int, int]
+
+
+def _new_hasher():
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def full_hash(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """流式计算完整文件哈希"""
+    hasher = _new_hasher()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def edge_hash(path: str, size: int, edge: int = EDGE_SIZE) -> str:
+    """首尾各 edge 字节的哈希，文件不超过 2 * edge 时等于完整哈希"""
+    if size <= 2 * edge:
+        return full_hash(path)
+    hasher = _new_hasher()
+    with open(path, "rb") as f:
+        hasher.update(f.read(edge))
+        f.seek(size - edge)
+        hasher.update(f.read(edge))
+    return hasher.hexdigest()
+
+
+@dataclass
+class DuplicateGroup:
+    """一组内容相同的文件(路径按发现顺序)"""
+    digest: str
+    size: int
+    paths: List[str] = field(default_factory=list)
+
+
+class HashCache:
+    """(路径, 大小, mtime) → 部分/完整哈希 的缓存(线程安全)"""
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self.cache_file = Path(cache_file) if cache_file else None
+        # 路径 → [大小, mtime_ns, 部分哈希, 完整哈希]
+        self._entries: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._loaded = False
+
+    def _entry(self, key: FileKey) -> Optional[list]:
+        entry = self._entries.get(key[0])
+        if entry is not None and entry[0] == key[1] and entry[1] == key[2]:
+            return entry
+        return None
+
+    def get(self, key: FileKey, full: bool) -> Optional[str]:
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None:
+                return None
+            return entry[3] if full else entry[2]
+
+    def put(self, key: FileKey, partial: Optional[str] = None, digest: Optional[str] = None):
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None:
+                entry = self._entries[key[0]] = [key[1], key[2], None, None]
+            if partial is not None:
+                entry[2] = partial
+            if digest is not None:
+                entry[3] = digest
+            self._dirty = True
+
+    def prune(self, roots: Iterable[str], seen: Iterable[str]):
+        """删除 roots 下本次未出现的条目(文件已删除或低于大小阈值)"""
+        prefixes = tuple(os.path.join(root, "") for root in roots)
+        seen = set(seen)
+        with self._lock:
+            stale = [
+                path for path in self._entries
+                if path.startswith(prefixes) and path not in seen
+            ]
+            for path in stale:
+                del self._entries[path]
+            if stale:
+                self._dirty = True
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.cache_file is None or not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("algorithm") == HASH_ALGORITHM:
+                self._entries = data.get("entries", {})
+        except Exception as e:
+            logger.warning(f"加载哈希缓存失败，将重新计算: {e}")
+            self._entries = {}
+
+    def save(self):
+        """写入缓存文件(先写临时文件再替换)"""
+        if self.cache_file is None or not self._dirty:
+            return
+        with self._lock:
+            try:
+                self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.cache_file.with_suffix(self.cache_file.suffix + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(
+                        {"algorithm": HASH_ALGORITHM, "entries": self._entries},
+                        f, ensure_ascii=False, separators=(",", ":")
+                    )
+                os.replace(tmp, self.cache_file)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"保存哈希缓存失败: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DuplicateFinder:
+    """分级重复文件查找器(同一时刻只进行一次查找)"""
+
+    def __init__(self, workers: int = 4, cache_file: Optional[str] = None):
+        """
+        参数:
+            workers: 哈希线程数(磁盘读取为主，不宜过大)
+            cache_file: 哈希缓存文件，为空时只在内存中缓存
+        """
+        self.workers = workers
+        self.cache = HashCache(cache_file)
+        self._lock = threading.Lock()
+        self.last_stats: Dict[str, int] = {}
+
+    def _walk(self, root: str, min_size: int, inodes: set) -> List[FileKey]:
+        """列出 root 下不小于 min_size 的普通文件(不跟随符号链接)"""
+        files: List[FileKey] = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            # 按名称排序，保证“保留第一个”的结果稳定
+            entries.sort(key=lambda e: e.name)
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode) or st.st_size < min_size:
+                    continue
+                inode = (st.st_dev, st.st_ino)
+                if st.st_ino and inode in inodes:
+                    continue
+                inodes.add(inode)
+                files.append((entry.path, st.st_size, st.st_mtime_ns))
+            stack.extend(reversed(subdirs))
+        return files
+
+    def _hash_all(
+        self,
+        executor: ThreadPoolExecutor,
+        files: List[FileKey],
+        full: bool
+    ) -> Dict[FileKey, str]:
+        """计算一批文件的部分/完整哈希，优先使用缓存，读取失败的文件被排除"""
+        digests: Dict[FileKey, str] = {}
+        missing: List[FileKey] = []
+        for key in files:
+            cached = self.cache.get(key, full)
+            if cached is None and not full and key[1] <= 2 * EDGE_SIZE:
+                # 小文件的部分哈希即完整哈希
+                cached = self.cache.get(key, True)
+            if cached is not None:
+                digests[key] = cached
+            else:
+                missing.append(key)
+
+        def compute(key: FileKey) -> Optional[str]:
+            path, size, _ = key
+            try:
+                digest = full_hash(path) if full else edge_hash(path, size)
+            except OSError as e:
+                logger.debug(f"读取文件失败 {path}: {e}")
+                return None
+            if full:
+                self.cache.put(key, digest=digest)
+            elif size <= 2 * EDGE_SIZE:
+                self.cache.put(key, partial=digest, digest=digest)
+            else:
+                self.cache.put(key, partial=digest)
+            return digest
+
+        for key, digest in zip(missing, executor.map(compute, missing)):
+            if digest is not None:
+                digests[key] = digest
+
+        stage = "full" if full else "partial"
+        self.last_stats[f"{stage}_hashed"] = len(missing)
+        self.last_stats[f"{stage}_cached"] = len(files) - len(missing)
+        return digests
+
+    @staticmethod
+    def _collisions(files: List[FileKey], key_func: Callable[[FileKey], object]) -> List[List[FileKey]]:
+        groups: Dict[object, List[FileKey]] = defaultdict(list)
+        for item in files:
+            key = key_func(item)
+            if key is not None:
+                groups[key].append(item)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def find(self, directories: List[str], min_size: int = 1) -> List[DuplicateGroup]:
+        """
+        查找重复文件
+
+        参数:
+            directories: 要扫描的目录(不存在的目录被忽略)
+            min_size: 最小文件大小(字节)，小于该值的文件不参与比较
+        """
+        with self._lock:
+            self.cache.load()
+            self.last_stats = {}
+            roots = [os.path.abspath(d) for d in directories if os.path.isdir(d)]
+
+            inodes: set = set()
+            files: List[FileKey] = []
+            for root in roots:
+                files.extend(self._walk(root, min_size, inodes))
+            self.last_stats["files"] = len(files)
+
+            # 第 1 级: 按大小
+            candidates = [f for group in self._collisions(files, lambda f: f[1]) for f in group]
+            self.last_stats["size_candidates"] = len(candidates)
+
+            groups: List[DuplicateGroup] = []
+            if candidates:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dedup") as executor:
+                    # 第 2 级: 首尾部分哈希
+                    partial = self._hash_all(executor, candidates, full=False)
+                    collided = self._collisions(
+                        candidates,
+                        lambda f: (f[1], partial[f]) if f in partial else None
+                    )
+
+                    # 小文件的部分哈希已是完整哈希，无需再读
+                    small = [g for g in collided if g[0][1] <= 2 * EDGE_SIZE]
+                    large = [f for g in collided if g[0][1] > 2 * EDGE_SIZE for f in g]
+                    for group in small:
+                        groups.append(DuplicateGroup(
+                            partial[group[0]], group[0][1], [f[0] for f in group]
+                        ))
+
+                    # 第 3 级: 完整哈希
+                    digests = self._hash_all(executor, large, full=True)
+                    for group in self._collisions(
+                        large,
+                        lambda f: (f[1], digests[f]) if f in digests else None
+                    ):
+                        groups.append(DuplicateGroup(
+                            digests[group[0]], group[0][1], [f[0] for f in group]
+                        ))
+
+            self.cache.prune(roots, (f[0] for f in files))
+            self.cache.save()
+            self.last_stats["groups"] = len(groups)
+            return groups
@@ -1,19 +1,25 @@
 """
 增强型事件总线
 支持事件追踪、中间件、优先级、持久化
+
+历史记录带全局偏移量，内存中保留最近 max_history 条并按类型建立偏移索引；
+开启持久化后写入分段事件日志(app.services.event_log)，可通过 replay() 从任意偏移量重放。
 """
 
 import asyncio
-import json
+import atexit
 import uuid
 import time
-from typing import Dict, List, Callable, Any, Optional, Set
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Callable, Any, Optional, Set, Tuple
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from collections import deque
 import threading
 
+from app.services.event_log import SegmentedEventLog
+from app.services.event_routing import DeliveryQueue, LatencyHistogram, TopicRouter
+
 
 class EventPriority(Enum):
     """事件优先级"""
@@ -76,20 +82,39 @@ class EnhancedEventBus:
     5. 事件持久化
     6. 订阅者管理
     7. 性能指标统计
+    8. 按事件类型的路由索引(支持 "script.*" 通配符)与订阅者独立投递队列
     """
     
-    def __init__(self, max_history: int = 10000, enable_persistence: bool = False):
+    def __init__(
+        self,
+        max_history: int = 10000,
+        enable_persistence: bool = False,
+        persistence_dir: str = "logs/event_bus"
+    ):
         self._handlers: Dict[str, List[Dict]] = {}  # event_type -> [{handler, priority, filter}]
+        self._handler_index: Dict[Tuple[str, str], Dict] = {}  # (event_type, subscriber_id) -> handler_info
+        self._router = TopicRouter()
+        self._router.set_sort_key(
+            lambda key: (self._handler_index[key]['priority'], self._handler_index[key]['seq'])
+        )
+        self._seq = 0
+        self._latency: Dict[str, LatencyHistogram] = {}
         self._middleware: List[EventMiddleware] = []
+        self._max_history = max_history
         self._history: deque = deque(maxlen=max_history)
+        self._history_times: deque = deque(maxlen=max_history)  # 与 _history 对齐的 datetime
+        self._type_index: Dict[str, deque] = {}  # event_type -> 内存中该类型事件的偏移量
+        self._next_offset = 0
         self._enable_persistence = enable_persistence
-        self._persistence_file = "logs/event_bus.jsonl"
+        self._persistence_dir = persistence_dir
+        self._event_log: Optional[SegmentedEventLog] = None
         self._lock = threading.RLock()
         self._stats = {
             'emitted': 0,
             'handled': 0,
             'errors': 0,
-            'dropped': 0
+            'dropped': 0,
+            'unrecorded': 0
         }
         self._running = False
         self._event_queue: asyncio.PriorityQueue = None
@@ -99,20 +124,88 @@ class EnhancedEventBus:
             self._init_persistence()
     
     def _init_persistence(self):
-        """初始化持久化"""
-        import os
-        os.makedirs(os.path.dirname(self._persistence_file), exist_ok=True)
-    
-    def _persist_event(self, event: Event):
-        """持久化事件"""
-        if not self._enable_persistence:
-            return
-        
+        """初始化持久化，并从事件日志恢复最近的历史"""
         try:
-            with open(self._persistence_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(asdict(event), default=str, ensure_ascii=False) + '\n')
+            self._event_log = SegmentedEventLog(self._persistence_dir)
         except Exception as e:
-            print(f"事件持久化失败: {e}")
+            print(f"事件日志初始化失败: {e}")
+            self._enable_persistence = False
+            return
+        
+        atexit.register(self._event_log.close)
+        
+        for record in self._event_log.tail(self._max_history):
+            self._index_record(record)
+        self._next_offset = self._event_log.next_offset
+    
+    @staticmethod
+    def _to_record(event: Event) -> Dict[str, Any]:
+        """事件转换为可序列化的历史记录"""
+        return {
+            'id': event.id,
+            'type': event.type,
+            'data': event.data,
+            'source': event.source,
+            'timestamp': event.timestamp.isoformat(),
+            'priority': event.priority.value,
+            'metadata': event.metadata
+        }
+    
+    def _record_event(self, event: Event) -> int:
+        """
+        记录历史并持久化，返回事件偏移量
+
+        启用持久化时偏移量只由事件日志分配；写入日志失败时事件不进入历史，
+        返回 -1，仍会分发给当前订阅者，但不能被重放。
+        """
+        record = self._to_record(event)
+        with self._lock:
+            if self._event_log is not None:
+                try:
+                    offset = self._event_log.append(dict(record))
+                except Exception as e:
+                    print(f"事件持久化失败: {e}")
+                    self._next_offset = self._event_log.next_offset
+                    self._stats['unrecorded'] += 1
+                    return -1
+                self._next_offset = self._event_log.next_offset
+            else:
+                offset = self._next_offset
+                self._next_offset = offset + 1
+            record['offset'] = offset
+            self._index_record(record, event.timestamp)
+        return offset
+    
+    def _index_record(self, record: Dict[str, Any], timestamp: Optional[datetime] = None):
+        """写入内存历史与类型索引"""
+        if len(self._history) == self._max_history:
+            evicted = self._history[0]
+            offsets = self._type_index.get(evicted['type'])
+            if offsets:
+                offsets.popleft()
+                if not offsets:
+                    del self._type_index[evicted['type']]
+        
+        self._history.append(record)
+        self._history_times.append(timestamp or datetime.fromisoformat(record['timestamp']))
+        self._type_index.setdefault(record['type'], deque()).append(record['offset'])
+    
+    def _history_position(self, offset: int) -> int:
+        """偏移量在内存历史中的位置，不在内存中时返回 -1"""
+        if not self._history:
+            return -1
+        position = offset - self._history[0]['offset']
+        if 0 <= position < len(self._history) and self._history[position]['offset'] == offset:
+            return position
+        # 日志写入失败会留下偏移量空洞，此时二分查找第一个不小于 offset 的记录
+        lo, hi = 0, len(self._history)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._history[mid]['offset'] < offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self._history) else -1
     
     def add_middleware(self, middleware: EventMiddleware):
         """添加中间件"""
@@ -128,32 +221,55 @@ class EnhancedEventBus:
         handler: Callable[[Event], Any],
         priority: EventPriority = EventPriority.NORMAL,
         filter_func: Optional[Callable[[Event], bool]] = None,
-        subscriber_id: Optional[str] = None
-    ):
+        subscriber_id: Optional[str] = None,
+        queued: bool = False,
+        max_pending: int = 1000
+    ) -> str:
         """
         订阅事件
         
         参数：
-            event_type: 事件类型
+            event_type: 事件类型，可使用通配符模式(如 "script.*"、"*")
             handler: 事件处理函数
             priority: 处理优先级
             filter_func: 事件过滤函数
             subscriber_id: 订阅者标识
+            queued: 是否通过独立投递队列处理，发送方不等待该处理器
+            max_pending: 投递队列上限，超出时丢弃最旧事件
+        
+        返回：
+            str: 订阅者标识
         """
         with self._lock:
             if event_type not in self._handlers:
                 self._handlers[event_type] = []
             
-            self._handlers[event_type].append({
+            subscriber_id = subscriber_id or str(uuid.uuid4())
+            key = (event_type, subscriber_id)
+            if key in self._handler_index:
+                self.unsubscribe(event_type, subscriber_id)
+                self._handlers.setdefault(event_type, [])
+            
+            self._seq += 1
+            handler_info = {
                 'handler': handler,
                 'priority': priority.value,
                 'filter': filter_func,
-                'subscriber_id': subscriber_id or str(uuid.uuid4()),
-                'subscribed_at': datetime.now().isoformat()
-            })
+                'subscriber_id': subscriber_id,
+                'subscribed_at': datetime.now().isoformat(),
+                'seq': self._seq,
+                'queue': DeliveryQueue(
+                    subscriber_id, handler, maxsize=max_pending, on_done=self._on_queued_done
+                ) if queued else None
+            }
+            self._handlers[event_type].append(handler_info)
+            self._handler_index[key] = handler_info
+            self._router.add(event_type, key)
             
             # 按优先级排序
             self._handlers[event_type].sort(key=lambda x: x['priority'])
+            
+            return subscriber_id
     
     def unsubscribe(self, event_type: str, subscriber_id: str) -> bool:
         """取消订阅"""
@@ -166,8 +282,39 @@ class EnhancedEventBus:
                 h for h in self._handlers[event_type]
                 if h['subscriber_id'] != subscriber_id
             ]
+            if not self._handlers[event_type]:
+                del self._handlers[event_type]
+            
+            key = (event_type, subscriber_id)
+            handler_info = self._handler_index.pop(key, None)
+            if handler_info is not None:
+                self._router.remove(event_type, key)
+                if handler_info['queue'] is not None:
+                    handler_info['queue'].close()
             
-            return len(self._handlers[event_type]) < original_count
+            return len(self._handlers.get(event_type, [])) < original_count
+    
+    def _route(self, event_type: str) -> List[Dict]:
+        """通过路由索引获取按优先级排序的处理器"""
+        index = self._handler_index
+        return [index[key] for key in self._router.match(event_type)]
+    
+    def _record_latency(self, event: Event, seconds: float):
+        """记录分发延迟"""
+        hist = self._latency.get(event.type)
+        if hist is None:
+            hist = self._latency[event.type] = LatencyHistogram()
+        hist.record(seconds)
+    
+    def _on_queued_done(self, event: Event, seconds: float, error: Optional[Exception]):
+        """投递队列处理完成回调"""
+        if error is None:
+            self._stats['handled'] += 1
+        else:
+            self._stats['errors'] += 1
+            for middleware in self._middleware:
+                middleware.on_error(event, error)
+        self._record_latency(event, seconds)
     
     def emit(
         self,
@@ -201,8 +348,7 @@ class EnhancedEventBus:
                 return None
         
         # 记录历史
-        self._history.append(asdict(event))
-        self._persist_event(event)
+        self._record_event(event)
         self._stats['emitted'] += 1
         
         # 分发事件
@@ -246,8 +392,7 @@ class EnhancedEventBus:
                 return None
         
         # 记录历史
-        self._history.append(asdict(event))
-        self._persist_event(event)
+        self._record_event(event)
         self._stats['emitted'] += 1
         
         # 异步分发
@@ -255,19 +400,47 @@ class EnhancedEventBus:
         
         return event.id
     
+    def emit_batch(self, events: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        批量发送事件（同步模式）
+        
+        参数：
+            events: 事件描述列表，每项包含 type、data，可选 source、priority、metadata
+        
+        返回：
+            List[str]: 事件ID列表，被中间件拦截的事件对应 None
+        """
+        return [
+            self.emit(
+                item['type'],
+                item.get('data'),
+                source=item.get('source', 'unknown'),
+                priority=item.get('priority', EventPriority.NORMAL),
+                metadata=item.get('metadata')
+            )
+            for item in events
+        ]
+    
     def _dispatch_sync(self, event: Event):
         """同步分发事件"""
-        handlers = self._handlers.get(event.type, [])
+        handlers = self._route(event.type)
         
         for handler_info in handlers:
+            started = time.perf_counter()
             try:
                 # 检查过滤器
                 if handler_info['filter'] and not handler_info['filter'](event):
                     continue
                 
+                # 队列订阅者只入队
+                queue = handler_info['queue']
+                if queue is not None and queue.put(event):
+                    continue
+                
                 # 调用处理器
                 handler_info['handler'](event)
                 self._stats['handled'] += 1
+                self._record_latency(event, time.perf_counter() - started)
                 
             except Exception as e:
                 self._stats['errors'] += 1
@@ -279,7 +452,7 @@ class EnhancedEventBus:
     
     async def _dispatch_async(self, event: Event):
         """异步分发事件"""
-        handlers = self._handlers.get(event.type, [])
+        handlers = self._route(event.type)
         
         tasks = []
         for handler_info in handlers:
@@ -287,6 +460,10 @@ class EnhancedEventBus:
                 if handler_info['filter'] and not handler_info['filter'](event):
                     continue
                 
+                queue = handler_info['queue']
+                if queue is not None and queue.put(event):
+                    continue
+                
                 # 创建任务
                 task = self._run_handler(handler_info['handler'], event)
                 tasks.append(task)
@@ -301,12 +478,14 @@ class EnhancedEventBus:
     
     async def _run_handler(self, handler: Callable, event: Event):
         """运行事件处理器"""
+        started = time.perf_counter()
         try:
             if asyncio.iscoroutinefunction(handler):
                 await handler(event)
             else:
                 handler(event)
             self._stats['handled'] += 1
+            self._record_latency(event, time.perf_counter() - started)
         except Exception as e:
             self._stats['errors'] += 1
             print(f"异步事件处理错误 [{event.type}]: {e}")
@@ -321,31 +500,106 @@ class EnhancedEventBus:
         """
         获取事件历史
         
-        支持按类型、时间范围过滤
+        支持按类型、时间范围过滤。指定类型时通过类型偏移索引定位，
+        并从最新记录向前遍历，遇到早于 start_time 的记录即停止。
         """
-        history = list(self._history)
+        with self._lock:
+            if event_type is not None:
+                positions = (
+                    self._history_position(offset)
+                    for offset in reversed(self._type_index.get(event_type, ()))
+                )
+            else:
+                positions = range(len(self._history) - 1, -1, -1)
+            
+            results = []
+            for position in positions:
+                if position < 0:
+                    continue
+                timestamp = self._history_times[position]
+                if end_time and timestamp > end_time:
+                    continue
+                if start_time and timestamp < start_time:
+                    break
+                results.append(self._history[position])
+                if len(results) >= limit:
+                    break
         
-        if event_type:
-            history = [h for h in history if h['type'] == event_type]
+        results.reverse()
+        return results
+    
+    def record(self, event_type: str, data: Any, source: str = "unknown") -> int:
+        """
+        只记录事件(写入历史与事件日志)，不分发给订阅者
+
+        用于 WebSocket 等推送通道记录已推送的消息，客户端重连时按偏移量重放。
+
+        返回：
+            int: 事件偏移量，写入事件日志失败时为 -1
+        """
+        event = Event(
+            id=str(uuid.uuid4()),
+            type=event_type,
+            data=data,
+            source=source,
+            timestamp=datetime.now(),
+            priority=EventPriority.NORMAL,
+            metadata={}
+        )
+        return self._record_event(event)
+    
+    def replay(
+        self,
+        from_offset: int,
+        types: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        从指定偏移量重放事件
         
-        if start_time:
-            history = [
-                h for h in history
-                if datetime.fromisoformat(h['timestamp']) >= start_time
-            ]
+        偏移量仍在内存历史中时直接读取内存，否则读取事件日志。
+        用于迟到的 WebSocket 订阅者补齐事件，以及重启后的恢复。
         
-        if end_time:
-            history = [
-                h for h in history
-                if datetime.fromisoformat(h['timestamp']) <= end_time
-            ]
+        参数：
+            from_offset: 起始偏移量(包含)
+            types: 仅返回这些事件类型
+            limit: 最大返回条数
+        """
+        with self._lock:
+            # 订阅者已是最新，没有需要重放的事件
+            if from_offset >= self._next_offset:
+                return []
+            in_memory = self._history and from_offset >= self._history[0]['offset']
+            if in_memory or self._event_log is None:
+                type_set = set(types) if types else None
+                start = self._history_position(from_offset) if in_memory else 0
+                if start < 0:
+                    return []
+                results = []
+                for position in range(start, len(self._history)):
+                    record = self._history[position]
+                    if type_set is not None and record['type'] not in type_set:
+                        continue
+                    results.append(record)
+                    if limit is not None and len(results) >= limit:
+                        break
+                return results
         
-        return history[-limit:]
+        return self._event_log.read(from_offset, types=types, limit=limit)
+    
+    @property
+    def last_offset(self) -> int:
+        """最近一条事件的偏移量，没有事件时为 -1"""
+        return self._next_offset - 1
     
     def get_stats(self) -> Dict[str, int]:
         """获取统计信息"""
         return self._stats.copy()
     
+    def get_dispatch_latency(self) -> Dict[str, Dict[str, Any]]:
+        """获取按事件类型统计的分发延迟直方图"""
+        return {event_type: hist.to_dict() for event_type, hist in self._latency.items()}
+    
     def get_subscribers(self, event_type: Optional[str] = None) -> Dict[str, List[Dict]]:
         """获取订阅者信息"""
         with self._lock:
@@ -354,8 +608,17 @@ class EnhancedEventBus:
             return dict(self._handlers)
     
     def clear_history(self):
-        """清空历史"""
-        self._history.clear()
+        """清空内存历史(不影响事件日志)"""
+        with self._lock:
+            self._history.clear()
+            self._history_times.clear()
+            self._type_index.clear()
+    
+    def close(self):
+        """停止异步处理器并落盘事件日志"""
+        self.stop_async_processor()
+        if self._event_log is not None:
+            self._event_log.close()
     
     def start_async_processor(self):
         """启动异步处理器"""
@@ -13,6 +13,8 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 import logging
 
+from app.services.resource_sampler import sample_resources
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,11 +56,10 @@ class DetailedCPUMonitor:
     def collect_metrics(self) -> CPUDetailedMetrics:
         """采集详细CPU指标"""
         try:
-            # 整体CPU使用率（需要间隔采样）
-            overall_percent = psutil.cpu_percent(interval=0.1)
-            
-            # 每核CPU使用率
-            per_cpu_percent = psutil.cpu_percent(interval=0.1, percpu=True)
+            # 整体与每核CPU使用率（与上次采样的 cpu_times 增量，无需等待）
+            resources = sample_resources()
+            overall_percent = resources.cpu_percent
+            per_cpu_percent = resources.per_cpu_percent
             
             # CPU数量
             cpu_count_logical = psutil.cpu_count(logical=True)
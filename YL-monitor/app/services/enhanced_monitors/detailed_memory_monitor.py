@@ -12,6 +12,8 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 import logging
 
+from app.services.process_table import get_process_snapshot
+
 logger = logging.getLogger(__name__)
 
 
@@ -101,25 +103,18 @@ class DetailedMemoryMonitor:
     def get_top_memory_processes(self, n: int = 5) -> List[TopMemoryProcess]:
         """获取内存占用最高的N个进程"""
         try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'memory_info', 
-                                              'memory_percent', 'cpu_percent']):
-                try:
-                    pinfo = proc.info
-                    processes.append(TopMemoryProcess(
-                        pid=pinfo['pid'],
-                        name=pinfo['name'] or 'Unknown',
-                        memory_rss=pinfo['memory_info'].rss,
-                        memory_vms=pinfo['memory_info'].vms,
-                        memory_percent=pinfo['memory_percent'] or 0.0,
-                        cpu_percent=pinfo['cpu_percent'] or 0.0
-                    ))
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
-            
-            # 按内存使用率排序
-            processes.sort(key=lambda x: x.memory_percent, reverse=True)
-            return processes[:n]
+            # 共享进程表快照，按内存使用率取前 n 个
+            return [
+                TopMemoryProcess(
+                    pid=info.pid,
+                    name=info.name or 'Unknown',
+                    memory_rss=info.memory_rss,
+                    memory_vms=info.memory_vms,
+                    memory_percent=info.memory_percent,
+                    cpu_percent=info.cpu_percent
+                )
+                for info in get_process_snapshot().top(n, key='memory_percent')
+            ]
             
         except Exception as e:
             logger.error(f"获取Top内存进程失败: {e}")
@@ -13,6 +13,8 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 import logging
 
+from app.services.process_table import get_process_snapshot
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,19 +59,14 @@ class DetailedProcessMonitor:
         self.running = False
         
     def find_process(self) -> Optional[psutil.Process]:
-        """查找目标进程"""
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                cmdline = ' '.join(proc.info['cmdline'] or [])
-                name = proc.info['name'] or ''
-                
-                # 匹配关键词
-                for keyword in self.process_keywords:
-                    if keyword in cmdline or keyword in name:
-                        return psutil.Process(proc.info['pid'])
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return None
+        """查找目标进程（共享进程表快照中按关键词匹配）"""
+        info = get_process_snapshot().find_first(self.process_keywords)
+        if info is None:
+            return None
+        try:
+            return psutil.Process(info.pid)
+        except psutil.NoSuchProcess:
+            return None
     
     def collect_metrics(self) -> Optional[ProcessMetrics]:
         """采集详细进程指标"""
@@ -77,6 +74,7 @@ class DetailedProcessMonitor:
             proc = self.find_process()
             if not proc:
                 return None
+            snapshot_info = get_process_snapshot().get(proc.pid)
             
             # 基础信息
             pid = proc.pid
@@ -85,8 +83,8 @@ class DetailedProcessMonitor:
             create_time = proc.create_time()
             runtime_seconds = time.time() - create_time
             
-            # CPU和内存
-            cpu_percent = proc.cpu_percent(interval=0.1)
+            # CPU和内存（CPU 使用率取相邻快照的增量，无需阻塞采样）
+            cpu_percent = snapshot_info.cpu_percent if snapshot_info else 0.0
             memory_info = proc.memory_info()
             memory_rss = memory_info.rss
             memory_vms = memory_info.vms
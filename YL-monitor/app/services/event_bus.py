@@ -3,15 +3,28 @@
 
 提供发布-订阅模式的事件处理系统，支持 Scripts、DAG、AR 模块间的数据流转和状态同步。
 支持同步和异步回调。
+
+订阅按事件类型建立路由索引(支持 "metric:*" 等通配符)，发布时不再遍历全部订阅者；
+订阅时可选择独立投递队列，慢处理器不会阻塞发布方。
 """
 
-from typing import Callable, Dict, List, Any, Optional, Union
+from typing import Callable, Deque, Dict, List, Any, Optional, Sequence, Union
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
+from collections import deque
 import json
 import asyncio
 import logging
+import time
+
+from app.services.event_routing import (
+    WILDCARD,
+    DeliveryQueue,
+    LatencyHistogram,
+    TopicRouter,
+    topic_matches,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -94,20 +107,30 @@ class EventSubscriber:
     def __init__(
         self,
         callback: Union[Callable[['Event'], None], Callable[['Event'], Any]],
-        filter_types: Optional[List[EventType]] = None,
+        filter_types: Optional[List[Union[EventType, str]]] = None,
         subscriber_id: Optional[str] = None,
+        seq: int = 0,
     ):
         self.callback = callback
-        self.filter_types = filter_types or []
+        self.filter_types = list(filter_types or [])
         self.active = True
         self.is_async = asyncio.iscoroutinefunction(callback)
         self.subscriber_id = subscriber_id
+        self.seq = seq
+        self.queue: Optional[DeliveryQueue] = None
+    
+    @property
+    def topics(self) -> List[str]:
+        """路由索引使用的主题/模式列表"""
+        if not self.filter_types:
+            return [WILDCARD]
+        return [t.value if isinstance(t, EventType) else str(t) for t in self.filter_types]
     
     def matches(self, event: Event) -> bool:
         """检查事件是否匹配过滤条件"""
         if not self.filter_types:
             return True
-        return event.type in self.filter_types
+        return any(topic_matches(topic, event.type.value) for topic in self.topics)
 
 
 class EventBus:
@@ -133,7 +156,7 @@ class EventBus:
     
     _instance: Optional['EventBus'] = None
     _subscribers: List[EventSubscriber]
-    _event_history: List[Event]
+    _event_history: Deque[Event]
     _max_history: int = 1000
     
     def __new__(cls):
@@ -146,31 +169,51 @@ class EventBus:
         if self._initialized:
             return
         self._subscribers = []
-        self._event_history = []
+        self._subscriber_index: Dict[str, EventSubscriber] = {}
+        self._router = TopicRouter()
+        self._router.set_sort_key(lambda sid: self._subscriber_index[sid].seq)
+        self._seq = 0
+        self._event_history = deque(maxlen=self._max_history)
+        self._latency: Dict[str, LatencyHistogram] = {}
         self._initialized = True
         logger.info("事件总线初始化完成")
     
     def subscribe(
         self,
         callback: Union[Callable[[Event], None], Callable[[Event], Any]],
-        filter_types: Optional[List[EventType]] = None,
-        subscriber_id: Optional[str] = None
+        filter_types: Optional[List[Union[EventType, str]]] = None,
+        subscriber_id: Optional[str] = None,
+        queued: bool = False,
+        max_pending: int = 1000
     ) -> str:
         """
         订阅事件
         
         Args:
             callback: 事件处理回调函数（支持同步或异步）
-            filter_types: 过滤的事件类型列表
-            subscriber_id: 订阅者标识
+            filter_types: 过滤的事件类型列表，可包含通配符模式(如 "metric:*")
+            subscriber_id: 订阅者标识，重复注册同一标识会替换旧订阅
+            queued: 是否通过独立投递队列异步处理，发布方不等待该订阅者
+            max_pending: 投递队列上限，超出时丢弃最旧事件
             
         Returns:
             订阅 ID
         """
-        sid = subscriber_id or f"sub_{len(self._subscribers)}"
-        subscriber = EventSubscriber(callback, filter_types, subscriber_id=sid)
+        self._seq += 1
+        sid = subscriber_id or f"sub_{self._seq}"
+        if sid in self._subscriber_index:
+            self.unsubscribe(sid)
+        
+        subscriber = EventSubscriber(callback, filter_types, subscriber_id=sid, seq=self._seq)
+        if queued:
+            subscriber.queue = DeliveryQueue(
+                sid, callback, maxsize=max_pending, on_done=self._on_queued_done
+            )
         self._subscribers.append(subscriber)
-        logger.info(f"事件订阅已注册: {sid}, 过滤类型: {filter_types}, 异步: {subscriber.is_async}")
+        self._subscriber_index[sid] = subscriber
+        for topic in subscriber.topics:
+            self._router.add(topic, sid)
+        logger.info(f"事件订阅已注册: {sid}, 过滤类型: {filter_types}, 异步: {subscriber.is_async}, 队列: {queued}")
         return sid
     
     def unsubscribe(self, subscriber_id: str) -> bool:
@@ -183,12 +226,36 @@ class EventBus:
         Returns:
             是否成功取消
         """
-        for i, sub in enumerate(list(self._subscribers)):
-            if sub.subscriber_id == subscriber_id:
-                self._subscribers.pop(i)
-                logger.info(f"事件订阅已取消: {subscriber_id}")
-                return True
-        return False
+        sub = self._subscriber_index.pop(subscriber_id, None)
+        if sub is None:
+            return False
+        
+        self._subscribers.remove(sub)
+        for topic in sub.topics:
+            self._router.remove(topic, subscriber_id)
+        if sub.queue is not None:
+            sub.queue.close()
+        logger.info(f"事件订阅已取消: {subscriber_id}")
+        return True
+    
+    def _route(self, event: Event) -> List[EventSubscriber]:
+        """通过路由索引获取匹配的活跃订阅者"""
+        index = self._subscriber_index
+        return [
+            index[sid] for sid in self._router.match(event.type.value)
+            if index[sid].active
+        ]
+    
+    def _record_latency(self, event: Event, seconds: float):
+        """记录分发延迟"""
+        hist = self._latency.get(event.type.value)
+        if hist is None:
+            hist = self._latency[event.type.value] = LatencyHistogram()
+        hist.record(seconds)
+    
+    def _on_queued_done(self, event: Event, seconds: float, error: Optional[Exception]):
+        """投递队列处理完成回调"""
+        self._record_latency(event, seconds)
     
     async def publish(self, event: Event) -> List[Any]:
         """
@@ -202,23 +269,40 @@ class EventBus:
         """
         # 添加到历史记录
         self._event_history.append(event)
-        if len(self._event_history) > self._max_history:
-            self._event_history = self._event_history[-self._max_history:]
+        return await self._dispatch(event)
+    
+    async def publish_batch(self, events: Sequence[Event]) -> List[List[Any]]:
+        """
+        批量发布事件
         
-        # 通知所有匹配的订阅者
+        Args:
+            events: 事件列表
+            
+        Returns:
+            每个事件对应的订阅者处理结果列表
+        """
+        self._event_history.extend(events)
+        return [await self._dispatch(event) for event in events]
+    
+    async def _dispatch(self, event: Event) -> List[Any]:
+        """通知所有匹配的订阅者"""
         results = []
-        for subscriber in self._subscribers:
-            if subscriber.active and subscriber.matches(event):
-                try:
-                    if subscriber.is_async:
-                        result = await subscriber.callback(event)
-                    else:
-                        result = subscriber.callback(event)
-                    results.append(result)
-                    logger.debug(f"事件 {event.type.value} 已处理: {event.source}")
-                except Exception as e:
-                    logger.error(f"事件处理失败: {event.type.value}, 错误: {str(e)}")
-                    results.append(e)
+        for subscriber in self._route(event):
+            # 队列订阅者只入队，不等待处理结果
+            if subscriber.queue is not None and subscriber.queue.put(event):
+                continue
+            started = time.perf_counter()
+            try:
+                if subscriber.is_async:
+                    result = await subscriber.callback(event)
+                else:
+                    result = subscriber.callback(event)
+                results.append(result)
+                logger.debug(f"事件 {event.type.value} 已处理: {event.source}")
+            except Exception as e:
+                logger.error(f"事件处理失败: {event.type.value}, 错误: {str(e)}")
+                results.append(e)
+            self._record_latency(event, time.perf_counter() - started)
         
         return results
     
@@ -231,21 +315,22 @@ class EventBus:
         """
         # 添加到历史记录
         self._event_history.append(event)
-        if len(self._event_history) > self._max_history:
-            self._event_history = self._event_history[-self._max_history:]
         
         # 同步通知所有匹配的订阅者
-        for subscriber in self._subscribers:
-            if subscriber.active and subscriber.matches(event):
-                try:
-                    if subscriber.is_async:
-                        # 对于异步回调，创建任务但不等待
-                        asyncio.create_task(subscriber.callback(event))
-                    else:
-                        subscriber.callback(event)
-                    logger.debug(f"事件 {event.type.value} 已触发: {event.source}")
-                except Exception as e:
-                    logger.error(f"事件处理失败: {event.type.value}, 错误: {str(e)}")
+        for subscriber in self._route(event):
+            if subscriber.queue is not None and subscriber.queue.put(event):
+                continue
+            started = time.perf_counter()
+            try:
+                if subscriber.is_async:
+                    # 对于异步回调，创建任务但不等待
+                    asyncio.create_task(subscriber.callback(event))
+                else:
+                    subscriber.callback(event)
+                logger.debug(f"事件 {event.type.value} 已触发: {event.source}")
+            except Exception as e:
+                logger.error(f"事件处理失败: {event.type.value}, 错误: {str(e)}")
+            self._record_latency(event, time.perf_counter() - started)
     
     def publish_event(
         self,
@@ -295,7 +380,7 @@ class EventBus:
         Returns:
             事件列表
         """
-        events = self._event_history
+        events = list(self._event_history)
         if event_type:
             events = [e for e in events if e.type == event_type]
         return events[-limit:]
@@ -305,17 +390,29 @@ class EventBus:
         return [
             {
                 "callback": f"{sub.callback.__module__}.{sub.callback.__qualname__}",
-                "filter_types": [t.value for t in sub.filter_types],
+                "subscriber_id": sub.subscriber_id,
+                "filter_types": sub.topics if sub.filter_types else [],
                 "active": sub.active,
-                "is_async": sub.is_async
+                "is_async": sub.is_async,
+                "queue": sub.queue.to_dict() if sub.queue is not None else None
             }
             for sub in self._subscribers
         ]
     
+    def get_dispatch_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取按事件类型统计的分发延迟直方图"""
+        return {event_type: hist.to_dict() for event_type, hist in self._latency.items()}
+    
     def clear(self):
         """清空事件历史和订阅者"""
         self._event_history.clear()
+        for sub in self._subscribers:
+            if sub.queue is not None:
+                sub.queue.close()
         self._subscribers.clear()
+        self._subscriber_index.clear()
+        self._router.clear()
+        self._latency.clear()
         logger.info("事件总线已清空")
 
 
@@ -0,0 +1,383 @@
+"""
+分段事件日志
+为事件总线提供追加写、批量落盘、偏移量索引与重放能力
+
+存储布局:
+- 目录下按段存储，文件名为段起始偏移量(20位补零) + ".log"
+- 每行一条 JSON 记录，记录中包含全局递增的 "offset" 字段
+- 每段维护稀疏偏移索引(offset -> 文件位置)，按偏移读取时直接定位
+- 段超过 segment_bytes 后滚动；按总大小/时间整段删除旧数据
+
+写入由后台线程批量完成，发送事件的线程只做内存追加。
+"""
+
+import bisect
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+SEGMENT_SUFFIX = ".log"
+
+
+@dataclass
+class _Segment:
+    """单个日志段"""
+    base_offset: int
+    path: Path
+    size: int = 0
+    next_offset: int = 0
+    last_write: float = 0.0
+    # 稀疏索引: 偏移量与对应的文件位置，None 表示尚未建立
+    index_offsets: Optional[List[int]] = field(default_factory=list)
+    index_positions: Optional[List[int]] = field(default_factory=list)
+
+
+class SegmentedEventLog:
+    """
+    分段事件日志
+
+    特性:
+    1. 只追加写，按批落盘
+    2. 全局偏移量与稀疏索引
+    3. 按大小/时间保留
+    4. read(from_offset, types) 重放
+    5. 启动时恢复偏移量并修复末尾不完整记录
+    """
+
+    def __init__(
+        self,
+        directory: str = "logs/event_bus",
+        segment_bytes: int = 8 * 1024 * 1024,
+        retention_bytes: int = 256 * 1024 * 1024,
+        retention_seconds: float = 7 * 24 * 3600,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        index_interval: int = 64,
+        background: bool = True
+    ):
+        """
+        参数:
+            directory: 日志目录
+            segment_bytes: 单段最大字节数
+            retention_bytes: 保留的最大总字节数
+            retention_seconds: 段最后写入后的保留时间
+            batch_size: 缓冲达到该条数时立即落盘
+            flush_interval: 后台落盘间隔(秒)
+            index_interval: 稀疏索引间隔(条)
+            background: 是否启动后台落盘线程
+        """
+        self._dir = Path(directory)
+        self._segment_bytes = segment_bytes
+        self._retention_bytes = retention_bytes
+        self._retention_seconds = retention_seconds
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._index_interval = index_interval
+
+        self._segments: List[_Segment] = []
+        self._buffer: List[Dict[str, Any]] = []
+        self._next_offset = 0
+
+        # _lock 保护缓冲区与偏移量；_io_lock 串行化文件读写
+        self._lock = threading.Lock()
+        self._io_lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._closed = False
+
+        self._stats = {
+            'appended': 0,
+            'flushed': 0,
+            'flush_batches': 0,
+            'segments_deleted': 0,
+            'recovered_truncations': 0
+        }
+
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._load_segments()
+
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(
+                target=self._flush_loop, name="event-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    # ==================== 启动恢复 ====================
+
+    def _load_segments(self):
+        """扫描已有段并恢复偏移量"""
+        paths = sorted(self._dir.glob(f"*{SEGMENT_SUFFIX}"))
+        for path in paths:
+            try:
+                base = int(path.stem)
+            except ValueError:
+                continue
+            stat = path.stat()
+            self._segments.append(_Segment(
+                base_offset=base,
+                path=path,
+                size=stat.st_size,
+                last_write=stat.st_mtime,
+                index_offsets=None,
+                index_positions=None
+            ))
+
+        # 非活动段的结束偏移为下一段的起始偏移
+        for current, following in zip(self._segments, self._segments[1:]):
+            current.next_offset = following.base_offset
+
+        if self._segments:
+            active = self._segments[-1]
+            self._scan_segment(active, repair=True)
+            self._next_offset = active.next_offset
+
+    def _scan_segment(self, segment: _Segment, repair: bool = False):
+        """扫描段文件，建立稀疏索引；repair 时截断末尾不完整记录"""
+        offsets: List[int] = []
+        positions: List[int] = []
+        next_offset = segment.base_offset
+        good_end = 0
+
+        with open(segment.path, 'rb') as f:
+            position = 0
+            for line in f:
+                end = position + len(line)
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    offset = json.loads(line)['offset']
+                except (ValueError, KeyError, TypeError):
+                    break
+                if (offset - segment.base_offset) % self._index_interval == 0:
+                    offsets.append(offset)
+                    positions.append(position)
+                next_offset = offset + 1
+                good_end = end
+                position = end
+
+        if repair and good_end < segment.size:
+            with open(segment.path, 'r+b') as f:
+                f.truncate(good_end)
+            segment.size = good_end
+            self._stats['recovered_truncations'] += 1
+
+        segment.index_offsets = offsets
+        segment.index_positions = positions
+        segment.next_offset = next_offset
+
+    # ==================== 写入 ====================
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """
+        追加一条记录
+
+        返回:
+            int: 分配给记录的偏移量(同时写入 record['offset'])
+        """
+        with self._lock:
+            offset = self._next_offset
+            self._next_offset += 1
+            record['offset'] = offset
+            self._buffer.append(record)
+            self._stats['appended'] += 1
+            if len(self._buffer) >= self._batch_size:
+                self._cond.notify()
+        if self._thread is None and len(self._buffer) >= self._batch_size:
+            self.flush()
+        return offset
+
+    def append_many(self, records: Iterable[Dict[str, Any]]) -> List[int]:
+        """批量追加记录"""
+        return [self.append(record) for record in records]
+
+    def flush(self):
+        """将缓冲区写入磁盘"""
+        with self._io_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                self._write_batch(batch)
+            self._enforce_retention()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """写入一批记录，必要时滚动段"""
+        segment = self._segments[-1] if self._segments else None
+        chunks: List[bytes] = []
+
+        def _commit():
+            if chunks and segment is not None:
+                with open(segment.path, 'ab') as f:
+                    f.write(b"".join(chunks))
+                segment.last_write = time.time()
+            chunks.clear()
+
+        for record in batch:
+            line = (json.dumps(record, default=str, ensure_ascii=False) + "\n").encode('utf-8')
+            offset = record['offset']
+            if segment is None or segment.size >= self._segment_bytes:
+                _commit()
+                segment = self._roll(offset)
+            if segment.index_offsets is not None and \
+                    (offset - segment.base_offset) % self._index_interval == 0:
+                segment.index_offsets.append(offset)
+                segment.index_positions.append(segment.size)
+            chunks.append(line)
+            segment.size += len(line)
+            segment.next_offset = offset + 1
+
+        _commit()
+        self._stats['flushed'] += len(batch)
+        self._stats['flush_batches'] += 1
+
+    def _roll(self, base_offset: int) -> _Segment:
+        """创建新段"""
+        path = self._dir / f"{base_offset:020d}{SEGMENT_SUFFIX}"
+        path.touch()
+        segment = _Segment(
+            base_offset=base_offset,
+            path=path,
+            next_offset=base_offset,
+            last_write=time.time()
+        )
+        self._segments.append(segment)
+        return segment
+
+    def _enforce_retention(self):
+        """按总大小与时间删除最旧的非活动段"""
+        now = time.time()
+        total = sum(s.size for s in self._segments)
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            expired = now - oldest.last_write > self._retention_seconds
+            if total <= self._retention_bytes and not expired:
+                break
+            try:
+                oldest.path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= oldest.size
+            self._segments.pop(0)
+            self._stats['segments_deleted'] += 1
+
+    def _flush_loop(self):
+        """后台落盘线程"""
+        while True:
+            with self._lock:
+                if not self._closed and len(self._buffer) < self._batch_size:
+                    self._cond.wait(timeout=self._flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"事件日志落盘失败: {e}")
+            if closed:
+                return
+
+    def close(self):
+        """停止后台线程并落盘剩余记录"""
+        with self._lock:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    # ==================== 读取 ====================
+
+    @property
+    def first_offset(self) -> int:
+        """最早可读取的偏移量"""
+        with self._io_lock:
+            if self._segments:
+                return self._segments[0].base_offset
+        with self._lock:
+            return self._buffer[0]['offset'] if self._buffer else self._next_offset
+
+    @property
+    def next_offset(self) -> int:
+        """下一条记录将分配的偏移量"""
+        return self._next_offset
+
+    def read(
+        self,
+        from_offset: int = 0,
+        types: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        从指定偏移量开始读取记录
+
+        参数:
+            from_offset: 起始偏移量(包含)
+            types: 仅返回这些事件类型
+            limit: 最大返回条数
+        """
+        type_set: Optional[Set[str]] = set(types) if types else None
+        results: List[Dict[str, Any]] = []
+        for record in self._iter_from(from_offset):
+            if type_set is not None and record.get('type') not in type_set:
+                continue
+            results.append(record)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def tail(self, count: int) -> List[Dict[str, Any]]:
+        """读取最后 count 条记录"""
+        return self.read(max(self._next_offset - count, 0))
+
+    def _iter_from(self, from_offset: int) -> Iterator[Dict[str, Any]]:
+        self.flush()
+        with self._io_lock:
+            segments = list(self._segments)
+
+        bases = [s.base_offset for s in segments]
+        start = max(bisect.bisect_right(bases, from_offset) - 1, 0)
+        for segment in segments[start:]:
+            if segment.next_offset <= from_offset:
+                continue
+            yield from self._read_segment(segment, from_offset)
+
+    def _read_segment(self, segment: _Segment, from_offset: int) -> Iterator[Dict[str, Any]]:
+        with self._io_lock:
+            if segment.index_offsets is None:
+                if not segment.path.exists():
+                    return
+                self._scan_segment(segment)
+            position = 0
+            i = bisect.bisect_right(segment.index_offsets, from_offset) - 1
+            if i >= 0:
+                position = segment.index_positions[i]
+            try:
+                with open(segment.path, 'rb') as f:
+                    f.seek(position)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+
+        for line in data.splitlines():
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('offset', -1) >= from_offset:
+                yield record
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取日志统计"""
+        with self._io_lock:
+            segments = list(self._segments)
+        return {
+            **self._stats,
+            'segments': len(segments),
+            'size_bytes': sum(s.size for s in segments),
+            'first_offset': segments[0].base_offset if segments else self._next_offset,
+            'next_offset': self._next_offset,
+            'buffered': len(self._buffer)
+        }
@@ -0,0 +1,348 @@
+"""
+事件路由组件
+
+供 EventBus 与 EnhancedEventBus 共用:
+- TopicRouter: 精确类型哈希索引 + 通配符前缀树，按事件类型缓存匹配结果
+- DeliveryQueue: 订阅者独立的有界异步投递队列，慢处理器不阻塞发布方
+- LatencyHistogram: 固定对数桶的分发延迟直方图
+
+主题按 ":" 或 "." 分段，例如 "metric:cpu"、"script.started"。
+通配符规则:
+- "*" 单独使用: 匹配所有事件
+- 末段 "*": 匹配该前缀下的一个或多个分段，如 "metric:*"、"script.*"
+- 中间段 "*": 恰好匹配一个分段，如 "dag.*.completed"
+"""
+
+import asyncio
+import bisect
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+_SEGMENT_SPLIT = re.compile(r"[.:]")
+
+
+def split_topic(topic: str) -> List[str]:
+    """将事件类型拆分为分段"""
+    return _SEGMENT_SPLIT.split(topic)
+
+
+def is_pattern(topic: str) -> bool:
+    """是否为通配符模式"""
+    return WILDCARD in topic
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """判断单个模式是否匹配主题(与 TopicRouter 语义一致)"""
+    if not is_pattern(pattern):
+        return pattern == topic
+    p_segments = split_topic(pattern)
+    t_segments = split_topic(topic)
+    for i, segment in enumerate(p_segments):
+        if i == len(p_segments) - 1 and segment == WILDCARD:
+            return len(t_segments) > i
+        if i >= len(t_segments):
+            return False
+        if segment != WILDCARD and segment != t_segments[i]:
+            return False
+    return len(t_segments) == len(p_segments)
+
+
+class _TrieNode:
+    """通配符前缀树节点"""
+
+    __slots__ = ("children", "exact", "tail")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # 模式在此节点结束: 需恰好消耗完全部分段
+        self.exact: Set[Hashable] = set()
+        # 末段为 "*" 的模式: 匹配剩余一个或多个分段
+        self.tail: Set[Hashable] = set()
+
+    def is_empty(self) -> bool:
+        return not (self.children or self.exact or self.tail)
+
+
+class TopicRouter:
+    """
+    主题路由索引
+
+    精确类型走字典查找；通配符模式存入前缀树。
+    match() 结果按主题缓存，仅在 add/remove 时失效，
+    因此稳定订阅关系下每次发布的路由成本为 O(1)。
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Set[Hashable]] = {}
+        self._root = _TrieNode()
+        self._pattern_count = 0
+        self._cache: Dict[str, Tuple[Hashable, ...]] = {}
+        self._sort_key: Optional[Callable[[Hashable], Any]] = None
+
+    def set_sort_key(self, key: Optional[Callable[[Hashable], Any]]):
+        """设置匹配结果的排序键(如优先级、订阅顺序)"""
+        self._sort_key = key
+        self._cache.clear()
+
+    def add(self, topic: str, key: Hashable):
+        """注册订阅"""
+        if is_pattern(topic):
+            node = self._root
+            segments = split_topic(topic)
+            for segment in segments[:-1]:
+                node = node.children.setdefault(segment, _TrieNode())
+            last = segments[-1]
+            if last == WILDCARD:
+                node.tail.add(key)
+            else:
+                node = node.children.setdefault(last, _TrieNode())
+                node.exact.add(key)
+            self._pattern_count += 1
+        else:
+            self._exact.setdefault(topic, set()).add(key)
+        self._cache.clear()
+
+    def remove(self, topic: str, key: Hashable) -> bool:
+        """移除订阅"""
+        removed = False
+        if is_pattern(topic):
+            segments = split_topic(topic)
+            path = [self._root]
+            node = self._root
+            for segment in segments[:-1]:
+                node = node.children.get(segment)
+                if node is None:
+                    return False
+                path.append(node)
+            last = segments[-1]
+            if last == WILDCARD:
+                if key in node.tail:
+                    node.tail.discard(key)
+                    removed = True
+            else:
+                leaf = node.children.get(last)
+                if leaf is not None and key in leaf.exact:
+                    leaf.exact.discard(key)
+                    removed = True
+                    if leaf.is_empty():
+                        del node.children[last]
+            # 回收空节点
+            for parent, segment in zip(reversed(path[:-1]), reversed(segments[:-1])):
+                child = parent.children.get(segment)
+                if child is not None and child.is_empty():
+                    del parent.children[segment]
+            if removed:
+                self._pattern_count -= 1
+        else:
+            keys = self._exact.get(topic)
+            if keys is not None and key in keys:
+                keys.discard(key)
+                removed = True
+                if not keys:
+                    del self._exact[topic]
+        if removed:
+            self._cache.clear()
+        return removed
+
+    def match(self, topic: str) -> Tuple[Hashable, ...]:
+        """返回匹配主题的全部订阅键"""
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+
+        keys: Set[Hashable] = set(self._exact.get(topic, ()))
+        if self._pattern_count:
+            self._collect(self._root, split_topic(topic), 0, keys)
+
+        result = tuple(sorted(keys, key=self._sort_key)) if self._sort_key else tuple(keys)
+        self._cache[topic] = result
+        return result
+
+    def _collect(self, node: _TrieNode, segments: List[str], index: int, out: Set[Hashable]):
+        remaining = len(segments) - index
+        if remaining >= 1 and node.tail:
+            out.update(node.tail)
+        if remaining == 0:
+            out.update(node.exact)
+            return
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            self._collect(child, segments, index + 1, out)
+        if segment != WILDCARD:
+            child = node.children.get(WILDCARD)
+            if child is not None:
+                self._collect(child, segments, index + 1, out)
+
+    def clear(self):
+        """清空索引"""
+        self._exact.clear()
+        self._root = _TrieNode()
+        self._pattern_count = 0
+        self._cache.clear()
+
+
+class LatencyHistogram:
+    """
+    分发延迟直方图
+
+    固定对数桶(毫秒)，记录与查询均为 O(桶数) 以内，不保存样本。
+    """
+
+    BOUNDS_MS: Tuple[float, ...] = (
+        0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+    )
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """记录一次延迟(秒)"""
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        """按桶上界估算分位数(毫秒)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.BOUNDS_MS[i] if i < len(self.BOUNDS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出直方图"""
+        buckets = {
+            f"le_{bound:g}ms": c for bound, c in zip(self.BOUNDS_MS, self.counts)
+        }
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 4) if self.count else 0.0,
+            "max_ms": round(self.max, 4),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": buckets,
+        }
+
+
+class DeliveryQueue:
+    """
+    订阅者投递队列
+
+    发布方只做入队(O(1))，由独立的工作任务顺序调用处理器。
+    队列满时丢弃最旧事件并计数。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Any],
+        maxsize: int = 1000,
+        on_done: Optional[Callable[[Any, float, Optional[Exception]], None]] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.is_async = asyncio.iscoroutinefunction(handler)
+        self._on_done = on_done
+        self._items: Deque[Tuple[Any, float]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def put(self, item: Any) -> bool:
+        """
+        入队事件
+
+        返回:
+            False 表示当前没有运行中的事件循环，调用方应同步处理
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+        if len(self._items) >= self.maxsize:
+            self._items.popleft()
+            self.dropped += 1
+        self._items.append((item, time.perf_counter()))
+        self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while True:
+            while not self._items:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            item, enqueued_at = self._items.popleft()
+            error = None
+            self._busy = True
+            try:
+                if self.is_async:
+                    await self.handler(item)
+                else:
+                    self.handler(item)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                error = e
+                logger.error(f"订阅者 {self.name} 处理事件失败: {e}")
+            finally:
+                self._busy = False
+            if self._on_done is not None:
+                self._on_done(item, time.perf_counter() - enqueued_at, error)
+
+    async def join(self, timeout: Optional[float] = None):
+        """等待队列排空"""
+        async def _wait():
+            while self._items or self._busy:
+                await asyncio.sleep(0.001)
+
+        await asyncio.wait_for(_wait(), timeout=timeout)
+
+    def close(self):
+        """停止工作任务并丢弃未投递事件"""
+        self._items.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
@@ -0,0 +1,303 @@
+"""
+增量文件系统扫描器
+
+- 基于 os.scandir，文件大小/修改时间直接取 DirEntry.stat，不再逐个 getsize/getmtime
+- 按目录维护 mtime 索引: 目录 mtime 未变时复用上次的统计，只需一次 stat，不重新列举
+- 目录在线程池中并行扫描(scandir/stat 期间释放 GIL)
+- 每个目录只保留最大的 top_k 个文件，查找大文件时用定长堆合并，内存与文件总数无关
+- 索引可持久化为 JSON，进程重启后仍可增量扫描
+
+注意: 目录 mtime 只反映条目增删改名，文件原地追加写不会改变目录 mtime，
+因此索引条目超过 revalidate_seconds 后会重新列举一次。
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (大小, 文件名/路径, 修改时间)
+FileItem = Tuple[int, str, float]
+
+
+class _DirIndexEntry:
+    """单个目录的索引条目(只含直属文件的统计)"""
+
+    __slots__ = ("mtime_ns", "scanned_at", "file_count", "total_size", "subdirs", "largest")
+
+    def __init__(
+        self,
+        mtime_ns: int,
+        scanned_at: float,
+        file_count: int,
+        total_size: int,
+        subdirs: Tuple[str, ...],
+        largest: List[FileItem]
+    ):
+        self.mtime_ns = mtime_ns
+        self.scanned_at = scanned_at
+        self.file_count = file_count
+        self.total_size = total_size
+        self.subdirs = subdirs
+        self.largest = largest
+
+    def to_list(self) -> list:
+        return [
+            self.mtime_ns, self.scanned_at, self.file_count, self.total_size,
+            list(self.subdirs), [list(item) for item in self.largest]
+        ]
+
+    @classmethod
+    def from_list(cls, data: list) -> "_DirIndexEntry":
+        mtime_ns, scanned_at, file_count, total_size, subdirs, largest = data
+        return cls(
+            mtime_ns, scanned_at, file_count, total_size,
+            tuple(subdirs), [tuple(item) for item in largest]
+        )
+
+
+@dataclass
+class ScanResult:
+    """扫描结果"""
+    path: str
+    file_count: int = 0
+    dir_count: int = 0
+    total_size: int = 0
+    # 最大的文件 (大小, 路径, 修改时间)，按大小降序
+    largest: List[FileItem] = field(default_factory=list)
+    dirs_scanned: int = 0
+    dirs_reused: int = 0
+    elapsed_ms: float = 0.0
+
+
+def _push_bounded(heap: List[FileItem], item: FileItem, k: int):
+    """维护大小为 k 的最小堆(保留最大的 k 项)"""
+    if len(heap) < k:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+class FilesystemScanner:
+    """增量文件系统扫描器(线程安全，同一时刻只进行一次扫描)"""
+
+    def __init__(
+        self,
+        workers: int = 8,
+        top_k: int = 20,
+        revalidate_seconds: float = 3600.0,
+        index_file: Optional[str] = None
+    ):
+        """
+        参数:
+            workers: 扫描线程数
+            top_k: 每个目录(及每次查询)保留的最大文件数
+            revalidate_seconds: 索引条目强制重新列举的时长
+            index_file: 索引持久化文件，为空时只保存在内存中
+        """
+        self.workers = workers
+        self.top_k = top_k
+        self.revalidate_seconds = revalidate_seconds
+        self.index_file = Path(index_file) if index_file else None
+        self._index: Dict[str, _DirIndexEntry] = {}
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._dirty = False
+        self._load()
+
+    # ==================== 单目录 ====================
+
+    def _visit(
+        self, path: str, cached: Optional[_DirIndexEntry], now: float
+    ) -> Optional[Tuple[_DirIndexEntry, bool]]:
+        """
+        扫描单个目录(在线程池中执行)
+
+        返回:
+            (索引条目, 是否重新列举)；目录不可访问时返回 None
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if (
+            cached is not None
+            and cached.mtime_ns == mtime_ns
+            and now - cached.scanned_at < self.revalidate_seconds
+        ):
+            return cached, False
+
+        file_count = 0
+        total_size = 0
+        subdirs: List[str] = []
+        heap: List[FileItem] = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    file_count += 1
+                    total_size += st.st_size
+                    _push_bounded(heap, (st.st_size, entry.name, st.st_mtime), self.top_k)
+        except OSError as e:
+            logger.debug(f"无法列举目录 {path}: {e}")
+            return None
+
+        heap.sort(reverse=True)
+        entry = _DirIndexEntry(mtime_ns, now, file_count, total_size, tuple(subdirs), heap)
+        return entry, True
+
+    def _drop_subtrees(self, path: str, names):
+        """删除已不存在的子目录及其下所有索引条目"""
+        roots = {os.path.join(path, name) for name in names}
+        subtrees = tuple(root + os.sep for root in roots)
+        stale = [key for key in self._index if key in roots or key.startswith(subtrees)]
+        for key in stale:
+            del self._index[key]
+
+    # ==================== 扫描 ====================
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="fs-scan"
+            )
+        return self._executor
+
+    def scan(self, path: str, max_depth: Optional[int] = None) -> ScanResult:
+        """
+        扫描目录树
+
+        参数:
+            path: 根目录
+            max_depth: 统计深度，1 表示只统计根目录直属条目，None 表示整棵树
+
+        异常:
+            FileNotFoundError: 根目录不存在或不可访问
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(path)
+        result = ScanResult(path=root)
+        heap: List[FileItem] = []
+        now = time.time()
+
+        with self._lock:
+            executor = self._get_executor()
+            index = self._index
+            pending = {executor.submit(self._visit, root, index.get(root), now): (root, 0)}
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path, depth = pending.pop(future)
+                    visited = future.result()
+                    if visited is None:
+                        if dir_path == root:
+                            raise FileNotFoundError(f"路径不存在: {path}")
+                        if index.pop(dir_path, None) is not None:
+                            self._dirty = True
+                        continue
+
+                    entry, rescanned = visited
+                    if rescanned:
+                        old = index.get(dir_path)
+                        if old is not None:
+                            removed = set(old.subdirs) - set(entry.subdirs)
+                            if removed:
+                                self._drop_subtrees(dir_path, removed)
+                        index[dir_path] = entry
+                        self._dirty = True
+                        result.dirs_scanned += 1
+                    else:
+                        result.dirs_reused += 1
+
+                    result.file_count += entry.file_count
+                    result.dir_count += len(entry.subdirs)
+                    result.total_size += entry.total_size
+                    for size, name, mtime in entry.largest:
+                        if len(heap) == self.top_k and size <= heap[0][0]:
+                            # 条目已按大小降序，后面的更小
+                            break
+                        _push_bounded(heap, (size, os.path.join(dir_path, name), mtime), self.top_k)
+
+                    if max_depth is None or depth + 1 < max_depth:
+                        for name in entry.subdirs:
+                            child = os.path.join(dir_path, name)
+                            future = executor.submit(self._visit, child, index.get(child), now)
+                            pending[future] = (child, depth + 1)
+
+            if self._dirty and self.index_file is not None:
+                self.save()
+
+        heap.sort(reverse=True)
+        result.largest = heap
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    # ==================== 持久化 ====================
+
+    def _load(self):
+        if self.index_file is None or not self.index_file.exists():
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._index = {
+                path: _DirIndexEntry.from_list(item) for path, item in data.items()
+            }
+        except Exception as e:
+            logger.warning(f"加载文件系统索引失败，将全量扫描: {e}")
+            self._index = {}
+
+    def save(self):
+        """写入索引文件(先写临时文件再替换)"""
+        if self.index_file is None:
+            return
+        with self._lock:
+            try:
+                self.index_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.index_file.with_suffix(self.index_file.suffix + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(
+                        {path: entry.to_list() for path, entry in self._index.items()},
+                        f, ensure_ascii=False, separators=(",", ":")
+                    )
+                os.replace(tmp, self.index_file)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"保存文件系统索引失败: {e}")
+
+    def invalidate(self, path: Optional[str] = None):
+        """清除索引(path 为空时全部清除)"""
+        with self._lock:
+            if path is None:
+                self._index.clear()
+            else:
+                root = os.path.abspath(path)
+                parent, name = os.path.split(root)
+                self._drop_subtrees(parent, [name])
+            self._dirty = True
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"indexed_dirs": len(self._index)}
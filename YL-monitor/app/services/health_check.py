@@ -14,6 +14,8 @@ from enum import Enum
 from pathlib import Path
 import logging
 
+from app.services.resource_sampler import sample_resources
+
 logger = logging.getLogger(__name__)
 
 
@@ -97,7 +99,7 @@ class SystemResourceCheck(HealthCheck):
     
     async def _do_check(self) -> HealthCheckResult:
         # CPU 使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
+        cpu_percent = sample_resources().cpu_percent
         
         # 内存使用率
         memory = psutil.virtual_memory()
@@ -5,6 +5,7 @@
 提供进程级、端口级、文件系统级的细粒度监控
 """
 
+import asyncio
 import os
 import time
 import socket
@@ -15,6 +16,12 @@ from pathlib import Path
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 
+from app.services.async_prober import (
+    AsyncProber, ProbeResult, ProbeTarget
+)
+from app.services.fs_scanner import FilesystemScanner
+from app.services.process_table import ProcessTable, process_table
+
 logger = logging.getLogger(__name__)
 
 
@@ -51,11 +58,21 @@ class ProcessMonitor:
     - 线程数、文件描述符数
     - 网络连接数
     - 进程状态
+    
+    进程查找与 CPU 使用率来自共享进程表快照，不再每个服务各扫一遍进程表。
     """
     
-    def __init__(self):
+    # 服务名 -> 命令行匹配子串
+    SERVICE_PATTERNS = {
+        'yl-monitor': 'start_server.py',
+        'ar-backend': 'monitor_server.py',
+        'user-gui': 'user/main.py'
+    }
+    
+    def __init__(self, table: Optional[ProcessTable] = None):
         self._cache = {}
         self._cache_ttl = 5  # 缓存5秒
+        self.table = table or process_table
     
     def collect_process_metrics(self, pid: int) -> Optional[ProcessMetrics]:
         """
@@ -69,10 +86,12 @@ class ProcessMonitor:
         """
         try:
             process = psutil.Process(pid)
+            # CPU 使用率取相邻快照的增量，无需阻塞采样
+            info = self.table.snapshot().get(pid)
             
             # 获取进程信息
             with process.oneshot():
-                cpu_percent = process.cpu_percent(interval=0.1)
+                cpu_percent = info.cpu_percent if info else 0.0
                 memory_info = process.memory_info()
                 io_counters = process.io_counters()
                 
@@ -112,31 +131,15 @@ class ProcessMonitor:
         Returns:
             匹配的进程ID列表
         """
-        pids = []
+        pattern = self.SERVICE_PATTERNS.get(service_name)
+        if pattern is None:
+            return []
         
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    cmdline = ' '.join(proc.info['cmdline'] or [])
-                    
-                    # 匹配规则
-                    if (service_name == 'yl-monitor' and
-                            'start_server.py' in cmdline):
-                        pids.append(proc.info['pid'])
-                    elif (service_name == 'ar-backend' and 
-                          'monitor_server.py' in cmdline):
-                        pids.append(proc.info['pid'])
-                    elif (service_name == 'user-gui' and 
-                          'user/main.py' in cmdline):
-                        pids.append(proc.info['pid'])
-                        
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-                    
+            return [info.pid for info in self.table.snapshot().find_by_cmdline(pattern)]
         except Exception as e:
             logger.error(f"查找服务进程失败 {service_name}: {e}")
-        
-        return pids
+            return []
     
     def monitor_service(self, service_name: str) -> Optional[ProcessMetrics]:
         """
@@ -178,7 +181,7 @@ class ProcessMonitor:
         Returns:
             包含所有服务指标的字典
         """
-        services = ['yl-monitor', 'ar-backend', 'user-gui']
+        services = list(self.SERVICE_PATTERNS)
         result = {
             "timestamp": datetime.now().isoformat(),
             "services": {}
@@ -222,10 +225,93 @@ class PortMonitor:
     - 连接建立时间
     - 服务响应时间
     - 错误码分析
+    
+    多端口检查通过 AsyncProber 并发进行，每个端口独立超时，
+    一轮检查的耗时取决于最慢的端口而不是所有端口之和。
+    探测引擎长期复用(可由应用启动时注入带结果处理器的实例)，关闭时调用 close()。
     """
     
-    def __init__(self, timeout: float = 5.0):
+    # 监控的服务端口
+    SERVICE_PORTS = {
+        'yl-monitor': ('0.0.0.0', 5500),
+        'ar-backend': ('0.0.0.0', 5501),
+        'user-gui': ('0.0.0.0', 5502)
+    }
+    
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        response_timeout: float = 2.0,
+        prober: Optional[AsyncProber] = None
+    ):
         self.timeout = timeout
+        self.response_timeout = response_timeout
+        self.prober = prober
+    
+    def get_prober(self) -> AsyncProber:
+        """长期复用的探测引擎(首次使用时创建)"""
+        if self.prober is None:
+            self.prober = AsyncProber(default_timeout=self.timeout)
+        return self.prober
+    
+    async def close(self):
+        """关闭探测引擎的 HTTP 会话"""
+        if self.prober is not None:
+            await self.prober.close()
+    
+    def service_targets(self) -> List[ProbeTarget]:
+        """服务端口探测目标"""
+        return [
+            ProbeTarget(
+                name=service, host=host, port=port,
+                timeout=self.timeout, labels={"service": service}
+            )
+            for service, (host, port) in self.SERVICE_PORTS.items()
+        ]
+    
+    @staticmethod
+    def _to_port_metrics(target: ProbeTarget, result: ProbeResult) -> PortMetrics:
+        return PortMetrics(
+            host=target.host,
+            port=target.port,
+            connectable=result.healthy,
+            connect_time_ms=result.connect_time_ms,
+            response_time_ms=result.response_time_ms,
+            error_code=result.error_code,
+            error_message=result.error,
+            timestamp=result.timestamp
+        )
+    
+    async def check_ports_async(
+        self,
+        targets: List[ProbeTarget],
+        prober: Optional[AsyncProber] = None
+    ) -> List[PortMetrics]:
+        """
+        并发检查多个端口
+        
+        Args:
+            targets: 探测目标
+            prober: 探测引擎，为空时使用本监控器的长期探测引擎
+        """
+        results = await (prober or self.get_prober()).probe_many(targets)
+        return [self._to_port_metrics(t, r) for t, r in zip(targets, results)]
+    
+    async def check_port_async(self, host: str, port: int) -> PortMetrics:
+        """异步检查单个端口"""
+        target = ProbeTarget(name=f"{host}:{port}", host=host, port=port, timeout=self.timeout)
+        return (await self.check_ports_async([target]))[0]
+    
+    async def monitor_service_ports_async(
+        self, prober: Optional[AsyncProber] = None
+    ) -> Dict[str, Any]:
+        """并发监控所有服务的端口"""
+        targets = self.service_targets()
+        metrics = await self.check_ports_async(targets, prober)
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "ports": {t.name: m.to_dict() for t, m in zip(targets, metrics)}
+        }
     
     def check_port(self, host: str, port: int) -> PortMetrics:
         """
@@ -273,7 +359,7 @@ class PortMonitor:
                     response_start = time.time()
                     
                     # 等待响应
-                    sock.settimeout(2.0)
+                    sock.settimeout(self.response_timeout)
                     _ = sock.recv(1024)  # 读取响应但不使用
                     response_time = (time.time() - response_start) * 1000
                     
@@ -300,30 +386,6 @@ class PortMonitor:
                 sock.close()
         
         return metrics
-    
-    def monitor_service_ports(self) -> Dict[str, Any]:
-        """
-        监控所有服务的端口
-        
-        Returns:
-            所有服务端口的监控结果
-        """
-        services = {
-            'yl-monitor': ('0.0.0.0', 5500),
-            'ar-backend': ('0.0.0.0', 5501),
-            'user-gui': ('0.0.0.0', 5502)
-        }
-        
-        result = {
-            "timestamp": datetime.now().isoformat(),
-            "ports": {}
-        }
-        
-        for service, (host, port) in services.items():
-            metrics = self.check_port(host, port)
-            result["ports"][service] = metrics.to_dict()
-        
-        return result
 
 
 @dataclass
@@ -351,11 +413,19 @@ class FilesystemMonitor:
     - 磁盘空间使用（总/已用/可用）
     - 文件和目录统计
     - 大文件识别
+    
+    目录统计由 FilesystemScanner 完成：scandir + 目录 mtime 索引，
+    未变化的目录只需一次 stat；大文件由每目录 top-K 合并得到。
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        index_file: Optional[str] = "data/fs_scan_index.json",
+        workers: int = 8
+    ):
         self._cache = {}
         self._cache_ttl = 300  # 5分钟缓存（文件系统扫描较耗时）
+        self.scanner = FilesystemScanner(workers=workers, index_file=index_file)
     
     def monitor_disk_usage(self, path: str = '/') -> Dict[str, Any]:
         """
@@ -416,30 +486,8 @@ class FilesystemMonitor:
             # 获取磁盘使用
             disk_usage = psutil.disk_usage(path)
             
-            # 统计文件
-            file_count = 0
-            dir_count = 0
-            total_size = 0
-            
-            # 限制扫描深度
-            for root, dirs, files in os.walk(path):
-                # 计算当前深度
-                current_depth = (
-                    root.count(os.sep) - path.count(os.sep)
-                )
-                if current_depth >= max_depth:
-                    del dirs[:]  # 不继续深入
-                    continue
-                
-                dir_count += len(dirs)
-                file_count += len(files)
-                
-                for file in files:
-                    try:
-                        file_path = os.path.join(root, file)
-                        total_size += os.path.getsize(file_path)
-                    except (OSError, FileNotFoundError):
-                        pass
+            # 统计文件（增量扫描）
+            scan = self.scanner.scan(path, max_depth=max_depth)
             
             metrics = FilesystemMetrics(
                 path=path,
@@ -447,9 +495,9 @@ class FilesystemMonitor:
                 disk_used=disk_usage.used,
                 disk_free=disk_usage.free,
                 disk_percent=disk_usage.percent,
-                file_count=file_count,
-                dir_count=dir_count,
-                total_size=total_size,
+                file_count=scan.file_count,
+                dir_count=scan.dir_count,
+                total_size=scan.total_size,
                 timestamp=datetime.now().isoformat()
             )
             
@@ -462,50 +510,38 @@ class FilesystemMonitor:
             logger.error(f"扫描目录失败 {path}: {e}")
             raise
     
-    def find_large_files(self, path: str, size_threshold_mb: int = 100) -> List[Dict[str, Any]]:
+    def find_large_files(
+        self, path: str, size_threshold_mb: int = 100, limit: int = 20
+    ) -> List[Dict[str, Any]]:
         """
-        查找大文件
+        查找大文件（遍历整棵目录树）
         
         Args:
             path: 搜索路径
             size_threshold_mb: 大小阈值（MB）
+            limit: 返回数量上限（不超过扫描器的 top_k）
             
         Returns:
-            大文件列表
+            大文件列表，按大小降序
         """
-        large_files = []
         threshold_bytes = size_threshold_mb * 1024 * 1024
         
         try:
-            for root, dirs, files in os.walk(path):
-                for file in files:
-                    try:
-                        file_path = os.path.join(root, file)
-                        size = os.path.getsize(file_path)
-                        
-                        if size > threshold_bytes:
-                            large_files.append({
-                                "path": file_path,
-                                "size": size,
-                                "size_mb": round(size / (1024 * 1024), 2),
-                                "modified": datetime.fromtimestamp(
-                                    os.path.getmtime(file_path)
-                                ).isoformat()
-                            })
-                            
-                    except (OSError, FileNotFoundError):
-                        pass
-                
-                # 限制扫描范围
-                if len(large_files) >= 50:
-                    break
-        
+            scan = self.scanner.scan(path)
         except Exception as e:
             logger.error(f"查找大文件失败 {path}: {e}")
-        
-        # 按大小排序
-        large_files.sort(key=lambda x: x['size'], reverse=True)
-        return large_files[:20]  # 返回最大的20个
+            return []
+        
+        return [
+            {
+                "path": file_path,
+                "size": size,
+                "size_mb": round(size / (1024 * 1024), 2),
+                "modified": datetime.fromtimestamp(mtime).isoformat()
+            }
+            for size, file_path, mtime in scan.largest[:limit]
+            if size > threshold_bytes
+        ]
     
     def monitor_project_directories(self) -> Dict[str, Any]:
         """
@@ -553,6 +589,10 @@ class FilesystemMonitor:
         )
         
         return result
+    
+    async def monitor_project_directories_async(self) -> Dict[str, Any]:
+        """在线程中监控项目关键目录，不阻塞事件循环"""
+        return await asyncio.to_thread(self.monitor_project_directories)
 
 
 class InfrastructureCollector:
@@ -567,21 +607,34 @@ class InfrastructureCollector:
         self.port_monitor = PortMonitor()
         self.filesystem_monitor = FilesystemMonitor()
     
-    def collect_all(self) -> Dict[str, Any]:
+    async def collect_all(self) -> Dict[str, Any]:
         """
         采集所有基础设施层指标
         
+        进程采集与目录扫描在线程中进行，端口并发探测，三者同时进行，
+        不阻塞事件循环。
+        
         Returns:
             完整的监控数据
         """
+        timestamp = datetime.now().isoformat()
+        processes, ports, filesystem = await asyncio.gather(
+            asyncio.to_thread(self.process_monitor.get_all_services_metrics),
+            self.port_monitor.monitor_service_ports_async(),
+            self.filesystem_monitor.monitor_project_directories_async()
+        )
         return {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "layer": "L1_infrastructure",
-            "processes": self.process_monitor.get_all_services_metrics(),
-            "ports": self.port_monitor.monitor_service_ports(),
-            "filesystem": self.filesystem_monitor.monitor_project_directories()
+            "processes": processes,
+            "ports": ports,
+            "filesystem": filesystem
         }
     
+    async def close(self):
+        """释放探测引擎"""
+        await self.port_monitor.close()
+    
     def get_service_health(self, service_name: str) -> Dict[str, Any]:
         """
         获取指定服务的健康状态
@@ -650,7 +703,7 @@ if __name__ == "__main__":
     
     # 测试端口监控
     print("\n2. 端口监控:")
-    port_metrics = collector.port_monitor.monitor_service_ports()
+    port_metrics = asyncio.run(collector.port_monitor.monitor_service_ports_async())
     for service, metrics in port_metrics['ports'].items():
         status = "✅ 正常" if metrics['connectable'] else "❌ 异常"
         print(f"  {status} {service} ({metrics['host']}:{metrics['port']}): "
@@ -9,11 +9,13 @@
 
 【版本历史】
 - v1.0.0 (2026-02-08): 初始版本，实现智能告警核心功能
+- v1.1.0 (2026-10-18): 去重过期、合并窗口关闭、升级期限改由截止时间队列按时触发，
+  规则 -> 策略索引
 
 【依赖说明】
 - 标准库: asyncio, time, typing, dataclasses, datetime, collections
 - 第三方库: 无
-- 内部模块: app.models.alert, app.services.alert_service
+- 内部模块: app.models.alert, app.services.deadline_queue
 
 【使用示例】
 ```python
@@ -42,6 +44,12 @@ from collections import defaultdict
 from enum import Enum
 
 from app.models.alert import AlertRule, AlertHistory, AlertLevel, AlertStatus, MetricType
+from app.services.deadline_queue import DeadlineQueue
+
+# 定时器类型
+TIMER_DEDUP = "dedup"          # 去重记录过期
+TIMER_MERGE = "merge"          # 合并窗口关闭
+TIMER_ESCALATE = "escalate"    # 升级期限
 
 
 class AlertDedupStrategy(Enum):
@@ -127,6 +135,7 @@ class MergeGroup:
     alerts: List[Dict[str, Any]] = field(default_factory=list)
     first_alert_time: datetime = field(default_factory=datetime.utcnow)
     last_alert_time: datetime = field(default_factory=datetime.utcnow)
+    window: int = 60               # 【合并窗口】秒，取自创建该组的策略
     
     def add_alert(self, alert: Dict[str, Any]):
         """添加告警到组"""
@@ -166,8 +175,10 @@ class IntelligentAlertService:
     【核心机制】
     - 去重缓存: 记录最近触发的告警，避免重复
     - 合并窗口: 时间窗口内相同类型告警合并
-    - 升级检查: 定时检查未确认告警并升级
+    - 升级检查: 未确认告警到达升级期限时升级
     - 恢复检测: 监控指标值，低于阈值后触发恢复
+    - 定时器: 去重过期、合并窗口关闭、升级期限统一放入截止时间队列，
+      由一个调度任务在最早到期时刻唤醒，只处理到期的键，不再周期扫描全部状态
     """
     
     def __init__(self):
@@ -187,10 +198,16 @@ class IntelligentAlertService:
         # 已升级告警: {alert_id: current_level}
         self._escalated_alerts: Dict[str, str] = {}
         
+        # 规则 -> 策略ID 索引（策略增删时重建）
+        self._rule_policy_index: Dict[str, str] = {}
+        
+        # 定时器: 键为 (定时器类型, 去重键/合并键/告警ID)
+        self._timers = DeadlineQueue()
+        self._timer_wakeup: Optional[asyncio.Event] = None
+        
         # 运行状态
         self._running = False
-        self._escalation_task: Optional[asyncio.Task] = None
-        self._merge_flush_task: Optional[asyncio.Task] = None
+        self._timer_task: Optional[asyncio.Task] = None
         
         # 回调函数
         self._alert_handlers: List[Callable] = []
@@ -226,7 +243,7 @@ class IntelligentAlertService:
             escalate_time=300,  # 5分钟
             recover_enabled=True
         )
-        self._policies[default_policy.policy_id] = default_policy
+        self.add_policy(default_policy)
     
     async def start(self):
         """【启动服务】"""
@@ -235,11 +252,9 @@ class IntelligentAlertService:
         
         self._running = True
         
-        # 启动升级检查任务
-        self._escalation_task = asyncio.create_task(self._escalation_loop())
-        
-        # 启动合并刷新任务
-        self._merge_flush_task = asyncio.create_task(self._merge_flush_loop())
+        # 启动定时器调度任务
+        self._timer_wakeup = asyncio.Event()
+        self._timer_task = asyncio.create_task(self._timer_loop())
         
         print(f"{self._log_prefix} 服务已启动")
     
@@ -247,21 +262,73 @@ class IntelligentAlertService:
         """【停止服务】"""
         self._running = False
         
-        if self._escalation_task:
-            self._escalation_task.cancel()
+        if self._timer_task:
+            self._timer_task.cancel()
             try:
-                await self._escalation_task
+                await self._timer_task
             except asyncio.CancelledError:
                 pass
+            self._timer_task = None
         
-        if self._merge_flush_task:
-            self._merge_flush_task.cancel()
+        print(f"{self._log_prefix} 服务已停止")
+    
+    # ==================== 定时器 ====================
+    
+    def _schedule(self, kind: str, key: str, delay: float):
+        """【设定定时器】同一键重复设定时覆盖原截止时间"""
+        if self._timers.schedule_in((kind, key), delay) and self._timer_wakeup:
+            # 新的截止时间早于当前等待目标，唤醒调度任务重新计算
+            self._timer_wakeup.set()
+    
+    def _cancel_timer(self, kind: str, key: str):
+        """【取消定时器】"""
+        self._timers.cancel((kind, key))
+    
+    async def _timer_loop(self):
+        """【定时器调度循环】睡眠到最早截止时间，只处理到期的键"""
+        while self._running:
+            delay = self._timers.next_delay()
             try:
-                await self._merge_flush_task
-            except asyncio.CancelledError:
+                await asyncio.wait_for(self._timer_wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
                 pass
-        
-        print(f"{self._log_prefix} 服务已停止")
+            self._timer_wakeup.clear()
+            
+            try:
+                await self._fire_due_timers()
+            except Exception as e:
+                print(f"{self._log_prefix} 定时器处理错误: {e}")
+    
+    async def _fire_due_timers(self):
+        """【处理到期定时器】"""
+        for (kind, key), _ in self._timers.pop_due():
+            if kind == TIMER_DEDUP:
+                self._dedup_cache.pop(key, None)
+            elif kind == TIMER_MERGE:
+                await self._close_merge_group(key)
+            elif kind == TIMER_ESCALATE:
+                await self._escalate_due(key)
+    
+    @staticmethod
+    def _seconds_until(start: datetime, seconds: float) -> float:
+        """【剩余秒数】start + seconds 距当前的秒数"""
+        return seconds - (datetime.utcnow() - start).total_seconds()
+    
+    @staticmethod
+    def _alert_time(alert: Dict[str, Any]) -> datetime:
+        """【告警时间】"""
+        return datetime.fromisoformat(alert.get("timestamp", "2000-01-01"))
+    
+    async def _notify(self, handlers: List[Callable], payload: Dict[str, Any], action: str):
+        """【通知处理器】"""
+        for handler in handlers:
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(payload)
+                else:
+                    handler(payload)
+            except Exception as e:
+                print(f"{self._log_prefix} {action}通知失败: {e}")
     
     async def process_alert(self, alert: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -293,32 +360,42 @@ class IntelligentAlertService:
         # 【合并检查】
         if policy.merge_enabled:
             merged_alert = self._try_merge(alert, policy)
-            if merged_alert:
-                # 如果是合并后的告警，返回合并结果
-                if merged_alert.get("type") == "merged_alert":
-                    self._stats["merged_count"] += 1
-                    return merged_alert
-                # 否则继续处理（已加入合并组）
+            if merged_alert is None:
+                # 已加入现有合并组，窗口关闭时统一发送
                 return None
+            if merged_alert.get("type") == "merged_alert":
+                self._stats["merged_count"] += 1
+                return merged_alert
+            # 新建合并组的首条告警照常发送
         
         # 记录活跃告警
         alert_id = alert.get("alert_id", f"alert_{int(time.time())}")
         self._active_alerts[alert_id] = alert
         
+        # 设定升级期限
+        if policy.escalate_enabled:
+            self._schedule(
+                TIMER_ESCALATE, alert_id,
+                self._seconds_until(self._alert_time(alert), policy.escalate_time)
+            )
+        
         # 更新去重缓存
         self._update_dedup_cache(alert, policy)
         
         return alert
     
     def _get_policy_for_rule(self, rule_id: str) -> Optional[IntelligentAlertPolicy]:
-        """【获取策略】获取适用于指定规则的策略"""
-        # 查找明确关联该规则的策略
+        """【获取策略】获取适用于指定规则的策略（明确关联优先，否则默认策略）"""
+        policy_id = self._rule_policy_index.get(rule_id, "default")
+        return self._policies.get(policy_id) or self._policies.get("default")
+    
+    def _rebuild_policy_index(self):
+        """【重建规则索引】按策略添加顺序，先关联的策略优先"""
+        index: Dict[str, str] = {}
         for policy in self._policies.values():
-            if rule_id in policy.rule_ids:
-                return policy
-        
-        # 返回默认策略
-        return self._policies.get("default")
+            for rule_id in policy.rule_ids:
+                index.setdefault(rule_id, policy.policy_id)
+        self._rule_policy_index = index
     
     def _should_dedup(self, alert: Dict[str, Any], policy: IntelligentAlertPolicy) -> bool:
         """【检查去重】检查是否应该去重"""
@@ -358,6 +435,8 @@ class IntelligentAlertService:
         """【更新去重缓存】"""
         dedup_key = self._generate_dedup_key(alert, policy)
         self._dedup_cache[dedup_key] = datetime.utcnow()
+        # 窗口结束时移除记录
+        self._schedule(TIMER_DEDUP, dedup_key, policy.dedup_window)
     
     def _try_merge(self, alert: Dict[str, Any], 
                   policy: IntelligentAlertPolicy) -> Optional[Dict[str, Any]]:
@@ -371,10 +450,11 @@ class IntelligentAlertService:
             print(f"{self._log_prefix} 告警已加入合并组: {group_key}")
             return None  # 已加入合并组，暂不发送
         
-        # 创建新合并组
-        merge_group = MergeGroup(group_key=group_key)
+        # 创建新合并组，窗口关闭时发送
+        merge_group = MergeGroup(group_key=group_key, window=policy.merge_window)
         merge_group.add_alert(alert)
         self._merge_cache[group_key] = merge_group
+        self._schedule(TIMER_MERGE, group_key, policy.merge_window)
         
         # 返回原始告警（等待合并窗口结束）
         return alert
@@ -395,102 +475,96 @@ class IntelligentAlertService:
         else:
             return f"type:{metric_type}"
     
-    async def _merge_flush_loop(self):
-        """【合并刷新循环】定期刷新合并缓存"""
-        while self._running:
-            try:
-                await self._flush_merge_groups()
-            except Exception as e:
-                print(f"{self._log_prefix} 合并刷新错误: {e}")
-            
-            await asyncio.sleep(30)  # 每30秒检查一次
-    
     async def _flush_merge_groups(self):
-        """【刷新合并组】发送超时的合并告警"""
+        """【刷新合并组】立即发送全部窗口已结束的合并组（正常由定时器逐组触发）"""
         now = datetime.utcnow()
-        expired_groups = []
-        
-        for group_key, merge_group in self._merge_cache.items():
-            # 检查合并窗口是否结束
-            policy = self._policies.get("default")
-            window = timedelta(seconds=policy.merge_window if policy else 60)
-            
-            if now - merge_group.first_alert_time >= window:
-                # 生成合并告警
-                if len(merge_group.alerts) > 1:
-                    merged_alert = merge_group.get_merged_alert()
-                    
-                    # 通知处理器
-                    for handler in self._alert_handlers:
-                        try:
-                            if asyncio.iscoroutinefunction(handler):
-                                await handler(merged_alert)
-                            else:
-                                handler(merged_alert)
-                        except Exception as e:
-                            print(f"{self._log_prefix} 合并告警通知失败: {e}")
-                
-                expired_groups.append(group_key)
-        
-        # 清理过期组
-        for key in expired_groups:
-            del self._merge_cache[key]
-    
-    async def _escalation_loop(self):
-        """【升级检查循环】定期检查告警升级"""
-        while self._running:
-            try:
-                await self._check_escalation()
-            except Exception as e:
-                print(f"{self._log_prefix} 升级检查错误: {e}")
-            
-            await asyncio.sleep(60)  # 每分钟检查一次
+        expired_groups = [
+            group_key for group_key, merge_group in self._merge_cache.items()
+            if now - merge_group.first_alert_time >= timedelta(seconds=merge_group.window)
+        ]
+        for group_key in expired_groups:
+            self._cancel_timer(TIMER_MERGE, group_key)
+            await self._close_merge_group(group_key)
+    
+    async def _close_merge_group(self, group_key: str):
+        """【关闭合并组】窗口内收到多条告警时发送合并告警"""
+        merge_group = self._merge_cache.pop(group_key, None)
+        if merge_group is None or len(merge_group.alerts) <= 1:
+            return
+        self._stats["merged_count"] += 1
+        await self._notify(self._alert_handlers, merge_group.get_merged_alert(), "合并告警")
     
     async def _check_escalation(self):
-        """【检查升级】检查并升级未确认的告警"""
+        """【检查升级】全量检查未确认的告警（正常由定时器在升级期限触发）"""
         now = datetime.utcnow()
         
         for alert_id, alert in list(self._active_alerts.items()):
-            # 跳过已确认或已解决的告警
-            if alert.get("acknowledged") or alert.get("resolved"):
-                continue
-            
-            # 获取策略
-            rule_id = alert.get("rule_id", "unknown")
-            policy = self._get_policy_for_rule(rule_id)
-            if not policy or not policy.escalate_enabled:
+            policy = self._escalation_policy(alert)
+            if policy is None:
                 continue
             
-            # 检查是否需要升级
-            alert_time = datetime.fromisoformat(alert.get("timestamp", "2000-01-01"))
-            escalate_threshold = timedelta(seconds=policy.escalate_time)
-            
-            if now - alert_time >= escalate_threshold:
-                # 检查是否已经升级过
-                current_level = self._escalated_alerts.get(alert_id, alert.get("level", "warning"))
-                
-                # 升级到下一级别
-                next_level = self._get_next_level(current_level, policy.escalate_levels)
-                if next_level and next_level != current_level:
-                    # 更新告警级别
-                    alert["level"] = next_level
-                    alert["escalated"] = True
-                    alert["escalated_at"] = now.isoformat()
-                    self._escalated_alerts[alert_id] = next_level
-                    
-                    self._stats["escalated_count"] += 1
-                    
-                    print(f"{self._log_prefix} 告警已升级: {alert_id} -> {next_level}")
-                    
-                    # 通知升级
-                    for handler in self._alert_handlers:
-                        try:
-                            if asyncio.iscoroutinefunction(handler):
-                                await handler(alert)
-                            else:
-                                handler(alert)
-                        except Exception as e:
-                            print(f"{self._log_prefix} 升级通知失败: {e}")
+            if now - self._alert_time(alert) >= timedelta(seconds=policy.escalate_time):
+                await self._escalate_alert(alert_id, alert, policy, now)
+    
+    def _escalation_policy(self, alert: Dict[str, Any]) -> Optional[IntelligentAlertPolicy]:
+        """【升级策略】告警可升级时返回适用策略"""
+        # 跳过已确认或已解决的告警
+        if alert.get("acknowledged") or alert.get("resolved"):
+            return None
+        
+        policy = self._get_policy_for_rule(alert.get("rule_id", "unknown"))
+        if not policy or not policy.escalate_enabled:
+            return None
+        return policy
+    
+    async def _escalate_due(self, alert_id: str):
+        """【升级到期】定时器触发的单个告警升级"""
+        alert = self._active_alerts.get(alert_id)
+        if alert is None:
+            return
+        policy = self._escalation_policy(alert)
+        if policy is None:
+            return
+        
+        # 策略可能在设定定时器后被修改，按当前策略重新计算
+        remaining = self._seconds_until(
+            datetime.fromisoformat(alert["escalated_at"]) if alert.get("escalated_at")
+            else self._alert_time(alert),
+            policy.escalate_time
+        )
+        if remaining > 0:
+            self._schedule(TIMER_ESCALATE, alert_id, remaining)
+            return
+        
+        await self._escalate_alert(alert_id, alert, policy, datetime.utcnow())
+    
+    async def _escalate_alert(self, alert_id: str, alert: Dict[str, Any],
+                              policy: IntelligentAlertPolicy, now: datetime):
+        """【升级告警】升级一级并设定下一次升级期限"""
+        # 检查是否已经升级过
+        current_level = self._escalated_alerts.get(alert_id, alert.get("level", "warning"))
+        
+        # 升级到下一级别
+        next_level = self._get_next_level(current_level, policy.escalate_levels)
+        if not next_level or next_level == current_level:
+            return
+        
+        # 更新告警级别
+        alert["level"] = next_level
+        alert["escalated"] = True
+        alert["escalated_at"] = now.isoformat()
+        self._escalated_alerts[alert_id] = next_level
+        
+        self._stats["escalated_count"] += 1
+        
+        print(f"{self._log_prefix} 告警已升级: {alert_id} -> {next_level}")
+        
+        # 仍未到最高级别时，再经过一个升级期限继续升级
+        if self._get_next_level(next_level, policy.escalate_levels):
+            self._schedule(TIMER_ESCALATE, alert_id, policy.escalate_time)
+        
+        # 通知升级
+        await self._notify(self._alert_handlers, alert, "升级")
     
     def _get_next_level(self, current_level: str, escalate_levels: List[str]) -> Optional[str]:
         """【获取下一级别】"""
@@ -542,6 +616,7 @@ class IntelligentAlertService:
                 alert["resolved"] = True
                 alert["resolved_at"] = datetime.utcnow().isoformat()
                 alert["recovery_value"] = current_value
+                self._cancel_timer(TIMER_ESCALATE, alert_id)
                 
                 self._stats["recovered_count"] += 1
                 
@@ -560,23 +635,18 @@ class IntelligentAlertService:
                               f"(当前值: {current_value:.2f}, 阈值: {threshold})"
                 }
                 
-                for handler in self._recover_handlers:
-                    try:
-                        if asyncio.iscoroutinefunction(handler):
-                            await handler(recovery_notification)
-                        else:
-                            handler(recovery_notification)
-                    except Exception as e:
-                        print(f"{self._log_prefix} 恢复通知失败: {e}")
+                await self._notify(self._recover_handlers, recovery_notification, "恢复")
     
     def add_policy(self, policy: IntelligentAlertPolicy) -> None:
-        """【添加策略】"""
+        """【添加策略】添加或替换策略（修改已有策略的 rule_ids 后也需调用以更新索引）"""
         self._policies[policy.policy_id] = policy
+        self._rebuild_policy_index()
     
     def remove_policy(self, policy_id: str) -> bool:
         """【移除策略】"""
         if policy_id in self._policies and policy_id != "default":
             del self._policies[policy_id]
+            self._rebuild_policy_index()
             return True
         return False
     
@@ -601,6 +671,7 @@ class IntelligentAlertService:
         if alert_id in self._active_alerts:
             self._active_alerts[alert_id]["acknowledged"] = True
             self._active_alerts[alert_id]["acknowledged_at"] = datetime.utcnow().isoformat()
+            self._cancel_timer(TIMER_ESCALATE, alert_id)
             return True
         return False
     
@@ -609,6 +680,7 @@ class IntelligentAlertService:
         if alert_id in self._active_alerts:
             self._active_alerts[alert_id]["resolved"] = True
             self._active_alerts[alert_id]["resolved_at"] = datetime.utcnow().isoformat()
+            self._cancel_timer(TIMER_ESCALATE, alert_id)
             return True
         return False
     
@@ -619,11 +691,12 @@ class IntelligentAlertService:
             "active_alerts": len(self._active_alerts),
             "dedup_cache_size": len(self._dedup_cache),
             "merge_groups": len(self._merge_cache),
+            "pending_timers": len(self._timers),
             "policies": len(self._policies)
         }
     
     def cleanup_cache(self):
-        """【清理缓存】清理过期的去重缓存"""
+        """【清理缓存】清理过期的去重缓存（正常由定时器在窗口结束时移除）"""
         now = datetime.utcnow()
         expired_keys = []
         
@@ -13,7 +13,8 @@
 import asyncio
 import psutil
 import json
-from datetime import datetime, timedelta
+import os
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 import threading
@@ -21,12 +22,27 @@ import time
 import logging
 
 from app.services.event_bus import EventBus, EventType
+from app.services.resource_sampler import sample_resources
+from app.services.ring_buffer import TimeIndexedRing
 
 logger = logging.getLogger(__name__)
 
 
+def _to_epoch(value: datetime) -> float:
+    """UTC 时间（无时区视为 UTC）转为时间戳"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
 class MetricsService:
-    """系统指标服务"""
+    """
+    系统指标服务
+    
+    - 采集在独立线程中按固定节拍进行，CPU/网络取计数增量，不阻塞事件循环
+    - 内存历史保存在按时间追加的环中，过期为队首弹出
+    - 每条样本以一行紧凑 JSON 追加写入 metrics.jsonl，行数超过上限两倍时压缩
+    """
 
     def __init__(self, storage_dir: Optional[Path] = None, collection_interval: int = 5):
         self.storage_dir = storage_dir or Path("data/metrics")
@@ -34,53 +50,93 @@ class MetricsService:
 
         self.collection_interval = collection_interval  # 采集间隔（秒）
         self.max_history_days = 7  # 保留历史天数
-
-        self.metrics_file = self.storage_dir / "metrics.json"
-        self._metrics_history: List[Dict[str, Any]] = []
-        self._collection_task: Optional[asyncio.Task] = None
+        # 内存与文件中保留最近 1 小时的数据
+        self.max_history_items = int(3600 / self.collection_interval)
+
+        self.metrics_file = self.storage_dir / "metrics.json"  # 旧格式，仅用于迁移
+        self.history_file = self.storage_dir / "metrics.jsonl"
+        self._history = TimeIndexedRing(
+            self.max_history_items, max_age=self.max_history_days * 86400
+        )
+        self._journal = None
+        self._journal_lines = 0
+        self._journal_lock = threading.Lock()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._running = False
 
         # 加载历史数据
         self._load_history()
 
     def start_collection(self):
-        """启动指标采集"""
+        """启动指标采集线程（在事件循环中调用时，事件在该循环中发布）"""
         if self._running:
             return
 
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
         self._running = True
-        self._collection_task = asyncio.create_task(self._collection_loop())
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._collection_loop, name="metrics-sampler", daemon=True
+        )
+        self._thread.start()
         logger.info("系统指标采集已启动")
 
-    def stop_collection(self):
+    def stop_collection(self, timeout: float = 5.0):
         """停止指标采集"""
         self._running = False
-        if self._collection_task:
-            self._collection_task.cancel()
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
         logger.info("系统指标采集已停止")
 
-    async def _collection_loop(self):
-        """指标采集循环"""
+    def _collection_loop(self):
+        """指标采集循环（采集线程），按固定节拍运行不累积漂移"""
+        next_at = time.monotonic()
         while self._running:
             try:
-                metrics = self._collect_metrics()
-                self._store_metrics(metrics)
-                self._publish_metrics(metrics)
-
-                # 清理过期数据
-                self._cleanup_old_data()
-
+                self.collect_once()
             except Exception as e:
                 logger.error(f"指标采集失败: {e}")
 
-            await asyncio.sleep(self.collection_interval)
+            next_at += self.collection_interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                # 采集耗时超过间隔时从当前时间重新计时
+                next_at = time.monotonic()
+                delay = 0
+            if self._stop_event.wait(delay):
+                break
+
+    def collect_once(self) -> Dict[str, Any]:
+        """采集、存储并发布一次指标"""
+        metrics = self._collect_metrics()
+        self._store_metrics(metrics)
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._publish_metrics, metrics)
+        else:
+            self._publish_metrics(metrics)
+        return metrics
 
     def _collect_metrics(self) -> Dict[str, Any]:
         """采集系统指标"""
         timestamp = datetime.utcnow()
 
-        # CPU 信息
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # CPU 信息（增量采样）
+        resources = sample_resources()
+        cpu_percent = resources.cpu_percent
         cpu_count = psutil.cpu_count()
         cpu_freq = psutil.cpu_freq()
 
@@ -96,7 +152,7 @@ class MetricsService:
         disk_used = disk.used / (1024**3)  # GB
         disk_total = disk.total / (1024**3)  # GB
 
-        # 网络信息
+        # 网络信息（速率取采样器的计数增量）
         network = psutil.net_io_counters()
         network_sent = network.bytes_sent / (1024**2)  # MB
         network_recv = network.bytes_recv / (1024**2)  # MB
@@ -131,7 +187,9 @@ class MetricsService:
                 "sent_mb": round(network_sent, 2),
                 "recv_mb": round(network_recv, 2),
                 "packets_sent": network.packets_sent,
-                "packets_recv": network.packets_recv
+                "packets_recv": network.packets_recv,
+                "sent_per_sec": resources.net_sent_per_sec,
+                "recv_per_sec": resources.net_recv_per_sec
             },
             "system": {
                 "load_1m": load_avg[0],
@@ -143,115 +201,114 @@ class MetricsService:
         }
 
     def _store_metrics(self, metrics: Dict[str, Any]):
-        """存储指标数据"""
-        self._metrics_history.append(metrics)
-
-        # 限制内存中的历史数量（最近 1 小时）
-        max_memory_items = int(3600 / self.collection_interval)  # 1小时的数据
-        if len(self._metrics_history) > max_memory_items:
-            self._metrics_history = self._metrics_history[-max_memory_items:]
-
-        # 每 10 次保存一次到文件
-        if len(self._metrics_history) % 10 == 0:
-            self._save_history()
+        """存储指标数据：追加到内存环并追加写入文件"""
+        self._history.append(time.time(), metrics)
+        self._append_history(metrics)
 
     def _publish_metrics(self, metrics: Dict[str, Any]):
         """发布指标事件"""
         event_bus = EventBus()
 
         # 发布各个指标的事件
-        event_bus.publish(EventType.METRIC_CPU, {
-            "value": metrics["cpu"]["percent"],
-            "timestamp": metrics["timestamp"]
-        })
-
-        event_bus.publish(EventType.METRIC_MEMORY, {
-            "value": metrics["memory"]["percent"],
-            "timestamp": metrics["timestamp"]
-        })
-
-        event_bus.publish(EventType.METRIC_DISK, {
-            "value": metrics["disk"]["percent"],
-            "timestamp": metrics["timestamp"]
-        })
-
-        event_bus.publish(EventType.METRIC_NETWORK, {
-            "value": metrics["network"]["sent_mb"] + metrics["network"]["recv_mb"],
-            "timestamp": metrics["timestamp"]
-        })
+        values = {
+            EventType.METRIC_CPU: metrics["cpu"]["percent"],
+            EventType.METRIC_MEMORY: metrics["memory"]["percent"],
+            EventType.METRIC_DISK: metrics["disk"]["percent"],
+            EventType.METRIC_NETWORK: metrics["network"]["sent_mb"] + metrics["network"]["recv_mb"],
+        }
+        for event_type, value in values.items():
+            event_bus.publish_event(
+                event_type=event_type,
+                source="metrics_service",
+                data={"value": value, "timestamp": metrics["timestamp"]}
+            )
 
     def _load_history(self):
-        """加载历史数据"""
-        if not self.metrics_file.exists():
-            return
-
+        """加载历史数据（兼容旧的 metrics.json）"""
+        records: List[Dict[str, Any]] = []
         try:
-            with open(self.metrics_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self._metrics_history = data.get("history", [])
-                logger.info(f"加载了 {len(self._metrics_history)} 条历史指标数据")
+            if self.history_file.exists():
+                with open(self.history_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            records.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            # 写入中断留下的不完整行
+                            continue
+                self._journal_lines = len(records)
+            elif self.metrics_file.exists():
+                with open(self.metrics_file, "r", encoding="utf-8") as f:
+                    records = json.load(f).get("history", [])
         except Exception as e:
             logger.error(f"加载历史指标数据失败: {e}")
-            self._metrics_history = []
-
-    def _save_history(self):
-        """保存历史数据到文件"""
-        try:
-            data = {
-                "last_updated": datetime.utcnow().isoformat(),
-                "collection_interval": self.collection_interval,
-                "history": self._metrics_history[-1000:]  # 只保存最近 1000 条
-            }
-
-            with open(self.metrics_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
-        except Exception as e:
-            logger.error(f"保存历史指标数据失败: {e}")
-
-    def _cleanup_old_data(self):
-        """清理过期数据"""
-        if not self._metrics_history:
-            return
-
-        cutoff_time = datetime.utcnow() - timedelta(days=self.max_history_days)
+            records = []
 
-        # 清理内存数据
-        original_count = len(self._metrics_history)
-        self._metrics_history = [
-            m for m in self._metrics_history
-            if datetime.fromisoformat(m["timestamp"]) > cutoff_time
-        ]
-
-        if len(self._metrics_history) < original_count:
-            logger.info(f"清理了 {original_count - len(self._metrics_history)} 条过期指标数据")
+        for metrics in records[-self.max_history_items:]:
+            try:
+                timestamp = _to_epoch(datetime.fromisoformat(metrics["timestamp"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._history.append(timestamp, metrics)
+        self._history.expire(time.time())
+
+        if records:
+            logger.info(f"加载了 {len(self._history)} 条历史指标数据")
+            if not self.history_file.exists():
+                self._compact_history()
+
+    def _append_history(self, metrics: Dict[str, Any]):
+        """追加一行到历史文件，行数超过上限两倍时压缩"""
+        line = json.dumps(metrics, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._journal_lock:
+            try:
+                if self._journal is None:
+                    self._journal = open(self.history_file, "a", encoding="utf-8")
+                self._journal.write(line)
+                self._journal.flush()
+                self._journal_lines += 1
+            except OSError as e:
+                logger.error(f"保存历史指标数据失败: {e}")
+                return
+        if self._journal_lines > 2 * self.max_history_items:
+            self._compact_history()
+
+    def _compact_history(self):
+        """用内存中的历史重写文件（先写临时文件再替换）"""
+        records = self._history.range()
+        tmp = self.history_file.with_suffix(".jsonl.tmp")
+        with self._journal_lock:
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for metrics in records:
+                        f.write(json.dumps(metrics, ensure_ascii=False, separators=(",", ":")) + "\n")
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                os.replace(tmp, self.history_file)
+                self._journal_lines = len(records)
+            except OSError as e:
+                logger.error(f"压缩历史指标数据失败: {e}")
 
     def get_current_metrics(self) -> Dict[str, Any]:
         """获取当前最新指标"""
-        if not self._metrics_history:
+        latest = self._history.latest()
+        if latest is None:
             return self._collect_metrics()
 
-        return self._metrics_history[-1]
+        return latest
 
     def get_metrics_history(
         self,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
-        limit: int = 100
+        limit: Optional[int] = 100
     ) -> List[Dict[str, Any]]:
-        """获取指标历史"""
-        if not self._metrics_history:
-            return []
-
-        # 过滤时间范围
-        history = self._metrics_history
-        if start_time:
-            history = [m for m in history if datetime.fromisoformat(m["timestamp"]) >= start_time]
-        if end_time:
-            history = [m for m in history if datetime.fromisoformat(m["timestamp"]) <= end_time]
-
-        # 返回最新的 limit 条
-        return history[-limit:]
+        """获取指标历史（时间为 UTC），返回时间范围内最新的 limit 条"""
+        return self._history.range(
+            start=_to_epoch(start_time) if start_time else None,
+            end=_to_epoch(end_time) if end_time else None,
+            limit=limit
+        )
 
     def get_metrics_summary(
         self,
@@ -259,7 +316,7 @@ class MetricsService:
     ) -> Dict[str, Any]:
         """获取指标汇总统计"""
         start_time = datetime.utcnow() - timedelta(hours=hours)
-        history = self.get_metrics_history(start_time=start_time)
+        history = self.get_metrics_history(start_time=start_time, limit=None)
 
         if not history:
             return {}
@@ -0,0 +1,209 @@
+"""
+共享进程表快照
+
+每个采集周期只遍历一次进程表(psutil.process_iter 的 as_dict 在 oneshot() 中读取)，
+生成不可变快照供各监控器只读共用:
+- 按 pid / 进程名建立索引，命令行子串查询结果在快照内缓存
+- CPU 使用率由相邻两次快照的 CPU 时间差计算，不需要 cpu_percent(interval) 阻塞等待
+- 快照在 min_interval 内复用，多个监控器同一周期内的查询不会触发重复扫描
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import heapq
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessInfo:
+    """单个进程的快照信息(只读)"""
+
+    __slots__ = (
+        "pid", "name", "cmdline", "status", "create_time", "cpu_time",
+        "cpu_percent", "memory_rss", "memory_vms", "memory_percent", "num_threads"
+    )
+
+    def __init__(
+        self,
+        pid: int,
+        name: str,
+        cmdline: str,
+        status: str,
+        create_time: float,
+        cpu_time: float,
+        cpu_percent: float,
+        memory_rss: int,
+        memory_vms: int,
+        memory_percent: float,
+        num_threads: int
+    ):
+        self.pid = pid
+        self.name = name
+        self.cmdline = cmdline
+        self.status = status
+        self.create_time = create_time
+        self.cpu_time = cpu_time
+        self.cpu_percent = cpu_percent
+        self.memory_rss = memory_rss
+        self.memory_vms = memory_vms
+        self.memory_percent = memory_percent
+        self.num_threads = num_threads
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class ProcessSnapshot:
+    """某一时刻的进程表及其索引"""
+
+    def __init__(self, timestamp: float, processes: Dict[int, ProcessInfo]):
+        self.timestamp = timestamp
+        self.processes = processes
+        self._by_name: Dict[str, List[int]] = {}
+        for pid, info in processes.items():
+            self._by_name.setdefault(info.name, []).append(pid)
+        self._cmdline_cache: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.processes)
+
+    def get(self, pid: int) -> Optional[ProcessInfo]:
+        return self.processes.get(pid)
+
+    def find_by_name(self, name: str) -> List[ProcessInfo]:
+        """按进程名精确查找"""
+        return [self.processes[pid] for pid in self._by_name.get(name, ())]
+
+    def find_by_cmdline(self, pattern: str) -> List[ProcessInfo]:
+        """按命令行子串查找(同一快照内结果缓存)"""
+        pids = self._cmdline_cache.get(pattern)
+        if pids is None:
+            pids = [pid for pid, info in self.processes.items() if pattern in info.cmdline]
+            with self._lock:
+                self._cmdline_cache[pattern] = pids
+        return [self.processes[pid] for pid in pids]
+
+    def find_first(self, keywords: Iterable[str]) -> Optional[ProcessInfo]:
+        """按关键词顺序查找第一个命令行或进程名包含关键词的进程"""
+        keywords = list(keywords)
+        for info in self.processes.values():
+            for keyword in keywords:
+                if keyword in info.cmdline or keyword in info.name:
+                    return info
+        return None
+
+    def filter(self, predicate: Callable[[ProcessInfo], bool]) -> List[ProcessInfo]:
+        return [info for info in self.processes.values() if predicate(info)]
+
+    def top(self, n: int, key: str = "memory_percent") -> List[ProcessInfo]:
+        """按字段取前 n 个进程"""
+        return heapq.nlargest(n, self.processes.values(), key=lambda p: getattr(p, key))
+
+
+class ProcessTable:
+    """
+    进程表采集器
+
+    snapshot() 返回不超过 max_age 秒的快照，过期时在锁内重新扫描一次，
+    并发调用方等待同一次扫描结果。
+    """
+
+    ATTRS = [
+        "pid", "name", "cmdline", "status", "create_time",
+        "cpu_times", "memory_info", "num_threads"
+    ]
+
+    def __init__(self, min_interval: float = 2.0):
+        self.min_interval = min_interval
+        self._snapshot: Optional[ProcessSnapshot] = None
+        # (pid, create_time) -> CPU 时间，用于计算增量
+        self._cpu_times: Dict[Tuple[int, float], float] = {}
+        self._lock = threading.Lock()
+        self._total_memory = psutil.virtual_memory().total
+        self._scans = 0
+
+    def snapshot(self, max_age: Optional[float] = None) -> ProcessSnapshot:
+        """获取快照，max_age 默认为 min_interval"""
+        if max_age is None:
+            max_age = self.min_interval
+        snap = self._snapshot
+        if snap is not None and time.time() - snap.timestamp < max_age:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is None or time.time() - snap.timestamp >= max_age:
+                snap = self._scan()
+                self._snapshot = snap
+        return snap
+
+    def _scan(self) -> ProcessSnapshot:
+        now = time.time()
+        previous = self._snapshot
+        elapsed = now - previous.timestamp if previous is not None else 0.0
+        cpu_times: Dict[Tuple[int, float], float] = {}
+        processes: Dict[int, ProcessInfo] = {}
+        total_memory = self._total_memory
+
+        for proc in psutil.process_iter(self.ATTRS, ad_value=None):
+            info = proc.info
+            pid = info["pid"]
+            times = info["cpu_times"]
+            memory = info["memory_info"]
+            create_time = info["create_time"] or 0.0
+
+            cpu_time = times.user + times.system if times else 0.0
+            key = (pid, create_time)
+            cpu_times[key] = cpu_time
+            last = self._cpu_times.get(key)
+            if last is not None and elapsed > 0:
+                cpu_percent = round(max(cpu_time - last, 0.0) / elapsed * 100, 2)
+            elif create_time:
+                # 没有上一次采样(首轮或新进程)时取进程生命周期内的平均值
+                cpu_percent = round(cpu_time / max(now - create_time, 1e-3) * 100, 2)
+            else:
+                cpu_percent = 0.0
+
+            rss = memory.rss if memory else 0
+            processes[pid] = ProcessInfo(
+                pid=pid,
+                name=info["name"] or "",
+                cmdline=" ".join(info["cmdline"] or []),
+                status=info["status"] or "unknown",
+                create_time=create_time,
+                cpu_time=cpu_time,
+                cpu_percent=cpu_percent,
+                memory_rss=rss,
+                memory_vms=memory.vms if memory else 0,
+                memory_percent=rss / total_memory * 100 if total_memory else 0.0,
+                num_threads=info["num_threads"] or 0
+            )
+
+        # 只保留本轮仍存在的进程，退出进程的记录随之丢弃
+        self._cpu_times = cpu_times
+        self._scans += 1
+        return ProcessSnapshot(now, processes)
+
+    def get_stats(self) -> Dict[str, float]:
+        snap = self._snapshot
+        return {
+            "scans": self._scans,
+            "processes": len(snap) if snap else 0,
+            "age_seconds": round(time.time() - snap.timestamp, 2) if snap else None
+        }
+
+
+# 全局进程表实例
+process_table = ProcessTable()
+
+
+def get_process_snapshot(max_age: Optional[float] = None) -> ProcessSnapshot:
+    """获取共享进程表快照"""
+    return process_table.snapshot(max_age)
@@ -0,0 +1,154 @@
+"""
+可合并的分位数草图
+
+- QuantileSketch: 对数分桶(DDSketch 思路)，相对误差固定；
+  记录为一次对数运算 + 一次字典自增，不保存样本；同参数草图按桶相加即可合并
+- WindowedSketch: 按时间分槽的滑动窗口，每槽一个草图；
+  查询时合并未过期的槽，窗口滑动时整槽丢弃
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class QuantileSketch:
+    """
+    对数分桶分位数草图
+
+    值 x 落入桶 ceil(log_gamma(x))，gamma = (1 + a) / (1 - a)，
+    桶内取代表值时相对误差不超过 a(relative_accuracy)。
+    小于 min_value 的值(含 0)单独计数。
+    """
+
+    __slots__ = (
+        "relative_accuracy", "min_value", "_gamma", "_log_gamma",
+        "bins", "zero_count", "count", "total", "min", "max"
+    )
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        """记录一个值，O(1)"""
+        if value > self.min_value:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            bins = self.bins
+            bins[index] = bins.get(index, 0) + 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "QuantileSketch"):
+        """合并另一个同参数草图，O(桶数)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("只能合并相对误差相同的草图")
+        bins = self.bins
+        for index, c in other.bins.items():
+            bins[index] = bins.get(index, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def copy(self) -> "QuantileSketch":
+        sketch = QuantileSketch(self.relative_accuracy, self.min_value)
+        sketch.merge(self)
+        return sketch
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """估算分位数(q 取 0~1)，O(桶数)"""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """一次遍历估算多个分位数(qs 需升序)"""
+        qs = list(qs)
+        if not self.count:
+            return [0.0] * len(qs)
+        result: List[float] = []
+        ranks = [q * (self.count - 1) for q in qs]
+        seen = self.zero_count
+        i = 0
+        while i < len(ranks) and seen > ranks[i]:
+            # 落在零值桶: 以最小值代表
+            result.append(self.min)
+            i += 1
+        for index in sorted(self.bins):
+            if i >= len(ranks):
+                break
+            seen += self.bins[index]
+            value = None
+            while i < len(ranks) and seen > ranks[i]:
+                if value is None:
+                    value = min(max(2 * self._gamma ** index / (self._gamma + 1), self.min), self.max)
+                result.append(value)
+                i += 1
+        result.extend([self.max] * (len(ranks) - i))
+        return result
+
+
+class WindowedSketch:
+    """
+    时间分槽的滑动窗口草图
+
+    窗口 window_seconds 均分为 slots 个槽，记录只写当前槽；
+    查询合并未过期的槽，窗口精度为一个槽的时长。
+    """
+
+    __slots__ = ("slot_seconds", "relative_accuracy", "clock", "_slots", "_slot_ids")
+
+    def __init__(
+        self,
+        window_seconds: float = 300.0,
+        slots: int = 10,
+        relative_accuracy: float = 0.01,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.slot_seconds = window_seconds / slots
+        self.relative_accuracy = relative_accuracy
+        self.clock = clock
+        self._slots: List[Optional[QuantileSketch]] = [None] * slots
+        self._slot_ids: List[int] = [-1] * slots
+
+    def add(self, value: float):
+        """记录一个值到当前槽"""
+        slot_id = int(self.clock() // self.slot_seconds)
+        pos = slot_id % len(self._slots)
+        sketch = self._slots[pos]
+        if self._slot_ids[pos] != slot_id or sketch is None:
+            # 槽位已轮转到新的时间段，丢弃旧数据
+            sketch = QuantileSketch(self.relative_accuracy)
+            self._slots[pos] = sketch
+            self._slot_ids[pos] = slot_id
+        sketch.add(value)
+
+    def snapshot(self, into: Optional[QuantileSketch] = None) -> QuantileSketch:
+        """合并窗口内的槽，返回(或合并进 into)草图"""
+        result = into if into is not None else QuantileSketch(self.relative_accuracy)
+        oldest = int(self.clock() // self.slot_seconds) - len(self._slots) + 1
+        for slot_id, sketch in zip(self._slot_ids, self._slots):
+            if sketch is not None and slot_id >= oldest:
+                result.merge(sketch)
+        return result
@@ -0,0 +1,169 @@
+"""
+增量式系统资源采样器
+
+保存上一次的 cpu_times / net_io_counters / disk_io_counters 原始计数，
+按需读取一次当前计数并与上一次相减得到使用率和速率:
+- 不调用 cpu_percent(interval=...)，采集不睡眠、不阻塞事件循环
+- min_interval 内的调用复用同一份快照，同一采集周期内各监控器看到一致的数据
+- 首次采样没有上一次计数时，CPU 使用率取开机以来的平均值，速率为 0
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResourceSnapshot:
+    """一次采样的结果"""
+    timestamp: str
+    # 距上一次采样的秒数，首次采样为 0
+    interval: float
+    cpu_percent: float
+    per_cpu_percent: List[float] = field(default_factory=list)
+    net_bytes_sent: int = 0
+    net_bytes_recv: int = 0
+    net_sent_per_sec: float = 0.0
+    net_recv_per_sec: float = 0.0
+    disk_read_bytes: int = 0
+    disk_write_bytes: int = 0
+    disk_read_per_sec: float = 0.0
+    disk_write_per_sec: float = 0.0
+
+    @property
+    def net_total_per_sec(self) -> float:
+        return self.net_sent_per_sec + self.net_recv_per_sec
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _busy_total(times) -> Tuple[float, float]:
+    """(忙碌时间, 总时间)，与 psutil.cpu_percent 的口径一致"""
+    total = sum(times)
+    # Linux 上 guest 时间已计入 user/nice
+    total -= getattr(times, "guest", 0.0) + getattr(times, "guest_nice", 0.0)
+    idle = times.idle + getattr(times, "iowait", 0.0)
+    return total - idle, total
+
+
+def _percent(current, previous) -> float:
+    busy, total = _busy_total(current)
+    if previous is not None:
+        prev_busy, prev_total = _busy_total(previous)
+        busy, total = busy - prev_busy, total - prev_total
+    if total <= 0:
+        return 0.0
+    return round(min(max(busy / total * 100, 0.0), 100.0), 1)
+
+
+class ResourceSampler:
+    """系统资源采样器(线程安全)"""
+
+    def __init__(self, min_interval: float = 1.0):
+        """
+        参数:
+            min_interval: 快照复用时长(秒)，也是 CPU 使用率的最小统计窗口
+        """
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_at: Optional[float] = None
+        self._last_cpu: Optional[list] = None
+        self._last_net = None
+        self._last_disk = None
+        self._snapshot: Optional[ResourceSnapshot] = None
+
+    def sample(self, max_age: Optional[float] = None) -> ResourceSnapshot:
+        """获取不超过 max_age 秒(默认 min_interval)的快照"""
+        if max_age is None:
+            max_age = self.min_interval
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._last_at < max_age:
+                return self._snapshot
+            self._snapshot = self._take(now)
+            return self._snapshot
+
+    def _take(self, now: float) -> ResourceSnapshot:
+        elapsed = now - self._last_at if self._last_at is not None else 0.0
+
+        per_cpu = psutil.cpu_times(percpu=True)
+        last_cpu = self._last_cpu
+        if last_cpu is not None and len(last_cpu) != len(per_cpu):
+            # CPU 热插拔后无法逐核对应
+            last_cpu = None
+        per_cpu_percent = [
+            _percent(cur, last_cpu[i] if last_cpu else None)
+            for i, cur in enumerate(per_cpu)
+        ]
+        overall = _percent(
+            _sum_times(per_cpu),
+            _sum_times(last_cpu) if last_cpu else None
+        )
+
+        snapshot = ResourceSnapshot(
+            timestamp=datetime.now().isoformat(),
+            interval=round(elapsed, 3),
+            cpu_percent=overall,
+            per_cpu_percent=per_cpu_percent
+        )
+
+        net = _safe(psutil.net_io_counters)
+        if net is not None:
+            snapshot.net_bytes_sent = net.bytes_sent
+            snapshot.net_bytes_recv = net.bytes_recv
+            if self._last_net is not None and elapsed > 0:
+                snapshot.net_sent_per_sec = _rate(net.bytes_sent, self._last_net.bytes_sent, elapsed)
+                snapshot.net_recv_per_sec = _rate(net.bytes_recv, self._last_net.bytes_recv, elapsed)
+
+        disk = _safe(psutil.disk_io_counters)
+        if disk is not None:
+            snapshot.disk_read_bytes = disk.read_bytes
+            snapshot.disk_write_bytes = disk.write_bytes
+            if self._last_disk is not None and elapsed > 0:
+                snapshot.disk_read_per_sec = _rate(disk.read_bytes, self._last_disk.read_bytes, elapsed)
+                snapshot.disk_write_per_sec = _rate(disk.write_bytes, self._last_disk.write_bytes, elapsed)
+
+        self._last_at = now
+        self._last_cpu = per_cpu
+        self._last_net = net
+        self._last_disk = disk
+        return snapshot
+
+
+def _sum_times(per_cpu):
+    """逐字段累加各核 CPU 时间"""
+    first = per_cpu[0]
+    return type(first)(*(sum(values) for values in zip(*per_cpu)))
+
+
+def _rate(current: int, previous: int, elapsed: float) -> float:
+    # 计数器回绕或网卡重置时差值为负，按 0 处理
+    return round(max(current - previous, 0) / elapsed, 2)
+
+
+def _safe(func):
+    try:
+        return func()
+    except Exception as e:
+        logger.debug(f"读取计数器失败 {func.__name__}: {e}")
+        return None
+
+
+# 全局采样器实例
+resource_sampler = ResourceSampler()
+
+
+def sample_resources(max_age: Optional[float] = None) -> ResourceSnapshot:
+    """获取共享的系统资源快照"""
+    return resource_sampler.sample(max_age)
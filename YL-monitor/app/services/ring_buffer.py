@@ -0,0 +1,238 @@
+"""
+列式环形缓冲区
+
+每个指标字段一列定长 NumPy 数组，追加为 O(1) 的数组写入，不创建逐样本对象：
+- 每个样本同时写入位置 i 和 i + capacity(双写)，任意"最近 n 个样本"
+  都是连续切片，导出时直接返回只读视图，不拷贝
+  (视图与缓冲区共享内存，环绕后会被新样本覆盖，需长期持有时自行 copy())
+- 窗口统计(均值/最大/最小/EWMA/斜率)全部向量化计算
+- 字段可以是标量列或定宽向量列(如每核 CPU 使用率)
+
+TimeIndexedRing 用于保存整条记录(如字典)的时间序列，按时间过期为队首弹出。
+
+作者: AI Assistant
+版本: 1.0.0
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+
+class ColumnarRing:
+    """定长列式环形缓冲区(线程安全)"""
+
+    def __init__(
+        self,
+        capacity: int,
+        fields: Union[Sequence[str], Mapping[str, Optional[int]]],
+        dtype=np.float64
+    ):
+        """
+        参数:
+            capacity: 最多保留的样本数
+            fields: 字段名列表(均为标量列)，或 {字段名: 向量宽度}(None 为标量列)
+            dtype: 数值类型
+        """
+        if capacity <= 0:
+            raise ValueError("capacity 必须大于 0")
+        if not isinstance(fields, Mapping):
+            fields = {name: None for name in fields}
+        self.capacity = capacity
+        self.widths: Dict[str, Optional[int]] = dict(fields)
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.zeros((2 * capacity,) if width is None else (2 * capacity, width), dtype=dtype)
+            for name, width in self.widths.items()
+        }
+        self._timestamps = np.zeros(2 * capacity, dtype=np.float64)
+        self._head = 0      # 下一个写入位置(0 ~ capacity-1)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, **values):
+        """追加一个样本，未给出的字段记为 NaN(整数列为 0)"""
+        with self._lock:
+            i = self._head
+            j = i + self.capacity
+            self._timestamps[i] = self._timestamps[j] = timestamp
+            for name, column in self._columns.items():
+                value = values.get(name)
+                if value is None:
+                    value = np.nan if column.dtype.kind == "f" else 0
+                column[i] = column[j] = value
+            self._head = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._size = 0
+
+    def _bounds(self, last: Optional[int]) -> slice:
+        n = self._size if last is None else max(min(last, self._size), 0)
+        # 最近 n 个样本位于 [head + capacity - n, head + capacity)
+        end = self._head + self.capacity if self._size == self.capacity else self._head
+        return slice(end - n, end)
+
+    def _window(self, last: Optional[int], seconds: Optional[float]) -> slice:
+        window = self._bounds(last)
+        if seconds is not None and window.stop > window.start:
+            ts = self._timestamps[window]
+            start = int(np.searchsorted(ts, ts[-1] - seconds, side="left"))
+            window = slice(window.start + start, window.stop)
+        return window
+
+    def _view(self, array: np.ndarray, window: slice) -> np.ndarray:
+        view = array[window]
+        view.flags.writeable = False
+        return view
+
+    def timestamps(self, last: Optional[int] = None, seconds: Optional[float] = None) -> np.ndarray:
+        """按时间顺序的时间戳(只读视图)"""
+        with self._lock:
+            return self._view(self._timestamps, self._window(last, seconds))
+
+    def column(self, name: str, last: Optional[int] = None, seconds: Optional[float] = None) -> np.ndarray:
+        """按时间顺序的字段值(只读视图，不拷贝)"""
+        with self._lock:
+            return self._view(self._columns[name], self._window(last, seconds))
+
+    def export(self, last: Optional[int] = None, seconds: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """导出同一窗口内的时间戳与全部字段(只读视图)"""
+        with self._lock:
+            window = self._window(last, seconds)
+            result = {"timestamp": self._view(self._timestamps, window)}
+            for name, column in self._columns.items():
+                result[name] = self._view(column, window)
+            return result
+
+    def latest(self, name: str):
+        """最新一个样本的字段值，为空时返回 None"""
+        with self._lock:
+            if not self._size:
+                return None
+            return self._columns[name][(self._head - 1) % self.capacity]
+
+    def stats(
+        self,
+        name: str,
+        last: Optional[int] = None,
+        seconds: Optional[float] = None,
+        alpha: float = 0.3
+    ) -> Dict[str, float]:
+        """
+        窗口统计(标量列)
+
+        返回:
+            samples/mean/max/min/ewma/slope_per_sec；窗口为空时 samples 为 0
+        """
+        with self._lock:
+            window = self._window(last, seconds)
+            values = self._columns[name][window]
+            ts = self._timestamps[window]
+            mask = ~np.isnan(values) if values.dtype.kind == "f" else slice(None)
+            values = values[mask]
+            ts = ts[mask]
+
+        n = len(values)
+        if n == 0:
+            return {"samples": 0, "mean": 0.0, "max": 0.0, "min": 0.0, "ewma": 0.0, "slope_per_sec": 0.0}
+
+        # EWMA: 权重 (1 - alpha)^k，k 为距最新样本的步数，按权重和归一
+        weights = (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        ewma = float(np.dot(weights, values) / weights.sum())
+
+        # 最小二乘斜率(每秒)
+        slope = 0.0
+        if n > 1:
+            t = ts - ts.mean()
+            denom = float(np.dot(t, t))
+            if denom > 0:
+                slope = float(np.dot(t, values - values.mean()) / denom)
+
+        return {
+            "samples": n,
+            "mean": float(values.mean()),
+            "max": float(values.max()),
+            "min": float(values.min()),
+            "ewma": ewma,
+            "slope_per_sec": slope,
+        }
+
+
+class TimeIndexedRing:
+    """
+    按时间顺序追加的对象环(线程安全)
+
+    样本按时间戳递增追加，过期只需从队首弹出(均摊 O(1))，
+    范围查询从队尾向前扫描，代价与返回条数成正比。
+    """
+
+    def __init__(self, max_items: int, max_age: Optional[float] = None):
+        """
+        参数:
+            max_items: 最多保留的条数
+            max_age: 最长保留秒数，为空时只按条数淘汰
+        """
+        self.max_items = max_items
+        self.max_age = max_age
+        self._times: deque = deque()
+        self._items: deque = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def append(self, timestamp: float, item: Any):
+        with self._lock:
+            self._times.append(timestamp)
+            self._items.append(item)
+            while len(self._items) > self.max_items:
+                self._times.popleft()
+                self._items.popleft()
+            self._expire(timestamp)
+
+    def _expire(self, now: float) -> int:
+        if self.max_age is None:
+            return 0
+        cutoff = now - self.max_age
+        removed = 0
+        while self._times and self._times[0] < cutoff:
+            self._times.popleft()
+            self._items.popleft()
+            removed += 1
+        return removed
+
+    def expire(self, now: float) -> int:
+        """淘汰早于 now - max_age 的条目，返回淘汰数"""
+        with self._lock:
+            return self._expire(now)
+
+    def latest(self) -> Optional[Any]:
+        with self._lock:
+            return self._items[-1] if self._items else None
+
+    def range(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Any]:
+        """时间范围内最新的 limit 条，按时间正序返回"""
+        result: List[Any] = []
+        with self._lock:
+            for timestamp, item in zip(reversed(self._times), reversed(self._items)):
+                if end is not None and timestamp > end:
+                    continue
+                if start is not None and timestamp < start:
+                    break
+                result.append(item)
+                if limit is not None and len(result) >= limit:
+                    break
+        result.reverse()
+        return result
@@ -0,0 +1,244 @@
+"""
+告警规则编译与向量化评估
+
+供 AlertService 与 AlertManager 共用:
+- RuleIndex: 规则在增删改时编译一次，按指标分组为阈值数组；
+  每个样本只做一次字典查找与一次向量比较，不再逐条复制、过滤、排序规则
+- compile_condition: 将 "cpu_percent > 80" 这类条件表达式解析为可直接调用的比较器
+
+NumPy 可用且同一指标规则较多时使用向量比较，否则逐条比较(语义一致)。
+"""
+
+import logging
+import operator
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 等于比较的容差(与原有实现一致)
+EQ_TOLERANCE = 0.001
+
+# 运算符别名 -> 规范名
+OP_ALIASES = {
+    ">": "gt", ">=": "gte", "<": "lt", "<=": "lte", "==": "eq", "!=": "ne",
+    "gt": "gt", "gte": "gte", "lt": "lt", "lte": "lte", "eq": "eq", "ne": "ne",
+}
+
+_SCALAR_OPS: Dict[str, Callable[[float, float], bool]] = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": lambda actual, threshold: abs(actual - threshold) < EQ_TOLERANCE,
+    "ne": lambda actual, threshold: abs(actual - threshold) >= EQ_TOLERANCE,
+}
+
+if NUMPY_AVAILABLE:
+    _VECTOR_OPS = {
+        "gt": np.greater,
+        "gte": np.greater_equal,
+        "lt": np.less,
+        "lte": np.less_equal,
+        "eq": lambda actual, threshold: np.abs(actual - threshold) < EQ_TOLERANCE,
+        "ne": lambda actual, threshold: np.abs(actual - threshold) >= EQ_TOLERANCE,
+    }
+
+
+def normalize_op(op: Any) -> str:
+    """将 ComparisonOp / 符号 / 名称统一为规范名"""
+    name = getattr(op, "value", op)
+    try:
+        return OP_ALIASES[name]
+    except KeyError:
+        raise ValueError(f"不支持的比较运算符: {op}")
+
+
+def compare(op: Any, actual: float, threshold: float) -> bool:
+    """单次比较"""
+    return _SCALAR_OPS[normalize_op(op)](actual, threshold)
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """编译后的阈值规则"""
+    rule_id: str
+    metric: Hashable
+    op: str
+    threshold: float
+    rule: Any = None
+
+
+class _MetricGroup:
+    """同一指标下的全部规则"""
+
+    __slots__ = ("rules", "scalar", "vector", "use_vector")
+
+    def __init__(self, rules: Sequence[CompiledRule], vector_min_rules: int):
+        self.rules: Tuple[CompiledRule, ...] = tuple(rules)
+        self.scalar = [(_SCALAR_OPS[r.op], r.threshold) for r in self.rules]
+        self.vector = None
+        if NUMPY_AVAILABLE:
+            # 按运算符分组: (比较函数, 规则下标数组, 阈值数组)
+            by_op: Dict[str, List[int]] = {}
+            for i, r in enumerate(self.rules):
+                by_op.setdefault(r.op, []).append(i)
+            self.vector = [
+                (
+                    _VECTOR_OPS[op],
+                    np.asarray(indices, dtype=np.intp),
+                    np.asarray([self.rules[i].threshold for i in indices], dtype=np.float64),
+                )
+                for op, indices in by_op.items()
+            ]
+        # 规则较少时逐条比较比创建数组更快
+        self.use_vector = self.vector is not None and len(self.rules) >= vector_min_rules
+
+    def evaluate(self, value: float) -> List[bool]:
+        if not self.use_vector:
+            return [fn(value, threshold) for fn, threshold in self.scalar]
+        result = np.empty(len(self.rules), dtype=bool)
+        for fn, indices, thresholds in self.vector:
+            result[indices] = fn(value, thresholds)
+        return result.tolist()
+
+    def evaluate_batch(self, values: Sequence[float]) -> List[List[bool]]:
+        """返回 len(values) x len(rules) 的结果矩阵"""
+        if self.vector is None:
+            return [self.evaluate(v) for v in values]
+        column = np.asarray(values, dtype=np.float64)[:, None]
+        result = np.empty((column.shape[0], len(self.rules)), dtype=bool)
+        for fn, indices, thresholds in self.vector:
+            result[:, indices] = fn(column, thresholds[None, :])
+        return result.tolist()
+
+
+class RuleIndex:
+    """
+    按指标索引的已编译规则集
+
+    规则集变化时调用 rebuild()，评估路径只读，不做任何复制或排序。
+    """
+
+    def __init__(self, vector_min_rules: int = 16):
+        """
+        参数:
+            vector_min_rules: 同一指标规则数达到该值时使用向量比较
+        """
+        self.vector_min_rules = vector_min_rules
+        self._groups: Dict[Hashable, _MetricGroup] = {}
+        self.version = 0
+
+    def rebuild(self, rules: Iterable[CompiledRule]):
+        """重新编译规则集(保持传入顺序)"""
+        grouped: Dict[Hashable, List[CompiledRule]] = {}
+        for rule in rules:
+            grouped.setdefault(rule.metric, []).append(rule)
+        self._groups = {
+            metric: _MetricGroup(group, self.vector_min_rules)
+            for metric, group in grouped.items()
+        }
+        self.version += 1
+
+    def rules_for(self, metric: Hashable) -> Tuple[CompiledRule, ...]:
+        group = self._groups.get(metric)
+        return group.rules if group else ()
+
+    def evaluate(self, metric: Hashable, value: float) -> List[Tuple[CompiledRule, bool]]:
+        """评估单个样本，返回 (规则, 是否满足) 列表"""
+        group = self._groups.get(metric)
+        if group is None:
+            return []
+        return list(zip(group.rules, group.evaluate(value)))
+
+    def evaluate_batch(
+        self, metric: Hashable, values: Sequence[float]
+    ) -> Tuple[Tuple[CompiledRule, ...], List[List[bool]]]:
+        """批量评估同一指标的多个样本"""
+        group = self._groups.get(metric)
+        if group is None or not len(values):
+            return (), []
+        return group.rules, group.evaluate_batch(values)
+
+    def __len__(self) -> int:
+        return sum(len(g.rules) for g in self._groups.values())
+
+
+# ==================== 条件表达式 ====================
+
+# 按长度降序匹配，保证 ">=" 先于 ">"
+_EXPRESSION_OPS = ("==", "!=", ">=", "<=", ">", "<")
+
+
+class CompiledCondition:
+    """
+    编译后的条件表达式
+
+    支持:
+    - status == "offline"  (字符串相等)
+    - cpu_percent > 80     (数值比较，缺失字段按 0 处理)
+    - health_check_failed  (特殊条件)
+    """
+
+    __slots__ = ("expression", "key", "op", "value", "_fn")
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.key: Optional[str] = None
+        self.op: Optional[str] = None
+        self.value: Any = None
+        try:
+            self._fn: Callable[[Dict[str, Any]], bool] = self._parse(expression.strip())
+        except ValueError as e:
+            logger.error(f"条件解析错误 [{expression}]: {e}")
+            self._fn = lambda data: False
+
+    def _parse(self, expression: str) -> Callable[[Dict[str, Any]], bool]:
+        for symbol in _EXPRESSION_OPS:
+            if symbol not in expression:
+                continue
+            key, raw = expression.split(symbol, 1)
+            self.key = key.strip()
+            self.op = OP_ALIASES[symbol]
+            raw = raw.strip()
+            if symbol in ("==", "!=") and not _is_number(raw):
+                self.value = raw.strip('"').strip("'")
+                key_, value, equal = self.key, self.value, symbol == "=="
+                return lambda data: (str(data.get(key_)) == value) == equal
+            self.value = float(raw)
+            key_, threshold, fn = self.key, self.value, _SCALAR_OPS[self.op]
+            return lambda data: fn(float(data.get(key_, 0)), threshold)
+
+        if expression == "health_check_failed":
+            self.key = "consecutive_fails"
+            return lambda data: data.get("consecutive_fails", 0) > 0
+        return lambda data: False
+
+    def __call__(self, data: Dict[str, Any]) -> bool:
+        try:
+            return self._fn(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"条件评估错误: {e}")
+            return False
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=1024)
+def compile_condition(expression: str) -> CompiledCondition:
+    """解析条件表达式(结果缓存)"""
+    return CompiledCondition(expression)
@@ -12,10 +12,49 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
-from collections import deque
+
+import numpy as np
+
+from app.services.process_table import get_process_snapshot
+from app.services.resource_sampler import sample_resources
+from app.services.ring_buffer import ColumnarRing
 
 logger = logging.getLogger(__name__)
 
+# 历史默认保留 1 小时（1 秒分辨率）
+DEFAULT_HISTORY_SIZE = 3600
+
+
+def _window_summary(ring: ColumnarRing, field: str, seconds: float) -> Dict[str, Any]:
+    """历史窗口统计与趋势（每分钟变化超过 5 个百分点视为上升/下降）"""
+    stats = ring.stats(field, seconds=seconds)
+    slope_per_min = stats["slope_per_sec"] * 60
+    if slope_per_min > 5:
+        trend = "rising"
+    elif slope_per_min < -5:
+        trend = "falling"
+    else:
+        trend = "stable"
+    return {
+        "seconds": seconds,
+        "samples": stats["samples"],
+        "mean": round(stats["mean"], 2),
+        "max": round(stats["max"], 2),
+        "ewma": round(stats["ewma"], 2),
+        "slope_per_min": round(slope_per_min, 2),
+        "trend": trend
+    }
+
+
+def _history_records(data: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """列式历史转换为逐条记录（兼容原有接口格式）"""
+    columns = {name: values.tolist() for name, values in data.items()}
+    timestamps = [datetime.fromtimestamp(ts).isoformat() for ts in columns.pop("timestamp")]
+    return [
+        {"timestamp": ts, **{name: values[i] for name, values in columns.items()}}
+        for i, ts in enumerate(timestamps)
+    ]
+
 
 @dataclass
 class CPUMetrics:
@@ -109,21 +148,32 @@ class CPUDetailedMonitor:
     - 中断次数
     - 系统调用次数
     - 系统负载（1/5/15分钟）
+    
+    使用率历史保存在列式环形缓冲区中（整体一列、每核一列向量）。
     """
     
-    def __init__(self, history_size: int = 60):
+    def __init__(self, history_size: int = DEFAULT_HISTORY_SIZE, pressure_window: float = 300.0):
+        """
+        Args:
+            history_size: 历史样本容量
+            pressure_window: 压力评估的统计窗口（秒）
+        """
         self.history_size = history_size
-        self._usage_history: deque = deque(maxlen=history_size)
-        self._last_cpu_times = None
+        self.pressure_window = pressure_window
+        self._cpu_count = psutil.cpu_count(logical=True) or 1
+        self._history = ColumnarRing(
+            history_size, {'overall': None, 'per_cpu': self._cpu_count}
+        )
     
     def collect_metrics(self) -> CPUMetrics:
         """
         采集 CPU 详细指标
         """
         try:
-            # 获取 CPU 使用率
-            overall_percent = psutil.cpu_percent(interval=0.1)
-            per_cpu_percent = psutil.cpu_percent(interval=0.1, percpu=True)
+            # 获取 CPU 使用率（与上次采样的 cpu_times 增量，无需等待）
+            resources = sample_resources()
+            overall_percent = resources.cpu_percent
+            per_cpu_percent = resources.per_cpu_percent
             
             # 获取 CPU 频率
             freq_info = psutil.cpu_freq()
@@ -158,12 +208,11 @@ class CPUDetailedMonitor:
                 timestamp=datetime.now().isoformat()
             )
             
-            # 保存历史
-            self._usage_history.append({
-                'timestamp': metrics.timestamp,
-                'overall': overall_percent,
-                'per_cpu': list(per_cpu_percent)
-            })
+            # 保存历史（核数变化时截断或补 0）
+            per_cpu = np.zeros(self._cpu_count)
+            values = per_cpu_percent[:self._cpu_count]
+            per_cpu[:len(values)] = values
+            self._history.append(time.time(), overall=overall_percent, per_cpu=per_cpu)
             
             return metrics
             
@@ -171,21 +220,36 @@ class CPUDetailedMonitor:
             logger.error(f"采集 CPU 指标失败: {e}")
             raise
     
-    def get_usage_history(self) -> List[Dict[str, Any]]:
+    def export_usage_history(
+        self, last: Optional[int] = None, seconds: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        导出列式使用率历史（只读视图，不拷贝）
+        
+        Returns:
+            {"timestamp": 秒级时间戳, "overall": 整体使用率, "per_cpu": 每核使用率(二维)}
+        """
+        return self._history.export(last=last, seconds=seconds)
+    
+    def get_usage_history(self, last: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         获取 CPU 使用率历史
+        
+        Args:
+            last: 只返回最近的样本数，为空时返回全部
         """
-        return list(self._usage_history)
+        return _history_records(self._history.export(last=last))
     
     def get_cpu_pressure(self) -> Dict[str, Any]:
         """
         获取 CPU 压力评估
+        
+        状态按最近 3 个样本的均值判断，并附带统计窗口内的均值/最大值/EWMA/趋势
         """
-        if len(self._usage_history) < 3:
+        if len(self._history) < 3:
             return {"status": "insufficient_data"}
         
-        recent = list(self._usage_history)[-3:]
-        avg_usage = sum(r['overall'] for r in recent) / len(recent)
+        avg_usage = self._history.stats('overall', last=3)["mean"]
         
         if avg_usage > 90:
             status = "critical"
@@ -203,6 +267,7 @@ class CPUDetailedMonitor:
         return {
             "status": status,
             "average_usage": round(avg_usage, 2),
+            "window": _window_summary(self._history, 'overall', self.pressure_window),
             "suggestion": suggestion,
             "timestamp": datetime.now().isoformat()
         }
@@ -220,11 +285,21 @@ class MemoryDetailedMonitor:
     - 交换空间总量/已用/空闲
     - 内存使用趋势
     - Top 内存消耗进程
+    
+    使用历史保存在列式环形缓冲区中。
     """
     
-    def __init__(self, history_size: int = 60):
+    def __init__(self, history_size: int = DEFAULT_HISTORY_SIZE, pressure_window: float = 300.0):
+        """
+        Args:
+            history_size: 历史样本容量
+            pressure_window: 压力评估的统计窗口（秒）
+        """
         self.history_size = history_size
-        self._usage_history: deque = deque(maxlen=history_size)
+        self.pressure_window = pressure_window
+        self._history = ColumnarRing(
+            history_size, ['percent', 'used', 'available', 'swap_percent']
+        )
     
     def collect_metrics(self) -> MemoryMetrics:
         """
@@ -256,12 +331,13 @@ class MemoryDetailedMonitor:
             )
             
             # 保存历史
-            self._usage_history.append({
-                'timestamp': metrics.timestamp,
-                'percent': vm.percent,
-                'used': vm.used,
-                'available': vm.available
-            })
+            self._history.append(
+                time.time(),
+                percent=vm.percent,
+                used=vm.used,
+                available=vm.available,
+                swap_percent=swap.percent
+            )
             
             return metrics
             
@@ -279,33 +355,24 @@ class MemoryDetailedMonitor:
         Returns:
             进程内存信息列表
         """
-        processes = []
-        
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'memory_info', 
-                                              'memory_percent', 'cpu_percent']):
-                try:
-                    info = proc.info
-                    mem_info = info.get('memory_info')
-                    
-                    if mem_info:
-                        processes.append(ProcessMemoryInfo(
-                            pid=info['pid'],
-                            name=info['name'],
-                            memory_rss=mem_info.rss,
-                            memory_vms=mem_info.vms,
-                            memory_percent=info.get('memory_percent', 0.0),
-                            cpu_percent=info.get('cpu_percent', 0.0)
-                        ))
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-        
+            # 共享进程表快照，按内存使用率取前 n 个
+            top = get_process_snapshot().top(n, key='memory_percent')
         except Exception as e:
             logger.error(f"获取进程内存信息失败: {e}")
+            return []
         
-        # 按内存使用率排序
-        processes.sort(key=lambda x: x.memory_percent, reverse=True)
-        return processes[:n]
+        return [
+            ProcessMemoryInfo(
+                pid=info.pid,
+                name=info.name,
+                memory_rss=info.memory_rss,
+                memory_vms=info.memory_vms,
+                memory_percent=info.memory_percent,
+                cpu_percent=info.cpu_percent
+            )
+            for info in top
+        ]
     
     def get_memory_pressure(self) -> Dict[str, Any]:
         """
@@ -329,7 +396,7 @@ class MemoryDetailedMonitor:
                 status = "normal"
                 suggestion = "内存使用正常"
             
-            return {
+            result = {
                 "status": status,
                 "memory_percent": vm.percent,
                 "swap_percent": swap.percent,
@@ -337,6 +404,11 @@ class MemoryDetailedMonitor:
                 "suggestion": suggestion,
                 "timestamp": datetime.now().isoformat()
             }
+            if len(self._history) >= 2:
+                result["window"] = _window_summary(
+                    self._history, 'percent', self.pressure_window
+                )
+            return result
             
         except Exception as e:
             logger.error(f"评估内存压力失败: {e}")
@@ -346,11 +418,20 @@ class MemoryDetailedMonitor:
                 "timestamp": datetime.now().isoformat()
             }
     
-    def get_usage_history(self) -> List[Dict[str, Any]]:
+    def export_usage_history(
+        self, last: Optional[int] = None, seconds: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """导出列式内存使用历史（只读视图，不拷贝）"""
+        return self._history.export(last=last, seconds=seconds)
+    
+    def get_usage_history(self, last: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         获取内存使用历史
+        
+        Args:
+            last: 只返回最近的样本数，为空时返回全部
         """
-        return list(self._usage_history)
+        return _history_records(self._history.export(last=last))
 
 
 class GPUMonitor:
@@ -511,8 +592,9 @@ class SystemResourceCollector:
     """
     
     def __init__(self):
-        self.cpu_monitor = CPUDetailedMonitor()
-        self.memory_monitor = MemoryDetailedMonitor()
+        history_size = int(os.getenv("YL_MONITOR_RESOURCE_HISTORY", str(DEFAULT_HISTORY_SIZE)))
+        self.cpu_monitor = CPUDetailedMonitor(history_size)
+        self.memory_monitor = MemoryDetailedMonitor(history_size)
         self.gpu_monitor = GPUMonitor()
     
     def collect_all(self) -> Dict[str, Any]:
@@ -12,6 +12,8 @@ from datetime import datetime
 from typing import Dict, Optional
 import subprocess
 
+from app.services.process_table import ProcessInfo, get_process_snapshot
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,22 +26,29 @@ class UserGUIMonitor:
         self.last_status = None
         self.last_check = None
         
-    def check_process_running(self) -> bool:
-        """检查 User GUI 进程是否运行"""
+    @staticmethod
+    def _is_gui_process(info: ProcessInfo) -> bool:
+        # 检查是否包含 user/main.py 或相关关键词
+        cmdline = info.cmdline
+        return 'user/main.py' in cmdline or (
+            'python' in cmdline and
+            'user' in cmdline and
+            'gui' in cmdline
+        )
+    
+    def _find_gui_process(self, max_age: Optional[float] = None) -> Optional[ProcessInfo]:
+        matches = get_process_snapshot(max_age).filter(self._is_gui_process)
+        return matches[0] if matches else None
+    
+    def check_process_running(self, max_age: Optional[float] = None) -> bool:
+        """
+        检查 User GUI 进程是否运行
+        
+        Args:
+            max_age: 可接受的进程表快照时长，0 表示强制重新扫描
+        """
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    cmdline = ' '.join(proc.info['cmdline'] or [])
-                    # 检查是否包含 user/main.py 或相关关键词
-                    if 'user/main.py' in cmdline or (
-                        'python' in cmdline and 
-                        'user' in cmdline and 
-                        'gui' in cmdline
-                    ):
-                        return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            return False
+            return self._find_gui_process(max_age) is not None
         except Exception as e:
             logger.error(f"检查进程时出错: {e}")
             return False
@@ -47,34 +56,20 @@ class UserGUIMonitor:
     def get_process_info(self) -> Optional[Dict]:
         """获取 User GUI 进程详细信息"""
         try:
-            for proc in psutil.process_iter([
-                'pid', 'name', 'cmdline', 'cpu_percent',
-                'memory_info', 'create_time', 'status'
-            ]):
-                try:
-                    cmdline = ' '.join(proc.info['cmdline'] or [])
-                    if 'user/main.py' in cmdline or (
-                        'python' in cmdline and 
-                        'user' in cmdline and 
-                        'gui' in cmdline
-                    ):
-                        mem_info = proc.info['memory_info']
-                        mem_mb = mem_info.rss / 1024 / 1024 if mem_info else 0
-                        create_time = proc.info['create_time']
-                        return {
-                            'pid': proc.info['pid'],
-                            'name': proc.info['name'],
-                            'cmdline': cmdline[:100],
-                            'cpu_percent': proc.info['cpu_percent'],
-                            'memory_mb': mem_mb,
-                            'create_time': datetime.fromtimestamp(
-                                create_time
-                            ).isoformat() if create_time else None,
-                            'status': proc.info['status']
-                        }
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            return None
+            info = self._find_gui_process()
+            if info is None:
+                return None
+            return {
+                'pid': info.pid,
+                'name': info.name,
+                'cmdline': info.cmdline[:100],
+                'cpu_percent': info.cpu_percent,
+                'memory_mb': info.memory_rss / 1024 / 1024,
+                'create_time': datetime.fromtimestamp(
+                    info.create_time
+                ).isoformat() if info.create_time else None,
+                'status': info.status
+            }
         except Exception as e:
             logger.error(f"获取进程信息时出错: {e}")
             return None
@@ -124,7 +119,7 @@ class UserGUIMonitor:
             )
             # 等待几秒让进程启动
             time.sleep(3)
-            return self.check_process_running()
+            return self.check_process_running(max_age=0)
         except Exception as e:
             logger.error(f"启动 User GUI 失败: {e}")
             return False
@@ -5,20 +5,21 @@
 - 实时推送告警状态变更
 - 客户端实时更新
 - 支持告警确认操作
+- 推送的消息带事件日志偏移量，重连时可通过 from_offset 补齐错过的消息
 
 作者: AI Assistant
 版本: 1.0.0
 """
 
 import json
-import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, Set, Optional
+from typing import Any, Dict, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter
 
 from app.services.alert_service import get_alert_service, AlertService
 from app.services.event_bus import EventBus, EventType
+from app.services.enhanced_event_bus import EnhancedEventBus, enhanced_event_bus
 from app.models.alert import AlertStatus
 
 logger = logging.getLogger(__name__)
@@ -30,15 +31,37 @@ router = APIRouter()
 class AlertsWebSocketManager:
     """告警 WebSocket 管理器"""
     
-    def __init__(self):
+    # 推送消息在事件日志中的类型前缀
+    EVENT_PREFIX = "alerts_ws."
+    # 记录到事件日志、可重放的消息类型
+    REPLAY_MESSAGE_TYPES = (
+        "alert_triggered", "alert_recovered", "browser_notification", "alert_acknowledged",
+    )
+    # 单次重放的最大消息数，超出部分由客户端按 next_offset 继续请求
+    REPLAY_LIMIT = 1000
+    
+    def __init__(self, event_log: Optional[EnhancedEventBus] = None):
+        """
+        参数:
+            event_log: 记录推送消息、提供重放的事件总线，默认为全局增强事件总线
+        """
         self.active_connections: Set[WebSocket] = set()
         self._alert_service: Optional[AlertService] = None
         self._event_handlers: Dict[str, callable] = {}
+        self._event_log = event_log or enhanced_event_bus
     
-    async def connect(self, websocket: WebSocket):
-        """处理客户端连接"""
+    async def connect(self, websocket: WebSocket, from_offset: Optional[int] = None):
+        """
+        处理客户端连接
+        
+        参数:
+            websocket: 客户端连接
+            from_offset: 重连时上次收到的最后一条消息偏移量加一，从该偏移量开始重放
+        """
         await websocket.accept()
         self.active_connections.add(websocket)
+        # 加入连接后推送的消息偏移量都大于此值，重放到此为止，避免重复
+        replay_until = self._event_log.last_offset
         
         # 初始化告警服务
         if self._alert_service is None:
@@ -54,6 +77,9 @@ class AlertsWebSocketManager:
             }
         })
         
+        if from_offset is not None:
+            await self.replay(websocket, from_offset, replay_until)
+        
         # 订阅事件
         self._subscribe_events()
         
@@ -64,6 +90,47 @@ class AlertsWebSocketManager:
         self.active_connections.discard(websocket)
         logger.info(f"告警 WebSocket 客户端已断开，当前连接数: {len(self.active_connections)}")
     
+    async def replay(self, websocket: WebSocket, from_offset: int, until: Optional[int] = None):
+        """
+        向客户端重放 from_offset(包含)之后推送过的消息
+        
+        参数:
+            websocket: 客户端连接
+            from_offset: 起始偏移量
+            until: 最大偏移量(包含)，默认为当前最后一条
+        """
+        if until is None:
+            until = self._event_log.last_offset
+        types = [self.EVENT_PREFIX + name for name in self.REPLAY_MESSAGE_TYPES]
+        records = self._event_log.replay(from_offset, types=types, limit=self.REPLAY_LIMIT)
+        
+        records = [r for r in records if r['offset'] <= until]
+        for record in records:
+            await websocket.send_json({**record['data'], "offset": record['offset']})
+        
+        # 达到单次上限时从最后一条之后继续，否则已补齐到 until
+        if len(records) >= self.REPLAY_LIMIT:
+            next_offset = records[-1]['offset'] + 1
+        else:
+            next_offset = max(from_offset, until + 1)
+        
+        await websocket.send_json({
+            "type": "replay_complete",
+            "data": {"count": len(records), "next_offset": next_offset}
+        })
+    
+    async def publish(self, msg_type: str, data: Any):
+        """记录到事件日志并广播，消息带偏移量供客户端重连时续传"""
+        message = {
+            "type": msg_type,
+            "timestamp": datetime.utcnow().isoformat(),
+            "data": data
+        }
+        offset = self._event_log.record(self.EVENT_PREFIX + msg_type, message, source="alerts_ws")
+        if offset >= 0:
+            message = {**message, "offset": offset}
+        await self.broadcast(message)
+    
     async def broadcast(self, message: dict):
         """广播消息给所有客户端"""
         if not self.active_connections:
@@ -86,56 +153,40 @@ class AlertsWebSocketManager:
         """订阅告警相关事件"""
         event_bus = EventBus()
         
-        # 告警触发事件
-        self._event_handlers['alert_triggered'] = lambda data: asyncio.create_task(
-            self._handle_alert_triggered(data)
-        )
-        event_bus.subscribe(
-            EventType.ALERT_TRIGGERED,
-            self._event_handlers['alert_triggered']
-        )
-        
-        # 告警恢复事件
-        self._event_handlers['alert_recovered'] = lambda data: asyncio.create_task(
-            self._handle_alert_recovered(data)
-        )
-        event_bus.subscribe(
-            EventType.ALERT_RECOVERED,
-            self._event_handlers['alert_recovered']
-        )
-        
-        # 浏览器通知事件
-        self._event_handlers['notification_browser'] = lambda data: asyncio.create_task(
-            self._handle_browser_notification(data)
-        )
-        event_bus.subscribe(
-            EventType.NOTIFICATION_BROWSER,
-            self._event_handlers['notification_browser']
+        # 告警事件通过独立投递队列推送，WebSocket 发送慢不会阻塞事件发布方；
+        # 固定订阅标识保证多次连接不会重复订阅
+        subscriptions = (
+            ('alert_triggered', EventType.ALERT_TRIGGERED, self._handle_alert_triggered),
+            ('alert_recovered', EventType.ALERT_RECOVERED, self._handle_alert_recovered),
+            ('notification_browser', EventType.NOTIFICATION_BROWSER, self._handle_browser_notification),
         )
+        for name, event_type, handler in subscriptions:
+            self._event_handlers[name] = self._wrap_event_handler(handler)
+            event_bus.subscribe(
+                callback=self._event_handlers[name],
+                filter_types=[event_type],
+                subscriber_id=f"alerts_ws_{name}",
+                queued=True
+            )
+    
+    @staticmethod
+    def _wrap_event_handler(handler):
+        """将事件对象转换为处理器所需的事件数据"""
+        async def _on_event(event):
+            await handler(event.data)
+        return _on_event
     
     async def _handle_alert_triggered(self, data: dict):
         """处理告警触发事件"""
-        await self.broadcast({
-            "type": "alert_triggered",
-            "timestamp": datetime.utcnow().isoformat(),
-            "data": data
-        })
+        await self.publish("alert_triggered", data)
     
     async def _handle_alert_recovered(self, data: dict):
         """处理告警恢复事件"""
-        await self.broadcast({
-            "type": "alert_recovered",
-            "timestamp": datetime.utcnow().isoformat(),
-            "data": data
-        })
+        await self.publish("alert_recovered", data)
     
     async def _handle_browser_notification(self, data: dict):
         """处理浏览器通知事件"""
-        await self.broadcast({
-            "type": "browser_notification",
-            "timestamp": datetime.utcnow().isoformat(),
-            "data": data
-        })
+        await self.publish("browser_notification", data)
     
     async def handle_message(self, websocket: WebSocket, message: dict):
         """处理客户端消息"""
@@ -149,14 +200,10 @@ class AlertsWebSocketManager:
             if self._alert_service and alert_id:
                 alert = self._alert_service.acknowledge_alert(alert_id, user)
                 if alert:
-                    await self.broadcast({
-                        "type": "alert_acknowledged",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "data": {
-                            "alert_id": alert_id,
-                            "acknowledged_by": user,
-                            "acknowledged_at": alert.acknowledged_at.isoformat() if alert.acknowledged_at else None
-                        }
+                    await self.publish("alert_acknowledged", {
+                        "alert_id": alert_id,
+                        "acknowledged_by": user,
+                        "acknowledged_at": alert.acknowledged_at.isoformat() if alert.acknowledged_at else None
                     })
         
         elif msg_type == "get_history":
@@ -169,6 +216,17 @@ class AlertsWebSocketManager:
                     "data": [alert.dict() for alert in history]
                 })
         
+        elif msg_type == "replay":
+            # 补齐 from_offset 之后错过的推送
+            from_offset = message.get("from_offset")
+            if isinstance(from_offset, int) and from_offset >= 0:
+                await self.replay(websocket, from_offset)
+            else:
+                await websocket.send_json({
+                    "type": "error",
+                    "message": "from_offset 必须是非负整数"
+                })
+        
         elif msg_type == "ping":
             # 心跳响应
             await websocket.send_json({
@@ -189,8 +247,14 @@ async def alerts_websocket_handler(websocket: WebSocket):
     @app.websocket("/ws/alerts")
     async def websocket_endpoint(websocket: WebSocket):
         await alerts_websocket_handler(websocket)
+    
+    重连时可带查询参数 from_offset(上次收到的 offset 加一)补齐错过的消息。
     """
-    await alerts_ws_manager.connect(websocket)
+    from_offset = websocket.query_params.get("from_offset")
+    await alerts_ws_manager.connect(
+        websocket,
+        from_offset=int(from_offset) if from_offset and from_offset.isdigit() else None
+    )
     
     try:
         while True:
@@ -1,25 +1,168 @@
 """
 WebSocket连接管理器
 管理所有WebSocket连接，支持按类型分组和广播
+
+发送模型:
+- 消息在广播时只编码一次(JSON，或可选的msgpack)，所有接收方共享同一份载荷
+- 每个连接持有一个有界的出站队列，由独立的写任务负责排空
+- 慢客户端队列满时丢弃最旧的消息；带 coalesce_key 的消息会覆盖队列中尚未发送的同键消息
+- 单个卡住的连接只会拖慢自己的写任务，不会阻塞其他订阅者
+- 正常断开时写任务先在限定时间内发完已入队的消息(如最后的完成通知)再退出
 """
 
-from typing import Dict, Set, Optional
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Union
 from fastapi import WebSocket
 import asyncio
+import json
+import time
+
+# msgpack为可选依赖
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+
+def encode_message(message: dict, encoding: str = ENCODING_JSON) -> Union[str, bytes]:
+    """
+    编码消息
+
+    参数:
+    - message: 消息内容
+    - encoding: json / msgpack
+
+    返回:
+    - JSON文本或msgpack字节
+    """
+    if encoding == ENCODING_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack未安装，无法使用msgpack编码")
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    # 与 WebSocket.send_json 的序列化参数保持一致
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+@dataclass
+class OutboundFrame:
+    """出站队列中的一条已编码消息"""
+    payload: Union[str, bytes]
+    enqueued_at: float
+    coalesce_key: Optional[str] = None
+
+
+@dataclass
+class ConnectionState:
+    """单个连接的发送状态与指标"""
+    websocket: WebSocket
+    conn_type: str
+    client_id: str
+    connected_at: float
+    encoding: str = ENCODING_JSON
+    max_queue_size: int = 256
+    queue: Deque[OutboundFrame] = field(default_factory=deque)
+    pending_keys: Dict[str, OutboundFrame] = field(default_factory=dict)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    # 队列已清空且没有正在发送的消息
+    idle: asyncio.Event = field(default_factory=asyncio.Event)
+    writer: Optional[asyncio.Task] = None
+
+    # 指标
+    sent: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    bytes_sent: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+
+    def enqueue(self, payload: Union[str, bytes], now: float,
+                coalesce_key: Optional[str] = None):
+        """放入出站队列，必要时合并或丢弃最旧消息"""
+        if coalesce_key is not None:
+            pending = self.pending_keys.get(coalesce_key)
+            if pending is not None:
+                # 覆盖尚未发送的同键消息，保留其队列位置与入队时间
+                pending.payload = payload
+                self.coalesced += 1
+                return
+
+        if len(self.queue) >= self.max_queue_size:
+            oldest = self.queue.popleft()
+            self._forget(oldest)
+            self.dropped += 1
+
+        frame = OutboundFrame(payload=payload, enqueued_at=now, coalesce_key=coalesce_key)
+        self.queue.append(frame)
+        if coalesce_key is not None:
+            self.pending_keys[coalesce_key] = frame
+        self.idle.clear()
+        self.wakeup.set()
+
+    def pop(self) -> OutboundFrame:
+        """取出下一条待发送消息"""
+        frame = self.queue.popleft()
+        self._forget(frame)
+        return frame
+
+    def _forget(self, frame: OutboundFrame):
+        if frame.coalesce_key is not None and self.pending_keys.get(frame.coalesce_key) is frame:
+            del self.pending_keys[frame.coalesce_key]
+
+    def to_dict(self, now: float) -> dict:
+        """导出连接指标"""
+        oldest_wait = now - self.queue[0].enqueued_at if self.queue else 0.0
+        return {
+            "type": self.conn_type,
+            "client_id": self.client_id,
+            "encoding": self.encoding,
+            "connected_for": round(now - self.connected_at, 3),
+            "queue_depth": len(self.queue),
+            "queue_capacity": self.max_queue_size,
+            "oldest_pending": round(oldest_wait, 6),
+            "last_lag": round(self.last_lag, 6),
+            "max_lag": round(self.max_lag, 6),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "bytes_sent": self.bytes_sent,
+        }
 
 
 class ConnectionManager:
     """
     WebSocket连接管理器
-    
+
     职责:
     1. 管理WebSocket连接生命周期
     2. 按类型分组管理连接
     3. 支持广播和单播消息
     4. 自动清理断开的连接
+    5. 每连接有界出站队列与写任务，隔离慢客户端
     """
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        max_queue_size: int = 256,
+        send_timeout: float = 10.0,
+        drain_timeout: float = 2.0
+    ):
+        """
+        参数:
+        - max_queue_size: 每个连接出站队列的最大长度
+        - send_timeout: 单条消息发送超时(秒)，超时视为连接失效
+        - drain_timeout: 断开时等待已入队消息发送完的最长时间(秒)
+        """
+        self.max_queue_size = max_queue_size
+        self.send_timeout = send_timeout
+        self.drain_timeout = drain_timeout
+
         # 按类型存储连接
         self.connections: Dict[str, Set[WebSocket]] = {
             "dashboard": set(),
@@ -27,38 +170,64 @@ class ConnectionManager:
             "scripts": set(),
             "alerts": set()
         }
-        
+
         # 连接元数据
         self.connection_meta: Dict[WebSocket, dict] = {}
-    
+
+        # 连接发送状态
+        self._states: Dict[WebSocket, ConnectionState] = {}
+
+        # client_id索引
+        self._client_index: Dict[str, Set[WebSocket]] = {}
+
     async def connect(
         self,
         websocket: WebSocket,
         conn_type: str,
-        client_id: Optional[str] = None
+        client_id: Optional[str] = None,
+        encoding: str = ENCODING_JSON
     ):
         """
         建立WebSocket连接
-        
+
         参数:
         - websocket: WebSocket对象
         - conn_type: 连接类型(dashboard/dag/scripts/alerts)
         - client_id: 客户端标识
+        - encoding: 消息编码(json/msgpack)，msgpack未安装时回退为json
         """
         await websocket.accept()
-        
+
         if conn_type in self.connections:
             self.connections[conn_type].add(websocket)
-        
+
+        if encoding == ENCODING_MSGPACK and not MSGPACK_AVAILABLE:
+            encoding = ENCODING_JSON
+
+        now = time.monotonic()
+        client_id = client_id or "anonymous"
+
         # 记录连接元数据
         self.connection_meta[websocket] = {
             "type": conn_type,
-            "client_id": client_id or "anonymous",
-            "connected_at": asyncio.get_event_loop().time()
+            "client_id": client_id,
+            "connected_at": now
         }
-        
+
+        state = ConnectionState(
+            websocket=websocket,
+            conn_type=conn_type,
+            client_id=client_id,
+            connected_at=now,
+            encoding=encoding,
+            max_queue_size=self.max_queue_size,
+        )
+        state.writer = asyncio.create_task(self._writer_loop(state))
+        self._states[websocket] = state
+        self._client_index.setdefault(client_id, set()).add(websocket)
+
         print(f"[WebSocket] 新连接: {conn_type} - {client_id}")
-    
+
     def disconnect(self, websocket: WebSocket, conn_type: Optional[str] = None):
         """
         断开WebSocket连接
@@ -66,94 +235,214 @@ class ConnectionManager:
         # 确定连接类型
         if conn_type is None and websocket in self.connection_meta:
             conn_type = self.connection_meta[websocket].get("type")
-        
+
         # 从对应类型中移除
         if conn_type and conn_type in self.connections:
             self.connections[conn_type].discard(websocket)
-        
+
         # 清理元数据
         if websocket in self.connection_meta:
             del self.connection_meta[websocket]
-        
+
+        self._drop_state(websocket)
+
         print(f"[WebSocket] 连接断开: {conn_type}")
-    
+
+    def _drop_state(self, websocket: WebSocket):
+        """释放连接的发送状态、写任务与索引"""
+        state = self._states.pop(websocket, None)
+        if state is None:
+            return
+
+        clients = self._client_index.get(state.client_id)
+        if clients is not None:
+            clients.discard(websocket)
+            if not clients:
+                del self._client_index[state.client_id]
+
+        writer = state.writer
+        if writer is None or writer.done():
+            return
+        try:
+            current = asyncio.current_task()
+        except RuntimeError:
+            current = None
+        if writer is current or current is None or state.idle.is_set():
+            state.queue.clear()
+            state.pending_keys.clear()
+            if writer is not current:
+                writer.cancel()
+            return
+
+        # 正常断开: 写任务先发完已入队(或正在发送)的消息，超时后取消
+        asyncio.ensure_future(self._drain_and_close(state))
+
+    async def _drain_and_close(self, state: ConnectionState):
+        try:
+            await asyncio.wait_for(state.idle.wait(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"[WebSocket] 断开时仍有 {len(state.queue)} 条消息未发送，已丢弃")
+        finally:
+            state.queue.clear()
+            state.pending_keys.clear()
+            if state.writer is not None:
+                state.writer.cancel()
+
+    async def _writer_loop(self, state: ConnectionState):
+        """排空单个连接的出站队列"""
+        websocket = state.websocket
+        try:
+            while True:
+                while not state.queue:
+                    state.idle.set()
+                    state.wakeup.clear()
+                    await state.wakeup.wait()
+
+                frame = state.pop()
+                lag = time.monotonic() - frame.enqueued_at
+                state.last_lag = lag
+                if lag > state.max_lag:
+                    state.max_lag = lag
+
+                if isinstance(frame.payload, bytes):
+                    send = websocket.send_bytes(frame.payload)
+                else:
+                    send = websocket.send_text(frame.payload)
+                await asyncio.wait_for(send, timeout=self.send_timeout)
+
+                state.sent += 1
+                state.bytes_sent += len(frame.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WebSocket] 发送失败，标记断开: {e}")
+            if self._states.get(websocket) is state:
+                self.disconnect(websocket)
+            else:
+                # 断开后的排空阶段发送失败，剩余消息无法送达
+                state.queue.clear()
+                state.pending_keys.clear()
+                state.idle.set()
+
+    def _enqueue(
+        self,
+        targets,
+        message: dict,
+        coalesce_key: Optional[str] = None
+    ) -> int:
+        """将消息编码一次后放入目标连接的出站队列"""
+        now = time.monotonic()
+        encoded: Dict[str, Union[str, bytes]] = {}
+        count = 0
+
+        for websocket in targets:
+            state = self._states.get(websocket)
+            if state is None:
+                continue
+            payload = encoded.get(state.encoding)
+            if payload is None:
+                payload = encoded[state.encoding] = encode_message(message, state.encoding)
+            state.enqueue(payload, now, coalesce_key)
+            count += 1
+
+        return count
+
     async def broadcast(
         self,
         conn_type: str,
         message: dict,
-        exclude: Optional[WebSocket] = None
-    ):
+        exclude: Optional[WebSocket] = None,
+        coalesce_key: Optional[str] = None
+    ) -> int:
         """
         广播消息到指定类型的所有连接
-        
+
         参数:
         - conn_type: 连接类型
         - message: 消息内容
         - exclude: 排除的连接
+        - coalesce_key: 合并键，相同键的未发送消息只保留最新一条(如周期性指标)
+
+        返回:
+        - 入队的连接数
         """
         if conn_type not in self.connections:
-            return
-        
-        disconnected = set()
-        
-        for conn in self.connections[conn_type]:
-            if conn == exclude:
-                continue
-            
-            try:
-                await conn.send_json(message)
-            except Exception as e:
-                # 标记断开的连接
-                disconnected.add(conn)
-                print(f"[WebSocket] 发送失败，标记断开: {e}")
-        
-        # 清理断开的连接
-        if disconnected:
-            self.connections[conn_type] -= disconnected
-            for conn in disconnected:
-                self.connection_meta.pop(conn, None)
-    
-    async def send_to(self, websocket: WebSocket, message: dict):
+            return 0
+
+        targets = [
+            conn for conn in self.connections[conn_type]
+            if conn is not exclude
+        ]
+        return self._enqueue(targets, message, coalesce_key)
+
+    async def send_to(
+        self,
+        websocket: WebSocket,
+        message: dict,
+        coalesce_key: Optional[str] = None
+    ):
         """
         发送消息到指定连接
         """
+        if websocket in self._states:
+            self._enqueue((websocket,), message, coalesce_key)
+            return
+
+        # 未经 connect 注册的连接直接发送
         try:
             await websocket.send_json(message)
         except Exception as e:
             print(f"[WebSocket] 单播失败: {e}")
             # 标记断开
             self.disconnect(websocket)
-    
-    async def send_to_client(self, client_id: str, message: dict):
+
+    async def send_to_client(
+        self,
+        client_id: str,
+        message: dict,
+        coalesce_key: Optional[str] = None
+    ) -> int:
         """
         发送消息到指定客户端
+
+        返回:
+        - 入队的连接数
         """
-        for websocket, meta in self.connection_meta.items():
-            if meta.get("client_id") == client_id:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    print(f"[WebSocket] 发送到客户端失败: {e}")
-    
+        targets = self._client_index.get(client_id)
+        if not targets:
+            return 0
+        return self._enqueue(tuple(targets), message, coalesce_key)
+
     def get_connection_count(self, conn_type: Optional[str] = None) -> int:
         """
         获取连接数量
         """
         if conn_type:
             return len(self.connections.get(conn_type, set()))
-        
+
         return sum(len(conns) for conns in self.connections.values())
-    
+
+    def get_connection_metrics(self) -> List[Dict[str, Any]]:
+        """
+        获取每个连接的发送指标(队列深度、延迟、丢弃数)
+        """
+        now = time.monotonic()
+        return [state.to_dict(now) for state in self._states.values()]
+
     def get_connection_stats(self) -> dict:
         """
         获取连接统计信息
         """
+        states = self._states.values()
         return {
             "total": self.get_connection_count(),
             "by_type": {
                 conn_type: len(conns)
                 for conn_type, conns in self.connections.items()
-            }
+            },
+            "queued": sum(len(s.queue) for s in states),
+            "dropped": sum(s.dropped for s in states),
+            "coalesced": sum(s.coalesced for s in states),
         }
 
 
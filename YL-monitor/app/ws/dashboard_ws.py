@@ -9,6 +9,8 @@ import asyncio
 import psutil
 from datetime import datetime
 
+from app.services.resource_sampler import sample_resources
+
 router = APIRouter()
 
 
@@ -28,7 +30,7 @@ async def dashboard_websocket(websocket: WebSocket):
         while True:
             # 收集系统资源数据
             metrics = {
-                "cpu": psutil.cpu_percent(interval=1),
+                "cpu": sample_resources().cpu_percent,
                 "memory": psutil.virtual_memory().percent,
                 "disk": psutil.disk_usage('/').percent
             }
@@ -38,7 +40,7 @@ async def dashboard_websocket(websocket: WebSocket):
                 "type": "resource_metrics",
                 "data": metrics,
                 "timestamp": datetime.utcnow().isoformat()
-            })
+            }, coalesce_key="resource_metrics")
             
             # 每5秒推送一次
             await asyncio.sleep(5)
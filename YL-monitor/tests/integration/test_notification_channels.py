@@ -179,12 +179,15 @@ class TestAlertServiceIntegration:
         """
         【测试】告警服务初始化
         """
-        from app.services.alert_service import get_alert_service
+        from app.services.alert_service import get_alert_service, close_alert_service
         
         service = get_alert_service()
-        assert service is not None
-        assert hasattr(service, 'check_alerts')
-        assert hasattr(service, '_send_notifications')
+        try:
+            assert service is not None
+            assert hasattr(service, 'check_alerts')
+            assert hasattr(service, '_send_notifications')
+        finally:
+            close_alert_service()
     
     async def test_notification_channel_selection(self):
         """
@@ -338,8 +341,9 @@ async def webhook_service():
 @pytest.fixture
 async def alert_service():
     """告警服务fixture"""
-    from app.services.alert_service import get_alert_service
-    return get_alert_service()
+    from app.services.alert_service import get_alert_service, close_alert_service
+    yield get_alert_service()
+    close_alert_service()
 
 
 @pytest.fixture
@@ -0,0 +1,148 @@
+"""
+中间件微基准 - 对比 BaseHTTPMiddleware 链与纯 ASGI 管线
+
+在进程内通过 httpx.ASGITransport 发送请求，不经过网络，测量中间件开销:
+- legacy: 请求 ID + 访问日志(BaseHTTPMiddleware) + GZipMiddleware
+- pipeline: ASGIPipeline(RequestIDStage, AccessLogStage, CompressionStage)
+
+运行: python -m tests.performance.middleware_benchmark
+"""
+
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.compression import CompressionStage
+from app.middleware.pipeline import ASGIPipeline
+from app.middleware.request_id import AccessLogStage, RequestIDStage
+
+PAYLOAD = {"items": [{"id": i, "name": f"item-{i}", "value": i * 1.5} for i in range(200)]}
+
+
+def _base_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/api/large")
+    async def large():
+        return PAYLOAD
+
+    @app.get("/api/stream")
+    async def stream():
+        async def gen():
+            for i in range(100):
+                yield (f'{{"n": {i}, "pad": "{"x" * 100}"}}\n').encode()
+        return StreamingResponse(gen(), media_type="application/json")
+
+    return app
+
+
+class _LegacyRequestID(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        request.state.request_id = request_id
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+
+class _LegacyAccessLog(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.time()
+        response = await call_next(request)
+        response.headers["X-Response-Time"] = f"{time.time() - start:.3f}"
+        return response
+
+
+def build_legacy_app() -> FastAPI:
+    app = _base_app()
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.add_middleware(_LegacyAccessLog)
+    app.add_middleware(_LegacyRequestID)
+    return app
+
+
+def build_pipeline_app() -> ASGIPipeline:
+    return ASGIPipeline(_base_app(), stages=[
+        RequestIDStage(),
+        AccessLogStage(),
+        CompressionStage(minimum_size=1000),
+    ])
+
+
+async def _measure(app, path: str, iterations: int) -> List[float]:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Accept-Encoding": "gzip"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(20):
+            await client.get(path, headers=headers)
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            response.read()
+            times.append((time.perf_counter() - start) * 1e6)
+    return times
+
+
+def _summary(times: List[float]) -> Dict[str, float]:
+    times = sorted(times)
+    return {
+        'avg_us': round(statistics.mean(times), 1),
+        'p50_us': round(times[len(times) // 2], 1),
+        'p95_us': round(times[int(len(times) * 0.95)], 1),
+    }
+
+
+async def run_benchmark(iterations: int = 2000) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """运行对比测试"""
+    legacy = build_legacy_app()
+    pipeline = build_pipeline_app()
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    for path in ("/api/small", "/api/large", "/api/stream"):
+        results[path] = {
+            'legacy': _summary(await _measure(legacy, path, iterations)),
+            'pipeline': _summary(await _measure(pipeline, path, iterations)),
+        }
+
+    results['pipeline_breakdown'] = {
+        name: {'avg_ms': data['avg_ms'], 'p95_ms': data['p95_ms']}
+        for name, data in pipeline.get_latency_breakdown().items()
+    }
+    return results
+
+
+async def main():
+    results = await run_benchmark()
+    breakdown = results.pop('pipeline_breakdown')
+
+    print("=" * 60)
+    print("中间件微基准 (每请求微秒)")
+    print("=" * 60)
+    for path, data in results.items():
+        legacy, pipeline = data['legacy'], data['pipeline']
+        speedup = legacy['avg_us'] / pipeline['avg_us'] if pipeline['avg_us'] else 0
+        print(f"\n{path}")
+        print(f"  legacy:   avg={legacy['avg_us']:>8}  p50={legacy['p50_us']:>8}  p95={legacy['p95_us']:>8}")
+        print(f"  pipeline: avg={pipeline['avg_us']:>8}  p50={pipeline['p50_us']:>8}  p95={pipeline['p95_us']:>8}")
+        print(f"  提升: {speedup:.2f}x")
+
+    print("\n管线分阶段耗时:")
+    for name, data in breakdown.items():
+        print(f"  {name:<12} avg={data['avg_ms']}ms  p95={data['p95_ms']}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
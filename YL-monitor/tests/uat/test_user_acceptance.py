@@ -368,7 +368,9 @@ class TestAlertNotificationChannels:
     @pytest.fixture
     def alert_service(self):
         """【夹具】创建告警服务"""
-        return AlertService()
+        service = AlertService()
+        yield service
+        service.close()
     
     @pytest.mark.asyncio
     async def test_browser_notification(self, alert_service):
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+告警历史存储单元测试
+
+【功能描述】
+测试告警历史追加写日志、压缩、索引查询与分页
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 索引查询/计数与全量过滤结果一致
+- 原地修改状态后重新登记更新索引
+- 日志重放、压缩与末尾不完整行截断
+- 超出容量淘汰最早记录
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.alert import AlertHistory, AlertLevel, AlertStatus, MetricType
+from app.services.alert_journal import AlertHistoryStore
+
+BASE_TIME = datetime(2026, 10, 18, 8, 0, 0)
+LEVELS = [AlertLevel.INFO, AlertLevel.WARNING, AlertLevel.CRITICAL]
+STATUSES = [AlertStatus.TRIGGERED, AlertStatus.RECOVERED, AlertStatus.ACKNOWLEDGED]
+
+
+def _alert(i: int, minutes: int) -> AlertHistory:
+    return AlertHistory(
+        id=f"alert-{i:04d}",
+        rule_id=f"rule-{i % 4}",
+        rule_name=f"规则{i % 4}",
+        level=LEVELS[i % len(LEVELS)],
+        status=STATUSES[i % len(STATUSES)],
+        metric=MetricType.CPU,
+        threshold=80.0,
+        actual_value=90.0,
+        message="测试",
+        triggered_at=BASE_TIME + timedelta(minutes=minutes),
+    )
+
+
+_stores = []
+
+
+def _make_store(path, **kwargs):
+    kwargs.setdefault("background", False)
+    store = AlertHistoryStore(path, **kwargs)
+    _stores.append(store)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def close_stores():
+    """测试结束后关闭创建的存储"""
+    yield
+    while _stores:
+        _stores.pop().close()
+
+
+@pytest.mark.unit
+class TestAlertHistoryStore:
+    """告警历史存储测试"""
+
+    def test_query_matches_scan(self, tmp_path):
+        """测试索引查询与全量过滤一致"""
+        store = _make_store(tmp_path)
+        rng = random.Random(3)
+        alerts = [_alert(i, rng.randint(0, 600)) for i in range(300)]
+        for alert in alerts:
+            store.put(alert)
+
+        filters = [
+            {},
+            {"rule_id": "rule-1"},
+            {"status": AlertStatus.RECOVERED, "level": AlertLevel.CRITICAL},
+            {"start_time": BASE_TIME + timedelta(minutes=100),
+             "end_time": BASE_TIME + timedelta(minutes=200)},
+            {"rule_id": "rule-2", "start_time": BASE_TIME + timedelta(minutes=500)},
+            {"rule_id": "missing"},
+        ]
+        for f in filters:
+            expected = [
+                a for a in alerts
+                if (not f.get("rule_id") or a.rule_id == f["rule_id"])
+                and (not f.get("status") or a.status == f["status"])
+                and (not f.get("level") or a.level == f["level"])
+                and (not f.get("start_time") or a.triggered_at >= f["start_time"])
+                and (not f.get("end_time") or a.triggered_at <= f["end_time"])
+            ]
+            expected.sort(key=lambda a: a.triggered_at, reverse=True)
+
+            assert store.count(**f) == len(expected)
+            got = store.query(limit=20, offset=5, **f)
+            assert [a.triggered_at for a in got] == [a.triggered_at for a in expected[5:25]]
+
+    def test_reindex_and_replay(self, tmp_path):
+        """测试状态更新后重新登记并重放日志"""
+        store = _make_store(tmp_path)
+        for i in range(10):
+            store.put(_alert(i * 3, i))
+
+        alert = store["alert-0000"]
+        alert.status = AlertStatus.ACKNOWLEDGED
+        alert.acknowledged_by = "admin"
+        store.put(alert)
+        store.flush()
+
+        assert store.count(status=AlertStatus.TRIGGERED) == 9
+        assert store.count(status=AlertStatus.ACKNOWLEDGED) == 1
+
+        # 模拟写入中途崩溃留下的半行
+        with open(store.journal_file, "a", encoding="utf-8") as f:
+            f.write('{"id": "alert-broken"')
+
+        reopened = _make_store(tmp_path)
+        assert len(reopened) == 10
+        assert reopened["alert-0000"].acknowledged_by == "admin"
+        assert reopened.count(status=AlertStatus.TRIGGERED) == 9
+        assert store.journal_file.read_bytes().endswith(b"\n")
+
+    def test_compaction_and_eviction(self, tmp_path):
+        """测试日志压缩与容量淘汰"""
+        store = _make_store(tmp_path, max_records=50, compact_ratio=2.0)
+        for i in range(200):
+            store.put(_alert(i, i))
+            store.flush()
+
+        stats = store.get_stats()
+        assert stats["records"] == 50
+        assert stats["evicted"] == 150
+        assert stats["compactions"] >= 1
+        assert stats["journal_lines"] <= 100
+        assert store.query(limit=1)[0].id == "alert-0199"
+
+        store.compact()
+        assert store.get_stats()["journal_lines"] == 0
+        reopened = _make_store(tmp_path, max_records=50)
+        assert [a.id for a in reopened.values()] == [f"alert-{i:04d}" for i in range(150, 200)]
+
+    def test_background_writer(self, tmp_path):
+        """测试后台线程落盘"""
+        store = AlertHistoryStore(tmp_path, flush_interval=0.01)
+        store.put(_alert(1, 0))
+        store.close()
+
+        assert _make_store(tmp_path).count() == 1
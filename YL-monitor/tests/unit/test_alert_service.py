@@ -30,7 +30,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 
-from app.services.alert_service import AlertService, get_alert_service
+from app.services.alert_service import AlertService, get_alert_service, close_alert_service
 from app.models.alert import (
     AlertRule, AlertHistory, AlertStatus, AlertLevel, 
     MetricType, NotificationChannel, ComparisonOp
@@ -45,7 +45,8 @@ class TestAlertService:
     def alert_service(self, temp_data_dir):
         """创建告警服务实例"""
         service = AlertService(storage_dir=temp_data_dir)
-        return service
+        yield service
+        service.close()
     
     @pytest.fixture
     def sample_rule_data(self):
@@ -623,12 +624,14 @@ class TestAlertService:
         service1 = AlertService(storage_dir=temp_data_dir)
         rule = service1.create_rule(sample_rule_data)
         rule_id = rule.id
+        service1.close()
         
         # 执行 - 创建新服务实例（会触发加载）
         service2 = AlertService(storage_dir=temp_data_dir)
         
         # 验证
         loaded_rule = service2.get_rule(rule_id)
+        service2.close()
         assert loaded_rule is not None
         assert loaded_rule.name == sample_rule_data["name"]
         assert loaded_rule.threshold == sample_rule_data["threshold"]
@@ -657,12 +660,14 @@ class TestAlertService:
         )
         service1._history["alert-001"] = alert
         service1._save_history()
+        service1.close()
         
         # 执行
         service2 = AlertService(storage_dir=temp_data_dir)
         
         # 验证
         history = service2.get_alert_history()
+        service2.close()
         assert len(history) == 1
         assert history[0].id == "alert-001"
 
@@ -671,6 +676,12 @@ class TestAlertService:
 class TestAlertServiceSingleton:
     """告警服务单例测试"""
     
+    @pytest.fixture(autouse=True)
+    def close_singleton(self):
+        """测试结束后关闭全局实例，避免写入线程残留"""
+        yield
+        close_alert_service()
+    
     def test_get_alert_service_singleton(self):
         """
         【测试】获取单例实例
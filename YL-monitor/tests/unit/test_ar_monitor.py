@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AR 监控器节点状态表单元测试
+
+【功能描述】
+测试 AR 监控器的批量心跳接入、增量状态计数、响应缓存与心跳超时调度
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 批量心跳自动注册节点并维护状态计数
+- 节点列表只重建发生变化的节点
+- 心跳超时由截止时间队列触发离线
+- 主动检查的节点不因心跳超时离线
+- 状态字段非法的心跳被拒绝，不影响同批次其他心跳
+- 批量心跳接口支持 gzip 压缩
+- 健康检查间隔随结果稳定性退避/加速，并记录延迟分布
+"""
+
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes.v1 import ar as v1_ar
+from app.services.ar_monitor import ARMonitor
+from app.services.deadline_queue import DeadlineQueue
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    return ARMonitor(config_path=str(tmp_path / "nodes.yaml"))
+
+
+@pytest.mark.unit
+class TestARMonitorNodeTable:
+    """节点状态表测试"""
+
+    def test_batch_ingest_and_counters(self, monitor):
+        """测试批量心跳与状态计数"""
+        heartbeats = [
+            {"node_id": f"gui-{i}", "node_type": "user-gui", "resources": {"cpu": i}}
+            for i in range(50)
+        ]
+        heartbeats += [{"node_id": "backend-1", "status": "busy"}, {"status": "online"}, "bad"]
+        result = monitor.ingest_heartbeats(heartbeats)
+
+        assert result == {"accepted": 51, "registered": 51, "rejected": 2}
+        counts = monitor.get_status_counts()
+        assert counts["online"] == 50
+        assert counts["busy"] == 1
+        assert len(monitor.get_online_nodes()) == 50
+
+        nodes = monitor.get_nodes()
+        assert nodes.total == len(monitor.nodes)
+        assert nodes.online_count == 50
+        views = {n.id: n for n in nodes.nodes}
+        assert views["gui-3"].resources == {"cpu": 3}
+
+        # 只重建发生变化的节点
+        monitor.ingest_heartbeats([{"node_id": "gui-3", "resources": {"cpu": 99}}])
+        again = {n.id: n for n in monitor.get_nodes().nodes}
+        assert again["gui-4"] is views["gui-4"]
+        assert again["gui-3"] is not views["gui-3"]
+        assert again["gui-3"].resources == {"cpu": 99}
+
+        monitor.unregister_node("gui-3")
+        assert monitor.get_nodes().online_count == 49
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_expiry(self, monitor):
+        """测试心跳超时由截止时间队列触发"""
+        clock = _Clock()
+        monitor._deadlines = DeadlineQueue(clock=clock)
+        monitor.ingest_heartbeats([{"node_id": "n1"}, {"node_id": "n2"}])
+        assert monitor.nodes["n1"].passive
+
+        clock.now += 59
+        monitor.update_heartbeat("n2", {})
+        clock.now += 2
+        await monitor._run_due()
+        assert monitor.nodes["n1"].status == "offline"
+        assert monitor.nodes["n2"].status == "online"
+        # 默认配置的两个节点尚未检查，状态为 unknown
+        assert monitor.get_status_counts() == {"unknown": 2, "online": 1, "offline": 1}
+
+        monitor.update_node_heartbeat("n1")
+        assert monitor.nodes["n1"].status == "online"
+        assert monitor._deadlines.next_delay() == pytest.approx(58)
+
+    @pytest.mark.asyncio
+    async def test_probed_node_not_expired(self, monitor):
+        """测试主动检查的节点心跳停止后不标记离线"""
+        clock = _Clock()
+        monitor._deadlines = DeadlineQueue(clock=clock)
+        node = monitor.nodes["ar-backend"]
+        assert not node.passive
+
+        monitor.update_heartbeat("ar-backend", {})
+        assert len(monitor._deadlines) == 0
+
+        # 已在队列中的超时定时同样不改变主动检查节点的状态
+        monitor._schedule(("expire", "ar-backend"), 1)
+        clock.now += node.check_interval * 2 + 1
+        await monitor._run_due()
+        assert node.status == "online"
+
+    def test_invalid_status_rejected(self, monitor):
+        """测试状态字段不是字符串的心跳被拒绝"""
+        result = monitor.ingest_heartbeats([
+            {"node_id": "n1", "status": ["online"]},
+            {"node_id": "n2", "status": {"state": "online"}},
+            {"node_id": "n3", "status": "busy"},
+        ])
+
+        assert result == {"accepted": 1, "registered": 1, "rejected": 2}
+        assert "n1" not in monitor.nodes
+        assert "n2" not in monitor.nodes
+        assert monitor.get_status_counts()["busy"] == 1
+
+
+@pytest.mark.unit
+class TestBatchHeartbeatRoute:
+    """批量心跳接口测试"""
+
+    def test_gzip_batch(self, monitor):
+        """测试 gzip 压缩的批量心跳"""
+        app = FastAPI()
+        app.include_router(v1_ar.router)
+        app.state.ar_monitor = monitor
+        client = TestClient(app)
+
+        body = gzip.compress(json.dumps({"heartbeats": [{"node_id": "a"}, {"node_id": "b"}]}).encode())
+        response = client.post("/ar/heartbeats", content=body, headers={"Content-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.json()["data"]["accepted"] == 2
+
+        response = client.post("/ar/heartbeats", content=json.dumps([{"node_id": "c"}]))
+        assert response.json()["data"]["registered"] == 1
+
+        response = client.post("/ar/heartbeats", content=b"\x00garbage", headers={"Content-Encoding": "gzip"})
+        assert response.status_code == 400
+        assert "c" in monitor.nodes
+
+
+@pytest.mark.unit
+class TestAdaptiveProbing:
+    """自适应健康检查测试"""
+
+    @pytest.mark.asyncio
+    async def test_backoff_and_fast_probe(self, monitor):
+        """测试稳定后退避、状态变化后快速探测"""
+        node = monitor.nodes["ar-backend"]
+        outcomes = iter([True] * 10 + [False] * 3)
+
+        async def fake_check(target):
+            if next(outcomes):
+                target.consecutive_fails = 0
+                monitor._set_status(target, "online")
+            else:
+                target.consecutive_fails += 1
+                if target.consecutive_fails >= target.fail_threshold:
+                    monitor._set_status(target, "offline")
+
+        monitor._check_node = fake_check
+        delays = []
+        for _ in range(13):
+            await monitor._probe_node(node)
+            delays.append(monitor._next_probe_delay(node))
+
+        fast = node.check_interval / monitor.PROBE_FAST_DIVISOR
+        assert delays[:3] == [fast] * 3
+        assert delays[3:6] == [node.check_interval] * 3
+        assert delays[6:9] == [node.check_interval * 2] * 3
+        assert delays[9] == node.check_interval * 4
+        # 失败确认期间与状态变化后快速探测
+        assert delays[10:] == [fast] * 3
+        assert node.status == "offline"
+
+        stats = monitor.get_probe_stats()["ar-backend"]
+        assert stats["count"] == 13
+        assert stats["p50_ms"] <= stats["p99_ms"]
+
+    @pytest.mark.asyncio
+    async def test_gui_check_in_executor(self, monitor):
+        """测试 User GUI 进程检查在线程池中执行"""
+        node = monitor.nodes["user-gui"]
+        await monitor._probe_node(node)
+        assert node.status in ("online", "unknown")
+        assert monitor.get_probe_stats("user-gui")["user-gui"]["count"] == 1
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AR 监控扩展指标存储单元测试
+
+【功能描述】
+测试 AR 设备指标的列式历史存储、按指标索引的告警规则、持续型规则与降采样查询
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 历史指标按列保存并还原为 ARMetrics(含场景ID)
+- 历史容量与查询条数限制
+- 持续型规则在窗口覆盖完整且全部满足时才触发
+- 规则添加/移除维护指标索引
+- 按时间桶降采样取均值
+"""
+
+import pytest
+
+from app.ar.ar_monitor_extension import ARAlertRule, ARMetrics, ARMonitorExtension
+
+
+@pytest.fixture
+def extension():
+    ext = ARMonitorExtension(history_size=100)
+    ext.register_device("hl-001", {"device_type": "HoloLens"})
+    return ext
+
+
+@pytest.mark.unit
+class TestMetricStore:
+    """列式指标存储测试"""
+
+    def test_history_round_trip(self, extension):
+        """测试历史指标还原"""
+        for i in range(150):
+            extension.update_metrics("hl-001", ARMetrics(
+                timestamp=1000.0 + i,
+                fps=float(i),
+                gpu_usage=50.0,
+                scene_id="scene-a" if i % 2 else None,
+            ))
+
+        history = extension.get_device_metrics("hl-001", limit=10)
+        assert len(history) == 10
+        assert [m.fps for m in history] == [float(i) for i in range(140, 150)]
+        assert history[-1].scene_id == "scene-a"
+        assert history[-2].scene_id is None
+        assert history[-1].gpu_usage == 50.0
+        assert history[-1].device_id == "hl-001"
+
+        assert len(extension.get_device_metrics("hl-001", limit=0)) == 100
+        assert extension.get_statistics()["metrics_history_size"] == 100
+        assert extension.get_device_metrics("missing") == []
+        assert not extension.update_metrics("missing", ARMetrics())
+
+    def test_downsample(self, extension):
+        """测试按时间桶降采样"""
+        for i in range(10):
+            extension.update_metrics("hl-001", ARMetrics(timestamp=1000.0 + i, fps=float(i)))
+
+        raw = extension.get_device_history("hl-001", fields=["fps"])
+        assert set(raw) == {"timestamp", "fps"}
+        assert len(raw["fps"]) == 10
+
+        buckets = extension.get_device_history("hl-001", bucket_seconds=5, fields=["fps"])
+        assert buckets["timestamp"] == [1000.0, 1005.0]
+        assert buckets["fps"] == [2.0, 7.0]
+
+        recent = extension.get_device_history("hl-001", seconds=3, bucket_seconds=2, fields=["fps"])
+        assert recent["timestamp"] == [1006.0, 1008.0]
+        assert recent["fps"] == [6.5, 8.5]
+
+        assert extension.get_device_history("missing", fields=["fps"]) == {"timestamp": [], "fps": []}
+
+
+@pytest.mark.unit
+class TestAlertRules:
+    """告警规则测试"""
+
+    def test_sustained_rule(self, extension):
+        """测试持续型规则"""
+        alerts = []
+        extension.add_alert_handler(alerts.append)
+        extension.add_alert_rule(ARAlertRule(
+            "low_fps", "帧率持续过低", "fps", 30, operator="<", cooldown=0, duration=5
+        ))
+
+        # 数据不足 5 秒，不触发
+        for i in range(5):
+            extension.update_metrics("hl-001", ARMetrics(timestamp=1000.0 + i, fps=20))
+        assert alerts == []
+
+        # 窗口覆盖完整且全部低于阈值
+        extension.update_metrics("hl-001", ARMetrics(timestamp=1005.0, fps=20))
+        assert len(alerts) == 1
+        assert alerts[0]["duration"] == 5
+
+        # 窗口内出现一次恢复，不触发
+        extension.update_metrics("hl-001", ARMetrics(timestamp=1006.0, fps=60))
+        extension.update_metrics("hl-001", ARMetrics(timestamp=1007.0, fps=20))
+        assert len(alerts) == 1
+
+    def test_rule_index(self, extension):
+        """测试规则索引维护"""
+        alerts = []
+        extension.add_alert_handler(alerts.append)
+        extension.add_alert_rule(ARAlertRule("hot", "温度过高", "temperature", 40, cooldown=0))
+        extension.add_alert_rule(ARAlertRule("hot", "温度过高", "temperature", 45, cooldown=0))
+        assert len(extension._rules_by_metric["temperature"]) == 1
+
+        extension.update_metrics("hl-001", ARMetrics(temperature=43))
+        assert alerts == []
+        extension.update_metrics("hl-001", ARMetrics(temperature=50))
+        assert [a["rule_id"] for a in alerts] == ["hot"]
+
+        assert extension.remove_alert_rule("hot")
+        assert extension._rules_by_metric == {}
+        assert not extension.remove_alert_rule("hot")
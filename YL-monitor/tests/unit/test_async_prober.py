@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步探测引擎单元测试
+
+【功能描述】
+测试 TCP/HTTP 并发探测、每目标独立超时、结果推送与抖动调度
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- TCP 连接与响应时间、端口关闭错误码
+- 慢目标超时不拖慢其他目标
+- HTTP 探测复用会话
+- 结果推送与持续调度
+- 端口/端点监控跨检查周期复用探测引擎
+- 基础设施采集并发进行
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from app.services.async_prober import AIOHTTP_AVAILABLE, AsyncProber, ProbeTarget
+from app.services.infrastructure_monitor import InfrastructureCollector, PortMonitor
+
+
+async def _start_http_server(delay: float = 0.0):
+    """本地最简 HTTP 服务，返回 (server, port, 连接列表)"""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(asyncio.current_task())
+        try:
+            while True:
+                data = await reader.readuntil(b"\r\n\r\n")
+                if not data:
+                    break
+                await asyncio.sleep(delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n"
+                    b"Connection: keep-alive\r\n\r\nok"
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, port, connections
+
+
+async def _stop_server(server, connections):
+    server.close()
+    for task in connections:
+        task.cancel()
+    await asyncio.gather(*connections, return_exceptions=True)
+
+
+def _closed_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.mark.unit
+class TestAsyncProber:
+    """异步探测引擎测试"""
+
+    @pytest.mark.asyncio
+    async def test_tcp_probe(self):
+        """测试 TCP 探测成功与端口关闭"""
+        server, port, conns = await _start_http_server()
+        prober = AsyncProber(default_timeout=1.0)
+        try:
+            ok, closed = await prober.probe_many([
+                ProbeTarget(name="ok", host="127.0.0.1", port=port),
+                ProbeTarget(name="closed", host="127.0.0.1", port=_closed_port()),
+            ])
+        finally:
+            await _stop_server(server, conns)
+            await prober.close()
+
+        assert ok.healthy and ok.connect_time_ms is not None
+        assert ok.response_time_ms is not None
+        assert not closed.healthy
+        assert closed.error_code is not None
+        assert prober.get_stats()["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_target_timeout(self):
+        """测试慢目标按自身超时结束，不拖慢其他目标"""
+        slow_server, slow_port, slow_conns = await _start_http_server(delay=5.0)
+        fast_server, fast_port, fast_conns = await _start_http_server()
+        prober = AsyncProber(default_timeout=1.0)
+        try:
+            start = time.perf_counter()
+            targets = [
+                ProbeTarget(name="slow", url=f"http://127.0.0.1:{slow_port}/health", timeout=0.2)
+            ] + [
+                ProbeTarget(name=f"fast-{i}", url=f"http://127.0.0.1:{fast_port}/health")
+                for i in range(20)
+            ]
+            results = await prober.probe_many(targets)
+            elapsed = time.perf_counter() - start
+        finally:
+            await _stop_server(slow_server, slow_conns)
+            await _stop_server(fast_server, fast_conns)
+            await prober.close()
+
+        if not AIOHTTP_AVAILABLE:
+            assert all(not r.healthy for r in results)
+            return
+        assert elapsed < 1.0
+        assert results[0].error == "Timeout" and not results[0].healthy
+        assert all(r.healthy and r.status_code == 200 for r in results[1:])
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not AIOHTTP_AVAILABLE, reason="aiohttp 未安装")
+    async def test_http_connection_reuse(self):
+        """测试 HTTP 探测复用 keep-alive 连接"""
+        server, port, conns = await _start_http_server()
+        prober = AsyncProber(concurrency=1)
+        target = ProbeTarget(name="api", url=f"http://127.0.0.1:{port}/health")
+        try:
+            for _ in range(5):
+                assert (await prober.probe(target)).healthy
+        finally:
+            await _stop_server(server, conns)
+            await prober.close()
+        assert len(conns) == 1
+
+    @pytest.mark.asyncio
+    async def test_run_streams_results(self):
+        """测试持续调度并推送结果"""
+        server, port, conns = await _start_http_server()
+        received = []
+
+        async def sink(result):
+            received.append(result.to_metric())
+
+        prober = AsyncProber(interval=0.05, sinks=[sink])
+        task = asyncio.create_task(prober.run([
+            ProbeTarget(name="svc", host="127.0.0.1", port=port, http_path=None)
+        ]))
+        await asyncio.sleep(0.4)
+        await prober.close()
+        await asyncio.wait_for(task, 1.0)
+        await _stop_server(server, conns)
+
+        assert len(received) >= 3
+        assert received[0]["metric_type"] == "probe"
+        assert received[0]["labels"]["healthy"] == "true"
+
+
+@pytest.mark.unit
+class TestPortMonitorAsync:
+    """端口监控并发检查测试"""
+
+    @pytest.mark.asyncio
+    async def test_reuses_prober(self):
+        """测试多次检查复用同一探测引擎"""
+        monitor = PortMonitor(timeout=0.5)
+        monitor.SERVICE_PORTS = {
+            f"svc-{i}": ("127.0.0.1", _closed_port()) for i in range(5)
+        }
+        first = await monitor.monitor_service_ports_async()
+        prober = monitor.prober
+        await monitor.monitor_service_ports_async()
+        await monitor.close()
+
+        assert set(first["ports"]) == set(monitor.SERVICE_PORTS)
+        assert not any(p["connectable"] for p in first["ports"].values())
+        assert monitor.prober is prober
+        assert prober.get_stats()["probes"] == 10
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not AIOHTTP_AVAILABLE, reason="aiohttp 未安装")
+    async def test_endpoint_checks_reuse_connections(self):
+        """测试端点检查跨周期复用连接，结果推送给处理器"""
+        pytest.importorskip("requests")
+        from app.services.application_monitor import APIDetailedMonitor
+
+        server, port, conns = await _start_http_server()
+        received = []
+        monitor = APIDetailedMonitor(prober=AsyncProber(concurrency=1, sinks=[received.append]))
+        try:
+            for _ in range(3):
+                results = await monitor.check_endpoints_async(
+                    f"http://127.0.0.1:{port}", [{"path": "/health"}]
+                )
+                assert results[0]["healthy"]
+        finally:
+            await monitor.close()
+            await _stop_server(server, conns)
+
+        assert len(conns) == 1
+        assert len(received) == 3
+
+
+@pytest.mark.unit
+class TestInfrastructureCollector:
+    """基础设施采集测试"""
+
+    @pytest.mark.asyncio
+    async def test_collect_all_concurrent(self, monkeypatch):
+        """测试端口探测、进程采集与目录扫描并发进行，不阻塞事件循环"""
+        collector = InfrastructureCollector()
+        collector.port_monitor.SERVICE_PORTS = {"svc": ("127.0.0.1", _closed_port())}
+
+        def slow_processes():
+            time.sleep(0.3)
+            return {"services": {}}
+
+        monkeypatch.setattr(collector.process_monitor, "get_all_services_metrics", slow_processes)
+        scan_threads = []
+
+        def scan():
+            scan_threads.append(threading.current_thread())
+            time.sleep(0.2)
+            return {"directories": {}}
+
+        monkeypatch.setattr(collector.filesystem_monitor, "monitor_project_directories", scan)
+
+        ticks = []
+
+        async def count_ticks():
+            while True:
+                await asyncio.sleep(0.01)
+                ticks.append(time.perf_counter())
+
+        counter = asyncio.create_task(count_ticks())
+        try:
+            result = await collector.collect_all()
+        finally:
+            counter.cancel()
+            await collector.close()
+
+        # 进程采集与目录扫描在线程中同时进行，期间事件循环仍在运行
+        assert len(ticks) >= 10
+        assert scan_threads and scan_threads[0] is not threading.main_thread()
+        assert result["filesystem"] == {"directories": {}}
+        assert result["layer"] == "L1_infrastructure"
+        assert result["processes"] == {"services": {}}
+        assert not result["ports"]["ports"]["svc"]["connectable"]
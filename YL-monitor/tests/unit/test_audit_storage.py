@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+审计存储单元测试
+
+【功能描述】
+测试分区审计存储的批量写入、索引查询、免物化统计与审计分析
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 分区存储与内存存储的查询/统计结果一致
+- 时间倒序分页
+- 重启后重建索引
+- 过期分区删除
+- 写入失败的行查询与统计时跳过
+- AuditAnalyzer 基于分组统计的异常检测与报告
+"""
+
+import time
+
+import pytest
+
+from app.middleware import audit
+from app.middleware.audit import (
+    ActionType,
+    AuditAnalyzer,
+    AuditLevel,
+    AuditLogEntry,
+    MemoryAuditStorage,
+    PartitionedAuditStorage,
+)
+
+BASE_TIME = 1_700_000_000.0
+
+
+def _entries(n: int = 200):
+    actions = [ActionType.READ, ActionType.LOGIN, ActionType.EXPORT, ActionType.UPDATE]
+    levels = [AuditLevel.INFO, AuditLevel.ERROR, AuditLevel.SECURITY]
+    return [
+        AuditLogEntry(
+            timestamp=BASE_TIME + i * 60,
+            user_id=f"u{i % 7}",
+            action=actions[i % len(actions)],
+            level=levels[i % len(levels)],
+            ip_address=f"10.0.0.{i % 3}",
+            success=i % 5 != 0,
+        )
+        for i in range(n)
+    ]
+
+
+def _make_storage(path, **kwargs):
+    kwargs.setdefault("background", False)
+    kwargs.setdefault("batch_size", 16)
+    kwargs.setdefault("retention_seconds", 10 ** 10)
+    return PartitionedAuditStorage(str(path), **kwargs)
+
+
+@pytest.mark.unit
+class TestPartitionedAuditStorage:
+    """分区审计存储测试"""
+
+    @pytest.mark.asyncio
+    async def test_matches_memory_storage(self, tmp_path):
+        """测试查询与统计结果与内存存储一致"""
+        storage = _make_storage(tmp_path)
+        memory = MemoryAuditStorage()
+        for entry in _entries():
+            await storage.store(entry)
+            await memory.store(entry)
+
+        assert storage.get_stats()["partitions"] > 1
+
+        filters = [
+            {},
+            {"user_id": "u3"},
+            {"action": ActionType.LOGIN, "level": AuditLevel.ERROR},
+            {"start_time": BASE_TIME + 3000, "end_time": BASE_TIME + 9000},
+            {"start_time": BASE_TIME + 3000, "level": AuditLevel.SECURITY},
+        ]
+        for f in filters:
+            assert await storage.count(**f) == await memory.count(**f)
+            assert await storage.aggregate("ip_address", **f) == \
+                await memory.aggregate("ip_address", **f)
+
+            got = await storage.query(limit=15, offset=5, **f)
+            expected = await memory.query(limit=15, offset=5, **f)
+            assert [e.id for e in got] == [e.id for e in expected]
+
+    @pytest.mark.asyncio
+    async def test_recovery(self, tmp_path):
+        """测试重启后重建索引"""
+        storage = _make_storage(tmp_path)
+        for entry in _entries(50):
+            await storage.store(entry)
+        storage.close()
+
+        reopened = _make_storage(tmp_path)
+        assert await reopened.count() == 50
+        assert await reopened.count(user_id="u1") == 7
+        latest = await reopened.query(limit=1)
+        assert latest[0].timestamp == BASE_TIME + 49 * 60
+        assert latest[0].action == ActionType.LOGIN
+
+    @pytest.mark.asyncio
+    async def test_retention(self, tmp_path):
+        """测试过期分区删除"""
+        storage = _make_storage(tmp_path, retention_seconds=3600)
+        await storage.store(AuditLogEntry(timestamp=time.time() - 7200))
+        await storage.store(AuditLogEntry())
+        storage.flush()
+
+        assert storage.get_stats()["partitions_deleted"] == 1
+        assert await storage.count() == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_write_skipped(self, tmp_path, monkeypatch):
+        """测试写入失败的行不影响后续写入，查询与统计均跳过"""
+        storage = _make_storage(tmp_path)
+        entries = _entries(3)
+        await storage.store(entries[0])
+        storage.flush()
+
+        def failing_open(path, mode="r", *args, **kwargs):
+            if "a" in mode:
+                raise OSError("disk full")
+            return open(path, mode, *args, **kwargs)
+
+        monkeypatch.setattr(audit, "open", failing_open, raising=False)
+        await storage.store(entries[1])
+        storage.flush()
+        monkeypatch.undo()
+
+        await storage.store(entries[2])
+        storage.flush()
+
+        assert storage.get_stats()["write_failed"] == 1
+        got = await storage.query(limit=10)
+        assert [e.id for e in got] == [entries[2].id, entries[0].id]
+
+        assert await storage.count() == 2
+        assert await storage.count(user_id=entries[1].user_id) == 0
+        assert await storage.count(start_time=BASE_TIME, end_time=BASE_TIME + 3600) == 2
+        assert await storage.aggregate("user_id") == {"u0": 1, "u2": 1}
+        assert storage.get_stats()["rows"] == 2
+
+
+@pytest.mark.unit
+class TestAuditAnalyzer:
+    """审计分析测试"""
+
+    @pytest.mark.asyncio
+    async def test_brute_force_and_report(self, tmp_path):
+        """测试登录失败检测与报告统计"""
+        storage = _make_storage(tmp_path)
+        now = time.time()
+        for i in range(12):
+            await storage.store(AuditLogEntry(
+                timestamp=now - i, action=ActionType.LOGIN, level=AuditLevel.ERROR,
+                ip_address="1.2.3.4", success=False
+            ))
+        for i in range(8):
+            await storage.store(AuditLogEntry(timestamp=now - i, user_id=f"u{i % 2}"))
+
+        analyzer = AuditAnalyzer(storage)
+        anomalies = await analyzer.detect_anomalies()
+        brute = [a for a in anomalies if a["type"] == "brute_force"]
+        assert brute and brute[0]["count"] == 12
+
+        report = await analyzer.generate_report(now - 3600, now + 1)
+        assert report["summary"]["total_operations"] == 20
+        assert report["summary"]["active_users"] == 2
+        assert report["summary"]["success_rate"] == pytest.approx(40.0)
+        assert report["action_statistics"] == {"login": 12, "access": 8}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+清理规则索引与单次遍历单元测试
+
+【功能描述】
+测试清理规则预编译、单次遍历匹配、流式模拟运行与限速批量删除
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- glob(含 **) 编译为相对路径正则
+- 年龄/大小/排除条件
+- 匹配的目录整体删除且不再深入
+- 模拟运行流式产出且不删除文件
+- 实际运行删除并汇总结果
+- 消费方提前结束时遍历线程随即停止
+- 限速器按文件数/字节数计算等待时间
+"""
+
+import os
+import time
+
+import pytest
+
+from app.services import cleanup_manager
+from app.services.cleanup_index import CleanupCandidate, RuleIndex, ThroughputBudget, compile_glob, walk_candidates
+from app.services.cleanup_manager import CleanupManager, CleanupRule
+
+OLD = time.time() - 40 * 86400
+
+
+def _touch(path, data=b"x", mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = {
+        "old_tmp": _touch(tmp_path / "a" / "old.tmp", mtime=OLD),
+        "new_tmp": _touch(tmp_path / "a" / "new.tmp"),
+        "important": _touch(tmp_path / "keep.important.tmp", mtime=OLD),
+        "old_log": _touch(tmp_path / "logs" / "app.log", mtime=OLD),
+        "nested_log": _touch(tmp_path / "other" / "logs" / "app.log", mtime=OLD),
+        "rotated": _touch(tmp_path / "logs" / "sub" / "app.log.1", mtime=OLD),
+        "pyc": _touch(tmp_path / "pkg" / "__pycache__" / "m.pyc", mtime=OLD),
+    }
+    cache = tmp_path / "pkg" / "__pycache__"
+    os.utime(cache, (OLD, OLD))
+    files["cache_dir"] = str(cache)
+    return tmp_path, files
+
+
+@pytest.mark.unit
+class TestRuleIndex:
+    """规则索引测试"""
+
+    def test_compile_glob(self):
+        """测试 glob 编译"""
+        regex = compile_glob("logs/**/*.log")
+        assert regex.match("logs/a.log")
+        assert regex.match("logs/x/y/a.log")
+        assert not regex.match("other/logs/a.log")
+        assert not regex.match("logs/a.log.1")
+        assert compile_glob("**/*.tmp").match("a/b/c.tmp")
+        assert compile_glob("**/*.tmp").match("c.tmp")
+
+    def test_single_pass_matching(self, project):
+        """测试单次遍历匹配结果"""
+        root, files = project
+        manager = CleanupManager(project_root=str(root), hash_cache_file=None)
+        index = RuleIndex(manager._cleanup_rules)
+        found = {c.path: c for c in walk_candidates(str(root), index)}
+
+        assert found[files["old_tmp"]].rule == "temp_files"
+        assert found[files["old_log"]].rule == "log_files"
+        assert found[files["rotated"]].rule == "old_logs"
+        assert found[files["cache_dir"]].is_dir
+        assert found[files["cache_dir"]].size == 1
+        # 目录被整体匹配后不再深入
+        assert files["pyc"] not in found
+        for key in ("new_tmp", "important", "nested_log"):
+            assert files[key] not in found
+
+    def test_size_limit(self, tmp_path):
+        """测试超过大小限制的新文件"""
+        path = _touch(tmp_path / "logs" / "big.log", b"x" * (1024 * 1024 + 1))
+        _touch(tmp_path / "logs" / "small.log", b"x" * 1024)
+        rule = CleanupRule(name="big", path_pattern="logs/**/*.log", max_age_days=30, max_size_mb=1)
+        assert [c.path for c in walk_candidates(str(tmp_path), RuleIndex([rule]))] == [path]
+
+    def test_budget(self):
+        """测试限速器"""
+        budget = ThroughputBudget(files_per_sec=100, mb_per_sec=1)
+        assert budget.consume(50, 0) == pytest.approx(0.5, abs=0.05)
+        assert budget.consume(0, 2 * 1024 * 1024) == pytest.approx(2.0, abs=0.05)
+        assert ThroughputBudget().consume(10 ** 6, 10 ** 12) == 0.0
+
+
+@pytest.mark.unit
+class TestStreamCleanup:
+    """流式清理测试"""
+
+    @pytest.mark.asyncio
+    async def test_dry_run_stream(self, project):
+        """测试模拟运行流式产出且不删除"""
+        root, files = project
+        manager = CleanupManager(project_root=str(root), hash_cache_file=None, delete_batch_size=1)
+        items = [item async for item in manager.stream_cleanup(dry_run=True)]
+        assert {item["action"] for item in items} == {"dry_run"}
+        assert len(items) == 4
+        assert all(os.path.exists(item["path"]) for item in items)
+
+    @pytest.mark.asyncio
+    async def test_early_stop(self, tmp_path, monkeypatch):
+        """测试消费方提前结束时不再遍历剩余条目"""
+        walked = []
+
+        def fake_walk(root, index):
+            for i in range(100000):
+                walked.append(i)
+                yield CleanupCandidate(path=f"{root}/{i}.tmp", rule="temp_files", size=1, is_dir=False)
+
+        monkeypatch.setattr(cleanup_manager, "walk_candidates", fake_walk)
+        manager = CleanupManager(project_root=str(tmp_path), hash_cache_file=None, delete_batch_size=10)
+
+        stream = manager.stream_cleanup(dry_run=True)
+        first = await stream.__anext__()
+        assert first["path"].endswith("/0.tmp")
+        await stream.aclose()
+
+        # 队列容量 4 批，停止前最多再遍历几批
+        assert len(walked) < 100
+
+    @pytest.mark.asyncio
+    async def test_run_cleanup(self, project):
+        """测试实际清理与结果汇总"""
+        root, files = project
+        manager = CleanupManager(project_root=str(root), hash_cache_file=None, delete_batch_size=2)
+        results = await manager.run_cleanup()
+
+        assert results["errors"] == []
+        assert results["files_found"] == 4
+        assert results["files_deleted"] == 4
+        assert results["rules_processed"] == 6
+        details = {d["rule"]: d for d in results["details"]}
+        assert details["temp_files"]["files"] == [files["old_tmp"]]
+        assert not os.path.exists(files["cache_dir"])
+        assert os.path.exists(files["new_tmp"])
+        assert os.path.exists(files["important"])
+        assert manager.get_statistics()["total_files_deleted"] == 4
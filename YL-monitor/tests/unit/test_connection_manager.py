@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket连接管理器单元测试
+
+【功能描述】
+测试连接管理器的出站队列、广播与慢客户端隔离
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 广播消息只编码一次
+- 慢客户端不阻塞其他订阅者
+- 队列满时丢弃最旧消息
+- 同键消息合并
+- client_id索引单播
+- 发送失败自动断开
+- 断开前已入队的消息仍会发出，排空有超时
+"""
+
+import pytest
+import asyncio
+import json
+
+from app.ws import connection_manager as cm_module
+from app.ws.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """模拟WebSocket，可选阻塞或失败"""
+
+    def __init__(self, block: bool = False, fail: bool = False):
+        self.sent = []
+        self.block = block
+        self.fail = fail
+        self.release = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.fail:
+            raise ConnectionError("closed")
+        if self.block:
+            await self.release.wait()
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.unit
+class TestConnectionManager:
+    """连接管理器测试"""
+
+    @pytest.mark.asyncio
+    async def test_broadcast_encodes_once(self, monkeypatch):
+        """测试广播只编码一次"""
+        calls = []
+        original = cm_module.encode_message
+
+        def counting(message, encoding="json"):
+            calls.append(encoding)
+            return original(message, encoding)
+
+        monkeypatch.setattr(cm_module, "encode_message", counting)
+
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(5)]
+        for ws in sockets:
+            await manager.connect(ws, "alerts")
+
+        count = await manager.broadcast("alerts", {"type": "alert", "id": 1})
+        await _settle()
+
+        assert count == 5
+        assert calls == ["json"]
+        assert all(ws.sent == [{"type": "alert", "id": 1}] for ws in sockets)
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_block_others(self):
+        """测试慢客户端不影响其他连接"""
+        manager = ConnectionManager()
+        slow = FakeWebSocket(block=True)
+        fast = FakeWebSocket()
+        await manager.connect(slow, "alerts")
+        await manager.connect(fast, "alerts")
+
+        for i in range(3):
+            await manager.broadcast("alerts", {"seq": i})
+        await _settle()
+
+        assert [m["seq"] for m in fast.sent] == [0, 1, 2]
+        assert slow.sent == []
+
+        slow.release.set()
+        await _settle()
+        assert [m["seq"] for m in slow.sent] == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_when_full(self):
+        """测试队列满时丢弃最旧消息"""
+        manager = ConnectionManager(max_queue_size=3)
+        slow = FakeWebSocket(block=True)
+        await manager.connect(slow, "dashboard")
+        await manager.broadcast("dashboard", {"seq": 0})
+        await _settle()  # 第0条已被写任务取出并阻塞
+
+        for i in range(1, 6):
+            await manager.broadcast("dashboard", {"seq": i})
+
+        metrics = manager.get_connection_metrics()[0]
+        assert metrics["queue_depth"] == 3
+        assert metrics["dropped"] == 2
+
+        slow.release.set()
+        await _settle()
+        assert [m["seq"] for m in slow.sent] == [0, 3, 4, 5]
+
+    @pytest.mark.asyncio
+    async def test_coalesce_pending_messages(self):
+        """测试同键消息合并"""
+        manager = ConnectionManager()
+        slow = FakeWebSocket(block=True)
+        await manager.connect(slow, "dashboard")
+        await manager.broadcast("dashboard", {"seq": "first"})
+        await _settle()
+
+        for i in range(4):
+            await manager.broadcast("dashboard", {"cpu": i}, coalesce_key="resource_metrics")
+
+        stats = manager.get_connection_stats()
+        assert stats["queued"] == 1
+        assert stats["coalesced"] == 3
+
+        slow.release.set()
+        await _settle()
+        assert slow.sent == [{"seq": "first"}, {"cpu": 3}]
+
+    @pytest.mark.asyncio
+    async def test_send_to_client_uses_index(self):
+        """测试按client_id单播"""
+        manager = ConnectionManager()
+        target = FakeWebSocket()
+        other = FakeWebSocket()
+        await manager.connect(target, "dag", client_id="exec_1")
+        await manager.connect(other, "dag", client_id="exec_2")
+
+        assert await manager.send_to_client("exec_1", {"progress": 50}) == 1
+        assert await manager.send_to_client("missing", {"progress": 50}) == 0
+        await _settle()
+
+        assert target.sent == [{"progress": 50}]
+        assert other.sent == []
+
+        manager.disconnect(target)
+        assert await manager.send_to_client("exec_1", {"progress": 60}) == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_send_disconnects(self):
+        """测试发送失败后自动断开"""
+        manager = ConnectionManager()
+        broken = FakeWebSocket(fail=True)
+        await manager.connect(broken, "alerts", client_id="c1")
+
+        await manager.broadcast("alerts", {"type": "alert"})
+        await _settle()
+
+        assert manager.get_connection_count("alerts") == 0
+        assert manager.get_connection_metrics() == []
+        assert await manager.send_to_client("c1", {}) == 0
+
+    @pytest.mark.asyncio
+    async def test_disconnect_drains_queued_messages(self):
+        """测试断开前入队的最后一条消息仍会送达"""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "dag", client_id="exec_1")
+
+        await manager.send_to(ws, {"type": "execution_finished"})
+        manager.disconnect(ws, "dag")
+        await _settle()
+
+        assert ws.sent == [{"type": "execution_finished"}]
+        assert manager.get_connection_metrics() == []
+
+    @pytest.mark.asyncio
+    async def test_disconnect_drain_timeout(self):
+        """测试卡住的连接在排空超时后被取消"""
+        manager = ConnectionManager(drain_timeout=0.05)
+        ws = FakeWebSocket(block=True)
+        await manager.connect(ws, "dag", client_id="exec_2")
+
+        await manager.send_to(ws, {"n": 1})
+        await manager.send_to(ws, {"n": 2})
+        await _settle()
+        manager.disconnect(ws, "dag")
+        await asyncio.sleep(0.1)
+
+        ws.release.set()
+        await _settle()
+        assert ws.sent == []
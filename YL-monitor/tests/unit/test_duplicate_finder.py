@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分级重复文件查找器单元测试
+
+【功能描述】
+测试按大小、首尾部分哈希、完整哈希逐级筛选重复文件，以及哈希缓存
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 大小唯一的文件不被读取
+- 首尾相同、中间不同的大文件经完整哈希区分
+- 硬链接只计一次
+- 缓存命中时不重新读取，文件修改后重新计算
+- CleanupManager.find_duplicates 返回结果
+"""
+
+import os
+
+import pytest
+
+from app.services.cleanup_manager import CleanupManager
+from app.services.duplicate_finder import EDGE_SIZE, DuplicateFinder
+
+
+def _write(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    big = os.urandom(3 * EDGE_SIZE)
+    other = bytearray(big)
+    other[EDGE_SIZE + 10] ^= 0xFF
+    return {
+        "root": root,
+        "small_a": _write(root / "a.txt", b"x" * 2048),
+        "small_b": _write(root / "sub" / "b.txt", b"x" * 2048),
+        "unique": _write(root / "unique.txt", b"y" * 4096),
+        "big_a": _write(root / "big_a.bin", big),
+        "big_b": _write(root / "sub" / "big_b.bin", big),
+        "big_mid": _write(root / "big_mid.bin", bytes(other)),
+        "tiny": _write(root / "tiny.txt", b"x"),
+    }
+
+
+@pytest.mark.unit
+class TestDuplicateFinder:
+    """重复文件查找器测试"""
+
+    def test_staged_grouping(self, tree):
+        """测试逐级筛选结果"""
+        finder = DuplicateFinder()
+        groups = finder.find([str(tree["root"])], min_size=1024)
+
+        found = sorted(sorted(g.paths) for g in groups)
+        assert found == sorted([
+            sorted([tree["small_a"], tree["small_b"]]),
+            sorted([tree["big_a"], tree["big_b"]]),
+        ])
+        stats = finder.last_stats
+        assert stats["files"] == 6
+        # unique.txt 大小唯一，不参与哈希
+        assert stats["size_candidates"] == 5
+        assert stats["partial_hashed"] == 5
+        # 只有首尾相同的 3 个大文件需要完整哈希
+        assert stats["full_hashed"] == 3
+
+    def test_hardlinks_counted_once(self, tree):
+        """测试硬链接不视为重复"""
+        os.link(tree["unique"], tree["root"] / "unique_link.txt")
+        groups = DuplicateFinder().find([str(tree["root"])], min_size=1024)
+        assert all(tree["unique"] not in g.paths for g in groups)
+
+    def test_cache(self, tree, tmp_path):
+        """测试哈希缓存持久化与失效"""
+        cache_file = str(tmp_path / "cache.json")
+        DuplicateFinder(cache_file=cache_file).find([str(tree["root"])], min_size=1024)
+        assert os.path.exists(cache_file)
+
+        finder = DuplicateFinder(cache_file=cache_file)
+        groups = finder.find([str(tree["root"])], min_size=1024)
+        assert len(groups) == 2
+        assert finder.last_stats["partial_hashed"] == 0
+        assert finder.last_stats["full_hashed"] == 0
+
+        with open(tree["big_b"], "r+b") as f:
+            f.seek(EDGE_SIZE + 10)
+            f.write(b"changed")
+        groups = finder.find([str(tree["root"])], min_size=1024)
+        assert finder.last_stats["partial_hashed"] == 1
+        assert sorted(sorted(g.paths) for g in groups) == [sorted([tree["small_a"], tree["small_b"]])]
+
+    @pytest.mark.asyncio
+    async def test_cleanup_manager(self, tree, tmp_path):
+        """测试清理管理器查找重复文件"""
+        manager = CleanupManager(
+            project_root=str(tmp_path),
+            hash_cache_file=str(tmp_path / "cache.json")
+        )
+        duplicates = await manager.find_duplicates(["tree", "missing"], min_size_kb=1)
+        assert len(duplicates) == 2
+        for dup in duplicates:
+            assert len(dup.duplicates) == 1
+            assert dup.file_size in (2048, 3 * EDGE_SIZE)
+        assert await manager._calculate_hash(tree["small_a"]) == await manager._calculate_hash(tree["small_b"])
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件总线单元测试
+
+【功能描述】
+测试事件总线的路由索引、通配符订阅、投递队列与批量发布
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- TopicRouter 精确/通配符匹配与缓存失效
+- EventBus 通配符订阅、订阅替换、队列投递、批量发布
+- EnhancedEventBus 优先级顺序、通配符、队列投递、延迟直方图
+"""
+
+import pytest
+import asyncio
+
+from app.services.event_routing import TopicRouter, LatencyHistogram, topic_matches
+from app.services.event_bus import EventBus, Event, EventType
+from app.services.enhanced_event_bus import EnhancedEventBus, EventPriority
+
+
+@pytest.mark.unit
+class TestTopicRouter:
+    """路由索引测试"""
+
+    def test_exact_and_wildcard(self):
+        """测试精确与通配符匹配"""
+        router = TopicRouter()
+        router.add("metric:cpu", "exact")
+        router.add("metric:*", "prefix")
+        router.add("*", "all")
+        router.add("dag.*.completed", "middle")
+
+        assert set(router.match("metric:cpu")) == {"exact", "prefix", "all"}
+        assert set(router.match("metric:memory")) == {"prefix", "all"}
+        assert set(router.match("dag.node.completed")) == {"middle", "all"}
+        assert set(router.match("dag.node.failed")) == {"all"}
+
+    def test_remove_invalidates_cache(self):
+        """测试移除订阅后缓存失效"""
+        router = TopicRouter()
+        router.add("alert:*", "a")
+        assert router.match("alert:triggered") == ("a",)
+
+        assert router.remove("alert:*", "a") is True
+        assert router.match("alert:triggered") == ()
+        assert router.remove("alert:*", "a") is False
+
+    def test_sort_key(self):
+        """测试匹配结果排序"""
+        order = {"low": 3, "high": 1, "mid": 2}
+        router = TopicRouter()
+        router.set_sort_key(order.get)
+        for key in order:
+            router.add("x.y", key)
+        assert router.match("x.y") == ("high", "mid", "low")
+
+    def test_topic_matches(self):
+        """测试单模式匹配与路由语义一致"""
+        assert topic_matches("metric:*", "metric:cpu")
+        assert not topic_matches("metric:*", "metric")
+        assert topic_matches("a.*.c", "a.b.c")
+        assert not topic_matches("a.*.c", "a.b.d")
+
+    def test_histogram(self):
+        """测试延迟直方图"""
+        hist = LatencyHistogram()
+        for _ in range(99):
+            hist.record(0.0004)
+        hist.record(0.2)
+        data = hist.to_dict()
+        assert data["count"] == 100
+        assert data["p50_ms"] == 0.5
+        assert data["p99_ms"] == 0.5
+        assert data["max_ms"] == pytest.approx(200.0)
+
+
+@pytest.mark.unit
+class TestEventBusRouting:
+    """EventBus 路由测试"""
+
+    @pytest.fixture
+    def bus(self):
+        bus = EventBus()
+        bus.clear()
+        yield bus
+        bus.clear()
+
+    @pytest.mark.asyncio
+    async def test_wildcard_subscription(self, bus):
+        """测试通配符订阅"""
+        received = []
+        bus.subscribe(lambda e: received.append(e.type), filter_types=["metric:*"])
+
+        await bus.publish(Event(type=EventType.METRIC_CPU, source="test"))
+        await bus.publish(Event(type=EventType.ALERT_TRIGGERED, source="test"))
+
+        assert received == [EventType.METRIC_CPU]
+
+    @pytest.mark.asyncio
+    async def test_resubscribe_replaces(self, bus):
+        """测试相同标识重复订阅会替换"""
+        calls = []
+        for _ in range(3):
+            bus.subscribe(lambda e: calls.append(1), [EventType.DAG_STARTED], subscriber_id="dup")
+
+        await bus.publish(Event(type=EventType.DAG_STARTED, source="test"))
+        assert calls == [1]
+        assert len(bus.get_subscribers()) == 1
+
+    @pytest.mark.asyncio
+    async def test_queued_subscriber_does_not_block(self, bus):
+        """测试队列订阅者不阻塞发布"""
+        release = asyncio.Event()
+        slow_received = []
+        fast_received = []
+
+        async def slow(event):
+            await release.wait()
+            slow_received.append(event)
+
+        bus.subscribe(slow, [EventType.ALERT_TRIGGERED], subscriber_id="slow", queued=True)
+        bus.subscribe(fast_received.append, [EventType.ALERT_TRIGGERED], subscriber_id="fast")
+
+        results = await asyncio.wait_for(
+            bus.publish(Event(type=EventType.ALERT_TRIGGERED, source="test")), timeout=1
+        )
+
+        assert len(fast_received) == 1
+        assert len(results) == 1
+        assert slow_received == []
+
+        release.set()
+        await bus._subscriber_index["slow"].queue.join(timeout=1)
+        assert len(slow_received) == 1
+
+    @pytest.mark.asyncio
+    async def test_publish_batch(self, bus):
+        """测试批量发布"""
+        received = []
+        bus.subscribe(received.append, [EventType.SCRIPT_COMPLETED])
+
+        events = [Event(type=EventType.SCRIPT_COMPLETED, source=f"s{i}") for i in range(5)]
+        results = await bus.publish_batch(events)
+
+        assert len(results) == 5
+        assert [e.source for e in received] == [f"s{i}" for i in range(5)]
+        assert len(bus.get_history(limit=10)) == 5
+        assert bus.get_dispatch_stats()["script:completed"]["count"] == 5
+
+
+@pytest.mark.unit
+class TestEnhancedEventBusRouting:
+    """EnhancedEventBus 路由测试"""
+
+    def test_priority_order_with_wildcard(self):
+        """测试通配符与精确订阅按优先级合并"""
+        bus = EnhancedEventBus()
+        order = []
+        bus.subscribe("script.*", lambda e: order.append("low"), priority=EventPriority.LOW)
+        bus.subscribe("script.started", lambda e: order.append("high"), priority=EventPriority.HIGH)
+        bus.subscribe("dag.*", lambda e: order.append("dag"))
+
+        bus.emit("script.started", {})
+        assert order == ["high", "low"]
+
+    def test_unsubscribe(self):
+        """测试取消订阅"""
+        bus = EnhancedEventBus()
+        calls = []
+        sid = bus.subscribe("a.b", lambda e: calls.append(e))
+        assert bus.unsubscribe("a.b", sid) is True
+
+        bus.emit("a.b", {})
+        assert calls == []
+
+    def test_emit_batch(self):
+        """测试批量发送"""
+        bus = EnhancedEventBus()
+        calls = []
+        bus.subscribe("metric.*", lambda e: calls.append(e.data))
+
+        ids = bus.emit_batch([
+            {"type": "metric.cpu", "data": 1},
+            {"type": "metric.memory", "data": 2},
+        ])
+
+        assert len(ids) == 2
+        assert calls == [1, 2]
+        assert set(bus.get_dispatch_latency()) == {"metric.cpu", "metric.memory"}
+
+    @pytest.mark.asyncio
+    async def test_queued_handler(self):
+        """测试队列处理器"""
+        bus = EnhancedEventBus()
+        release = asyncio.Event()
+        calls = []
+
+        async def slow(event):
+            await release.wait()
+            calls.append(event.data)
+
+        bus.subscribe("alert.*", slow, subscriber_id="slow", queued=True)
+        await asyncio.wait_for(bus.emit_async("alert.fired", 1), timeout=1)
+        assert calls == []
+
+        release.set()
+        await bus._handler_index[("alert.*", "slow")]["queue"].join(timeout=1)
+        assert calls == [1]
+        assert bus.get_stats()["handled"] == 1
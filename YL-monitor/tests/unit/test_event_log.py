@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段事件日志单元测试
+
+【功能描述】
+测试分段事件日志的追加、滚动、保留、恢复与事件总线重放
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 偏移量分配与按偏移读取
+- 段滚动与稀疏索引定位
+- 按大小保留
+- 末尾不完整记录修复
+- EnhancedEventBus 历史索引、replay 与重启恢复
+- 事件日志写入失败时不分配偏移量
+- 告警 WebSocket 推送带偏移量，重连时按 from_offset 重放
+"""
+
+import pytest
+from datetime import datetime, timedelta
+
+from app.services.event_log import SegmentedEventLog
+from app.services.enhanced_event_bus import EnhancedEventBus
+from app.ws.alerts_ws import AlertsWebSocketManager
+
+
+def _make_log(path, **kwargs):
+    kwargs.setdefault("background", False)
+    kwargs.setdefault("index_interval", 4)
+    return SegmentedEventLog(str(path), **kwargs)
+
+
+@pytest.mark.unit
+class TestSegmentedEventLog:
+    """分段事件日志测试"""
+
+    def test_append_and_read(self, tmp_path):
+        """测试追加与按偏移读取"""
+        log = _make_log(tmp_path)
+        offsets = log.append_many([{"type": "a" if i % 2 else "b", "n": i} for i in range(20)])
+
+        assert offsets == list(range(20))
+        records = log.read(15)
+        assert [r["n"] for r in records] == [15, 16, 17, 18, 19]
+
+        only_a = log.read(0, types=["a"], limit=3)
+        assert [r["n"] for r in only_a] == [1, 3, 5]
+
+    def test_segment_roll(self, tmp_path):
+        """测试段滚动后跨段读取"""
+        log = _make_log(tmp_path, segment_bytes=200, batch_size=1)
+        for i in range(30):
+            log.append({"type": "x", "n": i})
+        log.flush()
+
+        stats = log.get_stats()
+        assert stats["segments"] > 1
+        assert [r["n"] for r in log.read(7, limit=5)] == [7, 8, 9, 10, 11]
+        assert log.read(29)[0]["n"] == 29
+
+    def test_retention_by_size(self, tmp_path):
+        """测试按总大小删除旧段"""
+        log = _make_log(tmp_path, segment_bytes=200, retention_bytes=600, batch_size=1)
+        for i in range(100):
+            log.append({"type": "x", "n": i})
+        log.flush()
+
+        stats = log.get_stats()
+        assert stats["segments_deleted"] > 0
+        assert stats["size_bytes"] <= 600 + 200
+        assert log.first_offset > 0
+        assert log.read(0)[0]["offset"] == log.first_offset
+
+    def test_recovery_truncates_partial_record(self, tmp_path):
+        """测试重启时修复末尾不完整记录并续接偏移"""
+        log = _make_log(tmp_path)
+        log.append_many([{"type": "x", "n": i} for i in range(5)])
+        log.close()
+
+        segment = next(tmp_path.glob("*.log"))
+        with open(segment, "ab") as f:
+            f.write(b'{"offset": 5, "type": "x"')
+
+        reopened = _make_log(tmp_path)
+        assert reopened.next_offset == 5
+        assert reopened.get_stats()["recovered_truncations"] == 1
+        assert reopened.append({"type": "x", "n": 5}) == 5
+        assert [r["n"] for r in reopened.read(0)] == [0, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.unit
+class TestEnhancedEventBusHistory:
+    """事件总线历史与重放测试"""
+
+    def test_history_by_type_and_time(self):
+        """测试按类型索引与时间过滤"""
+        bus = EnhancedEventBus(max_history=5)
+        for i in range(8):
+            bus.emit("metric.cpu" if i % 2 else "script.started", {"n": i})
+
+        cpu = bus.get_history(event_type="metric.cpu")
+        assert [h["data"]["n"] for h in cpu] == [3, 5, 7]
+        assert [h["data"]["n"] for h in bus.get_history(limit=2)] == [6, 7]
+
+        future = datetime.now() + timedelta(hours=1)
+        assert bus.get_history(start_time=future) == []
+
+    def test_replay_from_memory(self):
+        """测试内存重放"""
+        bus = EnhancedEventBus()
+        for i in range(4):
+            bus.emit("a.b" if i < 2 else "c.d", i)
+
+        assert bus.last_offset == 3
+        assert [r["data"] for r in bus.replay(1)] == [1, 2, 3]
+        assert [r["data"] for r in bus.replay(0, types=["c.d"])] == [2, 3]
+
+    def test_replay_past_end(self, tmp_path):
+        """测试已是最新的订阅者不会重复收到事件"""
+        bus = EnhancedEventBus()
+        assert bus.replay(0) == []
+        for i in range(5):
+            bus.emit("a.b", i)
+
+        assert [r["data"] for r in bus.replay(4)] == [4]
+        assert bus.replay(5) == []
+        assert bus.replay(100) == []
+
+        persisted = EnhancedEventBus(max_history=3, enable_persistence=True,
+                                     persistence_dir=str(tmp_path))
+        for i in range(5):
+            persisted.emit("a.b", i)
+        assert persisted.replay(5) == []
+        persisted.close()
+
+    def test_replay_from_log_after_restart(self, tmp_path):
+        """测试重启后从事件日志恢复与重放"""
+        bus = EnhancedEventBus(max_history=3, enable_persistence=True,
+                               persistence_dir=str(tmp_path))
+        for i in range(6):
+            bus.emit("alert.fired", i)
+        bus.close()
+
+        restarted = EnhancedEventBus(max_history=3, enable_persistence=True,
+                                     persistence_dir=str(tmp_path))
+        assert [h["data"] for h in restarted.get_history()] == [3, 4, 5]
+        assert [r["data"] for r in restarted.replay(0)] == [0, 1, 2, 3, 4, 5]
+
+        restarted.emit("alert.fired", 6)
+        assert restarted.last_offset == 6
+        restarted.close()
+
+    def test_log_failure_skips_offset(self, tmp_path):
+        """测试写入事件日志失败时不分配偏移量，偏移量只来自事件日志"""
+        bus = EnhancedEventBus(enable_persistence=True, persistence_dir=str(tmp_path))
+        bus.emit("a.b", 0)
+
+        append = bus._event_log.append
+
+        def failing_append(record):
+            # 日志已分配偏移量后写入失败
+            append(record)
+            raise OSError("disk full")
+
+        bus._event_log.append = failing_append
+        bus.emit("a.b", 1)
+        bus._event_log.append = append
+        bus.emit("a.b", 2)
+
+        assert bus.get_stats()["unrecorded"] == 1
+        assert bus.last_offset == 2
+        assert [h["offset"] for h in bus.get_history()] == [0, 2]
+        assert [r["data"] for r in bus.replay(1)] == [2]
+        assert [h["data"] for h in bus.get_history(event_type="a.b")] == [0, 2]
+        bus.close()
+
+
+class _FakeWebSocket:
+    """记录发送消息的 WebSocket"""
+
+    def __init__(self, query_params=None):
+        self.sent = []
+        self.query_params = query_params or {}
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+class _FakeAlertService:
+    def get_active_alerts(self):
+        return []
+
+    def get_stats(self):
+        return {}
+
+
+@pytest.mark.unit
+class TestAlertsWebSocketReplay:
+    """告警 WebSocket 重放测试"""
+
+    @pytest.mark.asyncio
+    async def test_reconnect_from_offset(self):
+        """测试重连时补齐错过的推送，之后的推送实时送达"""
+        bus = EnhancedEventBus()
+        bus.emit("other.event", {})
+        manager = AlertsWebSocketManager(event_log=bus)
+        manager._alert_service = _FakeAlertService()
+        manager._subscribe_events = lambda: None
+
+        for i in range(3):
+            await manager.publish("alert_triggered", {"n": i})
+
+        ws = _FakeWebSocket()
+        await manager.connect(ws, from_offset=2)
+        assert ws.sent[0]["type"] == "init"
+        assert [(m["offset"], m["data"]["n"]) for m in ws.sent[1:3]] == [(2, 1), (3, 2)]
+        assert ws.sent[3] == {"type": "replay_complete", "data": {"count": 2, "next_offset": 4}}
+
+        await manager.publish("alert_recovered", {"n": 3})
+        assert ws.sent[4]["type"] == "alert_recovered"
+        assert ws.sent[4]["offset"] == 4
+
+        # 已是最新时不重放
+        await manager.handle_message(ws, {"type": "replay", "from_offset": 5})
+        assert ws.sent[5] == {"type": "replay_complete", "data": {"count": 0, "next_offset": 5}}
+
+        await manager.handle_message(ws, {"type": "replay", "from_offset": "x"})
+        assert ws.sent[6]["type"] == "error"
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量文件系统扫描器单元测试
+
+【功能描述】
+测试 scandir 扫描统计、目录 mtime 索引复用、持久化与大文件 top-K
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 统计结果与 os.walk 一致，深度限制
+- 未变化目录复用索引，增删条目后重新列举
+- 索引持久化后增量扫描
+- 大文件 top-K 覆盖整棵树
+"""
+
+import os
+
+import pytest
+
+from app.services.fs_scanner import FilesystemScanner
+from app.services.infrastructure_monitor import FilesystemMonitor
+
+
+def _build_tree(root, dirs=6, files=5):
+    for d in range(dirs):
+        sub = root / f"d{d}" / "inner"
+        sub.mkdir(parents=True)
+        for f in range(files):
+            (root / f"d{d}" / f"f{f}.log").write_bytes(b"x" * (d * 100 + f))
+            (sub / f"g{f}.dat").write_bytes(b"y" * (d * 1000 + f))
+
+
+def _walk_totals(root):
+    files = dirs = size = 0
+    for current, dirnames, filenames in os.walk(root):
+        dirs += len(dirnames)
+        files += len(filenames)
+        size += sum(os.path.getsize(os.path.join(current, name)) for name in filenames)
+    return files, dirs, size
+
+
+@pytest.mark.unit
+class TestFilesystemScanner:
+    """增量文件系统扫描器测试"""
+
+    def test_totals_and_depth(self, tmp_path):
+        """测试统计与 os.walk 一致，深度限制生效"""
+        _build_tree(tmp_path)
+        scanner = FilesystemScanner(workers=4)
+        try:
+            result = scanner.scan(str(tmp_path))
+            assert (result.file_count, result.dir_count, result.total_size) == _walk_totals(tmp_path)
+
+            shallow = scanner.scan(str(tmp_path), max_depth=1)
+            assert (shallow.file_count, shallow.dir_count) == (0, 6)
+        finally:
+            scanner.close()
+
+    def test_incremental_rescan(self, tmp_path):
+        """测试未变化目录复用索引，变化目录重新列举"""
+        _build_tree(tmp_path)
+        scanner = FilesystemScanner(workers=4)
+        try:
+            first = scanner.scan(str(tmp_path))
+            assert first.dirs_scanned == 13 and first.dirs_reused == 0
+
+            second = scanner.scan(str(tmp_path))
+            assert second.dirs_scanned == 0 and second.dirs_reused == 13
+            assert second.total_size == first.total_size
+
+            (tmp_path / "d2" / "new.bin").write_bytes(b"z" * 10)
+            for child in (tmp_path / "d3" / "inner").iterdir():
+                child.unlink()
+            (tmp_path / "d3" / "inner").rmdir()
+
+            third = scanner.scan(str(tmp_path))
+            assert third.dirs_scanned == 2
+            assert (third.file_count, third.dir_count, third.total_size) == _walk_totals(tmp_path)
+            assert scanner.get_stats()["indexed_dirs"] == 12
+        finally:
+            scanner.close()
+
+    def test_persisted_index(self, tmp_path):
+        """测试索引持久化后重启仍增量扫描"""
+        data = tmp_path / "data"
+        data.mkdir()
+        _build_tree(data, dirs=3)
+        index_file = tmp_path / "index.json"
+
+        scanner = FilesystemScanner(index_file=str(index_file))
+        first = scanner.scan(str(data))
+        scanner.close()
+        assert index_file.exists()
+
+        reopened = FilesystemScanner(index_file=str(index_file))
+        second = reopened.scan(str(data))
+        reopened.close()
+        assert second.dirs_scanned == 0
+        assert second.total_size == first.total_size
+
+    def test_large_files_whole_tree(self, tmp_path):
+        """测试大文件 top-K 覆盖整棵树"""
+        _build_tree(tmp_path, dirs=30, files=3)
+        monitor = FilesystemMonitor(index_file=None)
+        try:
+            large = monitor.find_large_files(str(tmp_path), size_threshold_mb=0, limit=5)
+            sizes = sorted(
+                (os.path.getsize(os.path.join(r, n)) for r, _, ns in os.walk(tmp_path) for n in ns),
+                reverse=True
+            )
+            assert [f["size"] for f in large] == sizes[:5]
+            assert large[0]["path"].endswith(os.path.join("d29", "inner", "g2.dat"))
+            assert monitor.find_large_files(str(tmp_path / "missing")) == []
+        finally:
+            monitor.scanner.close()
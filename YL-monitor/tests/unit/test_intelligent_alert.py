@@ -21,9 +21,11 @@ AI Assistant
 - 告警升级（5分钟后自动升级）
 - 恢复检测
 - 策略管理
+- 定时器按截止时间触发合并、升级与去重过期
 """
 
 import pytest
+import pytest_asyncio
 import asyncio
 import time
 from datetime import datetime, timedelta
@@ -36,6 +38,7 @@ from app.services.intelligent_alert import (
     add_intelligent_policy, get_intelligent_stats,
     start_intelligent_alert_service, stop_intelligent_alert_service
 )
+from app.services.deadline_queue import DeadlineQueue
 
 
 @pytest.mark.unit
@@ -152,8 +155,7 @@ class TestIntelligentAlertService:
         
         # 验证
         assert service._running is True
-        assert service._escalation_task is not None
-        assert service._merge_flush_task is not None
+        assert service._timer_task is not None
         
         # 清理
         await service.stop()
@@ -185,13 +187,13 @@ class TestIntelligentAlertService:
         """
         # 准备
         await service.start()
-        original_task = service._escalation_task
+        original_task = service._timer_task
         
         # 执行
         await service.start()  # 再次启动
         
         # 验证
-        assert service._escalation_task is original_task
+        assert service._timer_task is original_task
         
         # 清理
         await service.stop()
@@ -941,3 +943,120 @@ class TestIntelligentAlertConvenience:
         
         # 验证
         assert intelligent_alert_service._running is False
+
+
+
+@pytest.mark.unit
+class TestIntelligentAlertTimers:
+    """智能告警定时器测试"""
+    
+    @pytest_asyncio.fixture
+    async def service(self):
+        """创建并启动服务实例"""
+        service = IntelligentAlertService()
+        await service.start()
+        yield service
+        await service.stop()
+    
+    def _alert(self, alert_id, rule_id="rule-001"):
+        return {
+            "alert_id": alert_id,
+            "rule_id": rule_id,
+            "rule_name": "CPU告警",
+            "level": "warning",
+            "metric_type": "cpu",
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+    
+    def test_deadline_queue(self):
+        """
+        【测试】截止时间队列
+        
+        【场景】重复设定、取消与按时弹出
+        【预期】只弹出到期且未被覆盖/取消的键
+        """
+        now = [100.0]
+        queue = DeadlineQueue(clock=lambda: now[0])
+        queue.schedule_in("a", 10)
+        queue.schedule_in("b", 5)
+        queue.schedule_in("a", 1)
+        queue.schedule_in("c", 2)
+        queue.cancel("c")
+        
+        assert queue.next_delay() == 1
+        now[0] = 106.0
+        assert [key for key, _ in queue.pop_due()] == ["a", "b"]
+        assert len(queue) == 0
+        assert queue.next_deadline() is None
+    
+    def test_policy_index(self):
+        """
+        【测试】规则 -> 策略索引
+        
+        【场景】多个策略关联同一规则，移除后回退
+        【预期】先添加的策略优先，未关联规则使用默认策略
+        """
+        service = IntelligentAlertService()
+        service.add_policy(IntelligentAlertPolicy(policy_id="p1", name="p1", rule_ids=["rule-1"]))
+        service.add_policy(IntelligentAlertPolicy(
+            policy_id="p2", name="p2", rule_ids=["rule-1", "rule-2"]
+        ))
+        
+        assert service._get_policy_for_rule("rule-1").policy_id == "p1"
+        assert service._get_policy_for_rule("rule-2").policy_id == "p2"
+        assert service._get_policy_for_rule("rule-3").policy_id == "default"
+        
+        service.remove_policy("p1")
+        assert service._get_policy_for_rule("rule-1").policy_id == "p2"
+    
+    @pytest.mark.asyncio
+    async def test_merge_window_closes_on_time(self, service):
+        """
+        【测试】合并窗口到期自动发送
+        
+        【场景】窗口内收到多条同类告警，不手动刷新
+        【预期】首条立即返回，窗口结束后发送一条合并告警
+        """
+        service.add_policy(IntelligentAlertPolicy(
+            policy_id="p", name="p", rule_ids=["rule-001"],
+            dedup_enabled=False, merge_window=0.05, escalate_enabled=False
+        ))
+        received = []
+        service.on_alert(received.append)
+        
+        assert await service.process_alert(self._alert("a1")) is not None
+        assert await service.process_alert(self._alert("a2")) is None
+        assert await service.process_alert(self._alert("a3")) is None
+        
+        await asyncio.sleep(0.2)
+        
+        assert len(received) == 1
+        assert received[0]["type"] == "merged_alert"
+        assert received[0]["alert_count"] == 3
+        assert service._merge_cache == {}
+    
+    @pytest.mark.asyncio
+    async def test_escalation_and_dedup_expiry(self, service):
+        """
+        【测试】升级期限与去重过期
+        
+        【场景】告警未确认，升级期限很短
+        【预期】逐级升级到最高级别；去重记录在窗口结束时移除；确认后不再升级
+        """
+        service.add_policy(IntelligentAlertPolicy(
+            policy_id="p", name="p", rule_ids=["rule-001", "rule-002"],
+            dedup_window=0.05, merge_enabled=False, escalate_time=0.05
+        ))
+        
+        await service.process_alert(self._alert("a1"))
+        await service.process_alert(self._alert("a2", rule_id="rule-002"))
+        service.acknowledge_alert("a2")
+        assert len(service._dedup_cache) == 2
+        
+        await asyncio.sleep(0.3)
+        
+        assert service._active_alerts["a1"]["level"] == "critical"
+        assert service._active_alerts["a2"]["level"] == "warning"
+        assert service._stats["escalated_count"] == 2
+        assert service._dedup_cache == {}
+        assert service.get_stats()["pending_timers"] == 0
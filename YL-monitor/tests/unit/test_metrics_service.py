@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标服务单元测试
+
+【功能描述】
+测试指标服务的时间索引历史环、JSONL 追加持久化与独立采集线程
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 历史环按条数/时间从队首淘汰，范围查询按时间正序返回最新条目
+- 每条样本追加一行，重启后加载，不完整行被跳过
+- 行数超过上限两倍时压缩
+- 采集线程按间隔采集并可停止
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.metrics_service import MetricsService
+from app.services.ring_buffer import TimeIndexedRing
+
+
+@pytest.mark.unit
+class TestTimeIndexedRing:
+    """时间索引历史环测试"""
+
+    def test_expiry_and_range(self):
+        """测试淘汰与范围查询"""
+        ring = TimeIndexedRing(max_items=5, max_age=10)
+        for i in range(8):
+            ring.append(100.0 + i, i)
+        assert len(ring) == 5
+        assert ring.range() == [3, 4, 5, 6, 7]
+        assert ring.range(start=104.0, end=106.0) == [4, 5, 6]
+        assert ring.range(limit=2) == [6, 7]
+        assert ring.latest() == 7
+
+        assert ring.expire(115.0) == 2
+        assert ring.range() == [5, 6, 7]
+        ring.append(130.0, 8)
+        assert ring.range() == [8]
+
+
+@pytest.mark.unit
+class TestMetricsService:
+    """指标服务测试"""
+
+    def test_append_and_reload(self, tmp_path):
+        """测试追加写入与重启加载"""
+        service = MetricsService(storage_dir=tmp_path, collection_interval=5)
+        for _ in range(3):
+            service.collect_once()
+        service.stop_collection()
+
+        lines = (tmp_path / "metrics.jsonl").read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 3
+        assert json.loads(lines[-1])["cpu"]["percent"] >= 0
+
+        with open(tmp_path / "metrics.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"timestamp": "2026-')
+
+        reloaded = MetricsService(storage_dir=tmp_path, collection_interval=5)
+        assert len(reloaded.get_metrics_history(limit=None)) == 3
+        assert reloaded.get_current_metrics() == json.loads(lines[-1])
+
+        start = datetime.utcnow() - timedelta(minutes=5)
+        assert len(reloaded.get_metrics_history(start_time=start, limit=2)) == 2
+        assert reloaded.get_metrics_summary()["data_points"] == 3
+
+    def test_compaction(self, tmp_path):
+        """测试行数超过上限两倍时压缩"""
+        service = MetricsService(storage_dir=tmp_path, collection_interval=1200)
+        assert service.max_history_items == 3
+        for _ in range(7):
+            service.collect_once()
+        service.stop_collection()
+
+        lines = (tmp_path / "metrics.jsonl").read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 3
+        assert not (tmp_path / "metrics.jsonl.tmp").exists()
+
+    def test_collection_thread(self, tmp_path):
+        """测试采集线程按间隔采集并可停止"""
+        service = MetricsService(storage_dir=tmp_path, collection_interval=0.05)
+        service.start_collection()
+        deadline = time.monotonic() + 2
+        while len(service.get_metrics_history(limit=None)) < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        service.stop_collection()
+
+        assert len(service.get_metrics_history(limit=None)) >= 3
+        assert service._thread is None
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+纯 ASGI 中间件管线单元测试
+
+【功能描述】
+测试管线阶段顺序、短路响应、流式压缩、预压缩静态资源、审计与安全阶段
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 阶段响应头由内向外修改，短路响应仍经过外层阶段
+- gzip 流式压缩与小响应跳过
+- 预压缩静态文件直接返回
+- 审计阶段读取请求体后下游仍可读取
+- 安全阶段拦截并添加安全头
+- 分阶段耗时统计
+"""
+
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.audit import AuditStage, MemoryAuditStorage
+from app.middleware.compression import CompressionStage
+from app.middleware.pipeline import ASGIPipeline
+from app.middleware.rate_limit import RateLimitConfig, RateLimitStage
+from app.middleware.request_id import AccessLogStage, RequestIDStage
+from app.middleware.security import SecurityConfig, SecurityStage
+
+
+def _make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/items")
+    async def items(request: Request):
+        return {"request_id": getattr(request.state, "request_id", None), "items": ["x" * 20] * 100}
+
+    @app.get("/api/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/api/stream")
+    async def stream():
+        async def gen():
+            for i in range(50):
+                yield f"line-{i}-{'y' * 40}\n".encode()
+        return StreamingResponse(gen(), media_type="text/plain")
+
+    @app.post("/api/echo")
+    async def echo(request: Request):
+        return await request.json()
+
+    return app
+
+
+@pytest.mark.unit
+class TestASGIPipeline:
+    """管线测试"""
+
+    def test_request_id_and_short_circuit(self):
+        """测试短路响应仍带外层阶段的响应头"""
+        pipeline = ASGIPipeline(_make_app(), stages=[
+            RequestIDStage(),
+            AccessLogStage(),
+            RateLimitStage(path_configs={"/api/": RateLimitConfig(requests=2, seconds=60)}),
+        ])
+        client = TestClient(pipeline)
+
+        first = client.get("/api/items", headers={"X-Request-ID": "abc"})
+        assert first.json()["request_id"] == "abc"
+        assert first.headers["X-Request-ID"] == "abc"
+        assert first.headers["X-RateLimit-Remaining"] == "1"
+        assert "X-Response-Time" in first.headers
+
+        client.get("/api/items")
+        limited = client.get("/api/items")
+        assert limited.status_code == 429
+        assert "X-Request-ID" in limited.headers
+
+        breakdown = pipeline.get_latency_breakdown()
+        assert breakdown["total"]["count"] == 3
+        assert breakdown["rate_limit"]["count"] == 3
+        assert breakdown["app"]["count"] == 2
+
+    def test_gzip_compression(self):
+        """测试整体与流式压缩"""
+        client = TestClient(ASGIPipeline(_make_app(), stages=[CompressionStage(minimum_size=100)]))
+
+        response = client.get("/api/items", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["items"]) == 100
+
+        streamed = client.get("/api/stream", headers={"Accept-Encoding": "gzip"})
+        assert streamed.headers["content-encoding"] == "gzip"
+        assert "content-length" not in streamed.headers
+        assert streamed.text.count("\n") == 50
+
+        small = client.get("/api/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+        assert small.text == "ok"
+
+        plain = client.get("/api/items", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+    def test_precompressed_static(self, tmp_path):
+        """测试预压缩静态资源"""
+        (tmp_path / "app.js").write_text("console.log(1);")
+        (tmp_path / "app.js.gz").write_bytes(gzip.compress(b"console.log(1);"))
+
+        stage = CompressionStage(static_prefix="/static", static_directory=str(tmp_path))
+        client = TestClient(ASGIPipeline(_make_app(), stages=[stage]))
+
+        response = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == "console.log(1);"
+
+        escaped = client.get("/static/../app.js", headers={"Accept-Encoding": "gzip"})
+        assert escaped.status_code == 404
+
+    def test_audit_replays_body(self):
+        """测试审计读取请求体后下游仍可读取"""
+        storage = MemoryAuditStorage()
+        client = TestClient(ASGIPipeline(_make_app(), stages=[
+            AuditStage(storage=storage, log_request_body=True),
+        ]))
+
+        response = client.post("/api/echo", json={"name": "a", "password": "secret"})
+        assert response.json() == {"name": "a", "password": "secret"}
+
+        entry = storage._entries[-1]
+        assert entry.response_status == 200
+        assert entry.response_size == len(response.content)
+        assert '"***"' in entry.request_body
+
+    def test_security_stage(self):
+        """测试安全阶段拦截与安全头"""
+        config = SecurityConfig(enable_csrf_protection=False)
+        client = TestClient(ASGIPipeline(_make_app(), stages=[SecurityStage(config)]))
+
+        ok = client.get("/api/small")
+        assert ok.headers["X-Frame-Options"] == "DENY"
+
+        blocked = client.get("/api/small", params={"q": "1' OR '1'='1"})
+        assert blocked.status_code == 400
+        assert blocked.json()["detail"] == "检测到非法输入"
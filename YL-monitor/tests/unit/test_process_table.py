@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享进程表快照单元测试
+
+【功能描述】
+测试进程表单次扫描、索引查询、快照复用与 CPU 增量计算
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 快照在有效期内复用，过期后重新扫描
+- 按 pid/进程名/命令行查找当前进程
+- CPU 使用率由两次快照的 CPU 时间差计算
+- 内存 top-N 与服务进程查找使用共享快照
+"""
+
+import os
+import time
+
+import psutil
+import pytest
+
+from app.services.infrastructure_monitor import ProcessMonitor
+from app.services.process_table import ProcessTable
+
+
+@pytest.mark.unit
+class TestProcessTable:
+    """进程表快照测试"""
+
+    def test_snapshot_reuse(self):
+        """测试有效期内复用快照"""
+        table = ProcessTable(min_interval=60)
+        first = table.snapshot()
+        assert table.snapshot() is first
+        assert table.get_stats()["scans"] == 1
+
+        fresh = table.snapshot(max_age=0)
+        assert fresh is not first
+        assert table.get_stats()["scans"] == 2
+
+    def test_indexes(self):
+        """测试按 pid/进程名/命令行查找"""
+        snapshot = ProcessTable().snapshot()
+        me = snapshot.get(os.getpid())
+        assert me is not None
+        assert me.name == psutil.Process().name()
+        assert me in snapshot.find_by_name(me.name)
+
+        pattern = psutil.Process().cmdline()[-1]
+        assert os.getpid() in [p.pid for p in snapshot.find_by_cmdline(pattern)]
+        assert snapshot.find_by_cmdline("no-such-process-pattern-xyz") == []
+        assert snapshot.find_first(["no-such-keyword-xyz"]) is None
+
+        top = snapshot.top(3)
+        assert [p.memory_percent for p in top] == sorted(
+            (p.memory_percent for p in snapshot.processes.values()), reverse=True
+        )[:3]
+
+    def test_cpu_delta(self):
+        """测试 CPU 使用率按快照增量计算"""
+        table = ProcessTable()
+        table.snapshot(max_age=0)
+        deadline = time.process_time() + 0.3
+        while time.process_time() < deadline:
+            pass
+        me = table.snapshot(max_age=0).get(os.getpid())
+        assert me.cpu_percent > 20
+
+    def test_process_monitor_uses_snapshot(self):
+        """测试服务进程查找共用快照"""
+        table = ProcessTable(min_interval=60)
+        monitor = ProcessMonitor(table=table)
+        for service in monitor.SERVICE_PATTERNS:
+            assert isinstance(monitor.find_service_pids(service), list)
+        assert monitor.find_service_pids("unknown-service") == []
+        assert table.get_stats()["scans"] == 1
+
+        metrics = monitor.collect_process_metrics(os.getpid())
+        assert metrics is not None and metrics.pid == os.getpid()
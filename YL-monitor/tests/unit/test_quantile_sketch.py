@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分位数草图单元测试
+
+【功能描述】
+测试对数分桶分位数草图的精度、合并与时间分槽滑动窗口
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 分位数相对误差在设定范围内
+- 草图合并与整体记录结果一致
+- 零值与空草图
+- 滑动窗口整槽过期
+"""
+
+import random
+
+import pytest
+
+from app.services.quantile_sketch import QuantileSketch, WindowedSketch
+
+
+def _exact(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.unit
+class TestQuantileSketch:
+    """分位数草图测试"""
+
+    def test_relative_accuracy(self):
+        """测试分位数误差不超过相对精度"""
+        rng = random.Random(11)
+        values = [rng.lognormvariate(3, 1.5) for _ in range(20000)]
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for v in values:
+            sketch.add(v)
+
+        for q, estimate in zip((0.5, 0.95, 0.99), sketch.quantiles((0.5, 0.95, 0.99))):
+            exact = _exact(values, q)
+            assert abs(estimate - exact) <= exact * 0.01 + 1e-9
+            assert sketch.quantile(q) == estimate
+        assert sketch.count == len(values)
+        assert sketch.mean == pytest.approx(sum(values) / len(values))
+        assert sketch.min == min(values) and sketch.max == max(values)
+
+    def test_merge(self):
+        """测试合并后与整体记录一致"""
+        rng = random.Random(5)
+        a, b, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for i in range(3000):
+            v = rng.uniform(0, 500) if i % 2 else rng.uniform(100, 2000)
+            (a if i % 3 else b).add(v)
+            whole.add(v)
+
+        merged = a.copy()
+        merged.merge(b)
+        assert merged.bins == whole.bins
+        assert merged.quantiles((0.5, 0.99)) == whole.quantiles((0.5, 0.99))
+        with pytest.raises(ValueError):
+            merged.merge(QuantileSketch(relative_accuracy=0.05))
+
+    def test_zero_and_empty(self):
+        """测试零值与空草图"""
+        assert QuantileSketch().quantiles((0.5, 0.99)) == [0.0, 0.0]
+
+        sketch = QuantileSketch()
+        for _ in range(90):
+            sketch.add(0.0)
+        for _ in range(10):
+            sketch.add(100.0)
+        assert sketch.quantile(0.5) == 0.0
+        assert sketch.quantile(0.99) == pytest.approx(100.0, rel=0.01)
+
+
+@pytest.mark.unit
+class TestWindowedSketch:
+    """滑动窗口草图测试"""
+
+    def test_slots_expire(self):
+        """测试窗口滑动时整槽丢弃"""
+        now = [0.0]
+        window = WindowedSketch(window_seconds=10, slots=5, clock=lambda: now[0])
+
+        for _ in range(10):
+            window.add(1.0)
+        now[0] = 5.0
+        for _ in range(10):
+            window.add(50.0)
+        assert window.snapshot().count == 20
+
+        # 第一个槽(0~2 秒)滑出窗口
+        now[0] = 10.5
+        snapshot = window.snapshot()
+        assert snapshot.count == 10
+        assert snapshot.min == 50.0
+
+        # 槽位复用时旧数据被覆盖
+        now[0] = 15.0
+        window.add(7.0)
+        assert window.snapshot().count == 1
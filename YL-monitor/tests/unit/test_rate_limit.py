@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求限流中间件单元测试
+
+【功能描述】
+测试 GCRA 限流判定、路径规则匹配、后端存储与中间件前置拦截
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- GCRA 配额消耗与恢复
+- 最长前缀优先的规则匹配
+- 内存后端 LRU 上限与空闲键淘汰
+- 存储已满时不淘汰仍在限流中的键，改用粗粒度键计数
+- SQLite 共享后端
+- 超限请求不执行下游处理
+- 默认按路径计数，group_by_rule 时同一规则共享配额
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.rate_limit import (
+    RateLimitMiddleware,
+    RateLimitConfig,
+    MemoryRateLimitBackend,
+    SQLiteRateLimitBackend,
+    PathRuleMatcher,
+    gcra_decide,
+)
+
+
+@pytest.mark.unit
+class TestGCRA:
+    """GCRA 判定测试"""
+
+    def test_burst_then_reject(self):
+        """测试突发配额耗尽后拒绝"""
+        config = RateLimitConfig(requests=3, seconds=60)
+        tat, now = 0.0, 1000.0
+        remaining = []
+        for _ in range(3):
+            decision, tat = gcra_decide(tat, now, config)
+            assert decision.allowed
+            remaining.append(decision.remaining)
+        assert remaining == [2, 1, 0]
+
+        decision, _ = gcra_decide(tat, now, config)
+        assert not decision.allowed
+        assert decision.retry_after == pytest.approx(20.0)
+
+    def test_refill(self):
+        """测试按速率恢复配额"""
+        config = RateLimitConfig(requests=2, seconds=10)
+        tat = 0.0
+        for _ in range(2):
+            _, tat = gcra_decide(tat, 100.0, config)
+        assert not gcra_decide(tat, 100.0, config)[0].allowed
+        assert gcra_decide(tat, 105.0, config)[0].allowed
+
+
+@pytest.mark.unit
+class TestPathRuleMatcher:
+    """路径规则匹配测试"""
+
+    def test_longest_prefix_wins(self):
+        """测试最长前缀优先"""
+        matcher = PathRuleMatcher(RateLimitMiddleware.PATH_CONFIGS, RateLimitConfig())
+        assert matcher.match("/api/scripts/run/abc")[0] == "/api/scripts/run"
+        assert matcher.match("/api/dag/run")[0] == "/api/dag/run"
+        assert matcher.match("/api/metrics")[0] == "/api/"
+        assert matcher.match("/static/app.js")[0] == "*"
+
+
+@pytest.mark.unit
+class TestBackends:
+    """限流存储测试"""
+
+    def test_memory_lru_bound(self):
+        """测试内存后端键数量上限"""
+        backend = MemoryRateLimitBackend(max_keys=10)
+        config = RateLimitConfig(requests=5, seconds=60)
+        for i in range(50):
+            backend.acquire(f"ip{i}", config, 1000.0)
+        assert len(backend) == 10
+
+    def test_memory_idle_eviction(self):
+        """测试空闲键淘汰"""
+        backend = MemoryRateLimitBackend(sweep_every=1)
+        config = RateLimitConfig(requests=5, seconds=60)
+        for i in range(20):
+            backend.acquire(f"ip{i}", config, 1000.0)
+        backend.acquire("late", config, 5000.0)
+        assert len(backend) == 1
+
+    def test_memory_full_keeps_throttled_keys(self):
+        """测试存储已满时不能通过大量不同路径重置配额"""
+        backend = MemoryRateLimitBackend(max_keys=10)
+        config = RateLimitConfig(requests=2, seconds=60)
+        for _ in range(2):
+            assert backend.acquire("ip:/api/a", config, 1000.0, "ip:/api/").allowed
+        assert not backend.acquire("ip:/api/a", config, 1000.0, "ip:/api/").allowed
+
+        # 存储已满后新路径改用 ip:规则 键计数，同样会被限流
+        sprayed = [
+            backend.acquire(f"ip:/api/p{i}", config, 1000.0, "ip:/api/").allowed
+            for i in range(30)
+        ]
+        assert sprayed[:9] == [True] * 9
+        assert sprayed[9:11] == [True, True]
+        assert not any(sprayed[11:])
+        assert len(backend) == 10
+        assert not backend.acquire("ip:/api/a", config, 1000.0, "ip:/api/").allowed
+
+        # 有键恢复后淘汰已恢复的键，新键重新按路径计数
+        assert backend.acquire("ip:/api/new", config, 1031.0, "ip:/api/").allowed
+        assert len(backend) < 10
+        assert "ip:/api/new" in backend._entries
+
+    def test_sqlite_shared_state(self, tmp_path):
+        """测试 SQLite 后端跨实例共享"""
+        path = str(tmp_path / "rl.db")
+        config = RateLimitConfig(requests=2, seconds=60)
+        a = SQLiteRateLimitBackend(path)
+        b = SQLiteRateLimitBackend(path)
+
+        assert a.acquire("k", config, 1000.0).allowed
+        assert b.acquire("k", config, 1000.0).allowed
+        assert not a.acquire("k", config, 1000.0).allowed
+        assert len(b) == 1
+
+
+@pytest.mark.unit
+class TestRateLimitMiddleware:
+    """中间件测试"""
+
+    def test_rejects_before_handler(self):
+        """测试超限请求不执行下游处理"""
+        calls = []
+        app = FastAPI()
+
+        @app.post("/api/dag/run")
+        async def run_dag():
+            calls.append(1)
+            return {"ok": True}
+
+        app.add_middleware(RateLimitMiddleware)
+        client = TestClient(app)
+
+        statuses = [client.post("/api/dag/run").status_code for _ in range(7)]
+
+        assert statuses == [200] * 5 + [429] * 2
+        assert len(calls) == 5
+
+        response = client.post("/api/dag/run")
+        assert response.headers["X-RateLimit-Remaining"] == "0"
+        assert int(response.headers["Retry-After"]) >= 1
+
+    def test_per_path_keys(self):
+        """测试默认按路径计数，group_by_rule 时同一规则下的路径共享配额"""
+        app = FastAPI()
+
+        @app.get("/api/{name}")
+        async def api(name: str):
+            return {"name": name}
+
+        @app.get("/grouped/{name}")
+        async def grouped(name: str):
+            return {"name": name}
+
+        app.add_middleware(
+            RateLimitMiddleware,
+            path_configs={
+                "/api/": RateLimitConfig(requests=2, seconds=60),
+                "/grouped/": RateLimitConfig(requests=2, seconds=60, group_by_rule=True),
+            },
+        )
+        client = TestClient(app)
+
+        assert [client.get("/api/a").status_code for _ in range(3)] == [200, 200, 429]
+        assert client.get("/api/b").status_code == 200
+
+        assert client.get("/grouped/a").status_code == 200
+        assert client.get("/grouped/b").status_code == 200
+        assert client.get("/grouped/c").status_code == 429
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量式系统资源采样器单元测试
+
+【功能描述】
+测试基于计数增量的 CPU 使用率与网络/磁盘速率计算
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 采样不阻塞，快照在有效期内复用
+- CPU 使用率按 cpu_times 增量计算
+- 网络/磁盘速率按计数差除以间隔，计数回绕按 0 处理
+"""
+
+import time
+from collections import namedtuple
+from unittest.mock import patch
+
+import pytest
+
+from app.services.resource_sampler import ResourceSampler
+
+CpuTimes = namedtuple("CpuTimes", "user system idle iowait")
+NetIO = namedtuple("NetIO", "bytes_sent bytes_recv")
+DiskIO = namedtuple("DiskIO", "read_bytes write_bytes")
+
+
+class _FakeCounters:
+    """可控的 psutil 计数器"""
+
+    def __init__(self):
+        self.cpu = [CpuTimes(10.0, 5.0, 85.0, 0.0), CpuTimes(20.0, 0.0, 80.0, 0.0)]
+        self.net = NetIO(1000, 2000)
+        self.disk = DiskIO(0, 0)
+
+    def patches(self):
+        return (
+            patch("psutil.cpu_times", lambda percpu=False: list(self.cpu)),
+            patch("psutil.net_io_counters", lambda: self.net),
+            patch("psutil.disk_io_counters", lambda: self.disk),
+        )
+
+
+@pytest.mark.unit
+class TestResourceSampler:
+    """资源采样器测试"""
+
+    def test_non_blocking_and_reuse(self):
+        """测试采样不睡眠且在有效期内复用"""
+        sampler = ResourceSampler(min_interval=60)
+        start = time.perf_counter()
+        first = sampler.sample()
+        assert time.perf_counter() - start < 0.05
+        assert sampler.sample() is first
+        assert 0.0 <= first.cpu_percent <= 100.0
+        assert len(first.per_cpu_percent) >= 1
+        assert sampler.sample(max_age=0) is not first
+
+    def test_deltas(self):
+        """测试按增量计算使用率与速率"""
+        fake = _FakeCounters()
+        sampler = ResourceSampler()
+        p1, p2, p3 = fake.patches()
+        with p1, p2, p3, patch("time.monotonic", side_effect=[100.0, 102.0, 104.0]):
+            first = sampler.sample(max_age=0)
+            # 开机以来平均: 忙碌 35 / 总 200
+            assert first.cpu_percent == 17.5
+            assert first.per_cpu_percent == [15.0, 20.0]
+            assert first.interval == 0 and first.net_sent_per_sec == 0
+
+            fake.cpu = [CpuTimes(19.0, 6.0, 95.0, 0.0), CpuTimes(20.0, 0.0, 100.0, 0.0)]
+            fake.net = NetIO(3000, 2000 + 4096)
+            fake.disk = DiskIO(1000, 500)
+            second = sampler.sample(max_age=0)
+            assert second.interval == 2.0
+            assert second.per_cpu_percent == [50.0, 0.0]
+            assert second.cpu_percent == 25.0
+            assert second.net_sent_per_sec == 1000.0
+            assert second.net_recv_per_sec == 2048.0
+            assert second.net_total_per_sec == 3048.0
+            assert second.disk_read_per_sec == 500.0
+
+            # 计数器回绕
+            fake.net = NetIO(10, 10)
+            third = sampler.sample(max_age=0)
+            assert third.net_sent_per_sec == 0.0 and third.net_recv_per_sec == 0.0
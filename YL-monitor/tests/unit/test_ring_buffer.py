@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式环形缓冲区单元测试
+
+【功能描述】
+测试列式环形缓冲区的环绕顺序、零拷贝导出、向量化窗口统计及监控器历史
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- 环绕后按时间顺序导出，导出为只读视图
+- 按样本数/秒数截取窗口
+- 均值/最大值/EWMA/斜率
+- CPU/内存监控器历史与压力评估
+"""
+
+import numpy as np
+import pytest
+
+from app.services.ring_buffer import ColumnarRing
+from app.services.system_resource_monitor import CPUDetailedMonitor, MemoryDetailedMonitor
+
+
+@pytest.mark.unit
+class TestColumnarRing:
+    """列式环形缓冲区测试"""
+
+    def test_wraparound_and_views(self):
+        """测试环绕顺序与零拷贝只读视图"""
+        ring = ColumnarRing(5, {"value": None, "vec": 2})
+        for i in range(12):
+            ring.append(float(i), value=i * 10, vec=[i, -i])
+
+        assert len(ring) == 5
+        data = ring.export()
+        assert data["timestamp"].tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+        assert data["value"].tolist() == [70, 80, 90, 100, 110]
+        assert data["vec"][:, 1].tolist() == [-7, -8, -9, -10, -11]
+        assert ring.column("value", last=2).tolist() == [100, 110]
+        assert ring.latest("value") == 110
+
+        view = ring.column("value")
+        assert np.shares_memory(view, ring.column("value", last=3))
+        with pytest.raises(ValueError):
+            view[0] = 1
+
+    def test_partial_fill_and_seconds(self):
+        """测试未填满时的窗口与按秒截取"""
+        ring = ColumnarRing(100, ["value"])
+        assert ring.stats("value")["samples"] == 0
+        for i in range(10):
+            ring.append(1000.0 + i, value=float(i))
+        assert ring.column("value", seconds=3).tolist() == [6.0, 7.0, 8.0, 9.0]
+        ring.append(1010.0)
+        assert ring.stats("value", last=2)["samples"] == 1
+
+    def test_stats(self):
+        """测试向量化窗口统计"""
+        ring = ColumnarRing(50, ["value"])
+        for i in range(20):
+            ring.append(float(i * 2), value=5.0 + 3.0 * i)
+
+        stats = ring.stats("value", alpha=0.5)
+        values = 5.0 + 3.0 * np.arange(20)
+        weights = 0.5 ** np.arange(19, -1, -1)
+        assert stats["samples"] == 20
+        assert stats["mean"] == pytest.approx(values.mean())
+        assert stats["max"] == 62.0 and stats["min"] == 5.0
+        assert stats["ewma"] == pytest.approx((weights * values).sum() / weights.sum())
+        assert stats["slope_per_sec"] == pytest.approx(1.5)
+
+
+@pytest.mark.unit
+class TestResourceMonitorHistory:
+    """CPU/内存监控器历史测试"""
+
+    def test_cpu_history_and_pressure(self):
+        """测试 CPU 历史导出与压力评估"""
+        monitor = CPUDetailedMonitor(history_size=10)
+        assert monitor.get_cpu_pressure() == {"status": "insufficient_data"}
+        for _ in range(4):
+            monitor.collect_metrics()
+
+        history = monitor.get_usage_history(last=3)
+        assert len(history) == 3
+        assert set(history[0]) == {"timestamp", "overall", "per_cpu"}
+        assert len(history[0]["per_cpu"]) == monitor._cpu_count
+
+        pressure = monitor.get_cpu_pressure()
+        assert pressure["status"] in ("normal", "elevated", "warning", "critical")
+        assert pressure["window"]["samples"] == 4
+        assert monitor.export_usage_history()["per_cpu"].shape == (4, monitor._cpu_count)
+
+    def test_memory_history(self):
+        """测试内存历史与窗口统计"""
+        monitor = MemoryDetailedMonitor(history_size=10)
+        for _ in range(3):
+            monitor.collect_metrics()
+        assert len(monitor.get_usage_history()) == 3
+        assert monitor.get_memory_pressure()["window"]["samples"] == 3
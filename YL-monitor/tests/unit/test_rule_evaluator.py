@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+告警规则编译单元测试
+
+【功能描述】
+测试规则编译索引、向量化批量评估与条件表达式解析
+
+【作者】
+AI Assistant
+
+【创建时间】
+2026-10-18
+
+【版本】
+1.0.0
+
+【测试覆盖】
+- RuleIndex 逐条与向量比较结果一致
+- 批量评估结果矩阵
+- 条件表达式解析与缓存
+- AlertService 规则增删改后重新编译
+"""
+
+import random
+
+import pytest
+
+from app.models.alert import ComparisonOp, MetricType
+from app.services.alert_service import AlertService
+from app.services.rule_evaluator import (
+    CompiledRule,
+    RuleIndex,
+    compare,
+    compile_condition,
+)
+
+OPS = [ComparisonOp.GT, ComparisonOp.GTE, ComparisonOp.LT, ComparisonOp.LTE, ComparisonOp.EQ]
+
+
+def _rules(n: int):
+    rng = random.Random(7)
+    return [
+        CompiledRule(
+            rule_id=f"r{i}",
+            metric="cpu" if i % 3 else "memory",
+            op=OPS[i % len(OPS)].value,
+            threshold=float(rng.randint(0, 100)),
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.mark.unit
+class TestRuleIndex:
+    """规则索引测试"""
+
+    def test_vector_matches_scalar(self):
+        """测试向量比较与逐条比较一致"""
+        rules = _rules(60)
+        scalar = RuleIndex(vector_min_rules=10 ** 6)
+        vector = RuleIndex(vector_min_rules=1)
+        scalar.rebuild(rules)
+        vector.rebuild(rules)
+
+        for value in (0.0, 42.0, 50.0005, 99.9, 100.0):
+            expected = [
+                (r.rule_id, compare(r.op, value, r.threshold))
+                for r in rules if r.metric == "cpu"
+            ]
+            assert [(r.rule_id, m) for r, m in scalar.evaluate("cpu", value)] == expected
+            assert [(r.rule_id, m) for r, m in vector.evaluate("cpu", value)] == expected
+
+        assert vector.evaluate("disk", 1.0) == []
+
+    def test_evaluate_batch(self):
+        """测试批量评估"""
+        index = RuleIndex()
+        index.rebuild(_rules(30))
+        values = [10.0, 55.0, 90.0]
+
+        rules, matrix = index.evaluate_batch("memory", values)
+        assert len(matrix) == 3
+        for value, row in zip(values, matrix):
+            assert row == [compare(r.op, value, r.threshold) for r in rules]
+
+    def test_compile_condition(self):
+        """测试条件表达式解析"""
+        assert compile_condition("cpu_percent > 80")({"cpu_percent": 85})
+        assert not compile_condition("cpu_percent > 80")({})
+        assert compile_condition("memory_percent >= 85")({"memory_percent": 85})
+        assert compile_condition('status == "offline"')({"status": "offline"})
+        assert compile_condition("health_check_failed")({"consecutive_fails": 2})
+        assert not compile_condition("cpu_percent > abc")({"cpu_percent": 99})
+        assert compile_condition("cpu_percent > 80") is compile_condition("cpu_percent > 80")
+
+
+@pytest.mark.unit
+class TestAlertServiceCompiledRules:
+    """告警服务规则编译测试"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = AlertService(storage_dir=tmp_path)
+        yield service
+        service.close()
+
+    def test_recompile_on_crud(self, service):
+        """测试规则增删改后只评估启用且匹配指标的规则"""
+        cpu = service.create_rule({"name": "cpu", "metric": MetricType.CPU, "threshold": 80.0})
+        service.create_rule({"name": "mem", "metric": MetricType.MEMORY, "threshold": 10.0})
+
+        service.check_alerts(MetricType.CPU, 90.0)
+        assert set(service._trigger_times) == {cpu.id}
+
+        service._trigger_times.clear()
+        service.update_rule(cpu.id, {"enabled": False})
+        service.check_alerts(MetricType.CPU, 90.0)
+        assert service._trigger_times == {}
+
+        service.update_rule(cpu.id, {"enabled": True, "comparison": ComparisonOp.LT})
+        service.check_alerts_batch(MetricType.CPU, [90.0, 50.0])
+        assert set(service._trigger_times) == {cpu.id}
+
+        service.delete_rule(cpu.id)
+        assert service._rule_index.rules_for(MetricType.CPU) == ()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User GUI AR-backend 客户端单元测试
+
+测试内容:
+    - 并发 GET 请求合并与短时结果复用
+    - 连接失败时使发现缓存失效并重试(故障转移)
+    - 显式指定端口时不重试
+    - 最后一个订阅者退出时停止指标轮询任务
+
+版本: 1.0
+创建日期: 2026年10月18日
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+# services 包初始化时导入状态上报器(依赖 requests)
+pytest.importorskip("requests")
+
+USER_DIR = Path(__file__).resolve().parents[2] / "user"
+if str(USER_DIR) not in sys.path:
+    sys.path.insert(0, str(USER_DIR))
+
+from services import ar_backend_client
+from services.ar_backend_client import ARBackendClient
+
+HOST = "backend.test"
+
+
+class FakeDiscoveryCache:
+    """记录调用的发现缓存"""
+
+    def __init__(self, port=None):
+        self.port = port
+        self.invalidated = 0
+
+    def get(self, host):
+        return self.port
+
+    def put(self, host, port):
+        self.port = port
+
+    def invalidate(self, host):
+        self.invalidated += 1
+        self.port = None
+
+
+@pytest.fixture(autouse=True)
+def no_settings(monkeypatch):
+    """不读取本机配置与环境变量中的端口"""
+    monkeypatch.setattr(ar_backend_client, "_load_settings", lambda: {})
+    monkeypatch.delenv("AR_BACKEND_HOST", raising=False)
+    monkeypatch.delenv("AR_BACKEND_PORT", raising=False)
+
+
+def _client(handler, port=None, discovery=None, open_ports=()):
+    """创建使用 MockTransport 的客户端，open_ports 为端口探测视为开放的端口"""
+    client = ARBackendClient(host=HOST, port=port, discovery_cache=discovery or FakeDiscoveryCache())
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def check_port(p):
+        return p in open_ports
+
+    client._check_port = check_port
+    return client
+
+
+@pytest.mark.asyncio
+async def test_concurrent_gets_coalesced():
+    """测试同一路径的并发请求只发送一次"""
+    calls = []
+    release = asyncio.Event()
+
+    async def handler(request):
+        calls.append(request.url.path)
+        await release.wait()
+        return httpx.Response(200, json={"status": "running", "n": len(calls)})
+
+    client = _client(handler, discovery=FakeDiscoveryCache(5501))
+    waiters = asyncio.gather(*(client.get_status() for _ in range(5)))
+    await asyncio.sleep(0.01)
+    release.set()
+    results = await waiters
+
+    assert calls == ["/status"]
+    assert all(r == {"status": "running", "n": 1} for r in results)
+
+    # 窗口内复用结果，max_age=0 时重新请求
+    assert await client.get_status() == {"status": "running", "n": 1}
+    assert calls == ["/status"]
+    await client.get_metrics(max_age=0)
+    assert calls == ["/status", "/metrics"]
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_failover_rediscovers_port():
+    """测试缓存端口连接失败时重新发现并重试一次"""
+    ports = []
+
+    def handler(request):
+        ports.append(request.url.port)
+        if request.url.port == 5501:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"status": "healthy"})
+
+    discovery = FakeDiscoveryCache(5501)
+    client = _client(handler, discovery=discovery, open_ports={5503})
+
+    assert await client.is_available()
+    assert ports == [5501, 5503]
+    assert discovery.invalidated == 1
+    assert discovery.port == 5503
+    assert client.port == 5503
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_fixed_port_not_retried():
+    """测试显式指定端口时连接失败不重试"""
+    ports = []
+
+    def handler(request):
+        ports.append(request.url.port)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    discovery = FakeDiscoveryCache(5503)
+    client = _client(handler, port=5501, discovery=discovery, open_ports={5503})
+
+    health = await client.health_check()
+    assert health["status"] == "unhealthy"
+    assert ports == [5501]
+    assert discovery.invalidated == 0
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_polling_stops_with_last_subscriber():
+    """测试订阅者共享轮询任务，最后一个订阅者退出时停止"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"fps": 30, "n": len(calls)})
+
+    client = _client(handler, discovery=FakeDiscoveryCache(5501))
+    first = client.subscribe_metrics(interval=0.01)
+    second = client.subscribe_metrics(interval=0.01)
+
+    assert (await first.__anext__())["fps"] == 30
+    task = client._metrics_task
+    assert (await second.__anext__())["fps"] == 30
+    assert client._metrics_task is task
+
+    await first.aclose()
+    assert client._metrics_task is task
+    assert not task.done()
+
+    await second.aclose()
+    assert client._metrics_task is None
+    await asyncio.sleep(0)
+    assert task.cancelled()
+
+    polled = len(calls)
+    await asyncio.sleep(0.05)
+    assert len(calls) == polled
+    await client.aclose()
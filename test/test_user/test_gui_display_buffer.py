@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User GUI 显示帧三缓冲区单元测试
+
+测试内容:
+    - GUI 取帧前多次发布只保留最新一帧
+    - GUI 正在显示的槽位不会被改写
+    - 通知处理前只通知一次
+    - 按显示尺寸缩放并转换为 RGB
+
+版本: 1.0
+创建日期: 2026年10月18日
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+USER_DIR = Path(__file__).resolve().parents[2] / "user"
+if str(USER_DIR) not in sys.path:
+    sys.path.insert(0, str(USER_DIR))
+
+from gui.display_buffer import DisplayFrameBuffer
+
+
+def _frame(value, width=16, height=12):
+    """BGR 帧，三个通道分别为 value, value+1, value+2"""
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[...] = (value, value + 1, value + 2)
+    return frame
+
+
+def test_keeps_newest_frame():
+    """测试 GUI 取帧前多次发布只保留最新一帧"""
+    buffer = DisplayFrameBuffer()
+    buffer.publish(_frame(10), captured_at=0.0)
+    buffer.publish(_frame(20), captured_at=0.0)
+
+    shown = buffer.acquire()
+    assert shown is not None
+    assert tuple(shown[0, 0]) == (22, 21, 20)
+    assert buffer.acquire() is None
+
+    stats = buffer.get_statistics()
+    assert stats['display_published'] == 2
+    assert stats['display_dropped'] == 1
+    assert stats['display_presented'] == 1
+
+
+def test_showing_slot_not_overwritten():
+    """测试显示中的槽位在下次 acquire 之前不被改写"""
+    buffer = DisplayFrameBuffer()
+    buffer.publish(_frame(10))
+    shown = buffer.acquire()
+    expected = shown.copy()
+
+    for value in range(20, 80, 10):
+        buffer.publish(_frame(value))
+        assert np.array_equal(shown, expected)
+
+    latest = buffer.acquire()
+    assert latest is not shown
+    assert tuple(latest[0, 0]) == (72, 71, 70)
+
+    # 新帧写入已释放的槽位，当前显示的帧仍保持不变
+    expected = latest.copy()
+    for value in range(100, 140, 10):
+        buffer.publish(_frame(value))
+        assert np.array_equal(latest, expected)
+
+
+def test_single_notification_until_handled():
+    """测试 GUI 处理通知前重复发布不再通知"""
+    buffer = DisplayFrameBuffer()
+    assert buffer.publish(_frame(10)) is True
+    assert buffer.publish(_frame(20)) is False
+    assert buffer.publish(_frame(30)) is False
+
+    buffer.acquire()
+    assert buffer.publish(_frame(40)) is True
+
+    # 没有新帧时 acquire 同样表示通知已被处理
+    buffer.acquire()
+    assert buffer.acquire() is None
+    assert buffer.publish(_frame(50)) is True
+
+    buffer.release()
+    assert buffer.acquire() is None
+    assert buffer.publish(_frame(60)) is True
+
+
+def test_fit_to_target_size():
+    """测试保持宽高比缩放到显示区域"""
+    buffer = DisplayFrameBuffer()
+    buffer.set_target_size(8, 8)
+    buffer.publish(_frame(10, width=16, height=4))
+
+    shown = buffer.acquire()
+    assert shown.shape == (2, 8, 3)
+    assert tuple(shown[1, 7]) == (12, 11, 10)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User GUI 帧节奏控制单元测试
+
+测试内容:
+    - 耗时估计的 EWMA 与分位数
+    - 帧截止时间调度，落后超过一帧间隔时跳过错过的时隙
+    - P90 超出预算时每次只降一级
+    - 按 EWMA 预测升级后的耗时决定是否升级
+
+版本: 1.0
+创建日期: 2026年10月18日
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+USER_DIR = Path(__file__).resolve().parents[2] / "user"
+if str(USER_DIR) not in sys.path:
+    sys.path.insert(0, str(USER_DIR))
+
+from gui.frame_pacing import AdaptiveQualityController, FrameScheduler, TimingEstimator
+
+FRAME_INTERVAL = 0.04
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _estimator(*samples):
+    estimator = TimingEstimator()
+    for seconds in samples:
+        estimator.add(seconds)
+    return estimator
+
+
+def test_timing_estimator():
+    """测试 EWMA 以首个样本为初值，分位数取最近窗口"""
+    estimator = TimingEstimator(window=4, alpha=0.5)
+    assert estimator.percentile(90) == 0.0
+
+    for seconds in (1.0, 3.0, 5.0):
+        estimator.add(seconds)
+    assert estimator.ewma == pytest.approx(3.5)
+
+    for seconds in (7.0, 9.0):
+        estimator.add(seconds)
+    assert len(estimator) == 4
+    assert estimator.percentile(50) == pytest.approx(6.0)
+
+    estimator.reset()
+    assert len(estimator) == 0
+    assert estimator.ewma == 0.0
+
+
+class TestFrameScheduler:
+    """帧截止时间调度测试"""
+
+    def test_on_time(self):
+        """测试按时处理时等待到下一个截止时间"""
+        clock = FakeClock()
+        scheduler = FrameScheduler(4, clock=clock)
+        scheduler.reset()
+
+        clock.now = 0.1
+        assert scheduler.advance() == 0
+        assert scheduler.wait_time() == pytest.approx(0.15)
+
+        # 落后不足一帧间隔时立即开始下一帧追回进度，不跳过
+        clock.now = 0.3
+        assert scheduler.advance() == 0
+        assert scheduler.wait_time() == pytest.approx(0.2)
+        assert scheduler.skipped == 0
+
+    def test_skip_missed_slots(self):
+        """测试落后超过一帧间隔时跳过错过的时隙"""
+        clock = FakeClock()
+        scheduler = FrameScheduler(4, clock=clock)
+        scheduler.reset()
+
+        clock.now = 1.5
+        assert scheduler.advance() == 5
+        assert scheduler.skipped == 5
+        assert scheduler.next_deadline == pytest.approx(1.5)
+        assert scheduler.wait_time() == 0.0
+
+        # 跳过后恢复正常节奏，而不是连续突发输出
+        clock.now = 1.6
+        assert scheduler.advance() == 0
+        assert scheduler.wait_time() == pytest.approx(0.15)
+
+        # 恰好落后一帧间隔不跳过
+        clock.now = 2.25
+        assert scheduler.advance() == 0
+        assert scheduler.skipped == 5
+
+
+class TestAdaptiveQualityController:
+    """自适应处理质量测试"""
+
+    def test_needs_min_samples(self):
+        """测试样本不足时不调整"""
+        controller = AdaptiveQualityController(FRAME_INTERVAL)
+        estimator = _estimator(*[0.1] * (controller.MIN_SAMPLES - 1))
+        assert not controller.update(estimator)
+        assert controller.index == 0
+
+    def test_degrade_one_level(self):
+        """测试 P90 超出预算时每次只降一级并重新采样"""
+        controller = AdaptiveQualityController(FRAME_INTERVAL)
+        estimator = _estimator(*[0.2] * 20)
+
+        assert controller.update(estimator)
+        assert controller.index == 1
+        assert len(estimator) == 0
+
+        # 重新采样前不再调整
+        assert not controller.update(estimator)
+
+        for _ in range(20):
+            estimator.add(0.2)
+        assert controller.update(estimator)
+        assert controller.level == controller.LEVELS[2]
+
+    def test_degrade_stops_at_lowest(self):
+        """测试最低等级不再降级"""
+        controller = AdaptiveQualityController(FRAME_INTERVAL)
+        controller.index = len(controller.LEVELS) - 1
+        estimator = _estimator(*[1.0] * 20)
+        assert not controller.update(estimator)
+        assert len(estimator) == 20
+
+    def test_upgrade_uses_ewma(self):
+        """测试按 EWMA 与像素比例预测升级后的耗时"""
+        controller = AdaptiveQualityController(FRAME_INTERVAL)
+        controller.index = 2  # 0.5 倍分辨率，升级到 0.75 倍耗时约为 2.25 倍
+
+        # 预测耗时 0.012 * 2.25 = 0.027，超过预算的 60%(0.024)
+        assert not controller.update(_estimator(*[0.012] * 20))
+        assert controller.index == 2
+
+        # 早期样本较慢，但 EWMA 跟随最近样本: 均值预测不会升级，EWMA 预测会
+        samples = [0.03] * 14 + [0.005] * 10
+        assert sum(samples) / len(samples) * 2.25 > FRAME_INTERVAL * controller.UPGRADE_RATIO
+        estimator = _estimator(*samples)
+        assert controller.update(estimator)
+        assert controller.index == 1
+        assert len(estimator) == 0
+
+    def test_upgrade_process_every(self):
+        """测试降低处理频率的等级按分摊前的预算升级"""
+        controller = AdaptiveQualityController(FRAME_INTERVAL)
+        controller.index = 3  # 每 2 帧处理一次
+        assert controller.update(_estimator(*[0.02] * 20))
+        assert controller.level == controller.LEVELS[2]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User GUI 上报通道单元测试
+
+测试内容:
+    - 监控服务不可达时缓冲，恢复后分批补发
+    - 连续失败时的指数退避间隔
+    - 4xx 拒绝的数据直接丢弃不再重试
+
+版本: 1.0
+创建日期: 2026年10月18日
+"""
+
+import gzip
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+USER_DIR = Path(__file__).resolve().parents[2] / "user"
+if str(USER_DIR) not in sys.path:
+    sys.path.insert(0, str(USER_DIR))
+
+from services.report_channel import HEARTBEATS_PATH, ReportChannel
+
+MONITOR_URL = "http://monitor.test"
+
+
+class StubSession:
+    """按顺序返回预设结果(状态码或异常)的会话，记录发送的心跳"""
+
+    def __init__(self):
+        self.results = []
+        self.batches = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        assert url == MONITOR_URL + HEARTBEATS_PATH
+        result = self.results.pop(0) if self.results else 200
+        if isinstance(result, Exception):
+            raise result
+        if (headers or {}).get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        self.batches.append([hb["seq"] for hb in json.loads(data)["heartbeats"]])
+        return SimpleNamespace(status_code=result)
+
+
+def _channel(**kwargs):
+    """创建不启动后台线程的通道，注册一个递增序号的上报源"""
+    channel = ReportChannel(MONITOR_URL, **kwargs)
+    channel.session = StubSession()
+    channel._start = lambda: None
+    seq = iter(range(1000))
+    channel.register("gui", lambda: {"node_id": "node-1", "seq": next(seq)})
+    return channel
+
+
+def test_buffer_then_drain():
+    """测试离线期间缓冲，恢复后按批补发"""
+    channel = _channel(batch_size=2, compress_min_bytes=64)
+    session = channel.session
+    states = []
+    channel.add_listener(states.append)
+
+    session.results = [requests.exceptions.ConnectionError()] * 3
+    for _ in range(3):
+        assert channel.flush() is False
+    assert session.batches == []
+    assert channel.get_stats()["buffered"] == 3
+    assert channel.online is False
+
+    assert channel.flush() is True
+    assert session.batches == [[0, 1], [2, 3]]
+    assert states == [False, False, False, True]
+
+    stats = channel.get_stats()
+    assert stats["buffered"] == 0
+    assert stats["sent"] == 4
+    assert stats["failed"] == 3
+    assert stats["consecutive_failures"] == 0
+    assert channel.online is True
+
+
+def test_buffer_bounded():
+    """测试缓冲区满时丢弃最旧的数据"""
+    channel = _channel(max_buffered=2)
+    channel.session.results = [503] * 3
+    for _ in range(3):
+        channel.flush()
+
+    assert channel.get_stats()["dropped"] == 1
+    assert channel.flush() is True
+    assert channel.session.batches[-1] == [2, 3]
+
+
+def test_backoff_schedule():
+    """测试连续失败时指数退避，上限为 max_backoff，恢复后回到上报间隔"""
+    channel = _channel(interval=10.0, max_backoff=60.0)
+    channel.session.results = [503] * 5
+
+    assert channel._next_delay() == 10.0
+    delays = []
+    for _ in range(5):
+        channel.flush()
+        delays.append(channel._next_delay())
+    assert delays == [10.0, 20.0, 40.0, 60.0, 60.0]
+
+    channel.flush()
+    assert channel._next_delay() == 10.0
+
+
+def test_client_error_dropped():
+    """测试 4xx 被拒绝的数据丢弃，不计为失败也不重试"""
+    channel = _channel()
+    channel.session.results = [400]
+
+    assert channel.flush() is True
+    stats = channel.get_stats()
+    assert stats["dropped"] == 1
+    assert stats["sent"] == 0
+    assert stats["buffered"] == 0
+    assert stats["consecutive_failures"] == 0
+
+    channel.flush()
+    assert channel.session.batches == [[0], [1]]
+    assert channel.get_stats()["sent"] == 1
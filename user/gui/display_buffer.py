@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频显示帧三缓冲区
+工作线程把帧缩放并转换为RGB写入预分配槽位，GUI 线程只读取最新就绪帧
+
+作者: AI 全栈技术员
+版本: 1.0
+创建日期: 2026-10-18
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+try:
+    from .frame_pacing import TimingEstimator
+except ImportError:
+    # 直接运行 gui.py 时
+    from frame_pacing import TimingEstimator
+
+
+class DisplayFrameBuffer:
+    """
+    显示帧三缓冲区(工作线程写入，GUI 线程读取)
+    
+    三个槽位分别用于: 工作线程正在写入、已就绪待显示、GUI 正在显示。
+    工作线程总能找到空闲槽位，无需等待 GUI；未被显示的就绪帧会被新帧覆盖。
+    槽位数组按显示尺寸预分配，尺寸变化时才重新分配。
+    """
+
+    SLOTS = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = [None] * self.SLOTS
+        self._captured_at = [0.0] * self.SLOTS
+        self._scratch = None  # 缩放后的 BGR 中间缓冲
+        self._target_size = (0, 0)
+        self._ready = None    # 已就绪待显示的槽位
+        self._showing = None  # GUI 正在显示的槽位
+        self._notified = False
+        self.published = 0
+        self.dropped = 0
+        self.presented = 0
+        # 采集 → 交给 GUI 显示的延迟
+        self.latency = TimingEstimator()
+
+    def set_target_size(self, width, height):
+        """设置显示区域尺寸(GUI 线程调用)"""
+        with self._lock:
+            self._target_size = (max(int(width), 1), max(int(height), 1))
+
+    def _fit_size(self, frame_w, frame_h):
+        target_w, target_h = self._target_size
+        if target_w <= 1 or target_h <= 1:
+            return frame_w, frame_h
+        # 保持宽高比
+        scale = min(target_w / frame_w, target_h / frame_h)
+        return max(int(frame_w * scale), 1), max(int(frame_h * scale), 1)
+
+    def publish(self, frame, captured_at=None):
+        """
+        把 BGR 帧缩放并转换为 RGB 写入空闲槽位(工作线程调用)
+        
+        Args:
+            frame: BGR 帧
+            captured_at: 采集时刻(time.monotonic)，用于统计延迟
+        
+        Returns:
+            bool: 是否需要通知 GUI(上一帧通知尚未被处理时不重复通知)
+        """
+        frame_h, frame_w = frame.shape[:2]
+        with self._lock:
+            new_w, new_h = self._fit_size(frame_w, frame_h)
+            index = next(
+                i for i in range(self.SLOTS) if i != self._ready and i != self._showing
+            )
+        
+        shape = (new_h, new_w, 3)
+        slot = self._slots[index]
+        if slot is None or slot.shape != shape:
+            slot = self._slots[index] = np.empty(shape, dtype=np.uint8)
+        
+        if (new_w, new_h) != (frame_w, frame_h):
+            if self._scratch is None or self._scratch.shape != shape:
+                self._scratch = np.empty(shape, dtype=np.uint8)
+            cv2.resize(frame, (new_w, new_h), dst=self._scratch, interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(self._scratch, cv2.COLOR_BGR2RGB, dst=slot)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=slot)
+        
+        with self._lock:
+            if self._ready is not None:
+                self.dropped += 1
+            self._ready = index
+            self._captured_at[index] = time.monotonic() if captured_at is None else captured_at
+            self.published += 1
+            notify = not self._notified
+            self._notified = True
+        return notify
+
+    def acquire(self):
+        """
+        取出最新就绪帧(GUI 线程调用)，之前显示的槽位随之释放
+        
+        Returns:
+            np.ndarray: RGB 帧(在下次 acquire 之前不会被改写)，无新帧时返回 None
+        """
+        with self._lock:
+            self._notified = False
+            if self._ready is None:
+                return None
+            self._showing, self._ready = self._ready, None
+            self.presented += 1
+            self.latency.add(time.monotonic() - self._captured_at[self._showing])
+            return self._slots[self._showing]
+
+    def release(self):
+        """释放全部槽位(停止视频时调用)"""
+        with self._lock:
+            self._ready = None
+            self._showing = None
+            self._notified = False
+
+    def get_statistics(self):
+        with self._lock:
+            return {
+                'display_published': self.published,
+                'display_dropped': self.dropped,
+                'display_presented': self.presented,
+                'latency_ms': self.latency.ewma * 1000,
+                'latency_p50_ms': self.latency.percentile(50) * 1000,
+                'latency_p95_ms': self.latency.percentile(95) * 1000,
+            }
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频工作线程的帧节奏控制
+不依赖 Qt，供 VideoWorker 与显示缓冲区使用
+
+- TimingEstimator: 耗时的 EWMA 与分位数估计
+- FrameScheduler: 单调时钟帧截止时间调度，落后超过一帧时跳过错过的时隙
+- AdaptiveQualityController: 按处理耗时调整处理分辨率与处理频率
+
+作者: AI 全栈技术员
+版本: 1.0
+创建日期: 2026-10-18
+"""
+
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+
+class TimingEstimator:
+    """耗时估计: EWMA 与最近 window 个样本的分位数(单位: 秒)"""
+
+    def __init__(self, window=120, alpha=0.2):
+        self.alpha = alpha
+        self._samples = deque(maxlen=window)
+        self.ewma = 0.0
+
+    def add(self, seconds):
+        if self._samples:
+            self.ewma += self.alpha * (seconds - self.ewma)
+        else:
+            self.ewma = seconds
+        self._samples.append(seconds)
+
+    def percentile(self, q):
+        if not self._samples:
+            return 0.0
+        return float(np.percentile(self._samples, q))
+
+    def reset(self):
+        self._samples.clear()
+        self.ewma = 0.0
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class FrameScheduler:
+    """
+    基于单调时钟的帧截止时间调度
+    
+    截止时间按固定帧间隔排列；处理偶尔超时，下一帧立即开始以追回进度，
+    落后超过一帧间隔时直接跳过错过的时隙，避免连续突发输出。
+    """
+
+    def __init__(self, fps, clock=time.monotonic):
+        self.clock = clock
+        self.interval = 1.0 / fps
+        self.next_deadline = None
+        self.skipped = 0
+
+    def reset(self):
+        self.next_deadline = self.clock()
+        self.skipped = 0
+
+    def wait_time(self):
+        """距下一帧截止时间的秒数(已到期时为 0)"""
+        if self.next_deadline is None:
+            self.reset()
+        return max(self.next_deadline - self.clock(), 0.0)
+
+    def advance(self):
+        """
+        进入下一个时隙
+        
+        Returns:
+            int: 因落后而跳过的时隙数
+        """
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        self.next_deadline += self.interval
+        missed = 0
+        if now - self.next_deadline > self.interval:
+            missed = int((now - self.next_deadline) / self.interval)
+            self.next_deadline += missed * self.interval
+            self.skipped += missed
+        return missed
+
+
+QualityLevel = namedtuple('QualityLevel', ['scale', 'process_every'])
+
+
+class AdaptiveQualityController:
+    """
+    自适应处理质量
+    
+    依次降低处理分辨率、降低处理频率(其余帧直接显示原始帧)以维持目标帧率；
+    处理仍赶不上时由 FrameScheduler 跳过时隙。
+    """
+
+    LEVELS = (
+        QualityLevel(1.0, 1),
+        QualityLevel(0.75, 1),
+        QualityLevel(0.5, 1),
+        QualityLevel(0.5, 2),
+        QualityLevel(0.5, 3),
+    )
+    DEGRADE_RATIO = 0.9   # P90 超过预算的比例时降级
+    UPGRADE_RATIO = 0.6   # 预计升级后耗时低于预算的比例时升级
+    MIN_SAMPLES = 15
+
+    def __init__(self, frame_interval):
+        self.frame_interval = frame_interval
+        self.index = 0
+
+    @property
+    def level(self):
+        return self.LEVELS[self.index]
+
+    def _budget(self, level):
+        # 每 process_every 帧处理一次，处理耗时可分摊到这些帧
+        return self.frame_interval * level.process_every
+
+    def update(self, estimator):
+        """
+        根据处理耗时调整质量等级，等级变化后清空估计器重新采样
+        
+        Returns:
+            bool: 等级是否变化
+        """
+        if len(estimator) < self.MIN_SAMPLES:
+            return False
+        level = self.level
+        if estimator.percentile(90) > self._budget(level) * self.DEGRADE_RATIO:
+            if self.index == len(self.LEVELS) - 1:
+                return False
+            self.index += 1
+        elif self.index > 0:
+            # 耗时近似与像素数成正比
+            better = self.LEVELS[self.index - 1]
+            predicted = estimator.ewma * (better.scale / level.scale) ** 2
+            if predicted > self._budget(better) * self.UPGRADE_RATIO:
+                return False
+            self.index -= 1
+        else:
+            return False
+        estimator.reset()
+        return True
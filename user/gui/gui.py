@@ -11,6 +11,13 @@ AR Live Studio - PyQt5 GUI 界面 (增强版)
 - 模块状态监控
 - 截图和录制功能
 
+显示管线:
+- 工作线程把帧缩放并转换为RGB，写入预分配的显示缓冲区(三缓冲)
+- GUI 线程用 QImage 直接包装缓冲区内存绘制，不再逐帧拷贝/创建 QPixmap
+- GUI 来不及显示时只保留最新一帧(旧帧丢弃)，重绘频率不超过屏幕刷新率
+- 工作线程按单调时钟的帧截止时间调度，落后超过一帧时跳过错过的时隙而不是突发追帧
+- 按处理耗时(EWMA/P90)自适应调整处理分辨率与处理频率，并统计采集→显示延迟
+
 作者: AI 全栈技术员
 版本: 2.0
 创建日期: 2026-02-09
@@ -19,8 +26,8 @@ AR Live Studio - PyQt5 GUI 界面 (增强版)
 import sys
 import os
 import time
+import logging
 import cv2
-import numpy as np
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QPushButton, QSlider, QFileDialog,
@@ -28,7 +35,7 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QMenu, QAction, QComboBox, QSpinBox, QDoubleSpinBox,
                              QCheckBox, QTabWidget, QGridLayout, QSplitter)
 from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal, pyqtSlot
-from PyQt5.QtGui import QImage, QPixmap, QFont, QIcon, QColor, QPalette
+from PyQt5.QtGui import QImage, QPixmap, QFont, QIcon, QColor, QPalette, QPainter
 
 # 导入模块 - 使用try/except处理不同导入路径
 try:
@@ -39,92 +46,168 @@ except ImportError:
     from core.camera import CameraModule
     from core.audio_module import AudioModule, AudioEffect
 
+try:
+    from .frame_pacing import TimingEstimator, FrameScheduler, AdaptiveQualityController
+    from .display_buffer import DisplayFrameBuffer
+except ImportError:
+    # 直接运行 gui.py 时
+    from frame_pacing import TimingEstimator, FrameScheduler, AdaptiveQualityController
+    from display_buffer import DisplayFrameBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class VideoLabel(QLabel):
+    """直接绘制 QImage 的视频显示控件(不创建 QPixmap)"""
+
+    resized = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._frame = None
+        self._image = None
+
+    def set_frame(self, frame):
+        """显示 RGB 帧，QImage 直接引用帧内存，帧在下一次 set_frame 之前须保持不变"""
+        if self._image is None and self.text():
+            self.setText("")
+        h, w = frame.shape[:2]
+        # 保留数组引用，QImage 不持有内存
+        self._frame = frame
+        self._image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888)
+        self.update()
+
+    def clear_frame(self):
+        self._frame = None
+        self._image = None
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit(self.width(), self.height())
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._image is None:
+            return
+        painter = QPainter(self)
+        x = (self.width() - self._image.width()) // 2
+        y = (self.height() - self._image.height()) // 2
+        painter.drawImage(x, y, self._image)
+        painter.end()
+
 
 class VideoWorker(QThread):
-    """视频处理工作线程 - 优化版，支持帧跳过和性能监控"""
-    frame_ready = pyqtSignal(np.ndarray)
-    statistics_ready = pyqtSignal(dict)
+    """视频处理工作线程 - 按帧截止时间调度，自适应处理质量
     
-    # 类级别的帧缓冲区，避免重复创建
-    _frame_buffer = None
+    帧在本线程内转换后写入 DisplayFrameBuffer，frame_ready 只是无参通知，
+    GUI 未处理上一次通知前不会重复发送。
+    """
+    frame_ready = pyqtSignal()
+    statistics_ready = pyqtSignal(dict)
+
+    STATS_EVERY_N_FRAMES = 30
+    ADAPT_EVERY_N_PROCESSED = 15
 
-    def __init__(self, camera_module, target_fps=30):
+    def __init__(self, camera_module, display_buffer, target_fps=30):
         super().__init__()
         self.camera_module = camera_module
+        self.display_buffer = display_buffer
         self.running = False
         self.target_fps = target_fps
-        self.frame_interval = 1000 // target_fps  # 毫秒
-        self.frame_skip = 0
-        self.skip_threshold = 0  # 动态跳帧阈值
-        self.last_frame_time = 0
+        self.scheduler = FrameScheduler(target_fps)
+        self.quality = AdaptiveQualityController(self.scheduler.interval)
         
         # 性能监控
-        self.process_times = []
-        self.max_process_times = 10
+        self.process_timer = TimingEstimator()
+        self.frame_count = 0
+        self.processed_count = 0
+        self._fps_mark = (0.0, 0)
 
     def run(self):
         self.running = True
-        self.last_frame_time = self.current_time_ms()
+        self.scheduler.reset()
+        self._fps_mark = (time.monotonic(), self.frame_count)
         
         while self.running:
             try:
-                current_time = self.current_time_ms()
-                elapsed = current_time - self.last_frame_time
+                delay = self.scheduler.wait_time()
+                if delay > 0:
+                    self.usleep(int(delay * 1000000))
+                self.scheduler.advance()
                 
-                # 帧率控制：如果处理时间超过帧间隔，跳过此帧
-                if elapsed < self.frame_interval:
-                    self.msleep(self.frame_interval - elapsed)
+                capture = self.camera_module.capture
+                if not (capture and capture.isOpened()):
+                    continue
+                ret, frame = capture.read()
+                if not ret:
+                    continue
+                captured_at = time.monotonic()
+                self.frame_count += 1
                 
-                self.last_frame_time = self.current_time_ms()
+                level = self.quality.level
+                if self.frame_count % level.process_every:
+                    # 降低处理频率: 直接显示原始帧
+                    self._publish(frame, captured_at)
+                else:
+                    self._publish(self._process(frame, level), captured_at)
                 
-                if self.camera_module.capture and self.camera_module.capture.isOpened():
-                    ret, frame = self.camera_module.capture.read()
-                    if ret:
-                        # 动态跳帧：如果处理队列积压，跳过处理
-                        if self.skip_threshold > 0:
-                            self.frame_skip += 1
-                            if self.frame_skip % (self.skip_threshold + 1) != 0:
-                                # 只发送原始帧，不处理
-                                self.frame_ready.emit(frame)
-                                continue
-                        
-                        # 处理帧
-                        process_start = time.time()
-                        processed_frame = self.camera_module.process_frame(frame)
-                        process_time = (time.time() - process_start) * 1000
-                        
-                        # 更新性能监控
-                        self.process_times.append(process_time)
-                        if len(self.process_times) > self.max_process_times:
-                            self.process_times.pop(0)
-                        
-                        # 动态调整跳帧阈值
-                        avg_process_time = sum(self.process_times) / len(self.process_times)
-                        if avg_process_time > self.frame_interval * 0.8:
-                            self.skip_threshold = min(self.skip_threshold + 1, 2)
-                        elif avg_process_time < self.frame_interval * 0.5:
-                            self.skip_threshold = max(self.skip_threshold - 1, 0)
-                        
-                        self.frame_ready.emit(processed_frame)
-                        
-                        # 每30帧发送一次统计
-                        if self.camera_module.frame_count % 30 == 0:
-                            stats = self.camera_module.get_frame_statistics()
-                            stats['process_time_ms'] = avg_process_time
-                            stats['skip_threshold'] = self.skip_threshold
-                            self.statistics_ready.emit(stats)
+                if self.frame_count % self.STATS_EVERY_N_FRAMES == 0:
+                    self.statistics_ready.emit(self._statistics())
                 
             except Exception as e:
                 logger.error(f"视频处理错误: {e}")
                 self.msleep(100)
 
-    def current_time_ms(self):
-        """获取当前时间（毫秒）"""
-        return int(time.time() * 1000)
+    def _process(self, frame, level):
+        """按当前质量等级处理一帧，记录处理耗时并调整等级"""
+        start = time.monotonic()
+        if level.scale < 1.0:
+            # 低分辨率处理，显示时由显示缓冲区放大
+            frame = cv2.resize(
+                frame, None, fx=level.scale, fy=level.scale, interpolation=cv2.INTER_AREA
+            )
+        processed = self.camera_module.process_frame(frame)
+        self.process_timer.add(time.monotonic() - start)
+        
+        self.processed_count += 1
+        if self.processed_count % self.ADAPT_EVERY_N_PROCESSED == 0:
+            if self.quality.update(self.process_timer):
+                new_level = self.quality.level
+                logger.info(
+                    f"处理质量调整: 缩放 {new_level.scale}, 每 {new_level.process_every} 帧处理一次"
+                )
+        return processed
+
+    def _statistics(self):
+        now = time.monotonic()
+        mark_time, mark_frames = self._fps_mark
+        self._fps_mark = (now, self.frame_count)
+        elapsed = now - mark_time
+        
+        level = self.quality.level
+        stats = self.camera_module.get_frame_statistics()
+        stats.update(self.display_buffer.get_statistics())
+        stats.update({
+            'frame_count': self.frame_count,
+            'fps_actual': (self.frame_count - mark_frames) / elapsed if elapsed > 0 else 0.0,
+            'process_time_ms': self.process_timer.ewma * 1000,
+            'process_p90_ms': self.process_timer.percentile(90) * 1000,
+            'quality_level': self.quality.index,
+            'process_scale': level.scale,
+            'process_every': level.process_every,
+            'slots_skipped': self.scheduler.skipped,
+        })
+        return stats
+
+    def _publish(self, frame, captured_at):
+        """写入显示缓冲区，GUI 尚有未处理的通知时不再发送信号"""
+        if self.display_buffer.publish(frame, captured_at):
+            self.frame_ready.emit()
 
     def stop(self):
         self.running = False
-        self.process_times.clear()
+        self.process_timer.reset()
 
 
 class ARApp(QMainWindow):
@@ -141,6 +224,11 @@ class ARApp(QMainWindow):
         self.screenshot_count = 0
         self.record_enabled = False
         
+        # 显示缓冲区与重绘限速
+        self.display_buffer = DisplayFrameBuffer()
+        self._last_present = 0.0
+        self._present_pending = False
+        
         self.init_ui()
         self.setup_connections()
         self.setup_menus()
@@ -312,7 +400,8 @@ class ARApp(QMainWindow):
         video_group = QGroupBox("视频流")
         video_layout = QVBoxLayout()
         
-        self.video_label = QLabel()
+        self.video_label = VideoLabel()
+        self.video_label.resized.connect(self.display_buffer.set_target_size)
         self.video_label.setMinimumSize(800, 500)
         self.video_label.setStyleSheet("""
             QLabel {
@@ -643,7 +732,10 @@ class ARApp(QMainWindow):
         """启动摄像头"""
         try:
             if self.camera_module.start_capture():
-                self.video_worker = VideoWorker(self.camera_module)
+                self.display_buffer.set_target_size(
+                    self.video_label.width(), self.video_label.height()
+                )
+                self.video_worker = VideoWorker(self.camera_module, self.display_buffer)
                 self.video_worker.frame_ready.connect(self.update_frame)
                 self.video_worker.statistics_ready.connect(self.update_video_stats)
                 self.video_worker.start()
@@ -672,6 +764,8 @@ class ARApp(QMainWindow):
                 self.toggle_recording()
             
             self.camera_module.stop_capture()
+            self.video_label.clear_frame()
+            self.display_buffer.release()
             self.video_label.setText("视频流已停止")
             self.start_video_btn.setEnabled(True)
             self.stop_video_btn.setEnabled(False)
@@ -683,46 +777,34 @@ class ARApp(QMainWindow):
         except Exception as e:
             self.log_message(f"停止摄像头失败: {str(e)}", "error")
 
-    def update_frame(self, frame):
-        """更新视频帧显示 - 优化版，使用OpenCV缩放和内存优化"""
+    def _display_interval(self):
+        """两次重绘的最小间隔(秒)，取屏幕刷新率"""
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 0
+        return 1.0 / (refresh_rate if refresh_rate > 0 else 60.0)
+
+    def update_frame(self):
+        """有新帧可显示(工作线程通知)，按屏幕刷新率限速重绘"""
+        if self._present_pending:
+            return
+        
+        wait = self._last_present + self._display_interval() - time.monotonic()
+        if wait > 0:
+            # 期间到达的新帧会覆盖旧帧，到时只显示最新一帧
+            self._present_pending = True
+            QTimer.singleShot(int(wait * 1000) + 1, self._present_frame)
+        else:
+            self._present_frame()
+
+    def _present_frame(self):
+        """显示最新就绪帧(不拷贝，QImage 直接引用显示缓冲区)"""
+        self._present_pending = False
         try:
-            # 获取目标尺寸
-            target_size = self.video_label.size()
-            target_w, target_h = target_size.width(), target_size.height()
-            
-            # 使用OpenCV进行缩放（比Qt更快）
-            frame_h, frame_w = frame.shape[:2]
-            if frame_w != target_w or frame_h != target_h:
-                # 计算保持宽高比的缩放尺寸
-                scale = min(target_w / frame_w, target_h / frame_h)
-                new_w = int(frame_w * scale)
-                new_h = int(frame_h * scale)
-                
-                # OpenCV缩放
-                resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-            else:
-                resized = frame
-            
-            # BGR to RGB转换
-            rgb_image = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-            
-            # 创建QImage（使用内存视图避免拷贝）
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qt_image = QImage(
-                rgb_image.data.tobytes(),  # 使用tobytes确保内存连续
-                w, h, bytes_per_line, 
-                QImage.Format_RGB888
-            )
-            
-            # 创建Pixmap并显示
-            pixmap = QPixmap.fromImage(qt_image)
-            self.video_label.setPixmap(pixmap)
-            
-            # 清理（帮助垃圾回收）
-            del rgb_image
-            del qt_image
-            
+            frame = self.display_buffer.acquire()
+            if frame is None or self.video_worker is None:
+                return
+            self._last_present = time.monotonic()
+            self.video_label.set_frame(frame)
         except Exception as e:
             self.log_message(f"更新视频帧失败: {str(e)}", "error")
 
@@ -743,6 +825,13 @@ class ARApp(QMainWindow):
                 self.resolution_label.setText(f"分辨率: {res}")
             
             self.frame_count_label.setText(f"帧数: {stats.get('frame_count', 0)}")
+
+            self.video_info_label.setText(
+                f"延迟 P50/P95: {stats.get('latency_p50_ms', 0):.0f}/{stats.get('latency_p95_ms', 0):.0f} ms | "
+                f"处理: {stats.get('process_time_ms', 0):.1f} ms "
+                f"(缩放 {stats.get('process_scale', 1.0)}, 每 {stats.get('process_every', 1)} 帧) | "
+                f"丢弃: {stats.get('display_dropped', 0)} 显示 / {stats.get('slots_skipped', 0)} 时隙"
+            )
         except Exception as e:
             print(f"更新统计信息失败: {e}")
 
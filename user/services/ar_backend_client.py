@@ -3,193 +3,322 @@
 """
 AR-backend 服务客户端
 用于User GUI与AR-backend通信
+
+- 基于 httpx.AsyncClient 的异步客户端，连接池复用 keep-alive 连接
+- 端口发现延迟到首次请求，候选端口并发探测，结果按 TTL 缓存；
+  请求连接失败时缓存失效并重新发现(故障转移)
+- 同一路径的并发 GET 合并为一次请求，短时间内的重复查询直接复用结果
+- 指标订阅: 所有订阅者共享一个后台轮询任务(后端暂无推送接口)
 """
 
-import requests
+import asyncio
 import json
-import socket
-from typing import Optional, Dict, Any
+import os
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "settings.json"
+
+
+def _load_settings() -> Dict[str, Any]:
+    """读取 config/settings.json，不存在或无法解析时返回空字典"""
+    try:
+        if CONFIG_PATH.exists():
+            with open(CONFIG_PATH, 'r') as f:
+                return json.load(f)
+    except Exception:
+        pass
+    return {}
+
+
+class DiscoveryCache:
+    """服务端口发现结果缓存(主机 -> 端口)，条目 TTL 秒后过期"""
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[int, float]] = {}
+
+    def get(self, host: str) -> Optional[int]:
+        entry = self._entries.get(host)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def put(self, host: str, port: int):
+        self._entries[host] = (port, time.monotonic() + self.ttl)
+
+    def invalidate(self, host: str):
+        self._entries.pop(host, None)
+
+
+# 进程内共享的发现缓存
+_discovery_cache = DiscoveryCache()
 
 
 class ARBackendClient:
-    """AR-backend HTTP客户端"""
-    
+    """AR-backend 异步HTTP客户端"""
+
     DEFAULT_HOST = "0.0.0.0"
     DEFAULT_PORTS = [5501, 5503, 5504, 5505]
     TIMEOUT = 5
-    
-    def __init__(self, host: Optional[str] = None, port: Optional[int] = None):
-        self.host = host or self._discover_host()
-        self.port = port or self._discover_port()
-        self.base_url = f"http://{self.host}:{self.port}"
-        self.session = requests.Session()
-        self.session.headers.update({
+    CONNECT_TIMEOUT = 1.0
+    PROBE_TIMEOUT = 0.5
+    COALESCE_WINDOW = 0.5  # 秒，窗口内的重复查询复用上一次结果
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        discovery_cache: Optional[DiscoveryCache] = None
+    ):
+        settings = _load_settings() if not (host and port) else {}
+        self.host = (
+            host or os.getenv("AR_BACKEND_HOST")
+            or settings.get("ar_backend_host") or self.DEFAULT_HOST
+        )
+        # 显式指定的端口不参与发现与故障转移
+        configured = port or os.getenv("AR_BACKEND_PORT") or settings.get("ar_backend_port")
+        self._fixed_port = int(configured) if configured else None
+        self._discovery = discovery_cache or _discovery_cache
+
+        self.headers = {
             "Content-Type": "application/json",
             "Accept": "application/json"
-        })
-    
-    def _discover_host(self) -> str:
-        """自动发现服务主机"""
-        # 1. 检查环境变量
-        host = __import__('os').getenv("AR_BACKEND_HOST")
-        if host:
-            return host
-        
-        # 2. 检查配置文件
-        try:
-            config_path = (
-                __import__('pathlib').Path(__file__).parent.parent /
-                "config" / "settings.json"
-            )
-            if config_path.exists():
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-                    if config.get("ar_backend_host"):
-                        return config["ar_backend_host"]
-        except Exception:
-            pass
-        
-        # 3. 默认本地
-        return self.DEFAULT_HOST
-    
-    def _discover_port(self) -> int:
-        """自动发现服务端口"""
-        # 1. 检查环境变量
-        import os
-        port = os.getenv("AR_BACKEND_PORT")
-        if port:
-            return int(port)
-        
-        # 2. 检查配置文件
-        try:
-            config_path = (
-                __import__('pathlib').Path(__file__).parent.parent /
-                "config" / "settings.json"
+        }
+        api_key = os.getenv("MONITOR_API_KEY")
+        if api_key:
+            self.headers["X-API-Key"] = api_key
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._discover_lock: Optional[asyncio.Lock] = None
+
+        # 请求合并
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._recent: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+        # 指标订阅
+        self._metrics_subscribers: List[asyncio.Queue] = []
+        self._metrics_task: Optional[asyncio.Task] = None
+
+    @property
+    def port(self) -> int:
+        """当前使用的端口(尚未发现时为首个默认端口)"""
+        return self._fixed_port or self._discovery.get(self.host) or self.DEFAULT_PORTS[0]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # ---- 连接与发现 ----
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.TIMEOUT, connect=self.CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=8,
+                    max_keepalive_connections=4,
+                    keepalive_expiry=60
+                )
             )
-            if config_path.exists():
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-                    if config.get("ar_backend_port"):
-                        return config["ar_backend_port"]
-        except Exception:
-            pass
-        
-        # 3. 尝试默认端口
-        for port in self.DEFAULT_PORTS:
-            if self._check_port(self.host, port):
-                return port
-        
-        # 4. 返回默认端口
-        return self.DEFAULT_PORTS[0]
-    
-    def _check_port(self, host: str, port: int) -> bool:
+        return self._client
+
+    async def _check_port(self, port: int) -> bool:
         """检查端口是否开放"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, port),
+                timeout=self.PROBE_TIMEOUT
+            )
+            writer.close()
+            await writer.wait_closed()
+            return True
         except Exception:
             return False
-    
-    def health_check(self) -> Dict[str, Any]:
+
+    async def _discover_port(self) -> int:
+        """发现服务端口，候选端口并发探测，按 DEFAULT_PORTS 顺序取第一个开放的端口"""
+        if self._fixed_port:
+            return self._fixed_port
+        port = self._discovery.get(self.host)
+        if port:
+            return port
+
+        if self._discover_lock is None:
+            self._discover_lock = asyncio.Lock()
+        async with self._discover_lock:
+            port = self._discovery.get(self.host)
+            if port:
+                return port
+            results = await asyncio.gather(*(self._check_port(p) for p in self.DEFAULT_PORTS))
+            port = next((p for p, ok in zip(self.DEFAULT_PORTS, results) if ok), None)
+            if port is None:
+                # 未发现可用端口，不缓存
+                return self.DEFAULT_PORTS[0]
+            self._discovery.put(self.host, port)
+            return port
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict[str, Any]:
+        """发送请求，连接失败时重新发现端口并重试一次"""
+        for attempt in range(2):
+            port = await self._discover_port()
+            try:
+                response = await self._http().request(
+                    method, f"http://{self.host}:{port}{path}", json=payload
+                )
+                return response.json()
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt or self._fixed_port:
+                    raise
+                # 故障转移: 缓存的端口失效
+                self._discovery.invalidate(self.host)
+        raise RuntimeError("unreachable")
+
+    async def _fetch(self, path: str) -> Dict[str, Any]:
+        result = await self._request("GET", path)
+        self._recent[path] = (time.monotonic(), result)
+        return result
+
+    async def _get(self, path: str, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        合并的 GET: 复用 max_age 秒内的结果(默认 COALESCE_WINDOW)或正在进行的同一请求
+        """
+        max_age = self.COALESCE_WINDOW if max_age is None else max_age
+        recent = self._recent.get(path)
+        if recent and time.monotonic() - recent[0] < max_age:
+            return recent[1]
+
+        future = self._inflight.get(path)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(path))
+            self._inflight[path] = future
+            future.add_done_callback(lambda _: self._inflight.pop(path, None))
+        # 单个调用方取消时不取消共享请求
+        return await asyncio.shield(future)
+
+    # ---- 接口 ----
+
+    async def health_check(self) -> Dict[str, Any]:
         """健康检查"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/health",
-                timeout=self.TIMEOUT
-            )
-            return response.json()
+            return await self._get("/health")
         except Exception as e:
             return {"status": "unhealthy", "error": str(e)}
-    
-    def get_status(self) -> Dict[str, Any]:
+
+    async def get_status(self) -> Dict[str, Any]:
         """获取服务状态"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/status",
-                timeout=self.TIMEOUT
-            )
-            return response.json()
+            return await self._get("/status")
         except Exception as e:
             return {"status": "error", "error": str(e)}
-    
-    def get_metrics(self) -> Dict[str, Any]:
-        """获取性能指标"""
+
+    async def get_metrics(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """获取性能指标，max_age 为可接受的结果时效(秒)"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/metrics",
-                timeout=self.TIMEOUT
-            )
-            return response.json()
+            return await self._get("/metrics", max_age)
         except Exception as e:
             return {"status": "error", "error": str(e)}
-    
-    def start_video(self, params: Optional[Dict] = None) -> Dict[str, Any]:
-        """启动视频处理"""
+
+    async def get_snapshot(self) -> Dict[str, Any]:
+        """同时获取状态与指标(并发请求，复用连接池)"""
+        status, metrics = await asyncio.gather(self.get_status(), self.get_metrics())
+        return {"status": status, "metrics": metrics}
+
+    async def _post(self, path: str, params: Optional[Dict] = None) -> Dict[str, Any]:
         try:
-            response = self.session.post(
-                f"{self.base_url}/api/video/start",
-                json=params or {},
-                timeout=self.TIMEOUT
-            )
-            return response.json()
+            return await self._request("POST", path, payload=params or {})
         except Exception as e:
             return {"status": "error", "error": str(e)}
-    
-    def stop_video(self) -> Dict[str, Any]:
+
+    async def start_video(self, params: Optional[Dict] = None) -> Dict[str, Any]:
+        """启动视频处理"""
+        return await self._post("/api/video/start", params)
+
+    async def stop_video(self) -> Dict[str, Any]:
         """停止视频处理"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/api/video/stop",
-                timeout=self.TIMEOUT
-            )
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "error": str(e)}
-    
-    def start_audio(self, params: Optional[Dict] = None) -> Dict[str, Any]:
+        return await self._post("/api/video/stop")
+
+    async def start_audio(self, params: Optional[Dict] = None) -> Dict[str, Any]:
         """启动音频处理"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/api/audio/start",
-                json=params or {},
-                timeout=self.TIMEOUT
-            )
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "error": str(e)}
-    
-    def stop_audio(self) -> Dict[str, Any]:
+        return await self._post("/api/audio/start", params)
+
+    async def stop_audio(self) -> Dict[str, Any]:
         """停止音频处理"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/api/audio/stop",
-                timeout=self.TIMEOUT
-            )
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "error": str(e)}
-    
-    def is_available(self) -> bool:
+        return await self._post("/api/audio/stop")
+
+    async def is_available(self) -> bool:
         """检查服务是否可用"""
-        health = self.health_check()
+        health = await self.health_check()
         return health.get("status") == "healthy"
 
+    # ---- 指标订阅 ----
+
+    async def _poll_metrics(self, interval: float):
+        while self._metrics_subscribers:
+            # 每次轮询都取新数据，但仍与其他调用方的同一请求合并
+            metrics = await self.get_metrics(max_age=0)
+            for queue in list(self._metrics_subscribers):
+                # 订阅者来不及处理时只保留最新一条
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(metrics)
+            await asyncio.sleep(interval)
+
+    async def subscribe_metrics(self, interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        订阅性能指标
+
+        所有订阅者共享一个轮询任务(间隔取首个订阅者的设置)，最后一个订阅者退出时停止。
+
+        用法:
+            async for metrics in client.subscribe_metrics():
+                ...
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._metrics_subscribers.append(queue)
+        if self._metrics_task is None or self._metrics_task.done():
+            self._metrics_task = asyncio.ensure_future(self._poll_metrics(interval))
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._metrics_subscribers.remove(queue)
+            if not self._metrics_subscribers and self._metrics_task:
+                self._metrics_task.cancel()
+                self._metrics_task = None
+
+    async def aclose(self):
+        """关闭连接池并停止订阅任务"""
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> 'ARBackendClient':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
 
 # 全局客户端实例
 _client = None
 
 
 def get_client() -> ARBackendClient:
-    """获取全局客户端实例"""
+    """获取全局客户端实例(构造时不进行网络探测)"""
     global _client
     if _client is None:
         _client = ARBackendClient()
     return _client
 
 
-def check_backend() -> bool:
+async def check_backend() -> bool:
     """快捷函数：检查后端是否可用"""
-    return get_client().is_available()
+    return await get_client().is_available()
@@ -3,14 +3,15 @@
 """
 User GUI 监控服务客户端
 负责向YL-monitor上报状态、心跳和性能指标
+心跳通过共享的上报通道(report_channel)发送，与状态上报器合并为一条请求
 """
 
 import threading
-import requests
-import psutil
 from datetime import datetime
 from typing import Dict, Any, Optional, Callable
 
+from .report_channel import get_report_channel
+
 import logging
 logger = logging.getLogger('MonitorClient')
 
@@ -42,9 +43,8 @@ class MonitorClient:
         self.status = 'initializing'
         self.metadata = {}
         
-        # 线程
-        self._heartbeat_thread: Optional[threading.Thread] = None
-        self._stop_event = threading.Event()
+        # 上报通道
+        self._channel = get_report_channel(self.monitor_url)
         
         # 回调
         self._status_callbacks: list[Callable] = []
@@ -83,24 +83,23 @@ class MonitorClient:
             return
             
         self.running = True
-        self._stop_event.clear()
+        self.status = 'online'
         
-        # 启动心跳线程
-        self._heartbeat_thread = threading.Thread(
-            target=self._heartbeat_loop,
-            name='MonitorHeartbeat',
-            daemon=True
+        # 注册到上报通道
+        self._channel.add_listener(self._on_channel_state)
+        self._channel.register(
+            f'monitor_client:{self.node_id}',
+            self._heartbeat_payload,
+            self.heartbeat_interval
         )
-        self._heartbeat_thread.start()
         
         # 启动本地HTTP服务
         self._start_local_server()
         
-        self.status = 'online'
         logger.info("监控客户端已启动")
         
         # 发送初始心跳
-        self._send_heartbeat()
+        self._channel.trigger()
     
     def stop(self):
         """停止监控客户端"""
@@ -108,11 +107,10 @@ class MonitorClient:
             return
             
         self.running = False
-        self._stop_event.set()
         
-        # 停止心跳线程
-        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
-            self._heartbeat_thread.join(timeout=5)
+        # 从上报通道注销
+        self._channel.unregister(f'monitor_client:{self.node_id}')
+        self._channel.remove_listener(self._on_channel_state)
         
         # 停止本地HTTP服务
         self._stop_local_server()
@@ -120,108 +118,47 @@ class MonitorClient:
         self.status = 'offline'
         logger.info("监控客户端已停止")
     
-    def _heartbeat_loop(self):
-        """心跳循环"""
-        while not self._stop_event.is_set():
-            try:
-                self._send_heartbeat()
-            except Exception as e:
-                logger.error(f"心跳发送失败: {e}")
-                
-                # 状态降级
-                if self.status == 'online':
-                    old_status = self.status
-                    self.status = 'degraded'
-                    self._notify_status_change(old_status, self.status)
+    def _on_channel_state(self, ok: bool):
+        """上报通道发送结果回调，维护在线/降级状态"""
+        if ok:
+            self.last_heartbeat = datetime.utcnow()
             
-            # 等待下一次心跳
-            self._stop_event.wait(self.heartbeat_interval)
-    
-    def _send_heartbeat(self):
-        """发送心跳"""
-        if not self.enabled:
-            return
+            # 恢复状态
+            if self.status in ['degraded', 'error']:
+                old_status = self.status
+                self.status = 'online'
+                self._notify_status_change(old_status, self.status)
             
-        try:
-            # 收集状态数据
-            data = self._collect_status()
-            
-            # 发送心跳
-            url = f"{self.monitor_url}/api/v1/ar/heartbeat"
-            response = requests.post(
-                url,
-                json=data,
-                timeout=5,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            if response.status_code == 200:
-                self.last_heartbeat = datetime.utcnow()
-                
-                # 恢复状态
-                if self.status in ['degraded', 'error']:
-                    old_status = self.status
-                    self.status = 'online'
-                    self._notify_status_change(old_status, self.status)
-                
-                logger.debug(f"心跳发送成功: {self.node_id}")
-            else:
-                logger.warning(f"心跳发送失败: HTTP {response.status_code}")
-                
-        except requests.exceptions.ConnectionError:
-            logger.warning("无法连接到监控服务")
-            raise
-        except requests.exceptions.Timeout:
-            logger.warning("心跳发送超时")
-            raise
-        except Exception as e:
-            logger.error(f"心跳发送异常: {e}")
-            raise
+            logger.debug(f"心跳发送成功: {self.node_id}")
+        elif self.status == 'online':
+            # 状态降级
+            old_status = self.status
+            self.status = 'degraded'
+            self._notify_status_change(old_status, self.status)
     
-    def _collect_status(self) -> Dict[str, Any]:
-        """收集状态数据"""
-        try:
-            # 系统资源
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            memory = psutil.virtual_memory()
-            
-            resources = {
-                'cpu_percent': cpu_percent,
-                'memory_percent': memory.percent,
-                'memory_used': memory.used,
-                'memory_available': memory.available
-            }
-            
-            # GUI状态
-            gui_status = {
+    def _heartbeat_payload(self) -> Dict[str, Any]:
+        """心跳数据(资源信息由上报通道统一采集)"""
+        return {
+            'node_id': self.node_id,
+            'node_name': self.node_name,
+            'node_type': 'user-gui',
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'status': self.status,
+            'gui': {
                 'status': self.status,
                 'window_visible': True,  # 由GUI更新
                 'camera_active': False,  # 由GUI更新
                 'microphone_active': False,  # 由GUI更新
                 'current_scene': None,  # 由GUI更新
-            }
-            
-            return {
-                'node_id': self.node_id,
-                'node_name': self.node_name,
-                'node_type': 'user-gui',
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'status': self.status,
-                'resources': resources,
-                'gui': gui_status,
-                'metadata': self.metadata
-            }
-            
-        except Exception as e:
-            logger.error(f"状态收集失败: {e}")
-            return {
-                'node_id': self.node_id,
-                'node_name': self.node_name,
-                'node_type': 'user-gui',
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'status': 'error',
-                'error': str(e)
-            }
+            },
+            'metadata': self.metadata
+        }
+    
+    def _collect_status(self) -> Dict[str, Any]:
+        """收集状态数据"""
+        status = self._heartbeat_payload()
+        status['resources'] = self._channel.collect_resources()
+        return status
     
     def update_gui_status(self, **kwargs):
         """更新GUI状态"""
@@ -321,7 +258,8 @@ class MonitorClient:
                 self.last_heartbeat.isoformat()
                 if self.last_heartbeat else None
             ),
-            'monitor_url': self.monitor_url
+            'monitor_url': self.monitor_url,
+            'channel': self._channel.get_stats()
         }
 
 
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User GUI 统一上报通道
+监控客户端与状态上报器共用一个通道向 YL-monitor 上报心跳/状态
+
+- 持久 keep-alive 会话，不再每次心跳新建 TCP 连接
+- 各上报源按节点合并为一条心跳，资源信息每次只采集一次(非阻塞 CPU 采样)
+- 监控服务不可达时在有界缓冲区中暂存，恢复后分批(可 gzip 压缩)补发
+- 连续失败时按指数退避重试
+"""
+
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger('ReportChannel')
+
+HEARTBEATS_PATH = '/api/v1/ar/heartbeats'
+
+
+def _merge_payload(target: Dict[str, Any], payload: Dict[str, Any]):
+    """合并上报数据，字典字段(gui/metadata等)逐键合并，其余字段后者覆盖"""
+    for key, value in payload.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            target[key] = {**target[key], **value}
+        else:
+            target[key] = value
+
+
+class ReportChannel:
+    """
+    上报通道
+    各上报源注册一个返回心跳数据(需含 node_id)的函数，通道线程按最短间隔统一采集发送
+    """
+
+    def __init__(
+        self,
+        monitor_url: str,
+        interval: float = 30.0,
+        timeout: float = 5.0,
+        batch_size: int = 50,
+        max_buffered: int = 500,
+        max_backoff: float = 300.0,
+        compress_min_bytes: int = 1024
+    ):
+        self.monitor_url = monitor_url.rstrip('/')
+        self.default_interval = interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.compress_min_bytes = compress_min_bytes
+
+        # 单连接的持久会话
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'UserGUI-ReportChannel/1.0'
+        })
+
+        # 上报源: 名称 -> (数据函数, 间隔)
+        self._providers: Dict[str, tuple] = {}
+        self._listeners: List[Callable[[bool], None]] = []
+        self._buffer: deque = deque(maxlen=max_buffered)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+
+        self._process = None
+        self.online: Optional[bool] = None
+        self.consecutive_failures = 0
+        self.last_success: Optional[float] = None
+        self.sent_count = 0
+        self.failed_count = 0
+        self.dropped_count = 0
+
+    # ---- 上报源 ----
+
+    def register(self, name: str, provider: Callable[[], Dict[str, Any]], interval: Optional[float] = None):
+        """注册上报源，首个上报源注册时启动通道线程"""
+        with self._lock:
+            self._providers[name] = (provider, interval or self.default_interval)
+        self._start()
+
+    def unregister(self, name: str):
+        """注销上报源，最后一个上报源注销时发送剩余数据并停止通道线程"""
+        with self._lock:
+            self._providers.pop(name, None)
+            empty = not self._providers
+        if empty:
+            self._stop()
+
+    def add_listener(self, callback: Callable[[bool], None]):
+        """添加连通状态回调，每次发送后以是否成功调用"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[bool], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def trigger(self):
+        """立即进行一次上报(如启动时的首个心跳)"""
+        self._wakeup.set()
+
+    @property
+    def interval(self) -> float:
+        with self._lock:
+            intervals = [interval for _, interval in self._providers.values()]
+        return min(intervals) if intervals else self.default_interval
+
+    # ---- 采集 ----
+
+    def collect_resources(self) -> Dict[str, Any]:
+        """采集系统与本进程资源(CPU 为距上次调用的平均值，不阻塞)"""
+        if not PSUTIL_AVAILABLE:
+            return {}
+        try:
+            if self._process is None:
+                self._process = psutil.Process()
+                # 首次调用只建立基准
+                psutil.cpu_percent(interval=None)
+                self._process.cpu_percent(interval=None)
+            memory = psutil.virtual_memory()
+            return {
+                'cpu_percent': psutil.cpu_percent(interval=None),
+                'memory_percent': memory.percent,
+                'memory_used': memory.used,
+                'memory_available': memory.available,
+                'process_cpu_percent': self._process.cpu_percent(interval=None),
+                'memory_mb': self._process.memory_info().rss / 1024 / 1024,
+                'threads': self._process.num_threads()
+            }
+        except Exception as e:
+            logger.error(f"资源采集失败: {e}")
+            return {}
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """调用全部上报源，按 node_id 合并"""
+        with self._lock:
+            providers = list(self._providers.items())
+
+        snapshots: Dict[str, Dict[str, Any]] = {}
+        for name, (provider, _) in providers:
+            try:
+                payload = provider()
+            except Exception as e:
+                logger.error(f"上报源 {name} 采集失败: {e}")
+                continue
+            if payload and payload.get('node_id'):
+                _merge_payload(snapshots.setdefault(payload['node_id'], {}), payload)
+
+        if snapshots:
+            resources = self.collect_resources()
+            for snapshot in snapshots.values():
+                snapshot['resources'] = {**resources, **snapshot.get('resources', {})}
+        return list(snapshots.values())
+
+    # ---- 发送 ----
+
+    def _post(self, batch: List[Dict[str, Any]]) -> Optional[bool]:
+        """
+        发送一批心跳
+
+        Returns:
+            True 成功；False 可重试的失败(连接错误/服务端错误)；None 数据被拒绝(不再重试)
+        """
+        body = json.dumps({'heartbeats': batch}, ensure_ascii=False).encode('utf-8')
+        headers = {}
+        if len(body) >= self.compress_min_bytes:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+
+        try:
+            response = self.session.post(
+                self.monitor_url + HEARTBEATS_PATH,
+                data=body,
+                headers=headers,
+                timeout=self.timeout
+            )
+        except requests.exceptions.ConnectionError:
+            logger.warning("无法连接到监控服务")
+            return False
+        except requests.exceptions.Timeout:
+            logger.warning("心跳发送超时")
+            return False
+        except Exception as e:
+            logger.error(f"心跳发送异常: {e}")
+            return False
+
+        if response.status_code == 200:
+            return True
+        if 400 <= response.status_code < 500:
+            logger.error(f"心跳数据被拒绝: HTTP {response.status_code}")
+            return None
+        logger.warning(f"心跳发送失败: HTTP {response.status_code}")
+        return False
+
+    def _drain(self) -> bool:
+        """分批发送缓冲区，遇到可重试的失败时停止(数据保留在缓冲区)"""
+        while True:
+            with self._lock:
+                batch = list(islice(self._buffer, self.batch_size))
+            if not batch:
+                return True
+
+            result = self._post(batch)
+            if result is False:
+                return False
+
+            with self._lock:
+                for _ in batch:
+                    self._buffer.popleft()
+            if result:
+                self.sent_count += len(batch)
+            else:
+                self.dropped_count += len(batch)
+
+    def flush(self) -> bool:
+        """采集并发送一次(含离线期间缓冲的数据)，返回是否全部发送成功"""
+        with self._send_lock:
+            snapshots = self._collect()
+            with self._lock:
+                overflow = len(self._buffer) + len(snapshots) - self._buffer.maxlen
+                if overflow > 0:
+                    # 缓冲区满时丢弃最旧的数据
+                    self.dropped_count += overflow
+                self._buffer.extend(snapshots)
+
+            ok = self._drain()
+            if ok:
+                if self.online is False:
+                    logger.info("监控服务恢复连接，缓冲数据已补发")
+                self.consecutive_failures = 0
+                self.last_success = time.time()
+            else:
+                self.consecutive_failures += 1
+                self.failed_count += 1
+            self.online = ok
+
+        for callback in list(self._listeners):
+            try:
+                callback(ok)
+            except Exception as e:
+                logger.error(f"连通状态回调执行失败: {e}")
+        return ok
+
+    def _next_delay(self) -> float:
+        interval = self.interval
+        if self.consecutive_failures == 0:
+            return interval
+        # 离线时指数退避
+        return min(interval * 2 ** (self.consecutive_failures - 1), max(self.max_backoff, interval))
+
+    def _run(self):
+        logger.info(f"上报通道启动: {self.monitor_url}，间隔: {self.interval}秒")
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self._next_delay())
+            self._wakeup.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"上报循环异常: {e}")
+        logger.info("上报通道停止")
+
+    def _start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='ReportChannel', daemon=True)
+            self._thread.start()
+
+    def _stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop_event.set()
+        self._wakeup.set()
+        thread.join(timeout=5)
+        # 尽力发送剩余数据
+        if self._buffer:
+            with self._send_lock:
+                self._drain()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取通道统计"""
+        with self._lock:
+            buffered = len(self._buffer)
+            providers = list(self._providers)
+        return {
+            'monitor_url': self.monitor_url,
+            'online': self.online,
+            'providers': providers,
+            'interval': self.interval,
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'dropped': self.dropped_count,
+            'buffered': buffered,
+            'consecutive_failures': self.consecutive_failures,
+            'last_success': self.last_success
+        }
+
+
+# 按监控地址共享的通道
+_channels: Dict[str, ReportChannel] = {}
+_channels_lock = threading.Lock()
+
+
+def get_report_channel(monitor_url: str, **kwargs) -> ReportChannel:
+    """获取监控地址对应的共享上报通道(参数只在首次创建时生效)"""
+    key = monitor_url.rstrip('/')
+    with _channels_lock:
+        channel = _channels.get(key)
+        if channel is None:
+            channel = _channels[key] = ReportChannel(key, **kwargs)
+        return channel
+
+
+__all__ = ['ReportChannel', 'get_report_channel']
@@ -3,19 +3,21 @@
 """
 User GUI 状态上报服务
 定时向 YL-monitor 上报应用状态
+状态通过共享的上报通道(report_channel)发送，与监控客户端心跳合并为一条请求，
+监控服务离线期间的状态在通道中缓冲，恢复后补发
 """
 
 import os
 import sys
 import time
-import json
 import logging
-import requests
 import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from .report_channel import get_report_channel
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -33,19 +35,19 @@ class StatusReporter:
     def __init__(self, config_path: Optional[str] = None):
         self.config = self._load_config(config_path)
         self.running = False
-        self.thread: Optional[threading.Thread] = None
         self.last_report_time: Optional[datetime] = None
         self.report_count = 0
         self.error_count = 0
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'UserGUI-StatusReporter/1.0'
-        })
+        self.channel = get_report_channel(
+            self.config['monitor_url'],
+            interval=self.config['report_interval'],
+            timeout=self.config['timeout']
+        )
         
         # 状态缓存
         self._status_cache: Dict[str, Any] = {}
         self._lock = threading.Lock()
+        self._process = None
         
     def _load_config(self, config_path: Optional[str]) -> Dict:
         """加载配置"""
@@ -78,40 +80,42 @@ class StatusReporter:
             
         return default_config
     
+    def _report_payload(self) -> Dict[str, Any]:
+        """状态数据(资源信息由上报通道统一采集)"""
+        status = {
+            'node_id': self.config['node_id'],
+            'node_name': self.config['node_name'],
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'version': '2.0.0',
+            'gui': {
+                'window_active': True,  # 由GUI更新
+                'video_running': False,  # 由GUI更新
+                'audio_running': False,  # 由GUI更新
+                'face_loaded': False  # 由GUI更新
+            }
+        }
+        
+        try:
+            import psutil
+            if self._process is None:
+                self._process = psutil.Process()
+            status['uptime'] = time.time() - self._process.create_time()
+        except Exception as e:
+            logger.debug(f"获取进程信息失败: {e}")
+        
+        # 合并GUI更新的状态
+        with self._lock:
+            status['gui'].update(self._status_cache)
+        
+        return status
+    
     def _collect_status(self) -> Dict[str, Any]:
         """收集当前状态"""
         try:
-            import psutil
-            
-            # 获取进程信息
-            process = psutil.Process()
-            
-            status = {
-                'node_id': self.config['node_id'],
-                'node_name': self.config['node_name'],
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'status': 'running',
-                'version': '2.0.0',
-                'uptime': time.time() - process.create_time(),
-                'resources': {
-                    'cpu_percent': process.cpu_percent(),
-                    'memory_mb': process.memory_info().rss / 1024 / 1024,
-                    'threads': process.num_threads()
-                },
-                'gui': {
-                    'window_active': True,  # 由GUI更新
-                    'video_running': False,  # 由GUI更新
-                    'audio_running': False,  # 由GUI更新
-                    'face_loaded': False  # 由GUI更新
-                }
-            }
-            
-            # 合并GUI更新的状态
-            with self._lock:
-                status['gui'].update(self._status_cache)
-                
+            status = self._report_payload()
+            status['status'] = 'running'
+            status['resources'] = self.channel.collect_resources()
             return status
-            
         except Exception as e:
             logger.error(f"收集状态失败: {e}")
             return {
@@ -127,63 +131,15 @@ class StatusReporter:
             self._status_cache.update(kwargs)
             logger.debug(f"GUI状态更新: {kwargs}")
     
-    def _send_report(self, status: Dict[str, Any]) -> bool:
-        """发送状态报告"""
-        url = f"{self.config['monitor_url']}/api/ar/nodes/{self.config['node_id']}/heartbeat"
-        
-        for attempt in range(self.config['max_retries']):
-            try:
-                response = self.session.post(
-                    url,
-                    json=status,
-                    timeout=self.config['timeout']
-                )
-                
-                if response.status_code == 200:
-                    logger.debug(f"状态上报成功: {response.json()}")
-                    return True
-                else:
-                    logger.warning(f"状态上报失败: HTTP {response.status_code}")
-                    
-            except requests.exceptions.ConnectionError:
-                logger.warning(f"连接失败 (尝试 {attempt + 1}/{self.config['max_retries']})")
-            except requests.exceptions.Timeout:
-                logger.warning(f"请求超时 (尝试 {attempt + 1}/{self.config['max_retries']})")
-            except Exception as e:
-                logger.error(f"上报异常: {e}")
-                
-            if attempt < self.config['max_retries'] - 1:
-                time.sleep(self.config['retry_delay'])
-                
-        return False
-    
-    def _report_loop(self):
-        """上报循环"""
-        logger.info(f"状态上报线程启动，间隔: {self.config['report_interval']}秒")
-        
-        while self.running:
-            try:
-                status = self._collect_status()
-                success = self._send_report(status)
-                
-                if success:
-                    self.last_report_time = datetime.utcnow()
-                    self.report_count += 1
-                    logger.info(f"状态上报成功 [#{self.report_count}]")
-                else:
-                    self.error_count += 1
-                    logger.error(f"状态上报失败 [#{self.error_count}]")
-                    
-            except Exception as e:
-                logger.error(f"上报循环异常: {e}")
-                
-            # 等待下一次上报
-            for _ in range(self.config['report_interval']):
-                if not self.running:
-                    break
-                time.sleep(1)
-                
-        logger.info("状态上报线程停止")
+    def _on_channel_state(self, ok: bool):
+        """上报通道发送结果回调"""
+        if ok:
+            self.last_report_time = datetime.utcnow()
+            self.report_count += 1
+            logger.debug(f"状态上报成功 [#{self.report_count}]")
+        else:
+            self.error_count += 1
+            logger.warning(f"状态上报失败，已缓冲待补发 [#{self.error_count}]")
     
     def start(self) -> bool:
         """启动状态上报"""
@@ -196,8 +152,12 @@ class StatusReporter:
             return False
             
         self.running = True
-        self.thread = threading.Thread(target=self._report_loop, daemon=True)
-        self.thread.start()
+        self.channel.add_listener(self._on_channel_state)
+        self.channel.register(
+            f"status_reporter:{self.config['node_id']}",
+            self._report_payload,
+            self.config['report_interval']
+        )
         
         logger.info(f"状态上报服务启动: {self.config['node_id']} -> {self.config['monitor_url']}")
         return True
@@ -210,8 +170,8 @@ class StatusReporter:
         logger.info("正在停止状态上报服务...")
         self.running = False
         
-        if self.thread:
-            self.thread.join(timeout=5)
+        self.channel.unregister(f"status_reporter:{self.config['node_id']}")
+        self.channel.remove_listener(self._on_channel_state)
             
         logger.info("状态上报服务已停止")
     
@@ -226,7 +186,8 @@ class StatusReporter:
                 'node_id': self.config['node_id'],
                 'monitor_url': self.config['monitor_url'],
                 'interval': self.config['report_interval']
-            }
+            },
+            'channel': self.channel.get_stats()
         }
 
 